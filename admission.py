@@ -0,0 +1,164 @@
+"""Admission control per route class.
+
+Waitress runs a fixed number of threads per process. An AI chat can hold
+one for a minute (upstream call plus retries) and a big export for many
+seconds; when every thread is busy that way, a cashier's checkout waits in
+Waitress's queue behind them. Each request is therefore put in a class
+(``checkout``, ``crud``, ``reports``, ``ai``, ``events``) before the view runs:
+
+* every class except ``checkout`` has its own concurrency limit and a short
+  bounded queue; when both are full the request is answered at once with
+  429 and ``Retry-After`` instead of occupying a thread;
+* running requests of every class except ``checkout`` together may use at
+  most ``threads - reserved`` threads. A request over that budget waits in
+  its class queue until a thread frees or ``queue_timeout`` passes, so a
+  burst of dashboard fetches is served late rather than refused.
+
+A queued request waits on a server thread of its own: ``server_threads``
+gives Waitress one extra thread per queue slot, so waiting requests never
+sit on the ``reserved`` threads kept for checkout and scan lookups. A class
+outside the shared budget (``events``: AI job event streams, which stay
+open for seconds) also gets server threads of its own, one per slot.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+RESERVED_CLASS = "checkout"
+
+
+@dataclass
+class RouteClassLimits:
+    limit: int
+    queue: int
+    queue_timeout: float
+    retry_after: int
+    shared: bool = True  # counts against the shared budget
+
+
+class _ClassState:
+    def __init__(self, limits: RouteClassLimits):
+        self.limits = limits
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.queued = 0
+        self.rejected = 0
+        self.max_wait_ms = 0.0
+
+
+class AdmissionController:
+    def __init__(self, classes: Dict[str, RouteClassLimits], shared_budget: int):
+        self.shared_budget = max(1, shared_budget)
+        self._states = {name: _ClassState(limits) for name, limits in classes.items()}
+        self._condition = threading.Condition()
+
+    def _shared_occupancy(self) -> int:
+        return sum(state.active for name, state in self._states.items()
+                   if name != RESERVED_CLASS and state.limits.shared)
+
+    def _has_room(self, state: _ClassState) -> bool:
+        if state.active >= state.limits.limit:
+            return False
+        return not state.limits.shared or self._shared_occupancy() < self.shared_budget
+
+    def acquire(self, route_class: str) -> Tuple[bool, int]:
+        """Admit one request of ``route_class``; returns (admitted, retry_after_seconds)."""
+        state = self._states.get(route_class)
+        if state is None:
+            return True, 0
+        limits = state.limits
+        with self._condition:
+            if route_class == RESERVED_CLASS:
+                state.active += 1
+                state.admitted += 1
+                return True, 0
+            if self._has_room(state):
+                state.active += 1
+                state.admitted += 1
+                return True, 0
+            if state.waiting >= limits.queue:
+                state.rejected += 1
+                return False, limits.retry_after
+
+            state.waiting += 1
+            state.queued += 1
+            started = time.monotonic()
+            deadline = started + limits.queue_timeout
+            try:
+                while not self._has_room(state):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        state.rejected += 1
+                        return False, limits.retry_after
+                    self._condition.wait(remaining)
+            finally:
+                state.waiting -= 1
+                state.max_wait_ms = max(state.max_wait_ms, (time.monotonic() - started) * 1000)
+            state.active += 1
+            state.admitted += 1
+            return True, 0
+
+    def release(self, route_class: str) -> None:
+        state = self._states.get(route_class)
+        if state is None:
+            return
+        with self._condition:
+            state.active = max(0, state.active - 1)
+            self._condition.notify_all()
+
+    def report(self) -> Dict[str, Dict[str, float]]:
+        with self._condition:
+            return {
+                "shared_budget": self.shared_budget,
+                "classes": {
+                    name: {
+                        "limit": None if name == RESERVED_CLASS else state.limits.limit,
+                        "queue": None if name == RESERVED_CLASS else state.limits.queue,
+                        "active": state.active,
+                        "waiting": state.waiting,
+                        "admitted": state.admitted,
+                        "queued": state.queued,
+                        "rejected": state.rejected,
+                        "max_wait_ms": round(state.max_wait_ms, 1),
+                    }
+                    for name, state in self._states.items()
+                },
+            }
+
+
+def default_route_classes(threads: int, reserved: int, env: Optional[Dict[str, str]] = None) -> Dict[str, RouteClassLimits]:
+    """Limits derived from the Waitress thread count; ``ADMISSION_<CLASS>_LIMIT``/``_QUEUE`` override."""
+    env = env or {}
+    budget = max(1, threads - reserved)
+    classes = {
+        "checkout": RouteClassLimits(limit=threads, queue=0, queue_timeout=0, retry_after=1),
+        "crud": RouteClassLimits(limit=budget, queue=budget, queue_timeout=5, retry_after=2),
+        "reports": RouteClassLimits(limit=max(1, budget // 2), queue=1, queue_timeout=5, retry_after=10),
+        "ai": RouteClassLimits(limit=max(1, budget // 2), queue=1, queue_timeout=2, retry_after=5),
+        # A refused stream falls back to polling, so it never queues.
+        "events": RouteClassLimits(limit=2, queue=0, queue_timeout=0, retry_after=1, shared=False),
+    }
+    for name, limits in classes.items():
+        prefix = f"ADMISSION_{name.upper()}_"
+        limits.limit = max(1, int(env.get(prefix + "LIMIT", limits.limit)))
+        limits.queue = max(0, int(env.get(prefix + "QUEUE", limits.queue)))
+    return classes
+
+
+def server_threads(threads: int, env: Optional[Dict[str, str]] = None) -> int:
+    """Waitress threads for ``threads`` working threads plus one per queue slot and unshared slot.
+
+    Reads ``ADMISSION_CONTROL`` and ``ADMISSION_CHECKOUT_RESERVED`` like app.py.
+    """
+    env = env or {}
+    if env.get("ADMISSION_CONTROL", "1") == "0":
+        return threads
+    reserved = max(0, int(env.get("ADMISSION_CHECKOUT_RESERVED", "1")))
+    classes = default_route_classes(threads, reserved, env)
+    return threads + sum(limits.queue + (0 if limits.shared else limits.limit)
+                         for name, limits in classes.items() if name != RESERVED_CLASS)
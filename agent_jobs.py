@@ -0,0 +1,73 @@
+"""Background pool for AI chat turns.
+
+A chat turn may make a planner call, run tools and make a summary call,
+each with its own upstream timeout. Run inside the HTTP request, that holds
+a Waitress thread for the whole turn. ``AgentJobRunner`` runs turns on a
+small dedicated pool instead: the request only records the job and returns
+its id, and the client polls ``/api/agent/task/<id>`` or streams
+``/api/agent/task/<id>/events``.
+
+The queue is bounded; ``submit`` returns False when it is full so the
+caller can answer 429 instead of letting jobs pile up.
+"""
+
+from __future__ import annotations
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+
+class AgentJobRunner:
+    def __init__(self, workers: int = 2, queue_limit: int = 8):
+        self.workers = max(1, workers)
+        self.queue_limit = max(0, queue_limit)
+        self._lock = threading.Lock()
+        self._executor = None  # started on first use, so a pre-fork parent never owns threads
+        self._running = 0
+        self._queued = 0
+        self.submitted = 0
+        self.rejected = 0
+        self.failed = 0
+
+    def has_capacity(self) -> bool:
+        with self._lock:
+            return self._running + self._queued < self.workers + self.queue_limit
+
+    def submit(self, fn: Callable[[], Any]) -> bool:
+        with self._lock:
+            if self._running + self._queued >= self.workers + self.queue_limit:
+                self.rejected += 1
+                return False
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="ai-job")
+            self._queued += 1
+            self.submitted += 1
+        self._executor.submit(self._run, fn)
+        return True
+
+    def _run(self, fn: Callable[[], Any]) -> None:
+        with self._lock:
+            self._queued -= 1
+            self._running += 1
+        try:
+            fn()
+        except Exception as exc:
+            with self._lock:
+                self.failed += 1
+            print(f"[AI Jobs] Job crashed: {exc}")
+        finally:
+            with self._lock:
+                self._running -= 1
+
+    def report(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "queue_limit": self.queue_limit,
+                "running": self._running,
+                "queued": self._queued,
+                "submitted": self.submitted,
+                "rejected": self.rejected,
+                "failed": self.failed,
+            }
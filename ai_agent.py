@@ -1,18 +1,93 @@
 """
 AI Agent Module for POS System
-Handles communication with APIFree.ai (DeepSeek V4 Pro by default;
-override with the AI_MODEL environment variable)
+Handles communication with APIFree.ai (DeepSeek V4 Pro by default) or any
+OpenAI-compatible server, such as an on-prem Ollama or llama.cpp. See
+ProviderConfig for the base URL, model, timeout and concurrency settings.
 """
 
 import os
 import json
 import requests
-from typing import List, Dict, Any, Optional, Callable
+import llm_http
+from typing import List, Dict, Any, Optional, Callable, Sequence
+from urllib.parse import urlparse
 from dataclasses import dataclass, field
 
 
 APIFREE_BASE_URL = "https://api.apifree.ai/v1"
 DEFAULT_MODEL = "deepseek-ai/deepseek-v4-pro-stable"
+DEFAULT_TIMEOUT_SECONDS = 60.0
+STREAM_INTERRUPTED_MESSAGE = "The reply was interrupted. Please try again."
+
+# History budgets use a rough estimate (about four characters per token for
+# English and JSON). The provider does the exact count.
+CHARS_PER_TOKEN = 4
+HISTORY_SUMMARY_PREFIX = "Summary of earlier conversation:"
+HISTORY_SUMMARY_LINES = 8
+
+
+def with_turn_context(turn_context: str, content: Optional[str]) -> str:
+    """A user message with the per-turn context placed above it."""
+    return f"{turn_context}\n\n{content or ''}".rstrip()
+
+
+@dataclass(frozen=True)
+class ProviderConfig:
+    """Where chat completions go. An environment variable wins over the Settings value."""
+    base_url: str = APIFREE_BASE_URL
+    model: str = DEFAULT_MODEL
+    api_key: str = ""  # the hosted provider's key; never sent to another host
+    base_url_api_key: str = ""  # key for a self-configured base_url (gateway, on-prem server)
+    timeout_seconds: float = DEFAULT_TIMEOUT_SECONDS
+    max_concurrency: int = 0  # provider calls in flight per worker process; 0 = no limit
+
+    # field: (environment variable, setting key)
+    SOURCES = {
+        "base_url": ("AI_BASE_URL", "ai_base_url"),
+        "model": ("AI_MODEL", "ai_model"),
+        "api_key": ("APIFREE_API_KEY", "ai_api_key"),
+        "base_url_api_key": ("AI_API_KEY", "ai_base_url_api_key"),
+        "timeout_seconds": ("AI_TIMEOUT_SECONDS", "ai_timeout_seconds"),
+        "max_concurrency": ("AI_MAX_CONCURRENCY", "ai_max_concurrency"),
+    }
+
+    @classmethod
+    def load(cls, db_get_setting=None, env=None) -> "ProviderConfig":
+        env = os.environ if env is None else env
+        values: Dict[str, Any] = {}
+        for name, (variable, setting_key) in cls.SOURCES.items():
+            raw = env.get(variable, "")
+            if not raw and db_get_setting:
+                try:
+                    raw = db_get_setting(setting_key, "") or ""
+                    if raw and name == "api_key":
+                        print(f"[AI Agent] Loaded API key from database")
+                except Exception as e:
+                    print(f"[AI Agent] Error loading {setting_key} from database: {e}")
+                    raw = ""
+            raw = str(raw).strip()
+            if not raw:
+                continue
+            try:
+                if name == "timeout_seconds":
+                    values[name] = max(1.0, float(raw))
+                elif name == "max_concurrency":
+                    values[name] = max(0, int(raw))
+                else:
+                    values[name] = raw.rstrip("/") if name == "base_url" else raw
+            except ValueError:
+                print(f"[AI Agent] Ignoring invalid {variable}/{setting_key}: {raw!r}")
+        return cls(**values)
+
+    @property
+    def requires_api_key(self) -> bool:
+        """The hosted provider needs a key; a local OpenAI-compatible server usually does not."""
+        return urlparse(self.base_url).hostname == urlparse(APIFREE_BASE_URL).hostname
+
+    @property
+    def effective_api_key(self) -> str:
+        """The key sent to ``base_url``: the hosted key only goes to the hosted provider."""
+        return self.api_key if self.requires_api_key else self.base_url_api_key
 
 
 @dataclass
@@ -23,6 +98,24 @@ class Message:
     tool_call_id: Optional[str] = None
 
 
+def estimate_tokens(message: "Message") -> int:
+    """Approximate prompt tokens for one history message (content, tool calls, overhead)."""
+    size = len(message.content or "")
+    if message.tool_calls:
+        size += len(json.dumps(message.tool_calls))
+    return size // CHARS_PER_TOKEN + 4
+
+
+def _is_history_summary(message: "Message") -> bool:
+    # Histories saved by earlier releases carry the recap as an assistant message.
+    return message.role in ("user", "assistant") and (message.content or "").startswith(HISTORY_SUMMARY_PREFIX)
+
+
+def _clip(text: str, limit: int) -> str:
+    text = " ".join((text or "").split())
+    return text if len(text) <= limit else text[:limit - 3] + "..."
+
+
 @dataclass
 class ToolCall:
     id: str
@@ -37,41 +130,105 @@ class ChatResponse:
     finish_reason: str = ""
     usage: Dict = field(default_factory=dict)
     error: Optional[str] = None
+    unavailable: bool = False  # provider refused by the circuit breaker or the turn deadline
+    busy: bool = False  # every provider slot of this worker stayed taken until the deadline
+
+
+def read_stream(response, on_token: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
+    """Assemble a streamed (SSE) chat completion into the non-streamed response shape.
+
+    Content deltas are passed to ``on_token`` as they arrive. Tool calls arrive
+    as fragments keyed by ``index`` (id and name first, then pieces of the
+    JSON arguments) and are concatenated per index.
+    """
+    content_parts: List[str] = []
+    tool_calls: Dict[int, Dict[str, Any]] = {}
+    finish_reason = ""
+    usage: Dict[str, Any] = {}
+    # chunk_size=None yields data as it arrives; the default waits for 512 bytes,
+    # which would hold back the first tokens of every answer.
+    for raw in response.iter_lines(chunk_size=None):
+        # Decode per line: SSE bodies often lack a charset and would be read as Latin-1.
+        line = raw.decode("utf-8") if isinstance(raw, bytes) else raw
+        if not line.startswith("data:"):
+            continue  # blank separators, comments and event/id fields
+        body = line[5:].strip()
+        if body == "[DONE]":
+            break
+        chunk = json.loads(body)
+        if "error" in chunk:
+            return {"error": chunk["error"]}
+        usage = chunk.get("usage") or usage
+        for choice in chunk.get("choices") or []:
+            delta = choice.get("delta") or {}
+            text = delta.get("content")
+            if text:
+                content_parts.append(text)
+                if on_token:
+                    on_token(text)
+            for fragment in delta.get("tool_calls") or []:
+                slot = tool_calls.setdefault(fragment.get("index", len(tool_calls)), {
+                    "id": "", "type": "function", "function": {"name": "", "arguments": ""}})
+                if fragment.get("id"):
+                    slot["id"] = fragment["id"]
+                if fragment.get("type"):
+                    slot["type"] = fragment["type"]
+                function = fragment.get("function") or {}
+                slot["function"]["name"] += function.get("name") or ""
+                slot["function"]["arguments"] += function.get("arguments") or ""
+            if choice.get("finish_reason"):
+                finish_reason = choice["finish_reason"]
+    message: Dict[str, Any] = {"role": "assistant", "content": "".join(content_parts)}
+    if tool_calls:
+        message["tool_calls"] = [tool_calls[index] for index in sorted(tool_calls)]
+    return {"choices": [{"message": message, "finish_reason": finish_reason}], "usage": usage}
 
 
 class AIAgent:
     """Core AI Agent for handling chat completions with tool calling"""
     
-    def __init__(self, api_key: Optional[str] = None, model: Optional[str] = None, db_get_setting=None):
-        self.api_key = api_key or os.environ.get("APIFREE_API_KEY", "")
-        # If no API key from env, try to get from database via callback
-        if not self.api_key and db_get_setting:
-            try:
-                db_key = db_get_setting('ai_api_key', '')
-                if db_key:
-                    self.api_key = db_key
-                    print(f"[AI Agent] Loaded API key from database")
-            except Exception as e:
-                print(f"[AI Agent] Error loading API key from database: {e}")
+    def __init__(self, api_key: Optional[str] = None, model: Optional[str] = None, db_get_setting=None,
+                 config: Optional[ProviderConfig] = None):
+        # Environment first, then Settings (via the callback), then defaults.
+        self.config = config or ProviderConfig.load(db_get_setting)
+        self.api_key = api_key or self.config.effective_api_key
         if self.api_key:
             # Mask and print first/last few chars for debugging
             masked = f"{self.api_key[:8]}...{self.api_key[-4:]}" if len(self.api_key) > 12 else "configured"
             print(f"[AI Agent] API key is configured: {masked}")
-        else:
+        elif self.config.requires_api_key:
             print(f"[AI Agent] WARNING: No API key configured")
-        self.model = model or os.environ.get("AI_MODEL", DEFAULT_MODEL)
-        self.base_url = APIFREE_BASE_URL
+        self.model = model or self.config.model
+        # Any OpenAI-compatible endpoint: the hosted API, a gateway, an on-prem server or a test stand-in.
+        self.base_url = self.config.base_url
+        self.timeout = self.config.timeout_seconds
         self.conversation_history: List[Message] = []
-        self.tools: List[Dict] = []
+        # A list, or the shared read-only tuple that agent_orchestrator installs.
+        self.tools: Sequence[Dict] = []
         self.tool_functions: Dict[str, Callable] = {}
+        # Per-turn context (date, recalled memory). It is sent at the top of the
+        # latest user message and never stored, so the system prompt and the
+        # history before it stay a byte-identical prefix the provider can cache.
+        # Strict chat templates (llama.cpp, Ollama) accept only one leading
+        # system message, so it cannot travel as a system message of its own.
+        self.turn_context: str = ""
 
-    def trim_history(self, max_messages: int = 40):
+    def trim_history(self, max_messages: int = 40, max_tokens: Optional[int] = None,
+                     summarize: bool = False):
         """Bound retained chat data while preserving the system prompt.
 
         Tool results can contain large inventory and report payloads, so keeping an
         unlimited process-lifetime history causes steady memory growth. Trimming is
         performed after a complete request to avoid separating a tool call from its
         result while that request is in progress.
+
+        ``max_tokens`` also bounds the estimated size of what is re-sent on every
+        turn: whole turns (a user message and everything after it) are dropped,
+        oldest first, but the latest turn is always kept. With ``summarize`` the
+        dropped turns leave a short recap ("asked ... / answered ...") in their place.
+        The recap is a user-role note: strict chat templates reject an assistant
+        message straight after the system prompt, so ``_build_messages_payload``
+        sends it at the top of the first retained user message.
         """
         if max_messages < 1:
             self.clear_history()
@@ -79,15 +236,60 @@ class AIAgent:
 
         system_messages = [m for m in self.conversation_history if m.role == "system"][:1]
         conversation = [m for m in self.conversation_history if m.role != "system"]
-        if len(conversation) <= max_messages:
-            return
+        summary = conversation.pop(0) if conversation and _is_history_summary(conversation[0]) else None
 
         retained = conversation[-max_messages:]
         # A tool result without its preceding assistant tool call is not a valid API
         # conversation. Start at the first ordinary user/assistant message instead.
         while retained and retained[0].role == "tool":
             retained.pop(0)
-        self.conversation_history = system_messages + retained
+        dropped = conversation[:len(conversation) - len(retained)]
+
+        if max_tokens:
+            turns: List[List[Message]] = []
+            for message in retained:
+                if message.role == "user" or not turns:
+                    turns.append([])
+                turns[-1].append(message)
+            reserve = estimate_tokens(summary) if summary is not None else 0
+            total = sum(estimate_tokens(m) for m in retained) + reserve
+            while len(turns) > 1 and total > max_tokens:
+                turn = turns.pop(0)
+                dropped.extend(turn)
+                total -= sum(estimate_tokens(m) for m in turn)
+            retained = [m for turn in turns for m in turn]
+
+        if not dropped:
+            return
+        if summarize:
+            summary = self._summarize_turns(summary, dropped)
+        self.conversation_history = system_messages + ([summary] if summary else []) + retained
+
+    @staticmethod
+    def _summarize_turns(previous: Optional[Message], dropped: List[Message]) -> Optional[Message]:
+        """Fold dropped messages into the running recap, keeping the newest lines."""
+        lines = (previous.content.splitlines()[1:] if previous is not None else [])
+        question = None
+        answer = None
+
+        def flush():
+            if question is not None:
+                line = f"- Asked: {_clip(question, 100)}"
+                if answer:
+                    line += f" | Answered: {_clip(answer, 160)}"
+                lines.append(line)
+
+        for message in dropped:
+            if message.role == "user":
+                flush()
+                question, answer = message.content, None
+            elif message.role == "assistant" and message.content and not message.tool_calls:
+                answer = message.content
+        flush()
+        if not lines:
+            return previous
+        lines = lines[-HISTORY_SUMMARY_LINES:]
+        return Message(role="user", content="\n".join([HISTORY_SUMMARY_PREFIX] + lines))
         
     def register_tool(self, name: str, description: str, parameters: Dict, function: Callable):
         """Register a tool that the AI can call"""
@@ -99,6 +301,9 @@ class AIAgent:
                 "parameters": parameters
             }
         }
+        # Shared read-only schemas (see agent_orchestrator.SharedToolRegistry) are
+        # copied first; a name registered again replaces its schema.
+        self.tools = [t for t in self.tools if t["function"]["name"] != name]
         self.tools.append(tool_schema)
         self.tool_functions[name] = function
         
@@ -132,20 +337,74 @@ class AIAgent:
     def _build_messages_payload(self) -> List[Dict]:
         """Build the messages payload for the API request"""
         payload = []
+        summary = None
         for msg in self.conversation_history:
+            if _is_history_summary(msg):
+                summary = msg.content
+                continue
             message_dict = {"role": msg.role, "content": msg.content}
+            if summary is not None and msg.role == "user":
+                message_dict["content"] = with_turn_context(summary, msg.content)
+                summary = None
             if msg.tool_calls:
                 message_dict["tool_calls"] = msg.tool_calls
             if msg.tool_call_id:
                 message_dict["tool_call_id"] = msg.tool_call_id
             payload.append(message_dict)
+        if summary is not None:
+            payload.append({"role": "user", "content": summary})
+        if self.turn_context:
+            latest_user = max((i for i, m in enumerate(payload) if m["role"] == "user"), default=None)
+            if latest_user is None:
+                payload.append({"role": "user", "content": self.turn_context})
+            else:
+                payload[latest_user]["content"] = with_turn_context(self.turn_context,
+                                                                    payload[latest_user]["content"])
         return payload
         
+    def complete(self, payload: Dict[str, Any],
+                 on_token: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
+        """Send one chat completion to the configured provider and return the response body.
+
+        Every provider call goes through here: chat turns, planner and summary
+        calls. It holds a provider slot for the whole exchange, including a
+        streamed body, and records the reported token usage. Transport errors
+        propagate to the caller.
+        """
+        headers = {"Content-Type": "application/json"}
+        if self.api_key:
+            headers["Authorization"] = f"Bearer {self.api_key}"
+        stream = bool(payload.get("stream"))
+        with llm_http.provider_slot(self.timeout):
+            response = llm_http.post(
+                f"{self.base_url}/chat/completions",
+                headers=headers,
+                json=payload,
+                timeout=self.timeout,
+                **({"stream": True} if stream else {})
+            )
+            timings = getattr(response, "timings", None) or {}
+            print(f"[AI Agent API] connect {timings.get('connect_ms')} ms, "
+                  f"first byte {timings.get('ttfb_ms')} ms")
+            response.raise_for_status()
+            data = read_stream(response, on_token) if stream else response.json()
+        llm_http.record_usage(data.get("usage"), response)
+        return data
+
+    @staticmethod
+    def _may_retry(retry_count: int, max_retries: int, wait_time: float) -> bool:
+        """Retry only while the breaker lets calls through and the turn has time for the backoff."""
+        if retry_count >= max_retries or not llm_http.provider_available():
+            return False
+        remaining = llm_http.time_left()
+        return remaining is None or remaining > wait_time
+
     def chat(self, message: Optional[str] = None, temperature: float = 0.7, 
              max_tokens: int = 2048, stream: bool = False, 
              tools_override: Optional[List[Dict]] = None,
              force_tool_call: bool = False,
-             retry_count: int = 0, max_retries: int = 3) -> ChatResponse:
+             retry_count: int = 0, max_retries: int = 3,
+             on_token: Optional[Callable[[str], None]] = None) -> ChatResponse:
         """
         Send a chat completion request to APIFree.ai
         
@@ -153,18 +412,19 @@ class AIAgent:
             message: Optional user message to add before sending
             temperature: Controls randomness (0-2)
             max_tokens: Maximum tokens to generate
-            stream: Whether to stream the response
+            stream: Whether to stream the response (implied by ``on_token``)
             tools_override: Optional list of tools to use instead of all registered tools
             force_tool_call: When True and tools are provided, sends tool_choice="required"
                 so the model must call a real tool. Use this for data questions so every
                 answer is built from live database results instead of model guesses.
             retry_count: Current retry attempt (for internal use)
             max_retries: Maximum number of retries on failure
+            on_token: Called with each content fragment as the provider streams it
             
         Returns:
             ChatResponse object containing the AI's response
         """
-        if not self.api_key:
+        if not self.api_key and self.config.requires_api_key:
             # Don't hard-fail here: let the request go out (with an empty
             # Bearer token) so the upstream auth failure surfaces through the
             # normal response.error path, and offline/test harnesses that stub
@@ -174,11 +434,7 @@ class AIAgent:
             
         if message:
             self.add_user_message(message)
-            
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {self.api_key}"
-        }
+        stream = stream or on_token is not None
         
         payload = {
             "model": self.model,
@@ -188,6 +444,9 @@ class AIAgent:
             "stream": stream,
             "top_p": 1
         }
+        if stream:
+            # Streamed replies report token usage (cached prompt tokens) only when asked.
+            payload["stream_options"] = {"include_usage": True}
         
         # Add tools if registered (use override if provided)
         tools_to_send = tools_override if tools_override is not None else self.tools
@@ -198,15 +457,16 @@ class AIAgent:
             payload["tool_choice"] = "required" if force_tool_call else "auto"
             print(f"[AI Agent API] Sending {len(tools_to_send)} tools with request (tool_choice={payload['tool_choice']})")
             
+        # Once text has reached the caller a retry would replay it, so only
+        # requests that failed before their first token are retried.
+        forwarded = []
+
+        def forward(text: str) -> None:
+            forwarded.append(text)
+            on_token(text)
+
         try:
-            response = requests.post(
-                f"{self.base_url}/chat/completions",
-                headers=headers,
-                json=payload,
-                timeout=60
-            )
-            response.raise_for_status()
-            data = response.json()
+            data = self.complete(payload, forward if on_token else None)
             
             # Check for API errors
             if "error" in data:
@@ -254,28 +514,40 @@ class AIAgent:
                 usage=data.get("usage", {})
             )
             
+        except llm_http.ProviderBusy as e:
+            return ChatResponse(content="", error=str(e), busy=True)
+        except llm_http.ProviderUnavailable as e:
+            return ChatResponse(content="", error=str(e), unavailable=True)
         except requests.exceptions.Timeout:
-            if retry_count < max_retries:
+            wait_time = (2 ** retry_count) + 1  # Exponential backoff: 1, 3, 7 seconds
+            if forwarded:
+                return ChatResponse(content="", error=STREAM_INTERRUPTED_MESSAGE)
+            if self._may_retry(retry_count, max_retries, wait_time):
                 import time
-                wait_time = (2 ** retry_count) + 1  # Exponential backoff: 1, 3, 7 seconds
                 print(f"[AI Agent API] Timeout, retrying in {wait_time}s... (attempt {retry_count + 1}/{max_retries})")
                 time.sleep(wait_time)
                 return self.chat(message=None, temperature=temperature, max_tokens=max_tokens, 
                                stream=stream, tools_override=tools_override,
                                force_tool_call=force_tool_call,
-                               retry_count=retry_count + 1, max_retries=max_retries)
-            return ChatResponse(content="", error="Request timed out. Please try again.")
+                               retry_count=retry_count + 1, max_retries=max_retries,
+                               on_token=on_token)
+            return ChatResponse(content="", error="Request timed out. Please try again.",
+                                unavailable=not llm_http.provider_available())
         except requests.exceptions.ConnectionError:
-            if retry_count < max_retries:
+            wait_time = (2 ** retry_count) + 1
+            if forwarded:
+                return ChatResponse(content="", error=STREAM_INTERRUPTED_MESSAGE)
+            if self._may_retry(retry_count, max_retries, wait_time):
                 import time
-                wait_time = (2 ** retry_count) + 1
                 print(f"[AI Agent API] Connection error, retrying in {wait_time}s... (attempt {retry_count + 1}/{max_retries})")
                 time.sleep(wait_time)
                 return self.chat(message=None, temperature=temperature, max_tokens=max_tokens,
                                stream=stream, tools_override=tools_override,
                                force_tool_call=force_tool_call,
-                               retry_count=retry_count + 1, max_retries=max_retries)
-            return ChatResponse(content="", error="Connection error. Please check your internet connection.")
+                               retry_count=retry_count + 1, max_retries=max_retries,
+                               on_token=on_token)
+            return ChatResponse(content="", error="Connection error. Please check your internet connection.",
+                                unavailable=not llm_http.provider_available())
         except requests.exceptions.HTTPError as e:
             error_text = e.response.text if hasattr(e.response, 'text') else str(e)
             # Some compatible providers reject "required" tool_choice; retry once
@@ -284,18 +556,20 @@ class AIAgent:
                 print("[AI Agent API] Provider rejected forced tool calling, retrying with tool_choice=auto")
                 return self.chat(message=None, temperature=temperature, max_tokens=max_tokens,
                                stream=stream, tools_override=tools_override,
-                               force_tool_call=False, retry_count=retry_count, max_retries=max_retries)
+                               force_tool_call=False, retry_count=retry_count, max_retries=max_retries,
+                               on_token=on_token)
             # Check for rate limit errors
             if e.response.status_code == 429:
-                if retry_count < max_retries:
+                wait_time = (2 ** retry_count) * 2 + 1  # Longer backoff for rate limits: 3, 7, 15 seconds
+                if self._may_retry(retry_count, max_retries, wait_time):
                     import time
-                    wait_time = (2 ** retry_count) * 2 + 1  # Longer backoff for rate limits: 3, 7, 15 seconds
                     print(f"[AI Agent API] Rate limited, retrying in {wait_time}s... (attempt {retry_count + 1}/{max_retries})")
                     time.sleep(wait_time)
                     return self.chat(message=None, temperature=temperature, max_tokens=max_tokens,
                                    stream=stream, tools_override=tools_override,
                                    force_tool_call=force_tool_call,
-                                   retry_count=retry_count + 1, max_retries=max_retries)
+                                   retry_count=retry_count + 1, max_retries=max_retries,
+                                   on_token=on_token)
             return ChatResponse(content="", error=f"HTTP Error {e.response.status_code}: {error_text}")
         except Exception as e:
             return ChatResponse(content="", error=f"Unexpected error: {str(e)}")
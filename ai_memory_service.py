@@ -9,13 +9,14 @@ the memory feature.
 
 from __future__ import annotations
 
+import contextlib
 import json
 import logging
 import os
 import re
 import threading
 import uuid
-from typing import Any, Dict, Iterable, List, Mapping, Optional
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional
 
 LOG = logging.getLogger(__name__)
 
@@ -31,12 +32,216 @@ _SENSITIVE_PATTERNS = (
     r"\b\d{3}-\d{2}-\d{4}\b",  # US SSN-like values
 )
 _SENSITIVE_RE = re.compile("|".join(_SENSITIVE_PATTERNS), re.IGNORECASE)
+_QUERY_WORD_RE = re.compile(r"[\w-]{3,}")
+
+# SQLite FTS5 index over registry summaries, used for recall when Mem0 is off.
+# It is an external-content table: the text lives only in the registry and the
+# triggers keep the index in step with every insert, update and delete.
+_FTS_STATEMENTS = (
+    "CREATE VIRTUAL TABLE {fts} USING fts5(summary, content='{table}', content_rowid='id')",
+    "CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN "
+    "INSERT INTO {fts}(rowid, summary) VALUES (new.id, new.summary); END",
+    "CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN "
+    "INSERT INTO {fts}({fts}, rowid, summary) VALUES ('delete', old.id, old.summary); END",
+    "CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF summary ON {table} BEGIN "
+    "INSERT INTO {fts}({fts}, rowid, summary) VALUES ('delete', old.id, old.summary); "
+    "INSERT INTO {fts}(rowid, summary) VALUES (new.id, new.summary); END",
+    "INSERT INTO {fts}({fts}) VALUES ('rebuild')",
+)
+# Visibility in SQL: the caller's private rows plus the branch's shared rows.
+_VISIBLE_SQL = ("r.branch_id = :branch_id AND ((:private AND r.scope = 'private' AND r.user_id = :user_id)"
+                " OR (:shared AND r.scope = 'branch_shared'))")
+_COLUMNS_SQL = "r.memory_id, r.summary, r.user_id, r.branch_id, r.scope"
+_DEFAULT_VECTOR_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "instance", "memory_vectors")
 
 
 def _truthy(value: Optional[str]) -> bool:
     return str(value or "").strip().lower() in {"1", "true", "yes", "on"}
 
 
+def _local_url(url: str) -> bool:
+    return any(host in url for host in ("localhost", "127.0.0.1", "host.docker.internal", "ollama"))
+
+
+class OllamaEmbedder:
+    """Embeddings from a local Ollama model (``nomic-embed-text`` by default)."""
+
+    def __init__(self, base_url: str = "http://localhost:11434", model: str = "nomic-embed-text",
+                 timeout: float = 10.0):
+        if not _local_url(base_url):
+            raise ValueError("AI_MEMORY_EMBED_URL may only point at a local Ollama endpoint")
+        self.url = base_url.rstrip("/") + "/api/embed"
+        self.model = model
+        self.timeout = timeout
+
+    def __call__(self, texts: List[str]) -> List[List[float]]:
+        import requests
+        response = requests.post(self.url, json={"model": self.model, "input": texts}, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()["embeddings"]
+
+
+class VectorIndex:
+    """Per-branch float32 matrices on disk for brute-force cosine recall without Mem0.
+
+    Each branch has two append-only files in ``directory``: unit-length
+    vectors (``.f32``) and one fixed-size record per vector with its memory id
+    and owner (``.meta``; owner 0 means branch-shared). Both are read through
+    ``numpy.memmap``, so a search touches the page cache instead of loading a
+    copy, and a new memory is one append. The database keeps the same vectors
+    as blobs; a branch file that is missing is rebuilt from them. Deleted
+    memories stay in the files until the next rebuild, so callers confirm the
+    hits against the registry. Writers hold :meth:`locked`, which also takes
+    an ``flock`` on ``.lock`` so worker processes sharing the directory take
+    turns.
+    """
+
+    META = None  # numpy dtype, set on first use so numpy stays optional
+
+    def __init__(self, directory: str, embedder: Any, model: str = ""):
+        import numpy
+        self.np = numpy
+        if VectorIndex.META is None:
+            VectorIndex.META = numpy.dtype([("memory_id", "S64"), ("owner", "<i8")])
+        self.directory = directory
+        self.embedder = embedder
+        self.model = re.sub(r"[^\w.-]+", "-", model or getattr(embedder, "model", "") or "default")
+        self._lock = threading.RLock()
+        self._lock_handle: Any = None
+        self._maps: Dict[str, Any] = {}
+        os.makedirs(directory, exist_ok=True)
+
+    def embed(self, texts: List[str]) -> Any:
+        """Unit-length float32 rows, one per text."""
+        vectors = self.np.asarray(self.embedder(texts), dtype=self.np.float32)
+        norms = self.np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / self.np.maximum(norms, 1e-12)
+
+    def _path(self, branch_id: Any, dimensions: int) -> str:
+        return os.path.join(self.directory, f"branch_{int(branch_id)}.{self.model}.{dimensions}")
+
+    def exists(self, branch_id: Any, dimensions: int) -> bool:
+        return os.path.exists(self._path(branch_id, dimensions) + ".meta")
+
+    @contextlib.contextmanager
+    def locked(self) -> Iterator[None]:
+        """Hold the index against other threads and worker processes; re-entrant within a thread."""
+        with self._lock:
+            if self._lock_handle is not None:
+                yield
+                return
+            with open(os.path.join(self.directory, ".lock"), "a") as handle:
+                _lock_file(handle)
+                self._lock_handle = handle
+                try:
+                    yield
+                finally:
+                    self._lock_handle = None
+
+    def append(self, branch_id: Any, items: Iterable[tuple]) -> None:
+        """Append (memory_id, owner, unit vector) items; ids longer than 64 bytes are skipped."""
+        items = [(str(memory_id).encode(), int(owner), vector) for memory_id, owner, vector in items
+                 if len(str(memory_id).encode()) <= 64]
+        if not items:
+            return
+        path = self._path(branch_id, len(items[0][2]))
+        vectors = self.np.stack([vector for _, _, vector in items]).astype("<f4")
+        meta = self.np.array([(memory_id, owner) for memory_id, owner, _ in items], dtype=self.META)
+        with self.locked(), open(path + ".f32", "ab") as vector_file, open(path + ".meta", "ab") as meta_file:
+            vector_file.write(vectors.tobytes())
+            vector_file.flush()
+            meta_file.write(meta.tobytes())
+
+    def rebuild(self, branch_id: Any, dimensions: int, items: Iterable[tuple]) -> None:
+        path = self._path(branch_id, dimensions)
+        with self.locked():
+            for suffix in (".f32", ".meta"):
+                if os.path.exists(path + suffix):
+                    os.remove(path + suffix)
+                self._maps.pop(path + suffix, None)
+            self.append(branch_id, items)
+
+    def discard(self, branch_id: Any) -> None:
+        """Remove the branch files so forgotten vectors leave the disk; the next use rebuilds them."""
+        prefix = f"branch_{int(branch_id)}."
+        with self.locked():
+            for name in os.listdir(self.directory):
+                if name.startswith(prefix):
+                    os.remove(os.path.join(self.directory, name))
+                    self._maps.pop(os.path.join(self.directory, name), None)
+
+    def _map(self, filename: str, dtype: Any, width: int = 0) -> Any:
+        """Memory map of ``filename``; remapped when another worker has appended or rebuilt it."""
+        try:
+            stat = os.stat(filename)
+        except FileNotFoundError:
+            stat = None
+        # A rebuild can leave the same size behind, so the inode and mtime
+        # tell a replaced or rewritten file apart from the mapped one.
+        key = (stat.st_ino, stat.st_mtime_ns, stat.st_size) if stat else None
+        size = stat.st_size if stat else 0
+        with self._lock:
+            cached = self._maps.get(filename)
+            if cached is not None and cached[0] == key:
+                return cached[1]
+            record = self.np.dtype(dtype).itemsize * max(width, 1)
+            rows = size // record
+            if rows == 0:
+                mapped = self.np.zeros((0, width) if width else 0, dtype=dtype)
+            else:
+                mapped = self.np.memmap(filename, dtype=dtype, mode="r",
+                                        shape=(rows, width) if width else (rows,))
+            self._maps[filename] = (key, mapped)
+            return mapped
+
+    def search(self, branch_id: Any, vector: Any, *, owners: Iterable[int], k: int) -> List[tuple]:
+        """Top ``k`` (memory_id, cosine) among vectors whose owner is in ``owners``."""
+        path = self._path(branch_id, len(vector))
+        matrix = self._map(path + ".f32", "<f4", len(vector))
+        meta = self._map(path + ".meta", self.META)
+        rows = min(len(matrix), len(meta))
+        if rows == 0 or k <= 0:
+            return []
+        scores = matrix[:rows] @ self.np.asarray(vector, dtype=self.np.float32)
+        scores[~self.np.isin(meta["owner"][:rows], list(owners))] = -self.np.inf
+        k = min(k, rows)
+        top = self.np.argpartition(-scores, k - 1)[:k]
+        top = top[self.np.argsort(-scores[top])]
+        return [(meta["memory_id"][i].decode(), float(scores[i])) for i in top if scores[i] > -self.np.inf]
+
+
+def _lock_file(handle: Any) -> None:
+    """Serialise index writes across worker processes where ``fcntl`` exists."""
+    try:
+        import fcntl
+    except ImportError:
+        return
+    fcntl.flock(handle, fcntl.LOCK_EX)  # released when the file is closed
+
+
+def install_registry_search(session: Any, table: str = "memory_registry") -> bool:
+    """Create the FTS5 index for ``table`` once and fill it from existing rows.
+
+    Returns False when the SQLite build has no FTS5; recall then keeps the
+    in-Python word scan.
+    """
+    fts = table + "_fts"
+    from sqlalchemy import text
+    exists = session.execute(text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                             {"name": fts}).first()
+    if exists:
+        return True
+    try:
+        for statement in _FTS_STATEMENTS:
+            session.execute(text(statement.format(fts=fts, table=table)))
+        session.commit()
+        return True
+    except Exception as exc:
+        session.rollback()
+        LOG.warning("Memory full-text index unavailable: %s", exc)
+        return False
+
+
 class MemoryService:
     """Small compatibility wrapper around Mem0 with scoped, bounded results.
 
@@ -48,12 +253,15 @@ class MemoryService:
 
     def __init__(self, client: Any = None, *, enabled: Optional[bool] = None,
                  db: Any = None, models: Optional[Mapping[str, Any]] = None,
-                 registry_model: Any = None, audit_model: Any = None):
+                 registry_model: Any = None, audit_model: Any = None,
+                 embedding_model: Any = None, vector_index: Any = None):
         self.db = db
         self.models = dict(models or {})
         self.registry_model = registry_model or self.models.get("MemoryRegistry")
         self.audit_model = audit_model or self.models.get("MemoryAudit")
+        self.embedding_model = embedding_model or self.models.get("MemoryEmbedding")
         self._lock = threading.RLock()
+        self._fts_tables: Dict[str, bool] = {}
         self._client = client
         self.enabled = bool(client) if enabled is None else bool(enabled)
         self.unavailable_reason: Optional[str] = None
@@ -61,6 +269,24 @@ class MemoryService:
             self._client = self._create_local_mem0_client()
         if self._client is None:
             self.enabled = False
+        self.vector_index = vector_index
+        if vector_index is None and not self.enabled:
+            self.vector_index = self._create_vector_index()
+
+    @staticmethod
+    def _create_vector_index() -> Any:
+        """Local semantic recall for the registry fallback; opt-in with ``AI_MEMORY_VECTORS``."""
+        if not _truthy(os.getenv("AI_MEMORY_VECTORS")):
+            return None
+        try:
+            embedder = OllamaEmbedder(os.getenv("AI_MEMORY_EMBED_URL") or "http://localhost:11434",
+                                      os.getenv("AI_MEMORY_EMBED_MODEL") or "nomic-embed-text")
+            return VectorIndex(os.getenv("AI_MEMORY_VECTOR_DIR") or _DEFAULT_VECTOR_DIR, embedder)
+        except ImportError:
+            LOG.warning("AI memory vectors need numpy; using keyword recall")
+        except Exception as exc:
+            LOG.warning("AI memory vectors are unavailable: %s", exc)
+        return None
 
     def _create_local_mem0_client(self) -> Any:
         """Load Mem0 only on opt-in; reject configs that imply hosted services."""
@@ -90,8 +316,7 @@ class MemoryService:
         if any(marker in encoded for marker in forbidden):
             raise ValueError("AI_MEMORY_MEM0_CONFIG must use embedded/local providers only")
         urls = re.findall(r"https?://[^\"'\\\s,}]+", encoded)
-        local_hosts = ("localhost", "127.0.0.1", "host.docker.internal", "ollama")
-        if any(not any(host in url for host in local_hosts) for url in urls):
+        if any(not _local_url(url) for url in urls):
             raise ValueError("AI_MEMORY_MEM0_CONFIG may only connect to a local Ollama endpoint")
 
     @staticmethod
@@ -122,30 +347,174 @@ class MemoryService:
         registry = self._registry_backend(hooks)
         if registry is None:
             return []
+        words = {word for word in _QUERY_WORD_RE.findall(query.lower())}
         try:
-            db_query = registry.query.filter_by(branch_id=int(branch_id))
-            updated_at = getattr(registry, "updated_at", None)
-            if updated_at is not None:
-                db_query = db_query.order_by(updated_at.desc())
-            rows = db_query.all()
-            words = {word for word in re.findall(r"[\w-]{3,}", query.lower())}
-            matches = []
-            for row in rows:
-                if getattr(row, "scope", None) not in scopes:
-                    continue
-                if getattr(row, "scope", None) == "private" and int(getattr(row, "user_id", -1)) != int(user_id):
-                    continue
-                text = str(getattr(row, "summary", ""))
-                score = sum(word in text.lower() for word in words)
-                matches.append((score, row))
-            matches.sort(key=lambda item: (item[0], getattr(item[1], "updated_at", None)), reverse=True)
+            rows = self._vector_memories(query, registry, user_id=user_id, branch_id=branch_id,
+                                         scopes=scopes, limit=limit, hooks=hooks)
+            if len(rows) < limit:
+                keyword_rows = self._registry_search(registry, words, user_id=user_id, branch_id=branch_id,
+                                                     scopes=scopes, limit=limit, hooks=hooks)
+                if keyword_rows is None:
+                    keyword_rows = self._registry_scan(registry, words, user_id=user_id, branch_id=branch_id,
+                                                       scopes=scopes, limit=limit)
+                seen = {row.memory_id for row in rows}
+                rows += [row for row in keyword_rows if row.memory_id not in seen][:limit - len(rows)]
             return [{"id": row.memory_id, "memory": row.summary,
                      "metadata": {"user_id": str(row.user_id), "branch_id": str(row.branch_id), "scope": row.scope}}
-                    for _, row in matches[:limit]]
+                    for row in rows]
         except Exception as exc:
             LOG.warning("SQLite memory retrieval failed: %s", exc)
             return []
 
+    def _vector_memories(self, query: str, registry: Any, *, user_id: Any, branch_id: Any,
+                         scopes: List[str], limit: int, hooks: Mapping[str, Any]) -> List[Any]:
+        """Nearest registry rows by cosine similarity, confirmed against the registry."""
+        if self.vector_index is None or not query.strip():
+            return []
+        try:
+            vector = self.vector_index.embed([query])[0]
+            self._ensure_vectors(int(branch_id), len(vector), hooks)
+            owners = ([int(user_id)] if "private" in scopes else []) + ([0] if "branch_shared" in scopes else [])
+            # A memory appended twice (two workers racing a rebuild) counts once.
+            hits = list(dict.fromkeys(memory_id for memory_id, _ in
+                                      self.vector_index.search(branch_id, vector, owners=owners, k=limit * 2)))
+            if not hits:
+                return []
+            # Deleted memories stay in the branch file until a rebuild; the
+            # registry is the authority on what still exists and who sees it.
+            rows = {row.memory_id: row for row in registry.query.filter(
+                registry.memory_id.in_(hits), registry.branch_id == int(branch_id)).all()
+                if row.scope in scopes and (row.scope == "branch_shared" or int(row.user_id) == int(user_id))}
+            return [rows[memory_id] for memory_id in hits if memory_id in rows][:limit]
+        except Exception as exc:
+            LOG.warning("AI memory vector recall failed: %s", exc)
+            return []
+
+    def _index_vector(self, memory_id: str, text: str, namespace: Mapping[str, str],
+                      hooks: Mapping[str, Any]) -> None:
+        """Embed a new registry memory: a blob row for rebuilds plus an append to the branch file."""
+        if self.vector_index is None:
+            return
+        try:
+            vector = self.vector_index.embed([text])[0]
+            branch_id = int(namespace["branch_id"])
+            db = hooks.get("db") or self.db
+            model = hooks.get("embedding_model") or self.embedding_model
+            owner = 0 if namespace["scope"] == "branch_shared" else int(namespace["user_id"])
+            # Locked so no other worker rebuilds or discards the file between the two steps.
+            with self.vector_index.locked():
+                # Rebuild a missing branch file first, before this memory's blob is pending in the session.
+                self._ensure_vectors(branch_id, len(vector), hooks)
+                if model is not None and getattr(db, "session", None) is not None:
+                    db.session.add(model(memory_id=memory_id, branch_id=branch_id, model=self.vector_index.model,
+                                         dimensions=len(vector), vector=vector.astype("<f4").tobytes()))
+                self.vector_index.append(branch_id, [(memory_id, owner, vector)])
+        except Exception as exc:
+            LOG.warning("AI memory embedding failed: %s", exc)
+
+    def _forget_vector(self, memory_id: str, branch_id: Any, hooks: Mapping[str, Any]) -> None:
+        model = hooks.get("embedding_model") or self.embedding_model
+        if self.vector_index is None or model is None:
+            return
+        try:
+            model.query.filter_by(memory_id=memory_id).delete(synchronize_session=False)
+            self.vector_index.discard(branch_id)
+        except Exception as exc:
+            LOG.warning("AI memory embedding delete failed: %s", exc)
+
+    def _ensure_vectors(self, branch_id: int, dimensions: int, hooks: Mapping[str, Any]) -> None:
+        """Rebuild a branch file that is missing (new volume, deleted cache) from the stored blobs."""
+        index = self.vector_index
+        if index.exists(branch_id, dimensions):
+            return
+        db = hooks.get("db") or self.db
+        model = hooks.get("embedding_model") or self.embedding_model
+        registry = self._registry_backend(hooks)
+        if model is None or registry is None or getattr(db, "session", None) is None:
+            return
+        with index.locked():
+            if index.exists(branch_id, dimensions):  # another worker rebuilt it while we waited
+                return
+            rows = (db.session.query(model.memory_id, model.vector, registry.user_id, registry.scope)
+                    .join(registry, registry.memory_id == model.memory_id)
+                    .filter(model.branch_id == branch_id, model.model == index.model,
+                            model.dimensions == dimensions)
+                    .order_by(model.id).all())
+            index.rebuild(branch_id, dimensions, [
+                (memory_id, 0 if scope == "branch_shared" else user_id, index.np.frombuffer(blob, dtype="<f4"))
+                for memory_id, blob, user_id, scope in rows])
+
+    def _registry_search(self, registry: Any, words: Iterable[str], *, user_id: Any, branch_id: Any,
+                         scopes: List[str], limit: int, hooks: Mapping[str, Any]) -> Optional[List[Any]]:
+        """BM25-ranked rows from the FTS5 index, topped up with the newest visible rows.
+
+        Filtering and the limit run in SQL, so recall cost follows the number
+        of matching summaries, not the size of the branch. None when the index
+        is not installed (other databases, test doubles).
+        """
+        db = hooks.get("db") or self.db
+        table = getattr(registry, "__tablename__", None)
+        session = getattr(db, "session", None)
+        if table is None or session is None or not self._registry_fts_ready(session, table):
+            return None
+        from sqlalchemy import text
+        params = {"branch_id": int(branch_id), "user_id": int(user_id), "limit": limit,
+                  "private": "private" in scopes, "shared": "branch_shared" in scopes}
+        rows: List[Any] = []
+        if words:
+            # Quoted prefix terms: "report" also finds "reports", and user text
+            # can never be read as FTS query syntax.
+            params["match"] = " OR ".join(f'"{word}"*' for word in sorted(words))
+            try:
+                rows = session.execute(text(
+                    f"SELECT {_COLUMNS_SQL} FROM {table}_fts JOIN {table} AS r ON r.id = {table}_fts.rowid "
+                    f"WHERE {table}_fts MATCH :match AND {_VISIBLE_SQL} "
+                    f"ORDER BY bm25({table}_fts), r.updated_at DESC LIMIT :limit"), params).all()
+            except Exception as exc:
+                # The index went away under us (database replaced); check again next time.
+                LOG.warning("Memory full-text search failed, using the word scan: %s", exc)
+                self._fts_tables.pop(table, None)
+                return None
+        if len(rows) < limit:
+            # Like the word scan, recall still offers the newest memories when
+            # few or none share a word with the command.
+            seen = {row.memory_id for row in rows}
+            recent = session.execute(text(
+                f"SELECT {_COLUMNS_SQL} FROM {table} AS r WHERE {_VISIBLE_SQL} "
+                f"ORDER BY r.updated_at DESC LIMIT :limit"), params).all()
+            rows += [row for row in recent if row.memory_id not in seen][:limit - len(rows)]
+        return rows
+
+    def _registry_fts_ready(self, session: Any, table: str) -> bool:
+        ready = self._fts_tables.get(table)
+        if ready is None:
+            from sqlalchemy import text
+            bind = session.get_bind()
+            ready = bind.dialect.name == "sqlite" and session.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                {"name": table + "_fts"}).first() is not None
+            self._fts_tables[table] = ready
+        return ready
+
+    @staticmethod
+    def _registry_scan(registry: Any, words: Iterable[str], *, user_id: Any, branch_id: Any,
+                       scopes: List[str], limit: int) -> List[Any]:
+        """Score every branch row in Python by query words present in the summary."""
+        db_query = registry.query.filter_by(branch_id=int(branch_id))
+        updated_at = getattr(registry, "updated_at", None)
+        if updated_at is not None:
+            db_query = db_query.order_by(updated_at.desc())
+        matches = []
+        for row in db_query.all():
+            if getattr(row, "scope", None) not in scopes:
+                continue
+            if getattr(row, "scope", None) == "private" and int(getattr(row, "user_id", -1)) != int(user_id):
+                continue
+            text = str(getattr(row, "summary", "")).lower()
+            matches.append((sum(word in text for word in words), row))
+        matches.sort(key=lambda item: (item[0], getattr(item[1], "updated_at", None)), reverse=True)
+        return [row for _, row in matches[:limit]]
+
     @staticmethod
     def _clean_text(content: Any) -> str:
         if not isinstance(content, str):
@@ -185,6 +554,7 @@ class MemoryService:
                 return {"saved": False, "reason": self.unavailable_reason or "disabled", "memory_id": None}
             memory_id = "sqlite-" + uuid.uuid4().hex
             self._registry("create", memory_id, text, namespace, source, hooks)
+            self._index_vector(memory_id, text[:500], namespace, hooks)
             return {"saved": True, "memory_id": memory_id, "summary": text[:500], "backend": "sqlite"}
         try:
             with self._lock:
@@ -268,6 +638,7 @@ class MemoryService:
                 return {"deleted": False, "reason": self.unavailable_reason or "disabled"}
             if not self._owns_memory(str(memory_id), user_id, branch_id, scopes, hooks):
                 return {"deleted": False, "reason": "memory not found"}
+            self._forget_vector(str(memory_id), branch_id, hooks)
             return {"deleted": True, "memory_id": str(memory_id), "backend": "sqlite"}
         try:
             if not self._owns_memory(str(memory_id), user_id, branch_id, scopes, hooks):
@@ -333,6 +704,12 @@ class MemoryService:
 _service: Optional[MemoryService] = None
 _service_lock = threading.Lock()
 
+def reset_registry_search() -> None:
+    """Forget whether the registry FTS index exists; the database file was replaced."""
+    with _service_lock:
+        if _service is not None:
+            _service._fts_tables.clear()
+
 def get_memory_service(**kwargs: Any) -> MemoryService:
     """Return the process singleton; optional hooks refresh without reloading Mem0."""
     global _service
@@ -340,7 +717,7 @@ def get_memory_service(**kwargs: Any) -> MemoryService:
         if _service is None:
             _service = MemoryService(**kwargs)
         else:
-            for name in ("db", "registry_model", "audit_model"):
+            for name in ("db", "registry_model", "audit_model", "embedding_model"):
                 if kwargs.get(name) is not None: setattr(_service, name, kwargs[name])
             if kwargs.get("models"): _service.models.update(kwargs["models"])
     return _service
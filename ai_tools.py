@@ -40,7 +40,7 @@ from decimal import Decimal, ROUND_HALF_UP
 
 import pytz
 
-MONEY_QUANT = Decimal('0.01')
+from money import MONEY_QUANT, money_dec, money_plain, money_str, quantize_money as round_money
 
 # Delivery stages mirror app.py's DELIVERY_STAGE_FLOW keys (app.py cannot be
 # imported here without the Flask app context, so the valid set is mirrored).
@@ -53,32 +53,6 @@ DELIVERY_STAGE_FLOW = {
     'cancelled': []
 }
 
-def money_dec(value):
-    """Convert a value to a finite Decimal, defaulting to 0 for None/NaN/inf/unparseable input."""
-    if value is None:
-        return Decimal('0')
-    try:
-        result = Decimal(str(value).replace(',', ''))
-    except (TypeError, ValueError, ArithmeticError):
-        return Decimal('0')
-    if not result.is_finite():
-        return Decimal('0')
-    return result
-
-def money_str(value):
-    """Format a money value as a quantized 2-decimal string (e.g. '1,234.50')."""
-    return f"{money_dec(value).quantize(MONEY_QUANT):,.2f}"
-
-def money_plain(value):
-    """Format a money value as a plain 2-decimal string WITHOUT thousands separators (e.g. '1234.50').
-
-    Used by NEW tools so downstream consumers can parse amounts numerically."""
-    return f"{money_dec(value).quantize(MONEY_QUANT, rounding=ROUND_HALF_UP)}"
-
-def round_money(value):
-    """Quantize a money value to 2 decimals with ROUND_HALF_UP."""
-    return money_dec(value).quantize(MONEY_QUANT, rounding=ROUND_HALF_UP)
-
 # Tool schema definitions for the AI (parameter schemas only; enriched into
 # TOOL_METADATA right below -- do not add metadata fields here).
 _BASE_TOOL_PARAMETER_SCHEMAS: Dict[str, Dict] = {
@@ -1388,34 +1362,36 @@ class AITools:
         
         from_date = datetime.utcnow() - timedelta(days=days)
         
-        # Query sales in date range
-        sales_query = self._branch_filter(Sale.query.filter(Sale.date >= from_date), Sale)
-        sales = sales_query.all()
+        # Sale lines in the date range (Sale has no items relationship; join by sale_id)
+        items_query = self._branch_filter(
+            SaleItem.query.join(Sale, SaleItem.sale_id == Sale.id).filter(Sale.date >= from_date), Sale)
+        if product_id:
+            items_query = items_query.filter(SaleItem.product_id == product_id)
         
         # Aggregate sales by product
         product_sales = {}
         
-        for sale in sales:
-            for item in sale.items:
-                if product_id and item.product_id != product_id:
-                    continue
-                    
-                if item.product_id not in product_sales:
-                    product_sales[item.product_id] = {
-                        "product_id": item.product_id,
-                        "product_name": item.product.name if item.product else "Unknown",
-                        "total_quantity": 0,
-                        "total_revenue": 0,
-                        "sale_count": 0
-                    }
-                    
-                product_sales[item.product_id]["total_quantity"] += item.quantity
-                product_sales[item.product_id]["total_revenue"] += (item.price * item.quantity)
-                product_sales[item.product_id]["sale_count"] += 1
+        for item in items_query.all():
+            if item.product_id not in product_sales:
+                product_sales[item.product_id] = {
+                    "product_id": item.product_id,
+                    "product_name": "Unknown",
+                    "total_quantity": 0,
+                    "total_revenue": Decimal('0'),
+                    "sale_count": 0
+                }
+                
+            product_sales[item.product_id]["total_quantity"] += item.quantity
+            product_sales[item.product_id]["total_revenue"] += money_dec(item.price) * item.quantity
+            product_sales[item.product_id]["sale_count"] += 1
                 
         # Sort by quantity sold and get top N
         sorted_sales = sorted(product_sales.values(), key=lambda x: x["total_quantity"], reverse=True)
-        top_sales = sorted_sales[:top_n]
+        top_sales = [dict(p, total_revenue=money_str(p["total_revenue"])) for p in sorted_sales[:top_n]]
+        names = {p.id: p.name for p in Product.query.filter(
+            Product.id.in_([p["product_id"] for p in top_sales if p["product_id"]])).all()}
+        for p in top_sales:
+            p["product_name"] = names.get(p["product_id"], "Unknown")
         
         return {
             "period_days": days,
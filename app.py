@@ -1,14 +1,20 @@
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for, make_response, send_from_directory, send_file
+from flask import Flask, Response, render_template, request, jsonify, session, redirect, url_for, make_response, send_from_directory, send_file, g, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
 from werkzeug.security import generate_password_hash, check_password_hash
 from werkzeug.utils import secure_filename
+from werkzeug.exceptions import RequestEntityTooLarge
 from datetime import datetime, timedelta
 import os
+import re
+import secrets
 import uuid
+import sqlite3
+import tempfile
+import threading
 import io
 import json
 import time
-from sqlalchemy import inspect, text, func, event, or_
+from sqlalchemy import inspect, text, func, or_, type_coerce
 from sqlalchemy.exc import OperationalError
 from decimal import Decimal, ROUND_HALF_UP
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
@@ -32,28 +38,44 @@ from reportlab.graphics import renderPDF
 from reportlab.graphics.shapes import Drawing
 import pytz
 from functools import wraps
+from contextlib import contextmanager
 from reportlab.graphics.barcode import createBarcodeDrawing
 import base64
 import hashlib
 from cryptography.fernet import Fernet, InvalidToken
 
 # Import AI Agent modules
-from agent_orchestrator import get_orchestrator
+from agent_orchestrator import get_orchestrator, reset_orchestrator
+from money import (
+    MONEY_QUANT, Money, bind_money_columns, json_default, money_float, round_money, safe_to_decimal,
+    set_unconverted_tables as set_unconverted_money_tables, to_decimal
+)
+from db_backend import database_uri_from_env, get_backend, lock_rows_for_update
+from maintenance import maintenance_status, read_only_maintenance
+from shared_state import get_shared_state
+from admission import AdmissionController, default_route_classes
+from agent_jobs import AgentJobRunner
+from llm_http import concurrency as llm_concurrency, latency_report as llm_latency_report
+from plan_cache import plan_templates
+from tool_cache import ALL_BRANCHES, result_cache as tool_result_cache, watch_session
+from archive_history import ArchiveRangeError, history_model
+from db_pools import (
+    ReadRoutingSession, dispose_read_only_pool, install_read_only_pool, pool_report, read_only_route
+)
 
 app = Flask(__name__)
 app.secret_key = os.environ.get('SECRET_KEY', 'your_super_secret_key_here')
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///pos.db'
+app.config['SQLALCHEMY_DATABASE_URI'] = database_uri_from_env()
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['UPLOAD_FOLDER'] = os.path.join(app.root_path, 'uploads', 'products')
 app.config['RECEIPT_LOGO_FOLDER'] = os.path.join(app.root_path, 'uploads', 'receipts')
 app.config['MAX_CONTENT_LENGTH'] = 5 * 1024 * 1024  # 5 MB per request
 app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(days=365)
-db = SQLAlchemy(app)
+db = SQLAlchemy(app, session_options={'class_': ReadRoutingSession})
 
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 os.makedirs(app.config['RECEIPT_LOGO_FOLDER'], exist_ok=True)
 
-MONEY_QUANT = Decimal('0.01')
 ALLOWED_IMAGE_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
 CURRENCY_OPTIONS = {
     'USD': '$',
@@ -76,47 +98,9 @@ DELIVERY_STAGE_LABELS = {
 }
 DELIVERY_PRIORITIES = {'low', 'normal', 'high', 'urgent'}
 
-def to_decimal(value):
-    return Decimal(str(value))
-
-def safe_to_decimal(value, default=Decimal('0')):
-    """Convert a value to Decimal, returning ``default`` for None/NaN/inf/unparseable input."""
-    if value is None:
-        return default
-    try:
-        result = Decimal(str(value))
-    except (TypeError, ValueError, ArithmeticError):
-        return default
-    if not result.is_finite():
-        return default
-    return result
-
-
-def round_money(value):
-    """Round to 2 decimals with ROUND_HALF_UP, staying in Decimal space.
-
-    Intermediate money math stays on Decimal so totals match the JS frontend's
-    integer-cent arithmetic (Math.round per-item). Only final persistence/
-    display boundaries (Float columns, JSON output) convert to float via
-    money_float() or json_default().
-    """
-    return to_decimal(value).quantize(MONEY_QUANT, rounding=ROUND_HALF_UP)
-
-
-def money_float(value):
-    """Convert a rounded Decimal to float for final persistence/display (JSON)."""
-    return float(round_money(value))
-
-
-def json_default(o):
-    """json.dumps default handler: serialize Decimal as float (display boundary)."""
-    if isinstance(o, Decimal):
-        return float(o)
-    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
-
 # Settings whose values are credentials are encrypted at rest with a key derived
 # from SECRET_KEY, so secrets are never stored in plaintext in the database.
-_SECRET_SETTING_KEYS = {'ai_api_key'}
+_SECRET_SETTING_KEYS = {'ai_api_key', 'ai_base_url_api_key'}
 
 
 def _fernet():
@@ -405,6 +389,15 @@ def manager_or_boss_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+def history(model, start=None, end=None):
+    """``model``, or an alias that also reads archived years overlapping [start, end].
+
+    Only report views running under ``read_only_route`` see the archive; see
+    archive_history.py. Without a range no archive year is read. Callers
+    must turn ``ArchiveRangeError`` into a 400.
+    """
+    return history_model(db.session, model, resolve_database_file_path(), start, end)
+
 def resolve_report_scope():
     """Resolve report scope and branch filtering based on role and query params."""
     role = session.get('role')
@@ -735,6 +728,7 @@ class MemoryRegistry(db.Model):
     __table_args__ = (
         db.CheckConstraint("scope IN ('private', 'branch_shared')", name='ck_memory_registry_scope'),
         db.Index('idx_memory_registry_owner', 'user_id', 'branch_id', 'scope'),
+        db.Index('idx_memory_registry_branch_updated', 'branch_id', 'updated_at'),
     )
 
     def to_dict(self):
@@ -748,6 +742,25 @@ class MemoryRegistry(db.Model):
         }
 
 
+class MemoryEmbedding(db.Model):
+    """float32 embedding of a registry summary for local semantic recall.
+
+    Only used when ``AI_MEMORY_VECTORS`` is on and Mem0 is not configured.
+    These blobs are the durable copy; the per-branch memory-mapped files that
+    searches read are rebuilt from them when missing.
+    """
+    __tablename__ = 'memory_embedding'
+
+    id = db.Column(db.Integer, primary_key=True)
+    memory_id = db.Column(db.String(191), db.ForeignKey('memory_registry.memory_id', ondelete='CASCADE'),
+                          unique=True, nullable=False)
+    branch_id = db.Column(db.Integer, db.ForeignKey('branch.id'), nullable=False, index=True)
+    model = db.Column(db.String(100), nullable=False)
+    dimensions = db.Column(db.Integer, nullable=False)
+    vector = db.Column(db.LargeBinary, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+
 class MemoryAudit(db.Model):
     """Append-only local audit trail; never persist raw submitted memory text."""
     __tablename__ = 'memory_audit'
@@ -779,7 +792,7 @@ class AgentTask(db.Model):
     command = db.Column(db.Text, nullable=False)
     plan_json = db.Column(db.Text, nullable=True)
     status = db.Column(db.String(30), nullable=False, default='pending_approval')
-    # allowed statuses: pending_approval | executing | completed | failed | clarification
+    # allowed statuses: queued | pending_approval | executing | completed | failed | clarification
     step_results_json = db.Column(db.Text, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
@@ -837,12 +850,12 @@ class Product(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     barcode = db.Column(db.String(50))  # Branch-scoped: uniqueness enforced per (barcode, branch_id) at app level
     name = db.Column(db.String(100), nullable=False)
-    price = db.Column(db.Float, nullable=False)
-    cost = db.Column(db.Float)
+    price = db.Column(Money, nullable=False)
+    cost = db.Column(Money)
     stock = db.Column(db.Integer, default=0)
     category = db.Column(db.String(50))  # Legacy field, kept for backward compatibility
     category_id = db.Column(db.Integer, db.ForeignKey('category.id'))  # New foreign key
-    tax_rate = db.Column(db.Float, default=0.0)
+    tax_rate = db.Column(Money, default=0.0)
     photo_filename = db.Column(db.String(255))
     reorder_point = db.Column(db.Integer, default=10)
     reorder_quantity = db.Column(db.Integer, default=50)
@@ -880,7 +893,7 @@ class PurchaseOrder(db.Model):
     po_number = db.Column(db.String(40), unique=True, nullable=False)
     supplier_id = db.Column(db.Integer, db.ForeignKey('supplier.id'), nullable=False)
     status = db.Column(db.String(25), default='draft')  # draft, pending, approved, partially_received, received, cancelled
-    total_amount = db.Column(db.Float, default=0.0)
+    total_amount = db.Column(Money, default=0.0)
     expected_delivery_date = db.Column(db.DateTime)
     notes = db.Column(db.String(300))
     created_by = db.Column(db.Integer, db.ForeignKey('user.id'))
@@ -902,7 +915,7 @@ class PurchaseOrderItem(db.Model):
     product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
     ordered_qty = db.Column(db.Integer, nullable=False)
     received_qty = db.Column(db.Integer, default=0)
-    unit_cost = db.Column(db.Float, default=0.0)
+    unit_cost = db.Column(Money, default=0.0)
 
     purchase_order = db.relationship('PurchaseOrder', backref='items')
     product = db.relationship('Product', backref='purchase_order_items')
@@ -925,7 +938,7 @@ class SupplierPriceAgreement(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     supplier_id = db.Column(db.Integer, db.ForeignKey('supplier.id'), nullable=False)
     product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
-    agreed_price = db.Column(db.Float, nullable=False)
+    agreed_price = db.Column(Money, nullable=False)
     valid_from = db.Column(db.DateTime, default=datetime.utcnow)
     valid_to = db.Column(db.DateTime)
     notes = db.Column(db.String(200))
@@ -944,7 +957,7 @@ class WarehouseInventory(db.Model):
     batch_number = db.Column(db.String(50))  # Track by PO number
     received_date = db.Column(db.DateTime, default=datetime.utcnow)
     expiry_date = db.Column(db.DateTime)  # Optional for perishables
-    unit_cost = db.Column(db.Float)  # Cost at time of receiving
+    unit_cost = db.Column(Money)  # Cost at time of receiving
     notes = db.Column(db.String(200))
     branch_id = db.Column(db.Integer, db.ForeignKey('branch.id'))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -971,10 +984,10 @@ class Sale(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     transaction_id = db.Column(db.String(36), unique=True)
     date = db.Column(db.DateTime, default=datetime.utcnow)
-    total = db.Column(db.Float, nullable=False)
-    tax = db.Column(db.Float, nullable=False)
-    cash_received = db.Column(db.Float)
-    refund_amount = db.Column(db.Float, default=0.0)
+    total = db.Column(Money, nullable=False)
+    tax = db.Column(Money, nullable=False)
+    cash_received = db.Column(Money)
+    refund_amount = db.Column(Money, default=0.0)
     payment_method = db.Column(db.String(20))
     receipt_snapshot = db.Column(db.Text)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
@@ -986,7 +999,7 @@ class Promotion(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
     discount_type = db.Column(db.String(10), nullable=False)  # 'percent' or 'fixed'
-    discount_value = db.Column(db.Float, nullable=False)     # e.g., 10 for 10%, or $2 off
+    discount_value = db.Column(Money, nullable=False)     # e.g., 10 for 10%, or $2 off
     start_date = db.Column(db.DateTime, nullable=False)
     end_date = db.Column(db.DateTime, nullable=False)
     
@@ -1035,8 +1048,8 @@ class SaleItem(db.Model):
     sale_id = db.Column(db.Integer, db.ForeignKey('sale.id'))
     product_id = db.Column(db.Integer, db.ForeignKey('product.id'))
     quantity = db.Column(db.Integer, nullable=False)
-    price = db.Column(db.Float, nullable=False)
-    tax = db.Column(db.Float, nullable=False)
+    price = db.Column(Money, nullable=False)
+    tax = db.Column(Money, nullable=False)
 
 class ReturnExchange(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -1044,11 +1057,11 @@ class ReturnExchange(db.Model):
     mode = db.Column(db.String(20), nullable=False)  # return or exchange
     original_sale_id = db.Column(db.Integer, db.ForeignKey('sale.id'), nullable=False)
     adjustment_sale_id = db.Column(db.Integer, db.ForeignKey('sale.id'))
-    return_total = db.Column(db.Float, default=0.0)
-    exchange_total = db.Column(db.Float, default=0.0)
-    net_total = db.Column(db.Float, default=0.0)
-    refund_amount = db.Column(db.Float, default=0.0)
-    collected_amount = db.Column(db.Float, default=0.0)
+    return_total = db.Column(Money, default=0.0)
+    exchange_total = db.Column(Money, default=0.0)
+    net_total = db.Column(Money, default=0.0)
+    refund_amount = db.Column(Money, default=0.0)
+    collected_amount = db.Column(Money, default=0.0)
     settlement_method = db.Column(db.String(30))
     notes = db.Column(db.String(300))
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
@@ -1065,10 +1078,10 @@ class ReturnExchangeItem(db.Model):
     product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
     movement = db.Column(db.String(20), nullable=False)  # return or exchange
     quantity = db.Column(db.Integer, nullable=False)
-    unit_price = db.Column(db.Float, nullable=False)
-    tax_rate = db.Column(db.Float, default=0.0)
-    line_total = db.Column(db.Float, nullable=False)
-    line_tax = db.Column(db.Float, nullable=False)
+    unit_price = db.Column(Money, nullable=False)
+    tax_rate = db.Column(Money, default=0.0)
+    line_total = db.Column(Money, nullable=False)
+    line_tax = db.Column(Money, nullable=False)
 
     return_exchange = db.relationship('ReturnExchange', backref='items')
     original_sale_item = db.relationship('SaleItem', backref='return_exchange_items')
@@ -1091,8 +1104,8 @@ class Debt(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     customer_id = db.Column(db.Integer, db.ForeignKey('customer.id'), nullable=False)
     sale_id = db.Column(db.Integer, db.ForeignKey('sale.id'), nullable=True)
-    amount = db.Column(db.Float, nullable=False)
-    balance = db.Column(db.Float, nullable=False)  # Remaining balance
+    amount = db.Column(Money, nullable=False)
+    balance = db.Column(Money, nullable=False)  # Remaining balance
     date = db.Column(db.DateTime, default=datetime.utcnow)
     due_date = db.Column(db.DateTime, nullable=True)  # Expected payment date
     status = db.Column(db.String(20), default='pending')  # 'pending', 'partial', 'paid', 'overdue'
@@ -1116,7 +1129,7 @@ class DebtPayment(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     debt_id = db.Column(db.Integer, db.ForeignKey('debt.id'), nullable=False)
     customer_id = db.Column(db.Integer, db.ForeignKey('customer.id'), nullable=False)
-    amount = db.Column(db.Float, nullable=False)
+    amount = db.Column(Money, nullable=False)
     payment_date = db.Column(db.DateTime, default=datetime.utcnow)
     notes = db.Column(db.String(500))
     processed_by = db.Column(db.Integer, db.ForeignKey('user.id'))
@@ -1142,7 +1155,7 @@ class Delivery(db.Model):
     courier_name = db.Column(db.String(120))
     courier_phone = db.Column(db.String(30))
     tracking_code = db.Column(db.String(120))
-    delivery_fee = db.Column(db.Float, default=0.0)
+    delivery_fee = db.Column(Money, default=0.0)
     scheduled_at = db.Column(db.DateTime)
     packaged_at = db.Column(db.DateTime)
     out_for_delivery_at = db.Column(db.DateTime)
@@ -1192,21 +1205,19 @@ def serialize_delivery(delivery):
         'can_transition_to': DELIVERY_STAGE_FLOW.get(delivery.stage, [])
     }
 
-# Create database tables and admin user
-with app.app_context():
-    # Harden SQLite for concurrent POS writes: WAL journaling plus a busy timeout
-    # on every pooled connection so concurrent sales retry instead of failing fast.
-    @event.listens_for(db.engine, 'connect')
-    def _set_sqlite_busy_timeout(dbapi_connection, connection_record):
-        cursor = dbapi_connection.cursor()
-        cursor.execute('PRAGMA busy_timeout=5000')
-        cursor.close()
-
-    db.session.execute(text('PRAGMA journal_mode=WAL'))
-    db.session.execute(text('PRAGMA busy_timeout=5000'))
-    db.create_all()
-    inspector = inspect(db.engine)
+def ensure_default_branch():
+    if not Branch.query.first():
+        db.session.add(Branch(name='Main Branch', code='MAIN', address='Main Location',
+                              is_active=True, is_default=True))
+        db.session.commit()
+
 
+def run_legacy_schema_migrations(inspector):
+    """Upgrade SQLite files created by older releases in place.
+
+    Every step is guarded by a table/column check, so this is a no-op on a
+    database created by the current ``db.create_all()``.
+    """
     # Persist immutable financial and display data for reliable receipt reprints.
     if inspector.has_table('sale'):
         sale_columns = [col['name'] for col in inspector.get_columns('sale')]
@@ -1233,14 +1244,7 @@ with app.app_context():
         db.session.commit()
     
     # Create default branch if none exists
-    if inspector.has_table('branch'):
-        branch_count = db.session.execute(text('SELECT COUNT(*) FROM branch')).scalar()
-        if branch_count == 0:
-            db.session.execute(text('''
-                INSERT INTO branch (name, code, address, is_active, is_default, created_at, updated_at)
-                VALUES ('Main Branch', 'MAIN', 'Main Location', 1, 1, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
-            '''))
-            db.session.commit()
+    ensure_default_branch()
     
     # Add branch_id columns to existing tables
     tables_to_migrate = [
@@ -1412,24 +1416,7 @@ with app.app_context():
     except Exception as e:
         app.logger.warning(f"Could not drop legacy barcode unique index: {str(e)}")
 
-    product_indexes = [idx[0] for idx in db.session.execute(text(
-        "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'product'"
-    )).fetchall()]
-
-    barcode_unique_index = None
-    for idx_name in product_indexes:
-        idx_cols = [col[2] for col in db.session.execute(
-            text(f'PRAGMA index_info("{idx_name}")')
-        ).fetchall()]
-        if idx_cols == ['barcode']:
-            idx_list = db.session.execute(text('PRAGMA index_list("product")')).fetchall()
-            for row in idx_list:
-                # row: (seq, name, unique, origin, partial); origin 'u' = UNIQUE constraint
-                if row[1] == idx_name and row[2] == 1 and row[3] == 'u':
-                    barcode_unique_index = idx_name
-                    break
-        if barcode_unique_index:
-            break
+    barcode_unique_index = database_backend.find_legacy_barcode_unique_index(db.session)
 
     if barcode_unique_index:
         app.logger.warning(
@@ -1698,30 +1685,37 @@ with app.app_context():
         '''))
         db.session.commit()
 
-    # Create Promotion table
-    if not hasattr(Product, 'promotions'):
-        db.create_all()
-    if not User.query.filter_by(username='admin').first():
-        admin_user = User(
-            username='admin',
-            password=generate_password_hash('admin123'),
-            role='manager'
-        )
-        db.session.add(admin_user)
-        db.session.commit()
 
-    if not AppSetting.query.filter_by(key='currency_code').first():
-        db.session.add(AppSetting(key='currency_code', value='USD'))
-        db.session.commit()
+def refresh_money_storage(_payload=None):
+    """Re-read which tables still hold Float amounts and serve them as whole units.
 
-    if not AppSetting.query.filter_by(key='receipt_paper_size').first():
-        db.session.add(AppSetting(key='receipt_paper_size', value=DEFAULT_RECEIPT_PAPER_SIZE))
-        db.session.commit()
+    An older database is converted by ``python migrate_money_columns.py``
+    while the app keeps serving (never at startup: a large file would
+    outlast the container health check). The migrator publishes
+    ``money_storage_changed`` after each table it swaps in.
+    """
+    from migrate_money_columns import unconverted_tables
 
-    # Encrypt any legacy plaintext AI API key so it is never stored in the clear.
-    migrate_legacy_secrets()
+    pending = unconverted_tables(inspect(db.engine))
+    set_unconverted_money_tables(pending)
+    return pending
+
+
+def refresh_memory_search():
+    """(Re)install BM25-ranked memory recall (see ai_memory_service) on the current database.
+
+    A restored or replaced database file may lack the index, so this runs at
+    startup and again whenever the database is swapped.
+    """
+    from ai_memory_service import install_registry_search, reset_registry_search
 
-    # Performance indexes (safe for repeated startup)
+    reset_registry_search()
+    if database_backend.supports_full_text_search:
+        install_registry_search(db.session, MemoryRegistry.__tablename__)
+
+
+def create_performance_indexes():
+    """Performance indexes; safe to run on every startup and after a restore."""
     performance_indexes = [
         'CREATE INDEX IF NOT EXISTS idx_product_name ON product(name)',
         'CREATE INDEX IF NOT EXISTS idx_product_category ON product(category)',
@@ -1738,14 +1732,81 @@ with app.app_context():
         # Keep these explicit for databases created before the memory models
         # existed.  IF NOT EXISTS makes startup safe and idempotent on SQLite.
         'CREATE INDEX IF NOT EXISTS idx_memory_registry_owner ON memory_registry(user_id, branch_id, scope)',
+        'CREATE INDEX IF NOT EXISTS idx_memory_registry_branch_updated ON memory_registry(branch_id, updated_at)',
         'CREATE INDEX IF NOT EXISTS idx_memory_audit_actor_branch ON memory_audit(actor_user_id, branch_id, created_at)'
     ]
     for index_sql in performance_indexes:
         try:
             db.session.execute(text(index_sql))
+            db.session.commit()
         except Exception as e:
+            # PostgreSQL aborts the whole transaction on error; start afresh.
+            db.session.rollback()
             app.logger.warning(f'Failed to create index: {e}')
-    db.session.commit()
+
+
+def upgrade_database_schema():
+    """Bring the current database up to this release: new tables, legacy column upgrades, indexes.
+
+    Runs at startup and on a restored backup, so files from older releases are
+    upgraded the same way in both cases.
+    """
+    db.create_all()
+    ensure_default_branch()
+    if database_backend.runs_legacy_migrations:
+        run_legacy_schema_migrations(inspect(db.engine))
+    create_performance_indexes()
+
+
+def apply_ai_concurrency_limit():
+    """Set this worker's provider-call limit from the environment or Settings.
+
+    Runs at startup and whenever the AI configuration changes, not per agent:
+    every orchestrator builds its own ``AIAgent``, and they share one limit.
+    """
+    from ai_agent import ProviderConfig
+    llm_concurrency.set_limit(ProviderConfig.load(get_setting).max_concurrency)
+
+
+# Create database tables and admin user
+with app.app_context():
+    database_backend = get_backend(db.engine)
+    database_backend.configure_engine(db.engine, db.session)
+    bind_money_columns(db.metadata)
+    # Reports, exports, dashboards and AI read tools use a separate mode=ro pool.
+    install_read_only_pool(db.engine)
+    upgrade_database_schema()
+    apply_ai_concurrency_limit()
+    pending_money_tables = refresh_money_storage()
+    if pending_money_tables:
+        app.logger.warning(
+            f"Money columns still hold Float amounts ({', '.join(pending_money_tables)}); "
+            "run `python migrate_money_columns.py` to convert them to integer cents.")
+
+    # Create Promotion table
+    if not hasattr(Product, 'promotions'):
+        db.create_all()
+    if not User.query.filter_by(username='admin').first():
+        admin_user = User(
+            username='admin',
+            password=generate_password_hash('admin123'),
+            role='manager'
+        )
+        db.session.add(admin_user)
+        db.session.commit()
+
+    if not AppSetting.query.filter_by(key='currency_code').first():
+        db.session.add(AppSetting(key='currency_code', value='USD'))
+        db.session.commit()
+
+    if not AppSetting.query.filter_by(key='receipt_paper_size').first():
+        db.session.add(AppSetting(key='receipt_paper_size', value=DEFAULT_RECEIPT_PAPER_SIZE))
+        db.session.commit()
+
+    # Encrypt any legacy plaintext AI API key so it is never stored in the clear.
+    migrate_legacy_secrets()
+
+    refresh_memory_search()
 
 # Authentication routes
 @app.route('/login', methods=['GET', 'POST'])
@@ -1789,6 +1850,63 @@ def dashboard():
         currency_suffix=get_currency_suffix()
     )
 
+AI_PROVIDER_SETTING_KEYS = {
+    'base_url': 'ai_base_url',
+    'model': 'ai_model',
+    'timeout_seconds': 'ai_timeout_seconds',
+    'max_concurrency': 'ai_max_concurrency',
+    'api_key': 'ai_base_url_api_key',
+}
+
+
+def get_ai_provider_settings():
+    """Effective AI provider configuration (environment first, then Settings); never the key."""
+    from ai_agent import ProviderConfig
+    config = ProviderConfig.load(get_setting)
+    return {
+        'base_url': config.base_url,
+        'model': config.model,
+        'timeout_seconds': config.timeout_seconds,
+        'max_concurrency': config.max_concurrency,
+        'api_key_configured': bool(config.base_url_api_key),
+    }
+
+
+def normalize_ai_provider_settings(provider):
+    """Validate a Settings update of the AI provider; an empty value clears that setting."""
+    if not isinstance(provider, dict):
+        raise ValueError('Invalid AI provider settings')
+    values = {}
+    for field, key in AI_PROVIDER_SETTING_KEYS.items():
+        if field not in provider:
+            continue
+        value = str(provider.get(field) or '').strip()
+        if value and field == 'base_url':
+            if not value.startswith(('http://', 'https://')) or len(value) > 300:
+                raise ValueError('AI base URL must start with http:// or https://')
+            value = value.rstrip('/')
+        elif value and field == 'model' and len(value) > 200:
+            raise ValueError('AI model id is too long')
+        elif value and field == 'timeout_seconds':
+            try:
+                seconds = float(value)
+            except ValueError:
+                raise ValueError('AI timeout must be a number of seconds')
+            if not 1 <= seconds <= 600:
+                raise ValueError('AI timeout must be between 1 and 600 seconds')
+        elif value and field == 'max_concurrency':
+            if not value.isdigit() or int(value) > 64:
+                raise ValueError('AI concurrency limit must be a whole number from 0 to 64')
+        elif value and field == 'api_key' and len(value) > 500:
+            raise ValueError('AI API key is too long')
+        values[key] = value
+    # A key belongs to the server it was entered for; a new base URL starts without one.
+    if ('ai_base_url' in values and 'ai_base_url_api_key' not in values
+            and values['ai_base_url'] != (get_setting('ai_base_url', '') or '')):
+        values['ai_base_url_api_key'] = ''
+    return values
+
+
 @app.route('/api/settings', methods=['GET', 'PUT'])
 def api_settings():
     if 'user_id' not in session:
@@ -1805,7 +1923,8 @@ def api_settings():
             'receipt_customization': get_receipt_customization_settings(
                 db.session.get(Branch, get_current_branch_id())
             ),
-            'ai_api_key_configured': bool(ai_api_key and len(ai_api_key) > 10)
+            'ai_api_key_configured': bool(ai_api_key and len(ai_api_key) > 10),
+            'ai_provider': get_ai_provider_settings(),
         })
 
     if session.get('role') != 'manager':
@@ -1874,6 +1993,22 @@ def api_settings():
             )
         })
     
+    # Handle AI provider update (base URL, model, timeout, concurrency, key for that URL)
+    if data.get('ai_provider') is not None:
+        try:
+            provider_settings = normalize_ai_provider_settings(data['ai_provider'])
+        except ValueError as error:
+            return jsonify({'success': False, 'message': str(error)}), 400
+        for key, value in provider_settings.items():
+            set_setting(key, value)
+        reset_ai_clients()
+        shared_state.publish('ai_config_changed')
+        return jsonify({
+            'success': True,
+            'message': 'AI provider settings saved',
+            'ai_provider': get_ai_provider_settings(),
+        })
+
     # Handle AI API key update
     ai_api_key = data.get('ai_api_key')
     if ai_api_key is not None:
@@ -1883,10 +2018,8 @@ def api_settings():
             # Also update environment variable for current session
             os.environ.pop('APIFREE_API_KEY', None)
             # Reset AI agent to pick up the change
-            from agent_orchestrator import reset_orchestrator
-            from ai_agent import reset_agent
-            reset_orchestrator()
-            reset_agent()
+            reset_ai_clients()
+            shared_state.publish('ai_config_changed')
             return jsonify({
                 'success': True,
                 'message': 'API key cleared',
@@ -1902,10 +2035,8 @@ def api_settings():
             # Update environment variable for current session
             os.environ['APIFREE_API_KEY'] = ai_api_key
             # Reset AI agent to pick up the new key
-            from agent_orchestrator import reset_orchestrator
-            from ai_agent import reset_agent
-            reset_orchestrator()
-            reset_agent()
+            reset_ai_clients()
+            shared_state.publish('ai_config_changed')
             return jsonify({
                 'success': True,
                 'message': 'API key saved',
@@ -1914,9 +2045,423 @@ def api_settings():
     
     return jsonify({'success': False, 'message': 'No valid settings provided'}), 400
 
+DATABASE_RESTORE_MAX_BYTES = int(os.environ.get('DATABASE_RESTORE_MAX_BYTES', 2 * 1024 * 1024 * 1024))
+DATABASE_RESTORE_CHUNK_SIZE = 1024 * 1024
+# Large backups arrive as a resumable series of parts, each well under the
+# 5 MiB request limit that Flask and Waitress apply to every route.
+DATABASE_RESTORE_PART_BYTES = 4 * 1024 * 1024
+DATABASE_RESTORE_UPLOAD_MAX_AGE_SECONDS = 3600
+RESTORE_UPLOAD_ID_RE = re.compile(r'^[0-9a-f]{32}$')
+DATABASE_RESTORE_DRAIN_SECONDS = 30
+# Tables every Parrot POS database has had since the first release. A backup
+# without them is from another application or predates branch support.
+DATABASE_RESTORE_REQUIRED_TABLES = ('user', 'app_setting', 'branch', 'product', 'sale', 'sale_item')
+SQLITE_HEADER = b'SQLite format 3\x00'
+# Workers forked by serve.py keep their own connections to pos.db open, and
+# one worker cannot quiesce the others, so the file is only swapped when a
+# single worker process serves the app.
+RESTORE_SINGLE_WORKER_MESSAGE = ('Restoring needs the POS running as a single worker process. '
+                                 'Restart it with POS_WORKERS=1, restore, then restart with more workers.')
+SERVER_DATABASE_BACKUP_MESSAGE = ('Backup and restore from Settings are only available for the SQLite database. '
+                                  'Use pg_dump / pg_restore for PostgreSQL.')
+SQLITE_SIDECAR_SUFFIXES = ('-wal', '-shm', '-journal')
+
+# Admission control per route class (admission.py). Checkout and scan lookups
+# always keep ADMISSION_CHECKOUT_RESERVED of the POS_THREADS Waitress threads.
+ADMISSION_ENABLED = os.environ.get('ADMISSION_CONTROL', '1') != '0'
+ADMISSION_THREADS = max(1, int(os.environ.get('POS_THREADS', '2')))
+ADMISSION_CHECKOUT_RESERVED = max(0, int(os.environ.get('ADMISSION_CHECKOUT_RESERVED', '1')))
+ADMISSION_EXEMPT_ENDPOINTS = {'static', 'login', 'logout', 'healthcheck', 'product_image', 'receipt_logo'}
+CHECKOUT_ENDPOINTS = {'api_create_sale', 'api_search_products', 'print_receipt'}
+REPORT_ENDPOINTS = {'generate_barcode_labels', 'api_print_purchase_order', 'print_debt_receipt'}
+# Only the synchronous chat holds a thread for a whole AI turn. Queuing a job
+# and polling one are CRUD-sized. Its event streams stay open for seconds, so
+# they have their own class and threads, outside the CRUD budget.
+AI_ENDPOINTS = {'agent_chat'}
+EVENT_STREAM_ENDPOINTS = {'api_agent_task_events'}
+admission = AdmissionController(
+    default_route_classes(ADMISSION_THREADS, ADMISSION_CHECKOUT_RESERVED, os.environ),
+    ADMISSION_THREADS - ADMISSION_CHECKOUT_RESERVED,
+)
+
+
+def classify_request():
+    """Route class of the current request, or None for requests that are never limited."""
+    endpoint = request.endpoint
+    if endpoint is None or endpoint in ADMISSION_EXEMPT_ENDPOINTS:
+        return None
+    if endpoint in CHECKOUT_ENDPOINTS:
+        return 'checkout'
+    if endpoint in AI_ENDPOINTS:
+        return 'ai'
+    if endpoint in EVENT_STREAM_ENDPOINTS:
+        return 'events'
+    view = app.view_functions.get(endpoint)
+    if endpoint in REPORT_ENDPOINTS or getattr(view, 'read_only_route', False):
+        return 'reports'
+    return 'crud'
+
+
+@app.before_request
+def admit_request():
+    if not ADMISSION_ENABLED:
+        return None
+    route_class = classify_request()
+    if route_class is None:
+        return None
+    admitted, retry_after = admission.acquire(route_class)
+    if not admitted:
+        response = jsonify({'error': 'The POS is busy with other work of this kind. Please retry shortly.',
+                            'route_class': route_class})
+        response.status_code = 429
+        response.headers['Retry-After'] = str(retry_after)
+        return response
+    g.admission_class = route_class
+
+
+@app.teardown_request
+def release_admission(exc=None):
+    route_class = g.pop('admission_class', None)
+    if route_class is not None:
+        admission.release(route_class)
+
+
+# Request gate used to quiesce the app while the database file is swapped.
+_request_gate = threading.Condition()
+_request_gate_state = {'active': 0, 'restoring': False}
+
+
+class RestoreRolledBack(Exception):
+    """The swapped-in database failed verification and the old file was put back."""
+
+
+class RestoreSchemaMismatch(Exception):
+    """The swapped-in backup could not be upgraded to this release; the old file was put back."""
+
+
+@app.before_request
+def enter_request_gate():
+    with _request_gate:
+        if _request_gate_state['restoring']:
+            response = jsonify({'error': 'Database restore in progress. Please retry shortly.'})
+            response.status_code = 503
+            response.headers['Retry-After'] = '5'
+            return response
+        _request_gate_state['active'] += 1
+        g.request_gate_entered = True
+
+
+MAINTENANCE_SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+MAINTENANCE_ALLOWED_ENDPOINTS = ('login', 'logout', 'static')
+
+
+@app.before_request
+def enforce_read_only_maintenance():
+    """Reject writes while an offline tool (e.g. the money migration) holds maintenance mode."""
+    if request.method in MAINTENANCE_SAFE_METHODS or request.endpoint in MAINTENANCE_ALLOWED_ENDPOINTS:
+        return None
+    status = maintenance_status(resolve_database_file_path())
+    if not status:
+        return None
+    response = jsonify({
+        'error': 'Database maintenance in progress; the POS is read-only. Please retry shortly.',
+        'maintenance': status.get('reason', 'maintenance'),
+    })
+    response.status_code = 503
+    response.headers['Retry-After'] = '30'
+    return response
+
+
+@app.teardown_request
+def leave_request_gate(exc=None):
+    if g.pop('request_gate_entered', False):
+        with _request_gate:
+            _request_gate_state['active'] -= 1
+            _request_gate.notify_all()
+
+
+# State shared between worker processes when running under serve.py. AI
+# conversations live in the store; settings changes and database restores are
+# published so every worker drops its own caches and connections.
+shared_state = get_shared_state(app.instance_path)
+
+
+def reset_ai_clients():
+    from ai_agent import reset_agent
+    reset_orchestrator()
+    reset_agent()
+    apply_ai_concurrency_limit()
+
+
+def apply_remote_ai_config_change(_payload=None):
+    # The publisher only updated its own environment; reload the key from settings.
+    api_key = get_setting('ai_api_key', '')
+    if api_key:
+        os.environ['APIFREE_API_KEY'] = api_key
+    else:
+        os.environ.pop('APIFREE_API_KEY', None)
+    reset_ai_clients()
+
+
+def apply_remote_database_replaced(_payload=None):
+    db.session.remove()
+    db.engine.dispose()
+    dispose_read_only_pool()
+    tool_result_cache.invalidate()
+    refresh_money_storage()
+    refresh_memory_search()
+
+
+shared_state.subscribe('ai_config_changed', apply_remote_ai_config_change)
+shared_state.subscribe('database_replaced', apply_remote_database_replaced)
+shared_state.subscribe('money_storage_changed', refresh_money_storage)
+
+
+@app.before_request
+def apply_shared_state_events():
+    shared_state.poll()
+
+
+def quiesce_database_requests(timeout=DATABASE_RESTORE_DRAIN_SECONDS):
+    """Stop admitting requests and wait until only the caller is still running."""
+    with _request_gate:
+        if _request_gate_state['restoring']:
+            return False
+        _request_gate_state['restoring'] = True
+        drained = _request_gate.wait_for(lambda: _request_gate_state['active'] <= 1, timeout=timeout)
+        if not drained:
+            _request_gate_state['restoring'] = False
+        return drained
+
+
+def resume_database_requests():
+    with _request_gate:
+        _request_gate_state['restoring'] = False
+        _request_gate.notify_all()
+
+
+@contextmanager
+def database_work_outside_requests():
+    """Count background database work (AI jobs) like a request, so a restore drains it.
+
+    Work that starts while a restore is swapping waits for it to finish.
+    """
+    with _request_gate:
+        _request_gate.wait_for(lambda: not _request_gate_state['restoring'])
+        _request_gate_state['active'] += 1
+    try:
+        yield
+    finally:
+        with _request_gate:
+            _request_gate_state['active'] -= 1
+            _request_gate.notify_all()
+
+
+def remove_sqlite_sidecars(path):
+    for suffix in SQLITE_SIDECAR_SUFFIXES:
+        try:
+            os.remove(path + suffix)
+        except FileNotFoundError:
+            pass
+
+
+def remove_database_files(path):
+    remove_sqlite_sidecars(path)
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+class RestoreUploadTooLarge(Exception):
+    """The upload would grow past DATABASE_RESTORE_MAX_BYTES."""
+
+
+def copy_stream_limited(stream, out, limit):
+    """Copy ``stream`` to ``out`` in fixed-size chunks; raise once more than ``limit`` bytes arrive."""
+    written = 0
+    while True:
+        chunk = stream.read(DATABASE_RESTORE_CHUNK_SIZE)
+        if not chunk:
+            break
+        written += len(chunk)
+        if written > limit:
+            raise RestoreUploadTooLarge()
+        out.write(chunk)
+    out.flush()
+    os.fsync(out.fileno())
+    return written
+
+
+def stream_upload_to_temp_file(file_storage, directory):
+    """Copy an uploaded file to disk in fixed-size chunks and return its path.
+
+    The temp file lives in the database directory so the final os.replace is
+    an atomic rename on the same filesystem.
+    """
+    fd, temp_path = tempfile.mkstemp(prefix='.restore_', suffix='.db', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            copy_stream_limited(file_storage.stream, out, DATABASE_RESTORE_MAX_BYTES)
+    except Exception:
+        remove_database_files(temp_path)
+        raise
+    return temp_path
+
+
+def restore_upload_path(db_file_path, upload_id):
+    """Temp file of a part-wise upload, or None for a malformed id.
+
+    Parts of one upload may reach different worker processes, so the file
+    beside the database is the whole upload state.
+    """
+    if not isinstance(upload_id, str) or not RESTORE_UPLOAD_ID_RE.match(upload_id):
+        return None
+    return os.path.join(os.path.dirname(db_file_path), f'.restore_upload_{upload_id}.db')
+
+
+_restore_upload_locks = {}
+_restore_upload_locks_guard = threading.Lock()
+
+
+def restore_upload_lock(path):
+    """Lock held around the offset check and append of one part-wise upload."""
+    with _restore_upload_locks_guard:
+        return _restore_upload_locks.setdefault(path, threading.Lock())
+
+
+def forget_restore_upload(path):
+    with _restore_upload_locks_guard:
+        _restore_upload_locks.pop(path, None)
+
+
+def remove_stale_restore_uploads(directory):
+    cutoff = time.time() - DATABASE_RESTORE_UPLOAD_MAX_AGE_SECONDS
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        if name.startswith('.restore_upload_'):
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+                    forget_restore_upload(path)
+            except OSError:
+                pass
+
+
+def serving_worker_processes():
+    """Worker processes serving the app (set by serve.py; 1 when run any other way)."""
+    return max(1, int(os.environ.get('POS_WORKERS') or 1))
+
+
+def restore_schema_problem(conn):
+    """Tables or columns of the current models that the database at ``conn`` lacks, as a message.
+
+    Checked after the restored file went through ``upgrade_database_schema``,
+    so a backup from an older release passes once it has been upgraded.
+    """
+    tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    missing = []
+    for table in db.metadata.sorted_tables:
+        if table.name not in tables:
+            missing.append(table.name)
+            continue
+        present = {row[1] for row in conn.execute(f'PRAGMA table_info("{table.name}")')}
+        missing.extend(f'{table.name}.{column.name}' for column in table.columns if column.name not in present)
+    if not missing:
+        return None
+    shown = ', '.join(missing[:8]) + (f' and {len(missing) - 8} more' if len(missing) > 8 else '')
+    return f'schema version does not match this release (missing: {shown})'
+
+
+def verify_restore_candidate(path):
+    """Return a reason the SQLite file at ``path`` must not be restored, or None."""
+    try:
+        conn = sqlite3.connect(path)
+    except sqlite3.Error as e:
+        return f'cannot open database ({e})'
+    try:
+        rows = conn.execute('PRAGMA integrity_check').fetchall()
+        if [row[0] for row in rows] != ['ok']:
+            return 'integrity check failed: ' + '; '.join(str(row[0]) for row in rows[:5])
+        tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        missing = [name for name in DATABASE_RESTORE_REQUIRED_TABLES if name not in tables]
+        if missing:
+            return 'not a Parrot POS database (missing tables: ' + ', '.join(missing) + ')'
+        # Fold any WAL content into the main file so the swap moves one file.
+        conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        return None
+    except sqlite3.DatabaseError as e:
+        return f'unreadable database ({e})'
+    finally:
+        conn.close()
+
+
+def swap_in_database_file(new_path, db_file_path):
+    """Atomically replace the live database with ``new_path``.
+
+    Callers must have quiesced other requests first. A consistent copy of the
+    current database (including WAL content) is kept until the new file has
+    been opened, checked and upgraded to this release through the engine; on
+    failure it is put back.
+    """
+    backup_path = db_file_path + '.pre_restore_backup'
+
+    db.session.remove()
+    db.engine.dispose()
+    dispose_read_only_pool()
+
+    live = sqlite3.connect(db_file_path)
+    try:
+        snapshot = sqlite3.connect(backup_path)
+        try:
+            live.backup(snapshot)
+        finally:
+            snapshot.close()
+        live.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    finally:
+        live.close()
+
+    # A stale -wal/-shm left beside the new file would be replayed into it.
+    remove_sqlite_sidecars(db_file_path)
+    os.replace(new_path, db_file_path)
+
+    try:
+        db.session.execute(text('PRAGMA journal_mode=WAL'))
+        result = db.session.execute(text('PRAGMA quick_check')).scalar()
+        if result != 'ok':
+            raise sqlite3.DatabaseError(f'quick_check returned {result}')
+        db.session.commit()
+        # A backup from an older release is upgraded like a database at startup.
+        try:
+            upgrade_database_schema()
+        except Exception as e:
+            db.session.rollback()
+            raise RestoreSchemaMismatch(f'could not upgrade the backup ({e})') from e
+        conn = sqlite3.connect(db_file_path)
+        try:
+            problem = restore_schema_problem(conn)
+        finally:
+            conn.close()
+        if problem:
+            raise RestoreSchemaMismatch(problem)
+    except Exception as verify_error:
+        db.session.remove()
+        db.engine.dispose()
+        dispose_read_only_pool()
+        remove_sqlite_sidecars(db_file_path)
+        os.replace(backup_path, db_file_path)
+        if isinstance(verify_error, RestoreSchemaMismatch):
+            raise
+        raise RestoreRolledBack(str(verify_error)) from verify_error
+
+    remove_database_files(backup_path)
+
+
 @app.route('/api/settings/database_backup', methods=['GET'])
 @manager_required
 def api_settings_database_backup():
+    if not database_backend.file_based:
+        return jsonify({'success': False, 'message': SERVER_DATABASE_BACKUP_MESSAGE}), 400
     db_file_path = resolve_database_file_path()
     if not db_file_path:
         return jsonify({'success': False, 'message': 'Database file not found'}), 404
@@ -1930,74 +2475,152 @@ def api_settings_database_backup():
         conditional=True
     )
 
+@app.route('/api/settings/database_pools', methods=['GET'])
+@manager_required
+def api_settings_database_pools():
+    """Connection, lock and WAL checkpoint counters for the primary and read-only pools."""
+    report = pool_report(db.engine)
+    report['maintenance'] = maintenance_status(resolve_database_file_path())
+    report['admission'] = admission.report()
+    return jsonify(report)
+
+@app.route('/api/settings/database_restore/uploads', methods=['POST'])
+@manager_required
+def api_start_database_restore_upload():
+    """Start a part-wise backup upload; parts go to the returned upload id with PUT."""
+    if not database_backend.file_based:
+        return jsonify({'success': False, 'message': SERVER_DATABASE_BACKUP_MESSAGE}), 400
+    if serving_worker_processes() > 1:
+        return jsonify({'success': False, 'message': RESTORE_SINGLE_WORKER_MESSAGE}), 409
+    db_file_path = resolve_database_file_path()
+    if not db_file_path:
+        return jsonify({'success': False, 'message': 'Current database file not found'}), 404
+    remove_stale_restore_uploads(os.path.dirname(db_file_path))
+    upload_id = secrets.token_hex(16)
+    open(restore_upload_path(db_file_path, upload_id), 'xb').close()
+    return jsonify({'success': True, 'upload_id': upload_id,
+                    'part_bytes': DATABASE_RESTORE_PART_BYTES,
+                    'max_bytes': DATABASE_RESTORE_MAX_BYTES}), 201
+
+
+@app.route('/api/settings/database_restore/uploads/<upload_id>', methods=['PUT'])
+@manager_required
+def api_database_restore_upload_part(upload_id):
+    """Append one part (raw bytes) at ``?offset=``; a retried part is answered with the received size."""
+    db_file_path = resolve_database_file_path() if database_backend.file_based else None
+    path = restore_upload_path(db_file_path, upload_id) if db_file_path else None
+    if not path:
+        return jsonify({'success': False, 'message': 'Upload not found'}), 404
+    # A retried part can arrive while the original is still being written.
+    with restore_upload_lock(path):
+        if not os.path.exists(path):
+            return jsonify({'success': False, 'message': 'Upload not found'}), 404
+        received = os.path.getsize(path)
+        if request.args.get('offset', type=int) != received:
+            return jsonify({'success': False, 'message': 'Part out of order', 'received': received}), 409
+        length = request.content_length
+        if length is None:
+            return jsonify({'success': False, 'message': 'Content-Length is required'}), 411
+        if length > DATABASE_RESTORE_PART_BYTES or received + length > DATABASE_RESTORE_MAX_BYTES:
+            return jsonify({'success': False, 'message': 'Backup file is too large'}), 413
+        try:
+            with open(path, 'ab') as out:
+                received += copy_stream_limited(request.stream, out, length)
+        except RestoreUploadTooLarge:
+            remove_database_files(path)
+            return jsonify({'success': False, 'message': 'Backup file is too large'}), 413
+    return jsonify({'success': True, 'received': received})
+
+
 @app.route('/api/settings/database_restore', methods=['POST'])
 @manager_required
 def api_settings_database_restore():
-    """Restore database from a backup file."""
-    if 'database' not in request.files:
-        return jsonify({'success': False, 'message': 'No database file provided'}), 400
-    
-    file = request.files['database']
-    if file.filename == '':
-        return jsonify({'success': False, 'message': 'No file selected'}), 400
-    
-    # Check file extension
-    if not file.filename.lower().endswith('.db'):
-        return jsonify({'success': False, 'message': 'Invalid file type. Please select a .db file'}), 400
-    
-    # Get current database path
+    """Restore database from a backup file.
+
+    Small backups may be posted as the ``database`` form file. Larger ones are
+    uploaded in parts first (see ``/api/settings/database_restore/uploads``)
+    and finished here with ``{"upload_id": ...}``. The file is checked with
+    PRAGMA integrity_check, the required-table list and the current models'
+    columns, and only then swapped in with os.replace while every other
+    request is held off. Refused with 409 when several workers serve the app.
+    """
+    if not database_backend.file_based:
+        return jsonify({'success': False, 'message': SERVER_DATABASE_BACKUP_MESSAGE}), 400
+    if serving_worker_processes() > 1:
+        return jsonify({'success': False, 'message': RESTORE_SINGLE_WORKER_MESSAGE}), 409
     db_file_path = resolve_database_file_path()
     if not db_file_path:
         return jsonify({'success': False, 'message': 'Current database file not found'}), 404
-    
+
+    temp_path = upload_path = None
     try:
-        # Read the uploaded file
-        uploaded_data = file.read()
-        
-        # Validate it's a valid SQLite database by checking the header
+        if request.is_json:
+            temp_path = upload_path = restore_upload_path(
+                db_file_path, (request.get_json(silent=True) or {}).get('upload_id'))
+            if not temp_path or not os.path.exists(temp_path):
+                temp_path = None
+                return jsonify({'success': False, 'message': 'Upload not found'}), 404
+        else:
+            if 'database' not in request.files:
+                return jsonify({'success': False, 'message': 'No database file provided'}), 400
+
+            file = request.files['database']
+            if file.filename == '':
+                return jsonify({'success': False, 'message': 'No file selected'}), 400
+
+            # Check file extension
+            if not file.filename.lower().endswith('.db'):
+                return jsonify({'success': False, 'message': 'Invalid file type. Please select a .db file'}), 400
+            temp_path = stream_upload_to_temp_file(file, os.path.dirname(db_file_path))
+
         # SQLite databases start with "SQLite format 3\x00"
-        if not uploaded_data.startswith(b'SQLite format 3\x00'):
-            return jsonify({'success': False, 'message': 'Invalid database file. The file is not a valid SQLite database.'}), 400
-        
-        # Create a backup of the current database before replacing
-        backup_path = db_file_path + '.pre_restore_backup'
-        if os.path.exists(db_file_path):
-            import shutil
-            shutil.copy2(db_file_path, backup_path)
-        
-        # Close all database connections
-        db.session.remove()
-        db.engine.dispose()
-        
-        # Write the new database
-        with open(db_file_path, 'wb') as f:
-            f.write(uploaded_data)
-        
-        # Re-initialize the database connection
-        db.session.configure(bind=db.engine)
-        
-        # Verify the restored database by trying to query it
+        with open(temp_path, 'rb') as uploaded:
+            if uploaded.read(len(SQLITE_HEADER)) != SQLITE_HEADER:
+                return jsonify({'success': False, 'message': 'Invalid database file. The file is not a valid SQLite database.'}), 400
+
+        problem = verify_restore_candidate(temp_path)
+        if problem:
+            return jsonify({'success': False, 'message': f'Backup rejected: {problem}'}), 400
+
+        if not quiesce_database_requests():
+            return jsonify({
+                'success': False,
+                'message': 'The POS is busy. Please try the restore again in a moment.'
+            }), 503
         try:
-            db.session.execute(text('SELECT 1'))
-            db.session.commit()
-        except Exception as verify_error:
-            # Restore failed, revert to the backup
-            if os.path.exists(backup_path):
-                shutil.copy2(backup_path, db_file_path)
-            return jsonify({'success': False, 'message': f'Restored database is corrupted. Rolled back to previous state. Error: {str(verify_error)}'}), 500
-        
-        # Clean up the pre-restore backup
-        if os.path.exists(backup_path):
-            os.remove(backup_path)
-        
+            # Only this process serves requests (see serving_worker_processes);
+            # maintenance mode keeps tools such as the archiver from starting.
+            with read_only_maintenance(db_file_path, 'database restore'):
+                swap_in_database_file(temp_path, db_file_path)
+                temp_path = None
+                shared_state.publish('database_replaced')
+                tool_result_cache.invalidate()
+                refresh_money_storage()
+            # Outside maintenance: the restored file may need its search index written.
+            refresh_memory_search()
+        finally:
+            resume_database_requests()
+
         return jsonify({
             'success': True,
             'message': 'Database restored successfully. Please refresh the page to see the changes.'
         })
-        
+
+    except (RestoreUploadTooLarge, RequestEntityTooLarge):
+        return jsonify({'success': False, 'message': 'Backup file is too large; upload it in parts'}), 413
+    except RestoreSchemaMismatch as e:
+        return jsonify({'success': False, 'message': f'Backup rejected: {e}'}), 400
+    except RestoreRolledBack as e:
+        app.logger.error(f"Restored database failed verification: {str(e)}")
+        return jsonify({'success': False, 'message': f'Restored database is corrupted. Rolled back to previous state. Error: {str(e)}'}), 500
     except Exception as e:
         app.logger.error(f"Error restoring database: {str(e)}")
         return jsonify({'success': False, 'message': f'Failed to restore database: {str(e)}'}), 500
+    finally:
+        if temp_path:
+            remove_database_files(temp_path)
+        if upload_path:
+            forget_restore_upload(upload_path)
 
 # Branch Management API Endpoints
 @app.route('/api/branches', methods=['GET', 'POST'])
@@ -2848,15 +3471,16 @@ def api_create_sale():
     if not data or 'items' not in data:
         return jsonify({'success': False, 'message': 'Missing required fields'}), 400
 
-    # SQLite can raise "database is locked" under concurrent POS writes; retry the
-    # whole transaction (stock checks + guarded decrements) up to 3 times before failing.
+    # SQLite can raise "database is locked" (PostgreSQL: deadlock/serialization
+    # failures) under concurrent POS writes; retry the whole transaction
+    # (stock checks + guarded decrements) up to 3 times before failing.
     max_attempts = 3
     for attempt in range(max_attempts):
         try:
             return _create_sale_transaction(data)
         except OperationalError as exc:
             db.session.rollback()
-            if 'database is locked' in str(exc).lower() and attempt < max_attempts - 1:
+            if database_backend.is_retryable_lock_error(exc) and attempt < max_attempts - 1:
                 time.sleep(0.2 * (attempt + 1))
                 app.logger.warning(f"Sale transaction hit DB lock (attempt {attempt + 1}); retrying...")
                 continue
@@ -2874,6 +3498,14 @@ def _create_sale_transaction(data):
         tax_total = Decimal('0.00')
         items = []
 
+        # On PostgreSQL, take row locks on every product in the cart (in id order)
+        # before reading stock, so concurrent checkouts serialise per product.
+        try:
+            cart_product_ids = [int(item['product_id']) for item in data['items']]
+        except (KeyError, TypeError, ValueError):
+            cart_product_ids = []
+        lock_rows_for_update(Product.query, database_backend, cart_product_ids)
+
         for item in data['items']:
             product = db.session.get(Product, item['product_id'])
             if not product:
@@ -3597,6 +4229,7 @@ def api_single_delivery(delivery_id):
     return jsonify({'success': True, 'message': 'Delivery updated', 'delivery': serialize_delivery(delivery)})
 
 @app.route('/api/deliveries/stats', methods=['GET'])
+@read_only_route
 def api_delivery_stats():
     if 'user_id' not in session:
         return jsonify({'error': 'Unauthorized'}), 401
@@ -3693,25 +4326,31 @@ def print_receipt(transaction_id):
 # --- Excel Export ---
 @app.route('/api/reports/sales/export', methods=['GET'])
 @manager_or_boss_required
+@read_only_route
 def export_sales_report():
     start_date = request.args.get('start')
     end_date = request.args.get('end')
     _, branch_id = resolve_report_scope()
-    
-    query = Sale.query
-    if branch_id:
-        query = query.filter_by(branch_id=branch_id)
+
     try:
-        if start_date:
-            start_date_obj = datetime.strptime(start_date, '%Y-%m-%d')
-            query = query.filter(Sale.date >= start_date_obj)
-        if end_date:
-            end_date_obj = datetime.strptime(end_date, '%Y-%m-%d')
-            query = query.filter(Sale.date <= end_date_obj)
+        start_date_obj = datetime.strptime(start_date, '%Y-%m-%d') if start_date else None
+        end_date_obj = datetime.strptime(end_date, '%Y-%m-%d') if end_date else None
     except ValueError:
         return jsonify({'success': False, 'message': 'Invalid date format'}), 400
 
-    sales = query.order_by(Sale.date).all()
+    try:
+        sales_history = history(Sale, start_date_obj, end_date_obj)
+        query = db.session.query(sales_history)
+        if branch_id:
+            query = query.filter_by(branch_id=branch_id)
+        if start_date_obj:
+            query = query.filter(sales_history.date >= start_date_obj)
+        if end_date_obj:
+            query = query.filter(sales_history.date <= end_date_obj)
+
+        sales = query.order_by(sales_history.date).all()
+    except ArchiveRangeError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
     data = []
     for sale in sales:
         data.append({
@@ -3740,6 +4379,7 @@ def export_sales_report():
     return response
 
 @app.route('/api/reports/sales', methods=['GET'])
+@read_only_route
 def api_report_sales():
     if 'user_id' not in session:
         return jsonify({'error': 'Unauthorized'}), 401
@@ -3748,39 +4388,44 @@ def api_report_sales():
     end_date = request.args.get('end')      # Format: 'YYYY-MM-DD'
     scope, branch_id = resolve_report_scope()
 
-    query = Sale.query
-    if branch_id:
-        query = query.filter_by(branch_id=branch_id)
     myanmar_tz = pytz.timezone('Asia/Yangon')
     q = (request.args.get('q') or '').strip()
     page = request.args.get('page', type=int)
     per_page = request.args.get('per_page', type=int)
 
     try:
-        # Apply date filters if provided
+        start_date_obj = end_date_obj = None
         if start_date:
-            start_date_obj = datetime.strptime(start_date, '%Y-%m-%d')
-            start_date_obj = myanmar_tz.localize(start_date_obj)
-            query = query.filter(Sale.date >= start_date_obj)
-
+            start_date_obj = myanmar_tz.localize(datetime.strptime(start_date, '%Y-%m-%d'))
         if end_date:
             end_date_obj = datetime.strptime(end_date, '%Y-%m-%d')
             end_date_obj = myanmar_tz.localize(end_date_obj).replace(hour=23, minute=59, second=59)
-            query = query.filter(Sale.date <= end_date_obj)
+
+        # Older years may live in per-year archive files
+        sales_history = history(Sale, start_date_obj, end_date_obj)
+        query = db.session.query(sales_history)
+        if branch_id:
+            query = query.filter_by(branch_id=branch_id)
+
+        # Apply date filters if provided
+        if start_date_obj:
+            query = query.filter(sales_history.date >= start_date_obj)
+        if end_date_obj:
+            query = query.filter(sales_history.date <= end_date_obj)
 
         # Cashiers can only see their own sales
         if session.get('role') == 'cashier':
-            query = query.filter(Sale.user_id == session['user_id'])
+            query = query.filter(sales_history.user_id == session['user_id'])
 
         if q:
             like_q = f'%{q}%'
-            query = query.outerjoin(User, User.id == Sale.user_id).filter(
-                (Sale.transaction_id.ilike(like_q)) |
-                (Sale.payment_method.ilike(like_q)) |
+            query = query.outerjoin(User, User.id == sales_history.user_id).filter(
+                (sales_history.transaction_id.ilike(like_q)) |
+                (sales_history.payment_method.ilike(like_q)) |
                 (User.username.ilike(like_q))
             )
 
-        query = query.order_by(Sale.date.desc())
+        query = query.order_by(sales_history.date.desc())
 
         def serialize_sale_row(s):
             return {
@@ -3813,11 +4458,14 @@ def api_report_sales():
         sales = query.all()
         return jsonify([serialize_sale_row(s) for s in sales])
 
+    except ArchiveRangeError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
     except ValueError as e:
         app.logger.error(f"Date parsing error: {str(e)}")
         return jsonify({'success': False, 'message': 'Invalid date format. Use YYYY-MM-DD.'}), 400
 
 @app.route('/api/dashboard/sales_data')
+@read_only_route
 def api_dashboard_sales_data():
     if 'user_id' not in session:
         return jsonify({'error': 'Unauthorized'}), 401
@@ -3828,19 +4476,15 @@ def api_dashboard_sales_data():
     end_date = datetime.now(pytz.timezone('Asia/Yangon'))
     start_date = end_date - timedelta(days=7)
     
-    sales = Sale.query.filter(
-        Sale.branch_id == branch_id,
-        Sale.date >= start_date,
-        Sale.date <= end_date
-    ).order_by(Sale.date).all()
-
-    # Group sales by day
-    sales_by_day = {}
-    for sale in sales:
-        sale_date = sale.date.strftime('%Y-%m-%d')
-        if sale_date not in sales_by_day:
-            sales_by_day[sale_date] = Decimal('0')
-        sales_by_day[sale_date] += safe_to_decimal(sale.total)
+    # Group sales by day in SQL; Sale.total is integer cents so the SUM is exact
+    sales_history = history(Sale, start_date, end_date)
+    sale_day = func.date(sales_history.date)
+    daily_totals = db.session.query(sale_day, func.sum(sales_history.total)).filter(
+        sales_history.branch_id == branch_id,
+        sales_history.date >= start_date,
+        sales_history.date <= end_date
+    ).group_by(sale_day).all()
+    sales_by_day = {str(day): total or 0 for day, total in daily_totals}
 
     # Fill in missing days with 0
     result = []
@@ -3856,29 +4500,38 @@ def api_dashboard_sales_data():
     return jsonify(result)
 
 @app.route('/api/dashboard/top_products', methods=['GET'])
+@read_only_route
 def api_dashboard_top_products():
     if 'user_id' not in session:
         return jsonify({'error': 'Unauthorized'}), 401
 
     branch_id = get_current_branch_id()
-
-    rows = (
-        db.session.query(
-            Product.id,
-            Product.name,
-            Product.price,
-            Product.stock,
-            func.sum(SaleItem.quantity).label('units_sold'),
-            func.sum(SaleItem.price * SaleItem.quantity).label('sales_amount')
+    try:
+        # No range: the dashboard ranks recent (hot) sales, not archived years.
+        sales_history = history(Sale)
+        items_history = history(SaleItem)
+
+        rows = (
+            db.session.query(
+                Product.id,
+                Product.name,
+                Product.price,
+                Product.stock,
+                func.sum(items_history.quantity).label('units_sold'),
+                # The column's own Money type knows whether sale_item still holds whole units.
+                func.sum(type_coerce(items_history.price * items_history.quantity,
+                                     SaleItem.__table__.c.price.type)).label('sales_amount')
+            )
+            .join(items_history, items_history.product_id == Product.id)
+            .join(sales_history, sales_history.id == items_history.sale_id)
+            .filter(sales_history.branch_id == branch_id)
+            .group_by(Product.id)
+            .order_by(func.sum(items_history.quantity).desc())
+            .limit(5)
+            .all()
         )
-        .join(SaleItem, SaleItem.product_id == Product.id)
-        .join(Sale, Sale.id == SaleItem.sale_id)
-        .filter(Sale.branch_id == branch_id)
-        .group_by(Product.id)
-        .order_by(func.sum(SaleItem.quantity).desc())
-        .limit(5)
-        .all()
-    )
+    except ArchiveRangeError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
 
     return jsonify([
         {
@@ -4267,6 +4920,7 @@ def api_purchase_orders():
 
 @app.route('/api/purchase_orders/summary', methods=['GET'])
 @manager_required
+@read_only_route
 def api_purchase_orders_summary():
     """Get purchase order summary statistics"""
     branch_id = get_default_branch_id()
@@ -5026,6 +5680,7 @@ def api_warehouse_inventory():
 
 @app.route('/api/warehouse/summary', methods=['GET'])
 @manager_required
+@read_only_route
 def api_warehouse_summary():
     """Get warehouse summary statistics"""
     branch_id = get_default_branch_id()
@@ -5384,13 +6039,16 @@ def api_debts():
 
 @app.route('/api/debts/summary', methods=['GET'])
 @manager_required
+@read_only_route
 def api_debts_summary():
     """Get debt summary statistics"""
     branch_id = get_current_branch_id()
     # Get all outstanding debts (all debts are actual debts now, no type filter needed)
     outstanding_debts = Debt.query.filter(Debt.balance > 0, Debt.branch_id == branch_id).all()
     
-    total_outstanding = sum(d.balance for d in outstanding_debts)
+    total_outstanding = db.session.query(func.sum(Debt.balance)).filter(
+        Debt.balance > 0, Debt.branch_id == branch_id
+    ).scalar() or 0
     total_debts = len(outstanding_debts)
     
     # Calculate aging breakdown
@@ -5409,10 +6067,9 @@ def api_debts_summary():
     # Get this month's payments from DebtPayment table
     now = datetime.utcnow()
     month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-    monthly_payments = DebtPayment.query.filter(
+    total_payments_this_month = db.session.query(func.sum(DebtPayment.amount)).filter(
         DebtPayment.payment_date >= month_start
-    ).all()
-    total_payments_this_month = sum(p.amount for p in monthly_payments)
+    ).scalar() or 0
     
     # Get overdue count
     overdue_count = sum(1 for d in outstanding_debts if d.due_date and d.due_date < now)
@@ -5429,6 +6086,7 @@ def api_debts_summary():
 
 @app.route('/api/debts/aging', methods=['GET'])
 @manager_required
+@read_only_route
 def api_debts_aging():
     """Get debt aging analysis"""
     branch_id = get_current_branch_id()
@@ -5451,6 +6109,7 @@ def api_debts_aging():
 
 @app.route('/api/debts/export', methods=['GET'])
 @manager_required
+@read_only_route
 def export_debts():
     """Export debts to Excel"""
     branch_id = get_current_branch_id()
@@ -5600,6 +6259,7 @@ def api_single_debt(debt_id):
 
 @app.route('/api/customers/<int:customer_id>/debts', methods=['GET'])
 @manager_required
+@read_only_route
 def api_customer_debts(customer_id):
     customer = db.session.get(Customer, customer_id)
     if not customer:
@@ -5610,8 +6270,17 @@ def api_customer_debts(customer_id):
     # Calculate customer summary - total outstanding debt balance
     total_debt = sum(d.balance for d in debts if d.balance > 0)
     
-    # Calculate total paid from DebtPayment records
-    total_paid = sum(p.amount for p in DebtPayment.query.filter_by(customer_id=customer_id).all())
+    # Calculate total paid from DebtPayment records, including archived years.
+    # Debts stay hot, so no payment predates the year of the customer's first debt.
+    debt_dates = [d.date for d in debts]
+    paid_since = datetime(min(debt_dates).year, 1, 1) if debt_dates and None not in debt_dates else None
+    try:
+        payments_history = history(DebtPayment, paid_since)
+        total_paid = db.session.query(func.sum(payments_history.amount)).filter(
+            payments_history.customer_id == customer_id
+        ).scalar() or 0
+    except ArchiveRangeError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
     
     return jsonify({
         'customer': {
@@ -5791,19 +6460,41 @@ AI_MODELS = {
     'ReturnExchange': ReturnExchange,
     'ReturnExchangeItem': ReturnExchangeItem
 }
+def publish_tool_cache_invalidation(branches):
+    # A lone worker has no one to tell; skip the shared-state write on every commit.
+    if serving_worker_processes() > 1:
+        shared_state.publish('tool_cache_invalidated', branches)
+
 
+def apply_remote_tool_cache_invalidation(branches=None):
+    tool_result_cache.invalidate(branches or (ALL_BRANCHES,))
 
-def get_ai_orchestrator():
+
+# Any committed write to a table the AI tools read drops that branch's cached
+# results, in this worker and (through shared_state) in the others.
+watch_session(ReadRoutingSession, tool_result_cache, AI_MODELS.values(),
+              publish=publish_tool_cache_invalidation)
+shared_state.subscribe('tool_cache_invalidated', apply_remote_tool_cache_invalidation)
+
+
+def agent_request_context():
+    """Trusted scope of the signed-in user, captured so a background job can reuse it."""
+    return {
+        'branch_id': get_current_branch_id(),
+        'user_id': session.get('user_id'),
+        'role': session.get('role')
+    }
+
+
+def get_ai_orchestrator(context=None):
     """Get the current user's isolated AI conversation."""
+    context = context or agent_request_context()
     orchestrator = get_orchestrator(
         db, AI_MODELS, get_setting, app,
-        conversation_id=session.get('user_id')
+        conversation_id=context['user_id'],
+        conversation_store=shared_state
     )
-    orchestrator.set_request_context({
-        'branch_id': get_current_branch_id(),
-        'user_id': session.get('user_id'),
-        'role': session.get('role')
-    })
+    orchestrator.set_request_context(context)
     # SQLite-backed memory is always available; Mem0 upgrades it to semantic
     # retrieval when a local embedding backend is configured.
     orchestrator.memory_service = get_persistent_memory_service()
@@ -5818,7 +6509,8 @@ def get_persistent_memory_service():
     try:
         from ai_memory_service import get_memory_service
         service = get_memory_service(
-            db=db, registry_model=MemoryRegistry, audit_model=MemoryAudit
+            db=db, registry_model=MemoryRegistry, audit_model=MemoryAudit,
+            embedding_model=MemoryEmbedding,
         )
         if service is None:
             return None
@@ -5862,14 +6554,15 @@ def visible_memory_registry_query(scope=None):
     return query.filter(or_(MemoryRegistry.user_id == user_id, MemoryRegistry.scope == 'branch_shared'))
 
 
-def capture_low_risk_memory(command):
+def capture_low_risk_memory(command, context=None):
     """Allow Loli to learn only explicit, preference-like statements after a successful turn."""
     service = get_persistent_memory_service()
     if not service or not getattr(service, 'should_auto_save', lambda _: False)(command):
         return
+    context = context or agent_request_context()
     try:
         result = service.remember(
-            content=command, user_id=session['user_id'], branch_id=get_current_branch_id(),
+            content=command, user_id=context['user_id'], branch_id=context['branch_id'],
             scope='private', source='automatic', explicit=False, allow_auto=True,
             db=db, registry_model=MemoryRegistry, audit_model=MemoryAudit,
         )
@@ -6010,6 +6703,56 @@ def api_forget_all_agent_memories():
         return jsonify({'success': False, 'error': 'Unable to forget private memories'}), 503
 
 
+def run_agent_turn(command, context, progress=None, task=None):
+    """Run one chat turn and persist plan-bearing results as an AgentTask.
+
+    ``task`` is the AgentTask already created for a background job; it is
+    updated in place (and always gets a final status) instead of adding a row.
+    """
+    orchestrator = get_ai_orchestrator(context)
+    result = orchestrator.process_command(command, context['user_id'], progress=progress)
+    if result.get('success'):
+        capture_low_risk_memory(command, context)
+
+    # GOAL 1: persist plan-bearing results so proposals can be approved later.
+    has_plan = isinstance(result.get('plan'), list) and isinstance(result.get('step_results'), list)
+    if has_plan or task is not None:
+        try:
+            if task is None:
+                task = AgentTask(user_id=context['user_id'], command=command)
+                db.session.add(task)
+            status = 'completed' if result.get('success') else 'failed'
+            if has_plan:
+                if any(sr.get('status') == 'proposal' for sr in result['step_results']):
+                    status = 'pending_approval'
+                task.plan_json = json.dumps(result.get('plan'))
+                task.step_results_json = json.dumps(result.get('step_results'))
+            task.status = status
+            db.session.commit()
+            result['task_id'] = task.id
+        except Exception as persist_error:
+            db.session.rollback()
+            app.logger.warning(f"AgentTask persistence failed: {persist_error}")
+    return result
+
+
+def agent_command_from_request():
+    """(command, error response) for the chat endpoints."""
+    data = request.get_json(silent=True)
+    if not data or 'command' not in data:
+        return None, (jsonify({
+            'success': False,
+            'error': 'Missing required field: command'
+        }), 400)
+    command = str(data['command']).strip()
+    if not command:
+        return None, (jsonify({
+            'success': False,
+            'error': 'Command cannot be empty'
+        }), 400)
+    return command, None
+
+
 @app.route('/api/agent/chat', methods=['POST'])
 @login_required
 def agent_chat():
@@ -6018,46 +6761,10 @@ def agent_chat():
     Expects JSON: {"command": "your command here"}
     """
     try:
-        data = request.get_json()
-        if not data or 'command' not in data:
-            return jsonify({
-                'success': False,
-                'error': 'Missing required field: command'
-            }), 400
-
-        command = data['command'].strip()
-        if not command:
-            return jsonify({
-                'success': False,
-                'error': 'Command cannot be empty'
-            }), 400
-
-        # Process the command through the agent
-        orchestrator = get_ai_orchestrator()
-        result = orchestrator.process_command(command, session.get('user_id'))
-        if result.get('success'):
-            capture_low_risk_memory(command)
-
-        # GOAL 1: persist plan-bearing results so proposals can be approved later.
-        if isinstance(result.get('plan'), list) and isinstance(result.get('step_results'), list):
-            try:
-                has_proposals = any(sr.get('status') == 'proposal' for sr in result['step_results'])
-                task = AgentTask(
-                    user_id=session.get('user_id'),
-                    command=command,
-                    plan_json=json.dumps(result.get('plan')),
-                    status='pending_approval' if has_proposals else (
-                        'completed' if result.get('success') else 'failed'),
-                    step_results_json=json.dumps(result.get('step_results')),
-                )
-                db.session.add(task)
-                db.session.commit()
-                result['task_id'] = task.id
-            except Exception as persist_error:
-                db.session.rollback()
-                app.logger.warning(f"AgentTask persistence failed: {persist_error}")
-
-        return jsonify(result)
+        command, error = agent_command_from_request()
+        if error:
+            return error
+        return jsonify(run_agent_turn(command, agent_request_context()))
 
     except Exception as e:
         app.logger.error(f"AI Agent error: {str(e)}")
@@ -6068,6 +6775,106 @@ def agent_chat():
         }), 500
 
 
+# Chat turns as background jobs (agent_jobs.py). The request returns a task id
+# at once; progress and the final result go to the shared state store so any
+# worker process can serve the polling or SSE requests.
+AI_JOB_WORKERS = max(1, int(os.environ.get('AI_JOB_WORKERS', '2')))
+AI_JOB_QUEUE = max(0, int(os.environ.get('AI_JOB_QUEUE', '8')))
+AI_JOB_STREAM_POLL_SECONDS = 0.25
+AI_JOB_TOKEN_FLUSH_SECONDS = 0.1
+# An event stream holds a Waitress thread, so each one ends after a few
+# seconds; EventSource reconnects after AI_JOB_STREAM_RETRY_MS and resumes
+# from Last-Event-ID.
+AI_JOB_STREAM_MAX_SECONDS = 5
+AI_JOB_STREAM_RETRY_MS = 500
+AI_JOB_FINAL_EVENTS = ('final', 'failed')
+ai_jobs = AgentJobRunner(workers=AI_JOB_WORKERS, queue_limit=AI_JOB_QUEUE)
+
+
+def run_agent_job(task_id, command, context):
+    # Streamed answer text arrives a few characters at a time; store it in
+    # batches so a long answer costs a handful of writes, not hundreds.
+    tokens = []
+    last_flush = [time.monotonic()]
+
+    def flush_tokens():
+        if tokens:
+            shared_state.append_job_event(task_id, 'token', {'text': ''.join(tokens)})
+            tokens.clear()
+        last_flush[0] = time.monotonic()
+
+    def progress(kind, **data):
+        if kind == 'token':
+            tokens.append(data.get('text') or '')
+            if time.monotonic() - last_flush[0] >= AI_JOB_TOKEN_FLUSH_SECONDS:
+                flush_tokens()
+            return
+        flush_tokens()
+        shared_state.append_job_event(task_id, kind, data, default=json_default)
+
+    with database_work_outside_requests(), app.app_context():
+        task = db.session.get(AgentTask, task_id)
+        try:
+            task.status = 'executing'
+            db.session.commit()
+            progress('started')
+            result = run_agent_turn(command, context, progress=progress, task=task)
+            flush_tokens()
+            shared_state.append_job_event(task_id, 'final', result, default=json_default)
+        except Exception as e:
+            db.session.rollback()
+            app.logger.error(f"AI Agent job {task_id} failed: {str(e)}")
+            try:
+                task = db.session.get(AgentTask, task_id)
+                task.status = 'failed'
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+            shared_state.append_job_event(task_id, 'failed', {
+                'success': False,
+                'error': str(e),
+                'message': 'An error occurred while processing your request.'
+            })
+        finally:
+            db.session.remove()
+
+
+@app.route('/api/agent/jobs', methods=['POST'])
+@login_required
+def agent_submit_job():
+    """Queue a chat command; poll /api/agent/task/<id> or stream /api/agent/task/<id>/events."""
+    command, error = agent_command_from_request()
+    if error:
+        return error
+    if not ai_jobs.has_capacity():
+        response = jsonify({'success': False, 'error': 'The AI assistant is busy. Please retry shortly.'})
+        response.status_code = 429
+        response.headers['Retry-After'] = '5'
+        return response
+
+    context = agent_request_context()
+    task = AgentTask(user_id=context['user_id'], command=command, status='queued')
+    db.session.add(task)
+    db.session.commit()
+    task_id = task.id
+    shared_state.clear_job_events(task_id)
+    shared_state.append_job_event(task_id, 'queued')
+    if not ai_jobs.submit(lambda: run_agent_job(task_id, command, context)):
+        task.status = 'failed'
+        db.session.commit()
+        response = jsonify({'success': False, 'error': 'The AI assistant is busy. Please retry shortly.'})
+        response.status_code = 429
+        response.headers['Retry-After'] = '5'
+        return response
+    return jsonify({
+        'success': True,
+        'task_id': task_id,
+        'status': 'queued',
+        'poll_url': url_for('api_agent_get_task', task_id=task_id),
+        'events_url': url_for('api_agent_task_events', task_id=task_id),
+    }), 202
+
+
 @app.route('/api/agent/status', methods=['GET'])
 @manager_required
 def agent_status():
@@ -6075,6 +6882,10 @@ def agent_status():
     try:
         orchestrator = get_ai_orchestrator()
         status = orchestrator.get_status()
+        status['jobs'] = ai_jobs.report()
+        status['provider_http'] = llm_latency_report()
+        status['tool_cache'] = tool_result_cache.report()
+        status['plan_cache'] = plan_templates.report()
         return jsonify({
             'success': True,
             'status': status
@@ -6306,8 +7117,53 @@ def api_agent_get_task(task_id):
         for i, sr in enumerate(data.get('step_results') or [])
         if sr.get('status') == 'proposal' and not sr.get('approved')
     ]
+    # Background chat jobs: progress so far and, once finished, the chat result.
+    events = shared_state.job_events(task_id)
+    if events:
+        data['events'] = [{k: e[k] for k in ('seq', 'kind', 'data')} for e in events
+                          if e['kind'] not in AI_JOB_FINAL_EVENTS + ('token',)]
+        data['partial_message'] = ''.join((e['data'] or {}).get('text', '') for e in events
+                                          if e['kind'] == 'token')
+        final = next((e for e in events if e['kind'] in AI_JOB_FINAL_EVENTS), None)
+        data['result'] = final['data'] if final else None
     return jsonify(data)
 
+
+@app.route('/api/agent/task/<int:task_id>/events', methods=['GET'])
+@login_required
+def api_agent_task_events(task_id):
+    """Server-sent events for a background chat job: queued, started, planning, tool, token, final/failed.
+
+    Each response lasts at most AI_JOB_STREAM_MAX_SECONDS; the client reconnects
+    with Last-Event-ID (or ``?after=``) until it has seen final/failed.
+    """
+    task = AgentTask.query.get_or_404(task_id)
+    if task.user_id != session.get('user_id'):
+        return jsonify({'success': False, 'error': 'Forbidden'}), 403
+    try:
+        after = int(request.headers.get('Last-Event-ID') or request.args.get('after') or 0)
+    except ValueError:
+        after = 0
+
+    def stream(after):
+        started = time.monotonic()
+        yield f'retry: {AI_JOB_STREAM_RETRY_MS}\n\n'
+        while True:
+            for event in shared_state.job_events(task_id, after):
+                after = event['seq']
+                yield (f"id: {event['seq']}\nevent: {event['kind']}\n"
+                       f"data: {json.dumps(event['data'], default=json_default)}\n\n")
+                if event['kind'] in AI_JOB_FINAL_EVENTS:
+                    return
+            if time.monotonic() - started >= AI_JOB_STREAM_MAX_SECONDS:
+                return
+            time.sleep(AI_JOB_STREAM_POLL_SECONDS)
+
+    response = Response(stream_with_context(stream(after)), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
 @app.route('/api/agent/autonomy', methods=['GET'])
 @login_required
 def api_agent_autonomy_get():
@@ -0,0 +1,377 @@
+#!/usr/bin/env python3
+"""Cold-history archival into per-year SQLite files.
+
+``sale``, ``sale_item``, ``debt_payment`` and ``agent_task`` only grow. This
+moves rows of closed years out of the hot database into
+``instance/archive/pos_archive_<year>.db`` so index scans, ``VACUUM`` and
+backups of ``pos.db`` only pay for recent history.
+
+Reading: report views call ``history_model(session, Sale, db_path, start,
+end)``. Inside a ``read_only_db()`` scope it ATTACHes the archive files the
+date range needs to the read-only connection (``mode=ro``) and returns an
+ORM alias over ``hot UNION ALL archive_<year>...``; otherwise it returns the
+model unchanged. A call without a range reads no archive. Archived rows whose id is still present in the hot table are
+skipped, so a run interrupted between copy and delete never double counts.
+
+Archiving (``python archive_history.py [--keep-years N] [--dry-run] [--vacuum]``)
+runs under read-only maintenance mode and, per year:
+  1. selects rows that are safe to move -- sales not referenced by a
+     return/exchange, delivery or debt, payments of settled debts, finished
+     agent tasks -- never the row holding a table's highest id, so SQLite
+     cannot hand that id out again to a new hot row;
+  2. copies them into the year's archive file and commits;
+  3. verifies row counts and money-column sums against the hot rows;
+  4. deletes them from the hot database in one transaction.
+A rerun after an interruption re-copies (INSERT OR REPLACE) and finishes.
+Money columns must already be integer cents (see migrate_money_columns.py).
+"""
+import argparse
+import os
+import re
+import sqlite3
+import sys
+from datetime import datetime
+from pathlib import Path
+from urllib.parse import quote
+
+from sqlalchemy import MetaData, null, select, union_all
+from sqlalchemy.orm import aliased
+
+from db_pools import read_only_scope_active
+from maintenance import read_only_maintenance
+from migrate_money_columns import MONEY_COLUMNS, pending_tables
+
+DB_PATH = Path(__file__).resolve().parent / "instance" / "pos.db"
+ARCHIVE_DIR_NAME = "archive"
+ARCHIVE_FILE_RE = re.compile(r"^pos_archive_(\d{4})\.db$")
+DEFAULT_KEEP_YEARS = 2  # the current and the previous year stay hot
+# SQLite's default SQLITE_MAX_ATTACHED.
+MAX_ATTACHED = 10
+
+# table -> date column deciding its year (sale_item follows its sale)
+ARCHIVED_TABLES = {
+    "sale": "date",
+    "sale_item": None,
+    "debt_payment": "payment_date",
+    "agent_task": "created_at",
+}
+ARCHIVE_INDEXES = {
+    "sale": ["date", "branch_id"],
+    "sale_item": ["sale_id", "product_id"],
+    "debt_payment": ["payment_date", "customer_id"],
+    "agent_task": ["created_at"],
+}
+FINISHED_TASK_STATUSES = ("completed", "failed", "rejected", "expired")
+# (table, column) pairs that keep a sale hot while they reference it.
+SALE_REFERENCES = [
+    ("return_exchange", "original_sale_id"),
+    ("return_exchange", "adjustment_sale_id"),
+    ("delivery", "sale_id"),
+    ("debt", "sale_id"),
+]
+
+_archive_metadata = MetaData()
+
+
+class ArchiveRangeError(ValueError):
+    """A report range needs more archive years than SQLite can attach at once."""
+
+
+def archive_dir(db_path):
+    return os.path.join(os.path.dirname(os.path.abspath(str(db_path))), ARCHIVE_DIR_NAME)
+
+
+def archive_path(db_path, year):
+    return os.path.join(archive_dir(db_path), f"pos_archive_{int(year)}.db")
+
+
+def schema_name(year):
+    return f"archive_{int(year)}"
+
+
+def archive_years(db_path):
+    """Years that have an archive file next to ``db_path``, oldest first."""
+    try:
+        names = os.listdir(archive_dir(db_path))
+    except FileNotFoundError:
+        return []
+    return sorted(int(m.group(1)) for m in map(ARCHIVE_FILE_RE.match, names) if m)
+
+
+def years_overlapping(years, start=None, end=None):
+    return [y for y in years
+            if (start is None or y >= start.year) and (end is None or y <= end.year)]
+
+
+# ---------------------------------------------------------------- reading
+
+def attach_archives(connection, db_path, years):
+    """ATTACH the archive files for ``years`` read-only to ``connection``.
+
+    Attachments live as long as the pooled DBAPI connection, so the column
+    lists per archive are cached on it. Returns {schema: {table: columns}}.
+    """
+    schemas = [schema_name(y) for y in years]
+    if len(schemas) > MAX_ATTACHED:
+        raise ArchiveRangeError(
+            f"The date range spans {len(schemas)} archived years; narrow it to {MAX_ATTACHED} or fewer.")
+    attached = connection.info.setdefault("archive_attached", {})
+    live = {row[1] for row in connection.exec_driver_sql("PRAGMA database_list")}
+    for schema in list(attached):
+        if schema not in live:
+            del attached[schema]
+
+    spare = [s for s in attached if s not in schemas]
+    while spare and len(set(attached) | set(schemas)) > MAX_ATTACHED:
+        schema = spare.pop()
+        connection.exec_driver_sql(f'DETACH DATABASE "{schema}"')
+        del attached[schema]
+
+    for year, schema in zip(years, schemas):
+        if schema in attached:
+            continue
+        uri = f"file:{quote(archive_path(db_path, year))}?mode=ro"
+        connection.exec_driver_sql(f'ATTACH DATABASE ? AS "{schema}"', (uri,))
+        attached[schema] = {
+            table: {row[1] for row in connection.exec_driver_sql(f'PRAGMA "{schema}".table_info("{table}")')}
+            for table in ARCHIVED_TABLES
+        }
+    return {schema: attached[schema] for schema in schemas}
+
+
+def _archive_table(table, schema):
+    key = f"{schema}.{table.name}"
+    if key not in _archive_metadata.tables:
+        table.to_metadata(_archive_metadata, schema=schema)
+    return _archive_metadata.tables[key]
+
+
+def history_model(session, model, db_path, start=None, end=None):
+    """``model``, or an ORM alias over its hot rows plus the archived years in range.
+
+    Only takes effect inside a ``read_only_db()`` scope on SQLite, where the
+    read-only connection can ATTACH the archive files. Without a range only
+    the current year is looked up, so no archive is attached: pass ``start``
+    to read closed years.
+    """
+    table = model.__table__
+    if not db_path or table.name not in ARCHIVED_TABLES or not read_only_scope_active():
+        return model
+    archive_start = start
+    if start is None and end is None:
+        archive_start = datetime(datetime.now().year, 1, 1)
+    years = years_overlapping(archive_years(db_path), archive_start, end)
+    if not years:
+        return model
+
+    columns_by_schema = attach_archives(session.connection(), db_path, years)
+    date_column = ARCHIVED_TABLES[table.name]
+
+    def in_range(query, source):
+        if date_column and start is not None:
+            query = query.where(source.c[date_column] >= start)
+        if date_column and end is not None:
+            query = query.where(source.c[date_column] <= end)
+        return query
+
+    parts = [in_range(select(table), table)]
+    for schema, present in columns_by_schema.items():
+        present = present.get(table.name)
+        if not present:
+            continue
+        archived = _archive_table(table, schema)
+        columns = [archived.c[c.name] if c.name in present else null().label(c.name) for c in table.columns]
+        part = select(*columns).where(archived.c.id.not_in(select(table.c.id)))
+        parts.append(in_range(part, archived))
+    return aliased(model, union_all(*parts).subquery(f"{table.name}_history"))
+
+
+# ---------------------------------------------------------------- archiving
+
+def _table_sql(conn, schema, table):
+    row = conn.execute(f'SELECT sql FROM "{schema}".sqlite_master WHERE type = ? AND name = ?',
+                       ("table", table)).fetchone()
+    return row[0] if row else None
+
+
+def _columns(conn, schema, table):
+    return [(row[1], row[2]) for row in conn.execute(f'PRAGMA "{schema}".table_info("{table}")')]
+
+
+def prepare_archive(conn):
+    """Create missing archive tables/columns in the ATTACHed ``arch`` schema."""
+    for table, indexed in ARCHIVE_INDEXES.items():
+        hot_sql = _table_sql(conn, "main", table)
+        if not hot_sql:
+            continue
+        if not _table_sql(conn, "arch", table):
+            create = re.sub(r'(?is)^\s*CREATE\s+TABLE\s+"?%s"?' % re.escape(table),
+                            f'CREATE TABLE arch."{table}"', hot_sql, count=1)
+            conn.execute(create)
+            for column in indexed:
+                conn.execute(f'CREATE INDEX IF NOT EXISTS arch."ix_{table}_{column}" ON "{table}" ("{column}")')
+        archived = {name for name, _ in _columns(conn, "arch", table)}
+        for name, declared in _columns(conn, "main", table):
+            if name not in archived:
+                conn.execute(f'ALTER TABLE arch."{table}" ADD COLUMN "{name}" {declared}')
+
+
+def _existing(conn, table):
+    return _table_sql(conn, "main", table) is not None
+
+
+def select_rows_to_archive(conn, year):
+    """Fill temp.archive_ids_<table> with the ids that can move for ``year``."""
+    lo, hi = f"{year:04d}-01-01", f"{year + 1:04d}-01-01"
+    for table in ARCHIVED_TABLES:
+        conn.execute(f'DROP TABLE IF EXISTS temp."archive_ids_{table}"')
+        conn.execute(f'CREATE TEMP TABLE "archive_ids_{table}" (id INTEGER PRIMARY KEY)')
+
+    if _existing(conn, "sale"):
+        referenced = "".join(
+            f' AND id NOT IN (SELECT "{column}" FROM main."{ref}" WHERE "{column}" IS NOT NULL)'
+            for ref, column in SALE_REFERENCES if _existing(conn, ref))
+        if _existing(conn, "sale_item"):
+            referenced += (' AND id NOT IN (SELECT sale_id FROM main.sale_item WHERE sale_id IS NOT NULL'
+                           ' AND id = (SELECT MAX(id) FROM main.sale_item))')
+        conn.execute(
+            'INSERT INTO temp.archive_ids_sale SELECT id FROM main.sale '
+            'WHERE date >= ? AND date < ? AND id < (SELECT MAX(id) FROM main.sale)' + referenced,
+            (lo, hi))
+        if _existing(conn, "sale_item"):
+            conn.execute('INSERT INTO temp.archive_ids_sale_item SELECT id FROM main.sale_item '
+                         'WHERE sale_id IN (SELECT id FROM temp.archive_ids_sale)')
+
+    if _existing(conn, "debt_payment") and _existing(conn, "debt"):
+        conn.execute(
+            'INSERT INTO temp.archive_ids_debt_payment SELECT id FROM main.debt_payment '
+            'WHERE payment_date >= ? AND payment_date < ? AND id < (SELECT MAX(id) FROM main.debt_payment) '
+            'AND debt_id IN (SELECT id FROM main.debt WHERE balance <= 0)', (lo, hi))
+
+    if _existing(conn, "agent_task"):
+        placeholders = ", ".join("?" for _ in FINISHED_TASK_STATUSES)
+        conn.execute(
+            'INSERT INTO temp.archive_ids_agent_task SELECT id FROM main.agent_task '
+            'WHERE created_at >= ? AND created_at < ? AND id < (SELECT MAX(id) FROM main.agent_task) '
+            f'AND status IN ({placeholders})', (lo, hi, *FINISHED_TASK_STATUSES))
+
+    return {table: conn.execute(f'SELECT COUNT(*) FROM temp."archive_ids_{table}"').fetchone()[0]
+            for table in ARCHIVED_TABLES}
+
+
+def _totals(conn, schema, table):
+    money = MONEY_COLUMNS.get(table, [])
+    sums = "".join(f', COALESCE(SUM("{c}"), 0)' for c in money)
+    return tuple(conn.execute(
+        f'SELECT COUNT(*){sums} FROM "{schema}"."{table}" WHERE id IN (SELECT id FROM temp."archive_ids_{table}")'
+    ).fetchone())
+
+
+def archive_year(conn, db_path, year, report, dry_run=False):
+    """Move the archivable rows of ``year`` from ``conn`` (hot) to its archive file."""
+    counts = select_rows_to_archive(conn, year)
+    if not any(counts.values()):
+        report.append(f"[SKIP] {year}: nothing to archive")
+        return counts
+    summary = ", ".join(f"{table}={n}" for table, n in counts.items())
+    if dry_run:
+        report.append(f"[DRY] {year}: would archive {summary}")
+        return counts
+
+    os.makedirs(archive_dir(db_path), exist_ok=True)
+    conn.execute("ATTACH DATABASE ? AS arch", (archive_path(db_path, year),))
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            prepare_archive(conn)
+            for table, n in counts.items():
+                if not n:
+                    continue
+                columns = ", ".join(f'"{name}"' for name, _ in _columns(conn, "main", table))
+                conn.execute(
+                    f'INSERT OR REPLACE INTO arch."{table}" ({columns}) SELECT {columns} FROM main."{table}" '
+                    f'WHERE id IN (SELECT id FROM temp."archive_ids_{table}")')
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        for table, n in counts.items():
+            if n and _totals(conn, "main", table) != _totals(conn, "arch", table):
+                raise ValueError(f"{year} {table}: archived rows do not match the hot rows")
+
+        # Archive and hot database are separate WAL/rollback files, so the copy
+        # above is committed and verified before anything is deleted here.
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for table in ("sale_item", "sale", "debt_payment", "agent_task"):
+                if counts.get(table):
+                    conn.execute(f'DELETE FROM main."{table}" WHERE id IN (SELECT id FROM temp."archive_ids_{table}")')
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+    finally:
+        conn.execute("DETACH DATABASE arch")
+    report.append(f"[OK] {year}: archived {summary} -> {archive_path(db_path, year)}")
+    return counts
+
+
+def closed_years(conn, keep_years, today=None):
+    """Years with archivable history older than the ``keep_years`` most recent ones."""
+    cutoff = (today or datetime.now()).year - max(1, keep_years) + 1
+    years = set()
+    for table, column in ARCHIVED_TABLES.items():
+        if column and _existing(conn, table):
+            row = conn.execute(f'SELECT MIN("{column}") FROM main."{table}"').fetchone()
+            if row[0]:
+                years.update(range(int(str(row[0])[:4]), cutoff))
+    return sorted(years)
+
+
+def run_archive(db_path=None, keep_years=DEFAULT_KEEP_YEARS, dry_run=False, vacuum=False, today=None):
+    db_path = Path(db_path or DB_PATH)
+    if not db_path.exists():
+        print(f"Database not found: {db_path}")
+        return 1
+
+    report = []
+    with read_only_maintenance(str(db_path), "history archival"):
+        conn = sqlite3.connect(str(db_path), isolation_level=None)
+        conn.execute("PRAGMA busy_timeout=5000")
+        try:
+            pending = pending_tables(conn)
+            if pending:
+                print(f"Money columns not yet converted ({', '.join(pending)}); run migrate_money_columns.py first.")
+                return 1
+            for year in closed_years(conn, keep_years, today=today):
+                try:
+                    archive_year(conn, db_path, year, report, dry_run=dry_run)
+                except Exception as exc:  # noqa: BLE001
+                    report.append(f"[FAIL] {year}: {exc}")
+                    print("\n".join(report))
+                    return 2
+            if vacuum and not dry_run:
+                conn.execute("VACUUM")
+                report.append("[OK] hot database vacuumed")
+        finally:
+            conn.close()
+
+    print("\n===== ARCHIVE REPORT =====")
+    print("\n".join(report) or "nothing to archive")
+    print("==========================")
+    return 0
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--keep-years", type=int, default=DEFAULT_KEEP_YEARS,
+                    help="most recent calendar years kept in the hot database")
+    ap.add_argument("--dry-run", action="store_true")
+    ap.add_argument("--vacuum", action="store_true", help="VACUUM the hot database afterwards")
+    args = ap.parse_args()
+    sys.exit(run_archive(keep_years=args.keep_years, dry_run=args.dry_run, vacuum=args.vacuum))
+
+
+if __name__ == "__main__":
+    main()
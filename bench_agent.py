@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+"""Offline benchmark of Loli's agent hot path.
+
+Runs a scripted corpus of chat commands against a freshly seeded SQLite
+database. A local stand-in LLM (llm_standin.py) replays the recorded model
+replies of each command: the plan, the tool calls and the final answer.
+Per command it reports:
+
+* wall time of ``process_command`` (median over ``--rounds``);
+* the answer path (fast_path, llm, plan, ...);
+* LLM calls and estimated prompt tokens sent (about 4 characters per token);
+* tool calls executed;
+* SQL statements run and time spent in the database.
+
+No network access or API key is used, so the numbers compare between
+commits:
+
+    python bench_agent.py --rounds 5 --output before.json
+    ... change the agent ...
+    python bench_agent.py --rounds 5 --compare before.json
+
+Tool-result and plan caches are cleared before every command, so each
+command measures the cold path. ``--warm`` keeps them between rounds.
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+from llm_standin import StandInLLM  # noqa: E402
+
+# Each entry: the command and the model replies recorded for it. "plan" answers
+# the planner call, "tool_calls" the first tool-offering call, "answer" the rest.
+CORPUS = (
+    {"command": "any low stock items?"},
+    {"command": "show low stock items"},
+    {"command": "how much stock of Bench Cola 3?"},
+    {"command": "list pending purchase orders"},
+    {"command": "how are sales doing this week, and why?",
+     "tool_calls": [{"name": "get_sales_summary", "arguments": {"days": 7}}],
+     "answer": "Sales are steady this week."},
+    {"command": "which customers owe us money?",
+     "tool_calls": [{"name": "get_debt_summary", "arguments": {"status": "pending"}}],
+     "answer": "Three customers have open balances."},
+    {"command": "what are our best sellers this month and are they in stock?",
+     "tool_calls": [{"name": "get_sales_trends", "arguments": {"days": 30, "top_n": 5}},
+                    {"name": "get_inventory_status", "arguments": {}}],
+     "answer": "The top sellers are all in stock."},
+    {"command": "compare this month's sales with inventory value",
+     "plan": {"description": "Compare sales with inventory", "steps": [
+         {"step": "sales", "tool": "get_sales_summary", "args": {"days": 30}, "reason": "monthly sales"},
+         {"step": "inventory", "tool": "get_inventory_status", "args": {}, "reason": "stock value"}]},
+     "answer": "Sales this month exceed the inventory value."},
+    {"command": "restock low stock items from supplier 1",
+     "plan": {"description": "Order low stock items from supplier 1", "steps": [
+         {"step": "find low stock", "tool": "get_low_stock_items", "args": {}, "reason": "items to order"},
+         {"step": "order", "tool": "create_purchase_order",
+          "args": {"supplier_id": 1, "items": [{"product_id": {"$from": "step1.items.0.product_id"},
+                                                "quantity": 20}]},
+          "reason": "supplier 1 restocks them"}]},
+     "answer": "A purchase order is ready for your approval."},
+    {"command": "hello, who are you?",
+     "answer": "I am Loli and I am the AI assistant created by Min Thuta Saw Naing."},
+)
+
+
+class SqlMeter:
+    """Counts statements and time across every engine (main and read-only pools)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._started = threading.local()
+        self.statements = 0
+        self.seconds = 0.0
+
+    def install(self):
+        from sqlalchemy import event
+        from sqlalchemy.engine import Engine
+        event.listen(Engine, "before_cursor_execute", self._before)
+        event.listen(Engine, "after_cursor_execute", self._after)
+
+    def _before(self, *args):
+        self._started.at = time.perf_counter()
+
+    def _after(self, *args):
+        elapsed = time.perf_counter() - getattr(self._started, "at", time.perf_counter())
+        with self._lock:
+            self.statements += 1
+            self.seconds += elapsed
+
+    def snapshot(self):
+        with self._lock:
+            return self.statements, self.seconds
+
+
+def seed_database(app, db, models, products=80, sales=300, seed=7):
+    """Deterministic branch data: products (some low on stock), suppliers, orders, sales, debts."""
+    rng = random.Random(seed)
+    with app.app_context():
+        branch = models["Branch"].query.filter_by(is_active=True).first()
+        user = models["User"].query.filter_by(username="admin").first()
+        items = []
+        for index in range(1, products + 1):
+            items.append(models["Product"](
+                # Names share no word with the corpus ("item" would match "items").
+                name=f"Bench Cola {index}" if index <= 10 else f"Bench Snack {index}",
+                barcode=f"BENCH{index:05d}", price=500 + 50 * (index % 20), cost=300 + 30 * (index % 20),
+                stock=rng.choice((0, 3, 8)) if index % 7 == 0 else rng.randint(15, 200),
+                category=("Drinks", "Snacks", "Household", "Dairy")[index % 4], branch_id=branch.id))
+        db.session.add_all(items)
+        suppliers = [models["Supplier"](name=f"Bench Supplier {index}", lead_time_days=3, branch_id=branch.id)
+                     for index in range(1, 7)]
+        db.session.add_all(suppliers)
+        db.session.flush()
+        for index in range(10):
+            order = models["PurchaseOrder"](
+                po_number=f"BENCH-PO-{index:04d}", supplier_id=suppliers[index % len(suppliers)].id,
+                status=("pending", "draft", "approved")[index % 3], total_amount=10000,
+                created_by=user.id, branch_id=branch.id)
+            db.session.add(order)
+            db.session.flush()
+            db.session.add(models["PurchaseOrderItem"](purchase_order_id=order.id,
+                                                       product_id=items[index].id, ordered_qty=20, unit_cost=300))
+        now = datetime.utcnow()
+        for index in range(sales):
+            lines = rng.sample(items, rng.randint(1, 4))
+            quantities = [rng.randint(1, 3) for _ in lines]
+            total = sum(int(item.price) * quantity for item, quantity in zip(lines, quantities))
+            sale = models["Sale"](transaction_id=str(uuid.UUID(int=rng.getrandbits(128))),
+                                  date=now - timedelta(minutes=rng.randint(0, 30 * 24 * 60)),
+                                  total=total, tax=0, cash_received=total, payment_method="cash",
+                                  user_id=user.id, branch_id=branch.id)
+            db.session.add(sale)
+            db.session.flush()
+            db.session.add_all(models["SaleItem"](sale_id=sale.id, product_id=item.id, quantity=quantity,
+                                                  price=item.price, tax=0)
+                               for item, quantity in zip(lines, quantities))
+        for index in range(1, 6):
+            customer = models["Customer"](name=f"Bench Customer {index}", phone=f"0900{index:04d}",
+                                          branch_id=branch.id)
+            db.session.add(customer)
+            db.session.flush()
+            db.session.add(models["Debt"](customer_id=customer.id, amount=5000 * index, balance=5000 * index,
+                                          due_date=now + timedelta(days=7 - 3 * index),
+                                          status="pending", created_by=user.id, branch_id=branch.id))
+        db.session.commit()
+        return branch.id, user.id
+
+
+def count_tool_calls(orchestrator, counter):
+    """Wrap this orchestrator's tool functions so every call is counted."""
+    def counted(function):
+        def wrapper(*args, **kwargs):
+            counter[0] += 1
+            return function(*args, **kwargs)
+        return wrapper
+
+    for name in list(orchestrator.agent.tool_functions):
+        setattr(orchestrator.ai_tools, name, counted(getattr(orchestrator.ai_tools, name)))
+        orchestrator.agent.tool_functions[name] = getattr(orchestrator.ai_tools, name)
+
+
+def run(args, workdir):
+    standin = StandInLLM(delay=args.llm_delay, tool_name=None).start()
+    os.environ.update(
+        DATABASE_URL=f"sqlite:///{os.path.join(workdir, 'pos.db')}",
+        SHARED_STATE_PATH=os.path.join(workdir, "shared_state.db"),
+        AI_BASE_URL=standin.base_url, AI_MODEL="bench-model", APIFREE_API_KEY="",
+        AI_MEMORY_ENABLED="false",
+    )
+    import app as pos
+    from agent_orchestrator import AgentOrchestrator
+    from plan_cache import plan_templates
+    from tool_cache import result_cache
+
+    models = {name: getattr(pos, name) for name in (
+        "Branch", "User", "Product", "Supplier", "PurchaseOrder", "PurchaseOrderItem",
+        "Sale", "SaleItem", "Customer", "Debt")}
+    branch_id, user_id = seed_database(pos.app, pos.db, models)
+    meter = SqlMeter()
+    meter.install()
+    corpus = CORPUS if args.corpus is None else json.load(open(args.corpus))
+
+    samples = {entry["command"]: [] for entry in corpus}
+    try:
+        with pos.app.app_context():
+            for round_index in range(args.warmup + args.rounds):
+                for entry in corpus:
+                    if not args.warm:
+                        result_cache.invalidate()
+                        plan_templates.clear()
+                    standin.script = entry
+                    orchestrator = AgentOrchestrator(pos.db, pos.AI_MODELS, pos.get_setting, pos.app)
+                    orchestrator.set_request_context({"branch_id": branch_id, "user_id": user_id,
+                                                      "role": "manager"})
+                    tools = [0]
+                    count_tool_calls(orchestrator, tools)
+                    requests_before = len(standin.requests)
+                    statements, db_seconds = meter.snapshot()
+                    started = time.perf_counter()
+                    result = orchestrator.process_command(entry["command"], user_id=user_id)
+                    wall_ms = (time.perf_counter() - started) * 1000
+                    sent = standin.requests[requests_before:]
+                    statements_after, db_seconds_after = meter.snapshot()
+                    if round_index < args.warmup:
+                        continue
+                    errors = [f"{r['function_name']}: {r['error']}" for r in result.get("tool_results") or ()
+                              if isinstance(r, dict) and r.get("error")]
+                    if not result.get("success"):
+                        errors.append(str(result.get("error") or result.get("message")))
+                    samples[entry["command"]].append({
+                        "wall_ms": wall_ms,
+                        "answer_path": result.get("answer_path"),
+                        "success": not errors,
+                        "errors": errors,
+                        "llm_calls": len(sent),
+                        "prompt_tokens": sum(StandInLLM.usage(r["body"])["prompt_tokens"] for r in sent),
+                        "tools": tools[0],
+                        "sql": statements_after - statements,
+                        "db_ms": (db_seconds_after - db_seconds) * 1000,
+                    })
+    finally:
+        standin.stop()
+    return summarize(samples)
+
+
+def summarize(samples):
+    rows = []
+    for command, runs in samples.items():
+        rows.append({
+            "command": command,
+            "answer_path": runs[-1]["answer_path"],
+            "success": all(run["success"] for run in runs),
+            "errors": sorted({error for run in runs for error in run["errors"]}),
+            "wall_ms": round(statistics.median(run["wall_ms"] for run in runs), 2),
+            "llm_calls": runs[-1]["llm_calls"],
+            "prompt_tokens": runs[-1]["prompt_tokens"],
+            "tools": runs[-1]["tools"],
+            "sql": runs[-1]["sql"],
+            "db_ms": round(statistics.median(run["db_ms"] for run in runs), 2),
+        })
+    return rows
+
+
+COLUMNS = (("wall_ms", "wall ms", ".1f"), ("llm_calls", "llm", "d"), ("prompt_tokens", "tokens", "d"),
+           ("tools", "tools", "d"), ("sql", "sql", "d"), ("db_ms", "db ms", ".1f"))
+
+
+def print_report(rows, baseline=None):
+    baseline = {row["command"]: row for row in baseline or ()}
+    print(f"{'command':<52} {'path':<10}" + "".join(f" {title:>{14 if baseline else 8}}" for _, title, _ in COLUMNS))
+    for row in rows:
+        cells = []
+        before = baseline.get(row["command"])
+        for key, _, spec in COLUMNS:
+            cell = format(row[key], spec)
+            if before is not None:
+                delta = row[key] - before[key]
+                cell += f" ({delta:+{spec}})"
+            cells.append(f" {cell:>{14 if baseline else 8}}")
+        path = row["answer_path"] or "-"
+        if not row["success"]:
+            path += "!"
+        print(f"{row['command'][:52]:<52} {path:<10}" + "".join(cells))
+    totals = {key: sum(row[key] for row in rows) for key, _, _ in COLUMNS}
+    print(f"{'total':<52} {'':<10}" + "".join(f" {format(totals[key], spec):>{14 if baseline else 8}}"
+                                           for key, _, spec in COLUMNS))
+    for row in rows:
+        for error in row["errors"]:
+            print(f"error in {row['command']!r}: {error}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--warmup", type=int, default=1, help="unmeasured rounds first (imports, first queries)")
+    parser.add_argument("--llm-delay", type=float, default=0.0, help="simulated model seconds per call")
+    parser.add_argument("--warm", action="store_true", help="keep tool-result and plan caches between rounds")
+    parser.add_argument("--corpus", help="JSON file with entries like CORPUS, instead of the built-in one")
+    parser.add_argument("--output", help="write the results as JSON")
+    parser.add_argument("--compare", help="JSON results of an earlier run; show the change per column")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="pos_bench_agent_")
+    try:
+        rows = run(args, workdir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    baseline = json.load(open(args.compare)) if args.compare else None
+    print_report(rows, baseline)
+    if args.output:
+        with open(args.output, "w") as handle:
+            json.dump(rows, handle, indent=2)
+    # A failing entry times an error path, not the command; do not let it pass as a result.
+    return 1 if any(not row["success"] for row in rows) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
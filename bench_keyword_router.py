@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""Micro-benchmark of the AI router's keyword checks on real chat commands.
+
+Compares, per command, the work one turn does:
+
+* ``per-keyword``: the earlier checks, one substring test or ``re.search``
+  per keyword, for the category scan (made twice per turn), the
+  write-intent scan and the read-intent scan;
+* ``matcher``: one ``_COMMAND_MATCHER`` pass (``analyze_command`` uncached);
+* ``cached``: the later lookups of the same turn, served from the cache.
+
+Both implementations must agree on every command before timing starts.
+
+Usage:
+    python bench_keyword_router.py --rounds 2000
+"""
+import argparse
+import os
+import re
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+from agent_orchestrator import (  # noqa: E402
+    TOOL_CATEGORIES, _READ_INTENTS, _WRITE_INTENT_KEYWORDS, analyze_command)
+
+# Commands managers and cashiers send, taken from the test suite, the README and the chat widget hints.
+CORPUS = (
+    "show low stock items", "what is low stock today?", "how much stock of Cola do we have",
+    "inventory", "which branch am I in?", "pending purchase orders", "show me the suppliers",
+    "sales trend for the last 30 days", "best selling products this month", "total sales today",
+    "who owes us money?", "show overdue debts", "which supplier do we owe the most",
+    "show me suppliers with overdue debts", "compare cola stock with fanta stock",
+    "restock low stock items from supplier 3", "create a purchase order for 20 Sprite",
+    "please register a customer for me", "Add product Sprite", "cancel purchase order PO-0012",
+    "approve the draft order", "transfer 10 boxes from the warehouse", "what's in the warehouse?",
+    "recent transfers", "any promotions running?", "list product categories",
+    "deliveries waiting for dispatch", "how many returns this week?", "suggest reorder quantities",
+    "hello", "who created you?", "what can you do?", "adjust stock for rice to 40",
+    "mark as paid the invoice for U Bala", "show customers with a credit balance",
+    "suppose we order more rice, what would it cost?", "update price of coffee to 2500",
+    "what did we sell yesterday and what should I reorder?",
+)
+
+
+def _contains(text, keywords, whole_words=False):
+    for keyword in keywords:
+        if whole_words or len(keyword) <= 2:
+            if re.search(r"\b" + re.escape(keyword) + r"\b", text):
+                return True
+        elif keyword in text:
+            return True
+    return False
+
+
+def per_keyword(text):
+    categories = {name for name, config in TOOL_CATEGORIES.items() if _contains(text, config["keywords"])}
+    categories = {name for name, config in TOOL_CATEGORIES.items() if _contains(text, config["keywords"])}
+    write_intent = _contains(text, _WRITE_INTENT_KEYWORDS, whole_words=True)
+    read_intents = {index for index, (_, _, keywords) in enumerate(_READ_INTENTS)
+                    if keywords and _contains(text, keywords)}
+    return frozenset(categories), write_intent, read_intents
+
+
+def matcher(text):
+    result = analyze_command.__wrapped__(text)
+    return result.categories, result.write_intent, result.read_intents
+
+
+def timed(function, commands, rounds):
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for command in commands:
+            function(command)
+    return (time.perf_counter() - started) / (rounds * len(commands)) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=2000)
+    args = parser.parse_args()
+
+    commands = [command.lower() for command in CORPUS]
+    for command in commands:
+        assert per_keyword(command) == matcher(command), command
+
+    def cached(text):
+        keywords = analyze_command(text)
+        return keywords.categories, keywords.write_intent, keywords.read_intents
+
+    print(f"commands: {len(commands)}  rounds: {args.rounds}")
+    legacy = timed(per_keyword, commands, args.rounds)
+    single = timed(matcher, commands, args.rounds)
+    print(f"per-keyword checks:   {legacy:7.2f} us/command")
+    print(f"one matcher pass:     {single:7.2f} us/command  ({legacy / single:.1f}x)")
+    print(f"cached lookup:        {timed(cached, commands, args.rounds):7.2f} us/command")
+
+
+if __name__ == "__main__":
+    main()
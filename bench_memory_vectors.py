@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""Recall latency of the local memory vector index at growing branch sizes.
+
+For each size in ``--sizes``, fills one branch of a ``VectorIndex`` with
+random unit vectors (``--dim`` wide, like ``nomic-embed-text``) and reports:
+
+* build time: one append per memory, the way ``remember`` adds them,
+* file size of the memory-mapped matrix,
+* top-k cosine search time (p50/p95) with the owner filter applied, with the
+  matrix already in the page cache.
+
+Usage:
+    python bench_memory_vectors.py --sizes 1000 10000 100000 --dim 768
+
+No embedding model is called: query and memory vectors are random, so only
+the index cost is measured. A local model adds its own embedding time, once
+for the query of each turn and once per saved memory.
+"""
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+import numpy  # noqa: E402
+
+from ai_memory_service import VectorIndex  # noqa: E402
+
+
+def unit_rows(rng, rows, dim):
+    vectors = rng.standard_normal((rows, dim)).astype(numpy.float32)
+    return vectors / numpy.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--users", type=int, default=20, help="private owners; a quarter of memories are shared")
+    args = parser.parse_args()
+
+    rng = numpy.random.default_rng(7)
+    directory = tempfile.mkdtemp(prefix="pos_bench_vectors_")
+    try:
+        print(f"{'memories':>9} {'build s':>8} {'append us':>10} {'file MiB':>9} {'p50 ms':>8} {'p95 ms':>8}")
+        for size in args.sizes:
+            index = VectorIndex(directory, embedder=None, model=f"bench-{size}")
+            vectors = unit_rows(rng, size, args.dim)
+            owners = rng.integers(0, args.users + 1, size)
+            owners[rng.random(size) < 0.25] = 0
+            started = time.perf_counter()
+            for row in range(size):
+                index.append(1, [(f"sqlite-{row:032x}", int(owners[row]), vectors[row])])
+            build_s = time.perf_counter() - started
+
+            queries = unit_rows(rng, args.queries, args.dim)
+            index.search(1, queries[0], owners=[1, 0], k=args.top_k)  # map the files, warm the page cache
+            timings = []
+            for query in queries:
+                started = time.perf_counter()
+                index.search(1, query, owners=[1, 0], k=args.top_k)
+                timings.append((time.perf_counter() - started) * 1000)
+            timings.sort()
+            file_mib = os.path.getsize(index._path(1, args.dim) + ".f32") / 2 ** 20
+            print(f"{size:>9} {build_s:>8.2f} {build_s / size * 1e6:>10.1f} {file_mib:>9.1f} "
+                  f"{statistics.median(timings):>8.2f} {timings[int(len(timings) * 0.95) - 1]:>8.2f}")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""Benchmark report aggregation on REAL amounts vs INTEGER cents.
+
+Builds two in-memory ``sale`` tables with the same data -- one storing
+``total`` as REAL (the old layout), one as INTEGER cents (``money.Money``) --
+and times a 7-day-style "total per day" report both ways:
+
+  before: fetch every row, ``safe_to_decimal`` each total, add in Python
+  after:  ``SUM(total) ... GROUP BY date(date)`` on integer cents
+
+Usage: python bench_money_aggregation.py [--rows 200000] [--repeat 5]
+"""
+import argparse
+import random
+import sqlite3
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from money import from_cents, safe_to_decimal
+
+
+def build(rows, seed=7):
+    rng = random.Random(seed)
+    start = datetime(2025, 1, 1)
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE sale_real (id INTEGER PRIMARY KEY, date DATETIME, total REAL NOT NULL)")
+    conn.execute("CREATE TABLE sale_cents (id INTEGER PRIMARY KEY, date DATETIME, total INTEGER NOT NULL)")
+    data = []
+    for i in range(rows):
+        cents = rng.randint(50, 500_000)
+        stamp = (start + timedelta(seconds=rng.randint(0, 365 * 86400))).isoformat(" ")
+        data.append((i + 1, stamp, cents))
+    conn.executemany("INSERT INTO sale_real VALUES (?, ?, ?)", [(i, d, c / 100) for i, d, c in data])
+    conn.executemany("INSERT INTO sale_cents VALUES (?, ?, ?)", data)
+    conn.commit()
+    return conn
+
+
+def report_real(conn):
+    by_day = {}
+    for stamp, total in conn.execute("SELECT date, total FROM sale_real"):
+        day = stamp[:10]
+        by_day[day] = by_day.get(day, Decimal("0")) + safe_to_decimal(total)
+    return by_day
+
+
+def report_cents(conn):
+    rows = conn.execute("SELECT date(date), SUM(total) FROM sale_cents GROUP BY date(date)")
+    return {day: from_cents(cents) for day, cents in rows}
+
+
+def best_of(fn, conn, repeat):
+    timings = []
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn(conn)
+        timings.append(time.perf_counter() - started)
+    return min(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    conn = build(args.rows)
+    before, real_totals = best_of(report_real, conn, args.repeat)
+    after, cent_totals = best_of(report_cents, conn, args.repeat)
+    if real_totals != cent_totals:
+        raise SystemExit("Totals differ between layouts")
+
+    print(f"rows:                   {args.rows}")
+    print(f"REAL + per-row Decimal: {before * 1000:9.1f} ms")
+    print(f"INTEGER cents SUM:      {after * 1000:9.1f} ms")
+    print(f"speedup:                {before / after:9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
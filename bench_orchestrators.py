@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""Memory and construction cost of per-user AI orchestrators.
+
+Builds ``--sessions`` orchestrators the way ``get_ai_orchestrator`` does (one
+per conversation owner, up to AI_MAX_ACTIVE_SESSIONS) and reports:
+
+* construction time per orchestrator (p50/max),
+* first-turn preparation time: tool filtering plus the planning catalog,
+* memory: RSS growth and Python heap growth (tracemalloc) per orchestrator.
+
+Usage:
+    python bench_orchestrators.py --sessions 32
+
+No LLM call is made; the API key is left unset.
+"""
+import argparse
+import gc
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+
+def rss_bytes():
+    """Resident set size of this process (Linux /proc; 0 where unavailable)."""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=32)
+    args = parser.parse_args()
+    os.environ["AI_MAX_ACTIVE_SESSIONS"] = str(max(args.sessions, 1))
+
+    import agent_orchestrator
+    from app import app, db, AI_MODELS, get_setting
+
+    commands = ("show low stock items", "which suppliers deliver rice?", "hello")
+    with app.app_context():
+        # Warm imports and lazily built module state before measuring.
+        agent_orchestrator.AgentOrchestrator(db, AI_MODELS, get_setting, app)
+        gc.collect()
+        rss_before = rss_bytes()
+        tracemalloc.start()
+        heap_before = tracemalloc.get_traced_memory()[0]
+
+        build_ms, prepare_ms, keep = [], [], []
+        for owner in range(args.sessions):
+            started = time.perf_counter()
+            orchestrator = agent_orchestrator.get_orchestrator(
+                db, AI_MODELS, get_setting, app, conversation_id=f"bench-{owner}")
+            build_ms.append((time.perf_counter() - started) * 1000)
+
+            started = time.perf_counter()
+            orchestrator._filter_tools_for_query(commands[owner % len(commands)])
+            orchestrator._build_planning_catalog(orchestrator._get_tool_registry())
+            prepare_ms.append((time.perf_counter() - started) * 1000)
+            keep.append(orchestrator)
+
+        gc.collect()
+        heap_after = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        rss_after = rss_bytes()
+
+    n = args.sessions
+    print(f"orchestrators:        {n}")
+    print(f"construction ms:      p50 {statistics.median(build_ms):.2f}  max {max(build_ms):.2f}")
+    print(f"first-turn prep ms:   p50 {statistics.median(prepare_ms):.3f}  max {max(prepare_ms):.3f}")
+    print(f"python heap / owner:  {(heap_after - heap_before) / n / 1024:.1f} KiB")
+    print(f"RSS growth / owner:   {(rss_after - rss_before) / n / 1024:.1f} KiB")
+    agent_orchestrator.reset_orchestrator()
+
+
+if __name__ == "__main__":
+    main()
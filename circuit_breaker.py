@@ -0,0 +1,124 @@
+"""Circuit breaker for calls to the LLM provider.
+
+When the provider is down or overloaded, each chat would otherwise wait
+out a 60 s timeout and several backoff retries, holding a server thread for
+minutes. Every user would repeat this. The breaker watches the outcome of the
+last ``window`` calls in this process:
+
+* closed: calls go through. Once at least ``min_calls`` outcomes are known
+  and the failure rate reaches ``failure_rate``, the breaker opens.
+* open: calls are refused at once for ``open_seconds``.
+* half-open: up to ``half_open_probes`` calls go through as probes. A
+  successful probe closes the breaker; a failed one opens it again.
+
+Failures are timeouts, connection errors, 429s and 5xx responses. Any other
+response shows the provider is answering and counts as a success.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, Optional
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    def __init__(self, failure_rate: float = 0.5, min_calls: int = 5, window: int = 20,
+                 open_seconds: float = 30.0, half_open_probes: int = 1,
+                 clock: Callable[[], float] = time.monotonic):
+        self.failure_rate = failure_rate
+        self.min_calls = max(1, min_calls)
+        self.open_seconds = open_seconds
+        self.half_open_probes = max(1, half_open_probes)
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._outcomes = deque(maxlen=max(self.min_calls, window))
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probes = 0
+        self.opened = 0
+        self.rejected = 0
+
+    @classmethod
+    def from_env(cls, env: Dict[str, str]) -> "CircuitBreaker":
+        return cls(
+            failure_rate=float(env.get("AI_BREAKER_FAILURE_RATE", 0.5)),
+            min_calls=int(env.get("AI_BREAKER_MIN_CALLS", 5)),
+            window=int(env.get("AI_BREAKER_WINDOW", 20)),
+            open_seconds=float(env.get("AI_BREAKER_OPEN_SECONDS", 30)),
+            half_open_probes=int(env.get("AI_BREAKER_HALF_OPEN_PROBES", 1)),
+        )
+
+    def _current_state(self) -> str:
+        if self._state == OPEN and self._clock() - self._opened_at >= self.open_seconds:
+            self._state = HALF_OPEN
+            self._probes = 0
+        return self._state
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+
+    def available(self) -> bool:
+        """Whether a call would be let through now, without reserving a probe."""
+        with self._lock:
+            state = self._current_state()
+            return state == CLOSED or (state == HALF_OPEN and self._probes < self.half_open_probes)
+
+    def allow(self) -> bool:
+        """Admit one call; in half-open state this reserves a probe slot."""
+        with self._lock:
+            state = self._current_state()
+            if state == CLOSED:
+                return True
+            if state == HALF_OPEN and self._probes < self.half_open_probes:
+                self._probes += 1
+                return True
+            self.rejected += 1
+            return False
+
+    def _open(self) -> None:
+        self._state = OPEN
+        self._opened_at = self._clock()
+        self._outcomes.clear()
+        self.opened += 1
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._state = CLOSED
+                self._outcomes.clear()
+            self._outcomes.append(True)
+
+    def record_failure(self) -> None:
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._open()
+                return
+            self._outcomes.append(False)
+            failures = self._outcomes.count(False)
+            if len(self._outcomes) >= self.min_calls and failures / len(self._outcomes) >= self.failure_rate:
+                self._open()
+
+    def retry_after(self) -> Optional[float]:
+        with self._lock:
+            if self._current_state() != OPEN:
+                return None
+            return max(0.0, self.open_seconds - (self._clock() - self._opened_at))
+
+    def report(self) -> Dict[str, object]:
+        with self._lock:
+            state = self._current_state()
+            return {
+                "state": state,
+                "recent_calls": len(self._outcomes),
+                "recent_failures": self._outcomes.count(False),
+                "opened": self.opened,
+                "rejected": self.rejected,
+            }
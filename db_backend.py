@@ -0,0 +1,132 @@
+"""Database backend selection and dialect-specific behaviour.
+
+The POS runs on SQLite by default (a single file under ``instance/``). Larger
+multi-branch installs can point ``DATABASE_URL`` at PostgreSQL instead. All
+SQL that only one dialect understands -- PRAGMAs, ``sqlite_master`` lookups,
+legacy SQLite table rebuilds, lock-error detection -- lives behind the
+backend objects here so app.py stays dialect-neutral.
+"""
+
+from __future__ import annotations
+
+import os
+from typing import List, Optional
+
+from sqlalchemy import event, text
+from sqlalchemy.engine import Engine
+
+DEFAULT_DATABASE_URI = "sqlite:///pos.db"
+
+
+def database_uri_from_env(default: str = DEFAULT_DATABASE_URI) -> str:
+    """Return the configured database URI (``DATABASE_URL``), normalised for SQLAlchemy."""
+    uri = (os.environ.get("DATABASE_URL") or "").strip() or default
+    # Heroku-style URLs use the scheme SQLAlchemy 1.4+ no longer accepts.
+    if uri.startswith("postgres://"):
+        uri = "postgresql://" + uri[len("postgres://"):]
+    return uri
+
+
+class DatabaseBackend:
+    """Behaviour shared by every supported database."""
+
+    name = "generic"
+    # Whether the legacy in-place schema upgrades in app.py apply. They were
+    # written for SQLite files that predate the current models; other
+    # databases are always created fresh by ``db.create_all()``.
+    runs_legacy_migrations = False
+    # Whether SELECT ... FOR UPDATE actually locks rows.
+    supports_row_locks = False
+    file_based = False
+    # Whether the memory registry gets an FTS5 index for BM25-ranked recall.
+    supports_full_text_search = False
+
+    def configure_engine(self, engine: Engine, session) -> None:
+        """Apply per-connection settings once at startup."""
+
+    def is_retryable_lock_error(self, exc: Exception) -> bool:
+        return False
+
+    def find_legacy_barcode_unique_index(self, session) -> Optional[str]:
+        return None
+
+
+class SQLiteBackend(DatabaseBackend):
+    name = "sqlite"
+    runs_legacy_migrations = True
+    file_based = True
+    supports_full_text_search = True
+
+    def configure_engine(self, engine: Engine, session) -> None:
+        # Harden SQLite for concurrent POS writes: WAL journaling plus a busy timeout
+        # on every pooled connection so concurrent sales retry instead of failing fast.
+        @event.listens_for(engine, "connect")
+        def _set_sqlite_busy_timeout(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            cursor.execute("PRAGMA busy_timeout=5000")
+            cursor.close()
+
+        session.execute(text("PRAGMA journal_mode=WAL"))
+        session.execute(text("PRAGMA busy_timeout=5000"))
+
+    def is_retryable_lock_error(self, exc: Exception) -> bool:
+        return "database is locked" in str(exc).lower()
+
+    def find_legacy_barcode_unique_index(self, session) -> Optional[str]:
+        """Name of an inline ``UNIQUE (barcode)`` autoindex on product, if any."""
+        product_indexes = [idx[0] for idx in session.execute(text(
+            "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'product'"
+        )).fetchall()]
+
+        for idx_name in product_indexes:
+            idx_cols = [col[2] for col in session.execute(
+                text(f'PRAGMA index_info("{idx_name}")')
+            ).fetchall()]
+            if idx_cols == ["barcode"]:
+                idx_list = session.execute(text('PRAGMA index_list("product")')).fetchall()
+                for row in idx_list:
+                    # row: (seq, name, unique, origin, partial); origin 'u' = UNIQUE constraint
+                    if row[1] == idx_name and row[2] == 1 and row[3] == "u":
+                        return idx_name
+        return None
+
+
+class PostgresBackend(DatabaseBackend):
+    name = "postgresql"
+    supports_row_locks = True
+    _RETRYABLE_SQLSTATES = {"40001", "40P01", "55P03"}  # serialization, deadlock, lock timeout
+
+    def is_retryable_lock_error(self, exc: Exception) -> bool:
+        orig = getattr(exc, "orig", None)
+        code = getattr(orig, "sqlstate", None) or getattr(orig, "pgcode", None)
+        if code in self._RETRYABLE_SQLSTATES:
+            return True
+        message = str(exc).lower()
+        return "deadlock detected" in message or "could not serialize" in message
+
+
+def get_backend(engine: Engine) -> DatabaseBackend:
+    dialect = engine.url.get_backend_name()
+    if dialect == "sqlite":
+        return SQLiteBackend()
+    if dialect == "postgresql":
+        return PostgresBackend()
+    return DatabaseBackend()
+
+
+def lock_rows_for_update(query, backend: DatabaseBackend, ids: List[int]):
+    """Load rows for ``ids`` with row-level locks in primary-key order.
+
+    Ordering by id means two concurrent checkouts for the same products
+    always lock them in the same order and cannot deadlock each other.
+    SQLite has no row locks (the write transaction serialises sales), so
+    nothing is issued there.
+    """
+    if not backend.supports_row_locks or not ids:
+        return []
+    model = query.column_descriptions[0]["entity"]
+    return (query.filter(model.id.in_(sorted(set(ids))))
+            .order_by(model.id)
+            .with_for_update()
+            .populate_existing()
+            .all())
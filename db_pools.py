@@ -0,0 +1,215 @@
+"""Read-only connection pool and per-pool contention metrics.
+
+Checkout, CRUD and every write share the primary engine. Reports, exports,
+dashboard aggregates and the AI read tools can instead run inside
+``read_only_db()``: while that scope is active the Flask-SQLAlchemy session
+routes queries to a second engine opened on the same SQLite file with
+``mode=ro`` and ``PRAGMA query_only``. Long report scans then no longer take
+connections from the checkout pool, and any accidental write fails loudly.
+
+Both pools are instrumented so lock waits and WAL checkpoint pressure can be
+compared per pool (see ``pool_report``).
+"""
+
+from __future__ import annotations
+
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from typing import Any, Dict, Optional
+from urllib.parse import quote
+
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import URL, Engine
+
+_read_only_active = contextvars.ContextVar("read_only_db_active", default=False)
+_read_engine: Optional[Engine] = None
+_pool_stats: Dict[str, "PoolStats"] = {}
+_LOCK_ERROR_MARKERS = ("database is locked", "database table is locked", "busy")
+
+
+class PoolStats:
+    """Thread-safe counters for one engine's pool and statements."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.in_use = 0
+        self.peak_in_use = 0
+        self.statements = 0
+        self.statement_seconds = 0.0
+        self.slowest_statement_seconds = 0.0
+        self.lock_errors = 0
+
+    def on_checkout(self):
+        with self._lock:
+            self.checkouts += 1
+            self.in_use += 1
+            self.peak_in_use = max(self.peak_in_use, self.in_use)
+
+    def on_checkin(self):
+        with self._lock:
+            self.in_use = max(0, self.in_use - 1)
+
+    def on_statement(self, seconds: float):
+        with self._lock:
+            self.statements += 1
+            self.statement_seconds += seconds
+            self.slowest_statement_seconds = max(self.slowest_statement_seconds, seconds)
+
+    def on_error(self, message: str):
+        if any(marker in message.lower() for marker in _LOCK_ERROR_MARKERS):
+            with self._lock:
+                self.lock_errors += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "in_use": self.in_use,
+                "peak_in_use": self.peak_in_use,
+                "statements": self.statements,
+                "statement_ms_total": round(self.statement_seconds * 1000, 2),
+                "slowest_statement_ms": round(self.slowest_statement_seconds * 1000, 2),
+                "lock_errors": self.lock_errors,
+            }
+
+
+def instrument_engine(engine: Engine, name: str) -> PoolStats:
+    """Attach pool/statement listeners to ``engine`` and return its stats."""
+    stats = PoolStats(name)
+    _pool_stats[name] = stats
+
+    @event.listens_for(engine, "checkout")
+    def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+        stats.on_checkout()
+
+    @event.listens_for(engine, "checkin")
+    def _on_checkin(dbapi_connection, connection_record):
+        stats.on_checkin()
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("statement_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_execute(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.get("statement_started")
+        if started:
+            stats.on_statement(time.perf_counter() - started.pop())
+
+    @event.listens_for(engine, "handle_error")
+    def _on_error(exception_context):
+        started = exception_context.connection.info.get("statement_started") if exception_context.connection else None
+        if started:
+            started.pop()
+        stats.on_error(str(exception_context.original_exception))
+
+    return stats
+
+
+def install_read_only_pool(primary: Engine) -> Optional[Engine]:
+    """Create the read-only engine for ``primary`` and instrument both pools.
+
+    Only file-backed SQLite databases get a separate read-only engine; for any
+    other database ``read_only_db()`` transparently keeps using the primary.
+    """
+    global _read_engine
+    dispose_read_only_pool()
+    if "primary" not in _pool_stats:
+        instrument_engine(primary, "primary")
+
+    url = primary.url
+    if url.get_backend_name() != "sqlite" or not url.database or url.database == ":memory:":
+        _read_engine = None
+        return None
+
+    # SQLite parses the filename as a URI, so "?", "#" and "%" in the path are
+    # percent-encoded; URL.create keeps SQLAlchemy from decoding them again.
+    engine = create_engine(URL.create("sqlite", database=f"file:{quote(url.database)}",
+                                      query={"mode": "ro", "uri": "true"}))
+
+    @event.listens_for(engine, "connect")
+    def _set_read_only_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA busy_timeout=5000")
+        cursor.execute("PRAGMA query_only=1")
+        cursor.close()
+
+    instrument_engine(engine, "read_only")
+    _read_engine = engine
+    return engine
+
+
+def dispose_read_only_pool():
+    """Close pooled read-only connections (e.g. after the database file changes)."""
+    if _read_engine is not None:
+        _read_engine.dispose()
+
+
+def get_read_only_engine() -> Optional[Engine]:
+    return _read_engine
+
+
+def read_only_scope_active() -> bool:
+    """True when ORM queries in this context go to the read-only engine."""
+    return _read_engine is not None and _read_only_active.get()
+
+
+@contextmanager
+def read_only_db():
+    """Route ORM queries in this context to the read-only pool."""
+    token = _read_only_active.set(True)
+    try:
+        yield
+    finally:
+        _read_only_active.reset(token)
+
+
+def read_only_route(f):
+    """Decorator form of ``read_only_db`` for report and dashboard views."""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        with read_only_db():
+            return f(*args, **kwargs)
+    decorated_function.read_only_route = True  # admission control classes these as reports
+    return decorated_function
+
+
+class ReadRoutingSession(Session):
+    """Flask-SQLAlchemy session that honours ``read_only_db()`` scopes.
+
+    Flushes always go to the primary engine so an object loaded inside a
+    read-only scope can still be saved afterwards.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and _read_engine is not None and _read_only_active.get() and not self._flushing:
+            return _read_engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def pool_report(primary: Optional[Engine] = None) -> Dict[str, Any]:
+    """Per-pool counters plus a passive WAL checkpoint probe on ``primary``.
+
+    ``frames_pending`` is the number of WAL frames a passive checkpoint could
+    not copy back, which grows while long readers pin an old snapshot.
+    """
+    report: Dict[str, Any] = {
+        "read_only_pool": _read_engine is not None,
+        "pools": {name: stats.snapshot() for name, stats in _pool_stats.items()},
+    }
+    if primary is not None and primary.url.get_backend_name() == "sqlite":
+        with primary.connect() as conn:
+            busy, log_frames, checkpointed = conn.execute(text("PRAGMA wal_checkpoint(PASSIVE)")).one()
+        report["checkpoint"] = {
+            "busy": bool(busy),
+            "wal_frames": log_frames,
+            "checkpointed_frames": checkpointed,
+            "frames_pending": max(0, log_frames - checkpointed) if log_frames >= 0 else 0,
+        }
+    return report
@@ -0,0 +1,103 @@
+"""One precompiled pass over a command for every keyword list of the AI router.
+
+The router asks several keyword questions per turn (which tool categories,
+is it a write, which read intent). Each used to loop over its own keyword
+list and build a ``re.search`` per keyword. ``KeywordMatcher`` compiles all
+lists into two trie-shaped regexes, one for whole-word keywords and one for
+substring keywords. A trie-shaped regex branches one character at a time, so
+most positions are rejected after a single test instead of one per keyword.
+A lookahead scan finds the positions where some keyword starts; there the
+longest keyword of each kind is read off, plus the shorter keywords that are
+prefixes of it. That gives the same matches as searching for every keyword
+separately.
+
+Keyword rules are the router's: a whole-word list (write intent) matches on
+word boundaries only. Other lists match as substrings, except keywords of
+one or two characters ("po"), which must be whole words.
+"""
+
+from __future__ import annotations
+
+import re
+from typing import Dict, Hashable, Iterable, List, NamedTuple, Optional, Tuple
+
+
+class KeywordHit(NamedTuple):
+    start: int
+    end: int
+    tag: Hashable
+    keyword: str
+
+
+def keyword_pattern(keyword: str, whole_word: bool = False) -> str:
+    escaped = re.escape(keyword)
+    return rf"\b{escaped}\b" if whole_word or len(keyword) <= 2 else escaped
+
+
+def trie_pattern(keywords: Iterable[str]) -> str:
+    """Regex for any of ``keywords`` shaped as a character trie; prefers the longest."""
+    trie: Dict[str, dict] = {}
+    for keyword in keywords:
+        node = trie
+        for char in keyword:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def build(node: Dict[str, dict]) -> str:
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        return f"(?:{body})?" if "" in node else body
+
+    return build(trie)
+
+
+class KeywordMatcher:
+    def __init__(self, groups: Iterable[Tuple[Hashable, Iterable[str], bool]]):
+        """``groups`` holds (tag, keywords, whole_words) triples; tags may repeat."""
+        self._tags: Dict[Tuple[str, bool], List[Hashable]] = {}
+        for tag, keywords, whole_words in groups:
+            for keyword in keywords:
+                key = (keyword, whole_words or len(keyword) <= 2)
+                if tag not in self._tags.setdefault(key, []):
+                    self._tags[key].append(tag)
+        whole = [keyword for keyword, whole_word in self._tags if whole_word]
+        partial = [keyword for keyword, whole_word in self._tags if not whole_word]
+        self._kinds: List[Tuple[re.Pattern, bool]] = []
+        if whole:
+            self._kinds.append((re.compile(rf"\b(?:{trie_pattern(whole)})\b"), True))
+        if partial:
+            self._kinds.append((re.compile(trie_pattern(partial)), False))
+        self._scan = re.compile("(?=" + "|".join(regex.pattern for regex, _ in self._kinds) + ")")
+        # Shorter keywords of the same kind that also match where a longer one did.
+        self._prefixes: Dict[Tuple[str, bool], List[Tuple[str, Optional[re.Pattern]]]] = {
+            (keyword, whole_word): [
+                (other, re.compile(keyword_pattern(other, True)) if whole_word else None)
+                for other, other_whole in self._tags
+                if other_whole == whole_word and other != keyword and keyword.startswith(other)
+            ]
+            for keyword, whole_word in self._tags
+        }
+
+    def hits(self, text: str) -> List[KeywordHit]:
+        """Every keyword occurrence in ``text`` (already lowercased), in text order."""
+        found: List[KeywordHit] = []
+        if not self._kinds:
+            return found
+        for position in self._scan.finditer(text):
+            start = position.start()
+            for regex, whole_word in self._kinds:
+                match = regex.match(text, start)
+                if match is None:
+                    continue
+                keyword = match.group()
+                matched = [keyword] + [other for other, pattern in self._prefixes[(keyword, whole_word)]
+                                       if pattern is None or pattern.match(text, start)]
+                for word in matched:
+                    found.extend(KeywordHit(start, start + len(word), tag, word)
+                                 for tag in self._tags[(word, whole_word)])
+        return found
+
+    def tags(self, text: str) -> set:
+        return {hit.tag for hit in self.hits(text)}
@@ -0,0 +1,368 @@
+"""Shared keep-alive HTTP session for calls to the LLM provider.
+
+A bare ``requests.post`` opens a new TCP connection and TLS handshake for
+every planner, chat and summary call. Every ``AIAgent`` and orchestrator in
+the process sends through one ``requests.Session`` instead. Its connection pool
+(``AI_HTTP_POOL_SIZE`` connections per host, default 8) keeps connections
+alive between calls.
+
+The session never stores cookies. Sharing it between threads only shares
+urllib3's thread-safe pool. A forked worker builds its own session instead of
+reusing sockets inherited from the parent.
+
+``post`` records two timings per call:
+* connect time: TCP plus TLS for a new connection, 0 when one is reused;
+* time to first byte: from sending until the response headers are read.
+``latency_report`` summarises them for ``/api/agent/status``, together with
+the token ``usage`` the provider reported (``record_usage``): prompt tokens,
+how many of them came from the provider's prompt cache, and time to first
+byte with and without a cache hit.
+
+``provider_slot`` bounds how many provider calls a worker process has in
+flight (``AI_MAX_CONCURRENCY`` or the ``ai_max_concurrency`` setting; 0 means
+no limit). A small on-prem model server handles a few requests at a time,
+so extra calls wait for a slot within the turn's time left.
+
+Every call also passes through a process-wide circuit breaker
+(circuit_breaker.py). It also respects the deadline of the current chat
+turn, set with ``turn_deadline``: a call is cut to the time left and refused
+once no time remains. In both cases ``ProviderUnavailable`` is raised
+without touching the network.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.cookiejar import DefaultCookiePolicy
+from typing import Any, Dict, Iterator, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+from circuit_breaker import CircuitBreaker
+
+DEFAULT_POOL_SIZE = 8
+SAMPLE_SIZE = 200
+
+_call = threading.local()
+
+
+class ProviderUnavailable(requests.exceptions.RequestException):
+    """Raised instead of calling the provider: breaker open or turn deadline spent."""
+
+
+class ProviderBusy(ProviderUnavailable):
+    """Raised when no provider slot of this worker freed up in time; the provider itself is fine."""
+
+
+def _note_connect(seconds: float) -> None:
+    _call.connects = getattr(_call, "connects", 0) + 1
+    _call.connect_seconds = getattr(_call, "connect_seconds", 0.0) + seconds
+
+
+class _TimedHTTPConnection(HTTPConnection):
+    def connect(self):
+        started = time.perf_counter()
+        super().connect()
+        _note_connect(time.perf_counter() - started)
+
+
+class _TimedHTTPSConnection(HTTPSConnection):
+    def connect(self):
+        started = time.perf_counter()
+        super().connect()  # includes the TLS handshake
+        _note_connect(time.perf_counter() - started)
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class _TimedAdapter(HTTPAdapter):
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _TimedHTTPConnectionPool,
+            "https": _TimedHTTPSConnectionPool,
+        }
+
+
+class LatencyMetrics:
+    def __init__(self, sample_size: int = SAMPLE_SIZE):
+        self._lock = threading.Lock()
+        self._connect_ms = deque(maxlen=sample_size)
+        self._ttfb_ms = deque(maxlen=sample_size)
+        self._request_bytes = deque(maxlen=sample_size)
+        self.calls = 0
+        self.new_connections = 0
+        self.reused_connections = 0
+        self.errors = 0
+
+    def record(self, connect_ms: float, ttfb_ms: Optional[float], reused: bool,
+               request_bytes: Optional[int] = None) -> None:
+        with self._lock:
+            if request_bytes is not None:
+                self._request_bytes.append(request_bytes)
+            self.calls += 1
+            if reused:
+                self.reused_connections += 1
+            else:
+                self.new_connections += 1
+                self._connect_ms.append(connect_ms)
+            if ttfb_ms is not None:
+                self._ttfb_ms.append(ttfb_ms)
+
+    def record_error(self) -> None:
+        with self._lock:
+            self.errors += 1
+
+    @staticmethod
+    def _percentile(samples, fraction: float) -> Optional[float]:
+        if not samples:
+            return None
+        ordered = sorted(samples)
+        return round(ordered[min(len(ordered) - 1, int(fraction * len(ordered)))], 1)
+
+    def report(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "errors": self.errors,
+                "new_connections": self.new_connections,
+                "reused_connections": self.reused_connections,
+                "connect_ms_p50": self._percentile(self._connect_ms, 0.5),
+                "connect_ms_p95": self._percentile(self._connect_ms, 0.95),
+                "ttfb_ms_p50": self._percentile(self._ttfb_ms, 0.5),
+                "ttfb_ms_p95": self._percentile(self._ttfb_ms, 0.95),
+                "request_bytes_p50": self._percentile(self._request_bytes, 0.5),
+                "request_bytes_p95": self._percentile(self._request_bytes, 0.95),
+            }
+
+
+def cached_prompt_tokens(usage: Dict[str, Any]) -> int:
+    """Prompt tokens served from the provider's prefix cache (OpenAI or DeepSeek field names)."""
+    details = usage.get("prompt_tokens_details") or {}
+    cached = details.get("cached_tokens") if isinstance(details, dict) else None
+    if cached is None:
+        cached = usage.get("prompt_cache_hit_tokens")
+    try:
+        return max(0, int(cached or 0))
+    except (TypeError, ValueError):
+        return 0
+
+
+class UsageMetrics:
+    def __init__(self, sample_size: int = SAMPLE_SIZE):
+        self._lock = threading.Lock()
+        self._ttfb_cached_ms = deque(maxlen=sample_size)
+        self._ttfb_uncached_ms = deque(maxlen=sample_size)
+        self.calls = 0
+        self.calls_with_cache_hit = 0
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+        self.completion_tokens = 0
+
+    def record(self, usage: Optional[Dict[str, Any]], ttfb_ms: Optional[float] = None) -> None:
+        """Add one response's ``usage``; calls without usage are not counted."""
+        if not isinstance(usage, dict) or not usage:
+            return
+        cached = cached_prompt_tokens(usage)
+        with self._lock:
+            self.calls += 1
+            self.prompt_tokens += int(usage.get("prompt_tokens") or 0)
+            self.completion_tokens += int(usage.get("completion_tokens") or 0)
+            self.cached_tokens += cached
+            if cached:
+                self.calls_with_cache_hit += 1
+            if ttfb_ms is not None:
+                (self._ttfb_cached_ms if cached else self._ttfb_uncached_ms).append(ttfb_ms)
+
+    def report(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "calls_with_cache_hit": self.calls_with_cache_hit,
+                "prompt_tokens": self.prompt_tokens,
+                "cached_tokens": self.cached_tokens,
+                "completion_tokens": self.completion_tokens,
+                "cached_ratio": round(self.cached_tokens / self.prompt_tokens, 3) if self.prompt_tokens else None,
+                "ttfb_ms_p50_cached": LatencyMetrics._percentile(self._ttfb_cached_ms, 0.5),
+                "ttfb_ms_p50_uncached": LatencyMetrics._percentile(self._ttfb_uncached_ms, 0.5),
+            }
+
+
+class ConcurrencyLimit:
+    """At most ``limit`` provider calls in flight per process; 0 means unlimited."""
+
+    def __init__(self, limit: int = 0):
+        self._condition = threading.Condition()
+        self.limit = max(0, limit)
+        self.active = 0
+        self.waited = 0
+        self.rejected = 0
+
+    def set_limit(self, limit: int) -> None:
+        with self._condition:
+            self.limit = max(0, limit)
+            self._condition.notify_all()
+
+    @contextmanager
+    def slot(self, timeout: Optional[float] = None) -> Iterator[None]:
+        """Hold one slot for the block; waits at most ``timeout`` seconds (or the turn's time left)."""
+        with self._condition:
+            if self.limit and self.active >= self.limit:
+                self.waited += 1
+                remaining = time_left()
+                if remaining is not None:
+                    timeout = remaining if timeout is None else min(timeout, remaining)
+                if not self._condition.wait_for(lambda: not self.limit or self.active < self.limit,
+                                                timeout=None if timeout is None else max(0.0, timeout)):
+                    self.rejected += 1
+                    raise ProviderBusy("The AI service is busy. Please try again.")
+            self.active += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self.active -= 1
+                self._condition.notify()
+
+    def report(self) -> Dict[str, Any]:
+        with self._condition:
+            return {"limit": self.limit, "active": self.active, "waited": self.waited, "rejected": self.rejected}
+
+
+metrics = LatencyMetrics()
+usage = UsageMetrics()
+concurrency = ConcurrencyLimit()
+breaker = CircuitBreaker.from_env(os.environ)
+
+_session: Optional[requests.Session] = None
+_session_pid: Optional[int] = None
+_session_lock = threading.Lock()
+
+
+def pool_size() -> int:
+    return max(1, int(os.environ.get("AI_HTTP_POOL_SIZE", DEFAULT_POOL_SIZE)))
+
+
+def _build_session(size: int) -> requests.Session:
+    session = requests.Session()
+    session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+    adapter = _TimedAdapter(pool_connections=4, pool_maxsize=size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def http_session() -> requests.Session:
+    """The process-wide provider session, rebuilt once after a fork."""
+    global _session, _session_pid
+    if _session is not None and _session_pid == os.getpid():
+        return _session
+    with _session_lock:
+        if _session is None or _session_pid != os.getpid():
+            _session = _build_session(pool_size())
+            _session_pid = os.getpid()
+        return _session
+
+
+def reset_http_session() -> None:
+    """Close pooled connections; the next call opens fresh ones."""
+    global _session, _session_pid
+    with _session_lock:
+        if _session is not None and _session_pid == os.getpid():
+            _session.close()
+        _session = None
+        _session_pid = None
+
+
+def turn_deadline_seconds() -> float:
+    return float(os.environ.get("AI_TURN_DEADLINE_SECONDS", 45))
+
+
+@contextmanager
+def turn_deadline(seconds: float) -> Iterator[None]:
+    """Bound every provider call made by this thread inside the block to ``seconds`` in total."""
+    previous = getattr(_call, "deadline", None)
+    deadline = time.monotonic() + seconds
+    _call.deadline = deadline if previous is None else min(previous, deadline)
+    try:
+        yield
+    finally:
+        _call.deadline = previous
+
+
+def time_left() -> Optional[float]:
+    """Seconds left in the current turn's deadline, or None outside a turn."""
+    deadline = getattr(_call, "deadline", None)
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def provider_available() -> bool:
+    remaining = time_left()
+    return breaker.available() and (remaining is None or remaining > 0)
+
+
+def _is_provider_failure(status_code: int) -> bool:
+    return status_code == 429 or status_code >= 500
+
+
+def post(url: str, **kwargs) -> requests.Response:
+    """POST through the shared session, recording connect time and time to first byte."""
+    remaining = time_left()
+    if remaining is not None:
+        if remaining <= 0:
+            raise ProviderUnavailable("The AI turn ran out of time.")
+        kwargs["timeout"] = min(kwargs.get("timeout") or remaining, remaining)
+    if not breaker.allow():
+        raise ProviderUnavailable("The AI service is temporarily unavailable.")
+    _call.connects = 0
+    _call.connect_seconds = 0.0
+    try:
+        response = http_session().post(url, **kwargs)
+    except Exception:
+        metrics.record_error()
+        breaker.record_failure()
+        raise
+    status_code = getattr(response, "status_code", 200)
+    if isinstance(status_code, int) and _is_provider_failure(status_code):
+        breaker.record_failure()
+    else:
+        breaker.record_success()
+    connect_ms = _call.connect_seconds * 1000
+    elapsed = getattr(response, "elapsed", None)
+    ttfb_ms = elapsed.total_seconds() * 1000 if elapsed is not None else None
+    reused = _call.connects == 0
+    body = getattr(getattr(response, "request", None), "body", None)
+    metrics.record(connect_ms, ttfb_ms, reused,
+                   request_bytes=len(body) if isinstance(body, (bytes, str)) else None)
+    response.timings = {"connect_ms": round(connect_ms, 1),
+                        "ttfb_ms": None if ttfb_ms is None else round(ttfb_ms, 1),
+                        "reused_connection": reused}
+    return response
+
+
+def record_usage(response_usage: Optional[Dict[str, Any]], response: Any = None) -> None:
+    """Record a completion's token usage; ``response`` supplies its time to first byte."""
+    timings = getattr(response, "timings", None) or {}
+    usage.record(response_usage, timings.get("ttfb_ms"))
+
+
+def provider_slot(timeout: Optional[float] = None):
+    return concurrency.slot(timeout)
+
+
+def latency_report() -> Dict[str, Any]:
+    return {"pool_size": pool_size(), **metrics.report(), "breaker": breaker.report(),
+            "usage": usage.report(), "concurrency": concurrency.report()}
@@ -0,0 +1,140 @@
+"""Local stand-in for an OpenAI-compatible chat completions server.
+
+Used by the tests and load tests to run Loli end to end without the hosted
+provider, the same way it runs against an on-prem Ollama or llama.cpp
+server (point ``AI_BASE_URL`` at ``StandInLLM.base_url``).
+
+The first request of a turn that offers tools is answered with one call to
+``tool_name``. Once the turn has a tool result, or when no tools are
+offered, the reply is ``answer``. Setting ``script`` replays a recorded
+exchange instead (see ``reply``). Streamed requests get the reply as
+server-sent events. ``delay`` simulates model time per request. Every
+request body and its Authorization header are kept in ``requests``, and
+``peak_in_flight`` is the most requests handled at once.
+"""
+
+from __future__ import annotations
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+
+class StandInLLM:
+    def __init__(self, delay: float = 0.0, tool_name: Optional[str] = "get_sales_summary",
+                 answer: str = "Sales look steady today."):
+        self.delay = delay
+        self.tool_name = tool_name
+        self.answer = answer
+        self.script: Optional[Dict[str, Any]] = None
+        self.requests: List[Dict[str, Any]] = []
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self._lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_port}/v1"
+
+    def start(self) -> "StandInLLM":
+        standin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, like a real provider
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                with standin._lock:
+                    standin.requests.append({"path": self.path, "body": body,
+                                             "authorization": self.headers.get("Authorization")})
+                    standin.in_flight += 1
+                    standin.peak_in_flight = max(standin.peak_in_flight, standin.in_flight)
+                try:
+                    time.sleep(standin.delay)
+                    message, finish = standin.reply(body)
+                    if body.get("stream"):
+                        self._send_stream(message, finish)
+                    else:
+                        self._send_json({"choices": [{"message": message, "finish_reason": finish}],
+                                         "model": body.get("model"), "usage": standin.usage(body)})
+                finally:
+                    with standin._lock:
+                        standin.in_flight -= 1
+
+            def _send_json(self, payload):
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _send_stream(self, message, finish):
+                delta = {"content": message["content"]}
+                if message.get("tool_calls"):
+                    delta["tool_calls"] = [dict(call, index=i) for i, call in enumerate(message["tool_calls"])]
+                events = [{"choices": [{"delta": delta}]},
+                          {"choices": [{"delta": {}, "finish_reason": finish}], "usage": {}}]
+                data = "".join(f"data: {json.dumps(event)}\n\n" for event in events) + "data: [DONE]\n\n"
+                data = data.encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self) -> "StandInLLM":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def reply(self, body: Dict[str, Any]):
+        """(message, finish_reason) for one request body.
+
+        With a ``script`` ({"plan": ..., "tool_calls": [{"name", "arguments"}],
+        "answer": ...}) a planning request (``propose_plan`` offered) gets the
+        recorded plan, the first tool-offering request of a turn gets the
+        recorded tool calls, and everything else gets the recorded answer.
+        """
+        messages = body.get("messages", [])
+        offered = {tool["function"]["name"] for tool in body.get("tools") or []}
+        last_user = max((i for i, m in enumerate(messages) if m.get("role") == "user"), default=-1)
+        has_tool_result = any(m.get("role") == "tool" for m in messages[last_user + 1:])
+        script = self.script
+        if script is None:
+            calls = [{"name": self.tool_name}] if self.tool_name else []
+            answer = self.answer
+        else:
+            calls = script.get("tool_calls") or []
+            answer = script.get("answer", self.answer)
+            if "propose_plan" in offered:
+                calls = [{"name": "propose_plan", "arguments": script["plan"]}] if script.get("plan") else []
+        if calls and offered and not has_tool_result:
+            return {"role": "assistant", "content": "", "tool_calls": [{
+                "id": f"call_{len(self.requests)}_{index}", "type": "function",
+                "function": {"name": call["name"], "arguments": json.dumps(call.get("arguments") or {})},
+            } for index, call in enumerate(calls)]}, "tool_calls"
+        return {"role": "assistant", "content": answer}, "stop"
+
+    @staticmethod
+    def usage(body: Dict[str, Any]) -> Dict[str, int]:
+        """Estimated like the app does: about four characters per token of messages and tools."""
+        prompt_tokens = max(1, len(json.dumps([body.get("messages", []), body.get("tools", [])])) // 4)
+        return {"prompt_tokens": prompt_tokens, "completion_tokens": 8, "total_tokens": prompt_tokens + 8}
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""Checkout latency under concurrent AI chats: 1 worker vs N workers.
+
+Runs serve.py against a copy of the database and a local stand-in for the
+LLM API (llm_standin.py), then keeps AI chat clients busy while checkout clients POST
+/api/sales. Each chat turn makes the stand-in answer with a tool call
+(``get_sales_summary``) and then a final message, so the worker does the
+same prompt building, tool execution and JSON work as in production; only
+the network round trip is simulated (``--llm-delay``).
+
+Usage:
+    python loadtest_checkout.py --workers 1 2 --duration 20 --chat-clients 4 --checkout-clients 2
+
+Prints p50/p95/p99 checkout latency and the chat throughput per setting.
+"""
+import argparse
+import os
+import shutil
+import socket
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+from llm_standin import StandInLLM  # noqa: E402
+
+LOADTEST_PRODUCT_ID = 990001
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def prepare_database(source, target):
+    src = sqlite3.connect(source)
+    dst = sqlite3.connect(target)
+    src.backup(dst)
+    src.close()
+    branch_id = dst.execute("SELECT id FROM branch WHERE is_active = 1 ORDER BY id LIMIT 1").fetchone()[0]
+    dst.execute("INSERT OR REPLACE INTO product (id, name, price, cost, stock, tax_rate, branch_id) "
+                "VALUES (?, 'Load test item', 150, 100, 100000000, 0, ?)", (LOADTEST_PRODUCT_ID, branch_id))
+    dst.commit()
+    dst.close()
+
+
+def start_server(workers, threads, port, env):
+    proc = subprocess.Popen(
+        [sys.executable, os.path.join(HERE, "serve.py"), "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers), "--threads", str(threads)],
+        cwd=HERE, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            if requests.get(f"http://127.0.0.1:{port}/healthz", timeout=1).ok:
+                return proc
+        except requests.RequestException:
+            time.sleep(0.3)
+    proc.kill()
+    raise RuntimeError("server did not start")
+
+
+def logged_in_session(base, username, password):
+    http = requests.Session()
+    http.post(f"{base}/login", data={"username": username, "password": password}, timeout=10)
+    return http
+
+
+def percentile(values, pct):
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def run_load(base, args):
+    stop = threading.Event()
+    checkout_ms, chat_ms, errors = [], [], []
+    lock = threading.Lock()
+
+    def checkout_client():
+        http = logged_in_session(base, args.username, args.password)
+        sale = {"items": [{"product_id": LOADTEST_PRODUCT_ID, "quantity": 1, "price": 1.50}],
+                "payment_method": "cash", "cash_received": 2}
+        while not stop.is_set():
+            started = time.perf_counter()
+            response = http.post(f"{base}/api/sales", json=sale, timeout=60)
+            elapsed = (time.perf_counter() - started) * 1000
+            with lock:
+                (checkout_ms if response.ok else errors).append(elapsed if response.ok else response.status_code)
+            time.sleep(args.checkout_pause)
+
+    def chat_client():
+        http = logged_in_session(base, args.username, args.password)
+        while not stop.is_set():
+            started = time.perf_counter()
+            response = http.post(f"{base}/api/agent/chat", timeout=120,
+                                 json={"command": "How did the shop do recently? Give me a short overview."})
+            with lock:
+                if response.ok:
+                    chat_ms.append((time.perf_counter() - started) * 1000)
+                else:
+                    errors.append(response.status_code)
+
+    threads = [threading.Thread(target=chat_client) for _ in range(args.chat_clients)]
+    threads += [threading.Thread(target=checkout_client) for _ in range(args.checkout_clients)]
+    for thread in threads:
+        thread.start()
+    time.sleep(args.duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return checkout_ms, chat_ms, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2])
+    parser.add_argument("--threads", type=int, default=2)
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--chat-clients", type=int, default=4)
+    parser.add_argument("--checkout-clients", type=int, default=2)
+    parser.add_argument("--checkout-pause", type=float, default=0.05)
+    parser.add_argument("--llm-delay", type=float, default=0.2)
+    parser.add_argument("--database", default=os.path.join(HERE, "instance", "pos.db"))
+    parser.add_argument("--username", default="admin")
+    parser.add_argument("--password", default="admin123")
+    args = parser.parse_args()
+
+    llm = StandInLLM(delay=args.llm_delay).start()
+    tmpdir = tempfile.mkdtemp(prefix="pos_loadtest_")
+    print(f"{'workers':>7} {'checkouts':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'chats':>6} {'errors':>6}")
+    try:
+        for workers in args.workers:
+            run_dir = os.path.join(tmpdir, f"w{workers}")
+            os.makedirs(run_dir)
+            db_path = os.path.join(run_dir, "pos.db")
+            prepare_database(args.database, db_path)
+            env = dict(os.environ,
+                       DATABASE_URL=f"sqlite:///{db_path}",
+                       SHARED_STATE_PATH=os.path.join(run_dir, "shared_state.db"),
+                       AI_BASE_URL=llm.base_url,
+                       APIFREE_API_KEY="loadtest-key-0000")
+            port = free_port()
+            server = start_server(workers, args.threads, port, env)
+            try:
+                checkout_ms, chat_ms, errors = run_load(f"http://127.0.0.1:{port}", args)
+            finally:
+                server.terminate()
+                server.wait(timeout=30)
+            print(f"{workers:>7} {len(checkout_ms):>9} {statistics.median(checkout_ms) if checkout_ms else float('nan'):>8.1f} "
+                  f"{percentile(checkout_ms, 95):>8.1f} {percentile(checkout_ms, 99):>8.1f} "
+                  f"{len(chat_ms):>6} {len(errors):>6}")
+    finally:
+        llm.stop()
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Read-only maintenance mode shared between the app and offline tools.
+
+Long-running tools such as ``migrate_money_columns.py`` run in a separate
+process while the POS keeps serving. They hold a marker file next to the
+SQLite database for their whole run; while it exists the app answers reads
+normally and rejects writes with 503, so rows already copied by the tool
+cannot change underneath it.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+
+MAINTENANCE_SUFFIX = ".maintenance"
+
+
+def maintenance_marker_path(db_path: str) -> str:
+    return f"{db_path}{MAINTENANCE_SUFFIX}"
+
+
+def maintenance_status(db_path: Optional[str]) -> Optional[Dict[str, Any]]:
+    """Marker contents if ``db_path`` is in maintenance mode, else None."""
+    if not db_path:
+        return None
+    try:
+        with open(maintenance_marker_path(db_path), encoding="utf-8") as handle:
+            raw = handle.read()
+    except FileNotFoundError:
+        return None
+    try:
+        status = json.loads(raw)
+    except ValueError:
+        status = None
+    if not isinstance(status, dict):
+        # A marker that is still being written (or was hand-made) still counts.
+        return {"reason": "maintenance"}
+    if "pid" in status and not _pid_alive(status["pid"]):
+        return None  # left behind by a tool that was killed
+    return status
+
+
+def _pid_alive(pid: Any) -> bool:
+    if not isinstance(pid, int) or pid <= 0:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+@contextmanager
+def read_only_maintenance(db_path: str, reason: str):
+    """Hold read-only maintenance mode on ``db_path`` for the duration of the block.
+
+    A marker left behind by a tool that was killed is taken over, so an
+    interrupted run can simply be started again.
+    """
+    marker = maintenance_marker_path(str(db_path))
+    payload = {"reason": reason, "pid": os.getpid(), "started_at": time.time()}
+    try:
+        fd = os.open(marker, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+    except FileExistsError:
+        current = maintenance_status(str(db_path)) or {}
+        if _pid_alive(current.get("pid")):
+            raise RuntimeError(f"Database is already in maintenance mode: {current.get('reason', 'unknown')}")
+        os.remove(marker)
+        fd = os.open(marker, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as handle:
+            json.dump(payload, handle)
+        yield payload
+    finally:
+        try:
+            os.remove(marker)
+        except FileNotFoundError:
+            pass
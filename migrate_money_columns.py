@@ -1,30 +1,70 @@
 #!/usr/bin/env python3
-"""SQLite Float -> NUMERIC(12,2) migration for POS money columns.
-
-Strategy: copy-and-swap per table.
-  1. Timestamped file backup of the database.
-  2. For each table with target money columns still declared FLOAT:
-     - create <table>_new with identical schema except NUMERIC(12,2) money cols
-     - INSERT INTO <table>_new SELECT ... CAST(money_col AS NUMERIC(12,2)) ...
-     - verify row counts equal AND every money-column SUM differs < 0.005
-     - inside one transaction: rename original -> <table>_float_backup,
-       rename <table>_new -> <table>
-  3. Any check failure -> abort and restore from the file backup.
-
-Idempotent: tables whose money columns are already NUMERIC are skipped.
+"""Float/NUMERIC -> INTEGER cents migration for POS money columns.
+
+The models store money through ``money.Money`` (integer minor units). This
+converts databases written by older releases, where the same columns were
+declared FLOAT/REAL or NUMERIC(12,2).
+
+Strategy: chunked copy-and-swap per table, resumable, run beside the app.
+  1. The database is put in read-only maintenance mode (``maintenance.py``)
+     for the whole run: the app keeps serving reads and rejects writes, so
+     rows already copied cannot change underneath the migrator. Tables not
+     converted yet are read as whole units (``money.set_unconverted_tables``);
+     after each swap the app workers are told to re-read the schema.
+  2. For each table with target money columns not yet declared INTEGER:
+     - create <table>_new with identical schema except INTEGER money cols
+     - copy rows in rowid (primary key) chunks of --chunk-size:
+       INSERT INTO <table>_new SELECT ... CAST(ROUND(money_col * 100) AS INTEGER) ...
+       Each chunk is verified (row count, and every money-column SUM(old)
+       matches SUM(new) / 100 within 0.005 per row) and committed together
+       with its checkpoint in money_migration_progress. Progress is printed
+       as rows copied, rows/s and ETA.
+     - verify the whole table the same way, then inside one transaction:
+       rename original -> <table>_float_backup, rename <table>_new -> <table>
+       and move the table's indexes across. The renames run with foreign
+       keys off and ``legacy_alter_table`` on, so other tables' REFERENCES
+       keep naming <table> instead of following it to the backup.
+  3. A verification failure discards only that table's partial copy; tables
+     already swapped stay converted and the original is untouched. Any other
+     interruption (Ctrl-C, kill, lock timeout) keeps the checkpoint, and the
+     next run resumes after the last verified chunk.
+
+The original tables are kept as <table>_float_backup, so no full file copy
+is needed; pass --file-backup to also write one before starting.
+Idempotent: tables whose money columns are already INTEGER are skipped.
+Run it by hand: app.py never converts at startup, it only checks which
+tables are still unconverted and serves those as whole units.
+PostgreSQL (DATABASE_URL set to a postgresql:// URL): columns are changed
+in place with ALTER COLUMN ... TYPE BIGINT inside a single transaction,
+verified the same way, and rolled back on any mismatch.
 Restore:   python migrate_money_columns.py --restore
 Dry run:   python migrate_money_columns.py --dry-run
+Resume:    run the same command again after an interruption
 """
 import argparse
 import re
 import shutil
 import sqlite3
 import sys
+import time
 from datetime import datetime
 from pathlib import Path
 
+from db_backend import database_uri_from_env
+from maintenance import read_only_maintenance
+from shared_state import get_shared_state
+
 DB_PATH = Path(__file__).resolve().parent / "instance" / "pos.db"
 TOL = 0.005
+DEFAULT_CHUNK_SIZE = 20_000
+PROGRESS_INTERVAL_SECONDS = 5.0
+# Checkpoint table: one row per table whose copy is under way.
+PROGRESS_TABLE = "money_migration_progress"
+ROWID_FLOOR = -(2 ** 63)
+# Declared types that already hold cents (create_all renders Money as BIGINT).
+INTEGER_TYPES = {"INTEGER", "BIGINT"}
+# shared_state topic: a table was swapped in, app workers re-read the schema.
+MONEY_STORAGE_EVENT = "money_storage_changed"
 
 # table -> list of money columns to convert
 MONEY_COLUMNS = {
@@ -58,9 +98,77 @@ def create_sql(conn, table):
 
 
 def needs_migration(conn, table, cols):
-    """True if at least one target column is not already NUMERIC."""
+    """True if at least one target column is not yet stored as INTEGER cents."""
     types = {name: typ for name, typ, _, _ in table_columns(conn, table)}
-    return any(not types.get(c, "").startswith("NUMERIC") for c in cols)
+    return any(c in types and types[c] not in INTEGER_TYPES for c in cols)
+
+
+def pending_tables(conn):
+    """Money tables present in ``conn`` that still need converting."""
+    return [table for table, cols in MONEY_COLUMNS.items()
+            if create_sql(conn, table) and needs_migration(conn, table, cols)]
+
+
+def unconverted_columns(inspector, table, cols):
+    """Columns of ``table`` not yet BIGINT/INTEGER cents, read through a SQLAlchemy inspector."""
+    types = {c["name"]: str(c["type"]).upper() for c in inspector.get_columns(table)}
+    return [c for c in cols if c in types and types[c] not in INTEGER_TYPES]
+
+
+def unconverted_tables(inspector):
+    """Money tables still holding Float amounts, on any database the app runs on."""
+    return [table for table, cols in MONEY_COLUMNS.items()
+            if inspector.has_table(table) and unconverted_columns(inspector, table, cols)]
+
+
+def announce_money_storage_change(directory):
+    """Tell the running app workers (shared_state beside the database) to re-read the schema."""
+    get_shared_state(str(directory)).publish(MONEY_STORAGE_EVENT)
+
+
+def table_indexes(conn, table):
+    """(name, CREATE INDEX statement) for the explicit indexes on ``table``."""
+    return conn.execute(
+        "SELECT name, sql FROM sqlite_master WHERE type='index' AND tbl_name=? AND sql IS NOT NULL",
+        (table,)).fetchall()
+
+
+def swap_table(conn, table, replacement, backup=None, extra_sql=()):
+    """Rename ``replacement`` to ``table`` in one transaction, indexes included.
+
+    The current ``table`` is renamed to ``backup``, or dropped when no backup
+    is named. Modern SQLite rewrites every REFERENCES clause that names a
+    renamed table, which would point other tables' foreign keys at the
+    backup; with foreign keys off and ``legacy_alter_table`` on they keep
+    naming ``table``. ``extra_sql`` statements (sql, params) commit with the swap.
+    """
+    indexes = table_indexes(conn, table)
+    conn.execute("PRAGMA foreign_keys=OFF")  # no-op inside a transaction, so set before BEGIN
+    conn.execute("PRAGMA legacy_alter_table=ON")
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if backup:
+                conn.execute(f'DROP TABLE IF EXISTS "{backup}"')
+                conn.execute(f'ALTER TABLE "{table}" RENAME TO "{backup}"')
+                # The indexes went with the table; their names are needed on the replacement.
+                for name, _ in indexes:
+                    conn.execute(f'DROP INDEX IF EXISTS "{name}"')
+            else:
+                conn.execute(f'DROP TABLE IF EXISTS "{table}"')
+            conn.execute(f'ALTER TABLE "{replacement}" RENAME TO "{table}"')
+            for name, sql in indexes:
+                if not conn.execute("SELECT 1 FROM sqlite_master WHERE type='index' AND name=?",
+                                    (name,)).fetchone():
+                    conn.execute(sql)
+            for sql, params in extra_sql:
+                conn.execute(sql, params)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+    finally:
+        conn.execute("PRAGMA legacy_alter_table=OFF")
 
 
 def rename_table_in_create_sql(sql, old, new):
@@ -73,42 +181,165 @@ def rename_table_in_create_sql(sql, old, new):
 
 
 def build_new_create_sql(orig_sql, cols):
-    """Rewrite the CREATE TABLE statement, declaring money cols NUMERIC(12,2)."""
+    """Rewrite the CREATE TABLE statement, declaring money cols INTEGER (cents)."""
     new_sql = orig_sql
     for c in cols:
         pattern = (rf'(?i)(?<![\w"])(("?{re.escape(c)}"?))(\s+)'
-                   r'(FLOAT|REAL|DOUBLE)(\s*\(\s*\d+\s*\))?')
-        new_sql, n = re.subn(pattern, r'\1\3NUMERIC(12, 2)', new_sql, count=1)
+                   r'(FLOAT|REAL|DOUBLE|NUMERIC|DECIMAL)(\s*\(\s*\d+\s*(?:,\s*\d+\s*)?\))?')
+        new_sql, n = re.subn(pattern, r'\1\3INTEGER', new_sql, count=1)
         if n != 1:
-            raise ValueError(f"column {c!r} not found with FLOAT/REAL type in schema")
+            raise ValueError(f"column {c!r} not found with FLOAT/REAL/NUMERIC type in schema")
     return new_sql
 
 
-def migrate_table(conn, table, cols, report, dry_run):
+def columns_to_convert(conn, table, cols):
+    """Target columns present in ``table`` and not yet INTEGER.
+
+    Columns that are already INTEGER hold cents and must not be scaled again.
+    """
+    types = {name: typ for name, typ, _, _ in table_columns(conn, table)}
+    return [c for c in cols if c in types and types[c] not in INTEGER_TYPES]
+
+
+def cents_expr(column):
+    return f'CAST(ROUND("{column}" * 100) AS INTEGER)'
+
+
+def sums_match(old_sum, new_cents_sum, rows):
+    # Each row is rounded to the nearest cent, so a SUM may drift by up to TOL per row.
+    return abs((old_sum or 0) - (new_cents_sum or 0) / 100) < TOL * max(1, rows)
+
+
+def ensure_progress_table(conn):
+    conn.execute(f'''CREATE TABLE IF NOT EXISTS "{PROGRESS_TABLE}" (
+        table_name TEXT PRIMARY KEY,
+        last_rowid INTEGER NOT NULL,
+        rows_copied INTEGER NOT NULL,
+        total_rows INTEGER NOT NULL
+    )''')
+
+
+def load_progress(conn, table):
+    """(last_rowid, rows_copied) checkpointed for ``table``, or None if no copy is under way."""
+    if not create_sql(conn, PROGRESS_TABLE) or not create_sql(conn, f"{table}_new"):
+        return None
+    row = conn.execute(
+        f'SELECT last_rowid, rows_copied FROM "{PROGRESS_TABLE}" WHERE table_name = ?',
+        (table,)).fetchone()
+    return (row[0], row[1]) if row else None
+
+
+class ProgressMeter:
+    """Prints rows copied, rows/s and ETA at most every ``interval`` seconds."""
+
+    def __init__(self, table, total_rows, already_copied, interval=PROGRESS_INTERVAL_SECONDS):
+        self.table = table
+        self.total_rows = total_rows
+        self.copied = already_copied
+        self.copied_this_run = 0
+        self.interval = interval
+        self.started = time.monotonic()
+        self.last_print = None
+
+    def rate(self):
+        elapsed = time.monotonic() - self.started
+        return self.copied_this_run / elapsed if elapsed > 0 else 0.0
+
+    def eta_seconds(self):
+        rate = self.rate()
+        remaining = max(0, self.total_rows - self.copied)
+        return remaining / rate if rate > 0 else None
+
+    def advance(self, rows, force=False):
+        self.copied += rows
+        self.copied_this_run += rows
+        now = time.monotonic()
+        if not force and self.last_print is not None and now - self.last_print < self.interval:
+            return
+        self.last_print = now
+        eta = self.eta_seconds()
+        eta_text = "--" if eta is None else f"{eta:.0f}s"
+        pct = 100.0 * self.copied / self.total_rows if self.total_rows else 100.0
+        print(f"  {self.table}: {self.copied}/{self.total_rows} rows ({pct:.1f}%), "
+              f"{self.rate():.0f} rows/s, ETA {eta_text}", flush=True)
+
+
+def copy_chunk(conn, table, cols, col_list, cast_list, after_rowid, chunk_size):
+    """Copy the next ``chunk_size`` rows after ``after_rowid`` and checkpoint them.
+
+    The copy, its verification and the progress update commit together, so
+    an interrupted run resumes exactly after the last verified chunk.
+    Returns (rows copied, last rowid); (0, after_rowid) when the table is done.
+    """
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        rows, last_rowid = conn.execute(
+            f'SELECT COUNT(*), MAX(rowid) FROM (SELECT rowid FROM "{table}" '
+            f'WHERE rowid > ? ORDER BY rowid LIMIT ?)', (after_rowid, chunk_size)).fetchone()
+        if not rows:
+            conn.execute("COMMIT")
+            return 0, after_rowid
+        window = "WHERE rowid > ? AND rowid <= ?"
+        bounds = (after_rowid, last_rowid)
+        conn.execute(f'INSERT INTO "{table}_new" ({col_list}) SELECT {cast_list} FROM "{table}" {window}', bounds)
+        copied = conn.execute(f'SELECT COUNT(*) FROM "{table}_new" {window}', bounds).fetchone()[0]
+        if copied != rows:
+            raise ValueError(f"chunk ({after_rowid}, {last_rowid}]: row count {rows} != {copied}")
+        for c in cols:
+            old_s = conn.execute(f'SELECT COALESCE(SUM("{c}"), 0) FROM "{table}" {window}', bounds).fetchone()[0]
+            new_s = conn.execute(f'SELECT COALESCE(SUM("{c}"), 0) FROM "{table}_new" {window}', bounds).fetchone()[0]
+            if not sums_match(old_s, new_s, rows):
+                raise ValueError(f"chunk ({after_rowid}, {last_rowid}] {c}: SUM {old_s} vs {new_s / 100}")
+        conn.execute(
+            f'UPDATE "{PROGRESS_TABLE}" SET last_rowid = ?, rows_copied = rows_copied + ? WHERE table_name = ?',
+            (last_rowid, rows, table))
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return rows, last_rowid
+
+
+def migrate_table(conn, table, cols, report, dry_run, chunk_size=DEFAULT_CHUNK_SIZE):
     orig_sql = create_sql(conn, table)
     if not orig_sql:
         report.append(f"[SKIP] {table}: not found in database")
         return False
+    cols = columns_to_convert(conn, table, cols)
     new_sql = build_new_create_sql(orig_sql, cols)
-    if "NUMERIC(12, 2)" not in new_sql:
-        report.append(f"[FAIL] {table}: could not rewrite CREATE TABLE for {cols}")
-        return False
 
-    col_list = ", ".join(f'"{c}"' for c in
-                         [c for c, *_ in table_columns(conn, table)])
-    cast_list = ", ".join(
-        f'CAST("{c}" AS NUMERIC(12, 2))' if c in cols else f'"{c}"'
-        for c, *_ in table_columns(conn, table))
+    all_cols = [c for c, *_ in table_columns(conn, table)]
+    col_list = ", ".join(f'"{c}"' for c in all_cols)
+    cast_list = ", ".join(cents_expr(c) if c in cols else f'"{c}"' for c in all_cols)
+    total_rows = conn.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0]
 
     if dry_run:
-        report.append(f"[DRY] would migrate {table} columns {cols}")
+        chunks = -(-total_rows // chunk_size)
+        report.append(f"[DRY] would migrate {table} columns {cols}: {total_rows} rows in {chunks} chunks")
         return True
 
-    conn.execute(f'DROP TABLE IF EXISTS "{table}_new"')
-    conn.execute(rename_table_in_create_sql(new_sql, table, f"{table}_new"))
-    conn.execute(f'INSERT INTO "{table}_new" ({col_list}) SELECT {cast_list} FROM "{table}"')
-
-    # --- verification gates ---
+    progress = load_progress(conn, table)
+    if progress is None:
+        conn.execute("BEGIN")
+        conn.execute(f'DROP TABLE IF EXISTS "{table}_new"')
+        conn.execute(rename_table_in_create_sql(new_sql, table, f"{table}_new"))
+        conn.execute(f'INSERT OR REPLACE INTO "{PROGRESS_TABLE}" VALUES (?, ?, 0, ?)',
+                     (table, ROWID_FLOOR, total_rows))
+        conn.execute("COMMIT")
+        after_rowid, rows_copied = ROWID_FLOOR, 0
+    else:
+        after_rowid, rows_copied = progress
+        print(f"  {table}: resuming after rowid {after_rowid} ({rows_copied} rows already copied)", flush=True)
+
+    meter = ProgressMeter(table, total_rows, rows_copied)
+    while True:
+        rows, after_rowid = copy_chunk(conn, table, cols, col_list, cast_list, after_rowid, chunk_size)
+        if not rows:
+            break
+        meter.advance(rows)
+    meter.advance(0, force=True)
+
+    # --- whole-table verification gates ---
     old_n = conn.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0]
     new_n = conn.execute(f'SELECT COUNT(*) FROM "{table}_new"').fetchone()[0]
     if old_n != new_n:
@@ -117,75 +348,133 @@ def migrate_table(conn, table, cols, report, dry_run):
     for c in cols:
         old_s = conn.execute(f'SELECT COALESCE(SUM("{c}"), 0) FROM "{table}"').fetchone()[0] or 0
         new_s = conn.execute(f'SELECT COALESCE(SUM("{c}"), 0) FROM "{table}_new"').fetchone()[0] or 0
-        if abs(old_s - new_s) >= TOL:
-            report.append(f"[FAIL] {table}.{c}: SUM {old_s} vs {new_s} (diff >= {TOL})")
+        if not sums_match(old_s, new_s, new_n):
+            report.append(f"[FAIL] {table}.{c}: SUM {old_s} vs {new_s / 100} (cents {new_s})")
             return False
-        report.append(f"[OK] {table}.{c}: rows={new_n} sum {old_s} -> {new_s}")
+        report.append(f"[OK] {table}.{c}: rows={new_n} sum {old_s} -> {new_s} cents")
+    report.append(f"[OK] {table}: {new_n} rows copied at {meter.rate():.0f} rows/s")
 
     # --- swap inside one transaction, keep original as backup ---
-    conn.execute("BEGIN")
-    try:
-        conn.execute(f'DROP TABLE IF EXISTS "{table}_float_backup"')
-        conn.execute(f'ALTER TABLE "{table}" RENAME TO "{table}_float_backup"')
-        conn.execute(f'ALTER TABLE "{table}_new" RENAME TO "{table}"')
-        conn.execute("COMMIT")
-    except Exception:
-        conn.execute("ROLLBACK")
-        raise
+    swap_table(conn, table, f"{table}_new", backup=f"{table}_float_backup",
+               extra_sql=[(f'DELETE FROM "{PROGRESS_TABLE}" WHERE table_name = ?', (table,))])
     return True
 
-    """Rewrite the CREATE TABLE statement, declaring money cols NUMERIC(12,2)."""
-    out_lines = []
-    target = set(cols)
-    for line in orig_sql.splitlines():
-        stripped = line.strip().rstrip(",")
-        first = stripped.split("(")[0].split()[0].strip('"').lower() if stripped else ""
-        if first in target and re.match(r'(?i)^\s*"?\w+"?\s+(FLOAT|REAL|DOUBLE)\b', line):
-            line = re.sub(r'(?i)\b(FLOAT|REAL|DOUBLE)\b(\s*\(\s*\d+\s*\))?',
-                          "NUMERIC(12, 2)", line, count=1)
-        out_lines.append(line)
-    return "\n".join(out_lines)
 
+def discard_partial_copy(conn, table):
+    conn.execute("BEGIN")
+    conn.execute(f'DROP TABLE IF EXISTS "{table}_new"')
+    if create_sql(conn, PROGRESS_TABLE):
+        conn.execute(f'DELETE FROM "{PROGRESS_TABLE}" WHERE table_name = ?', (table,))
+    conn.execute("COMMIT")
 
-def run_migration(dry_run=False):
-    if not DB_PATH.exists():
-        print(f"Database not found: {DB_PATH}")
+
+def run_migration(dry_run=False, db_path=None, chunk_size=DEFAULT_CHUNK_SIZE, file_backup=False):
+    db_path = Path(db_path or DB_PATH)
+    if not db_path.exists():
+        print(f"Database not found: {db_path}")
         return 1
-    backup = DB_PATH.with_name(
-        DB_PATH.stem + f"_pre_numeric_{datetime.now():%Y%m%d_%H%M%S}.db")
-    if not dry_run:
-        shutil.copy2(DB_PATH, backup)
-        print(f"Backup written: {backup}")
 
-    conn = sqlite3.connect(str(DB_PATH), isolation_level=None)  # explicit txn control
-    report = []
-    failures = []
-    try:
-        for table, cols in MONEY_COLUMNS.items():
-            if not create_sql(conn, table):
-                report.append(f"[SKIP] {table}: table absent")
-                continue
-            if not needs_migration(conn, table, cols):
-                report.append(f"[SKIP] {table}: money columns already NUMERIC")
-                continue
-            try:
-                ok = migrate_table(conn, table, cols, report, dry_run)
-            except Exception as exc:  # noqa: BLE001
-                report.append(f"[FAIL] {table}: {exc}")
-                ok = False
-            if not ok and not dry_run:
-                failures.append(table)
-                break  # restore from file backup below
-        if failures and not dry_run:
-            print("\n!!! FAILURE DETECTED — restoring from backup !!!")
+    with read_only_maintenance(str(db_path), "money column migration"):
+        conn = sqlite3.connect(str(db_path), isolation_level=None)  # explicit txn control
+        conn.execute("PRAGMA busy_timeout=5000")
+        report = []
+        failed = None
+        try:
+            if file_backup and not dry_run:
+                backup = db_path.with_name(
+                    db_path.stem + f"_pre_cents_{datetime.now():%Y%m%d_%H%M%S}.db")
+                # Fold WAL content into the main file so the file copy is complete.
+                conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+                shutil.copy2(db_path, backup)
+                print(f"Backup written: {backup}")
+            if not dry_run:
+                ensure_progress_table(conn)
+            for table, cols in MONEY_COLUMNS.items():
+                if not create_sql(conn, table):
+                    report.append(f"[SKIP] {table}: table absent")
+                    continue
+                if not needs_migration(conn, table, cols):
+                    report.append(f"[SKIP] {table}: money columns already INTEGER cents")
+                    continue
+                try:
+                    ok = migrate_table(conn, table, cols, report, dry_run, chunk_size=chunk_size)
+                except ValueError as exc:  # verification mismatch
+                    report.append(f"[FAIL] {table}: {exc}")
+                    ok = False
+                except Exception as exc:  # noqa: BLE001
+                    # e.g. a lock timeout: keep the checkpoint so a rerun resumes.
+                    report.append(f"[FAIL] {table}: {exc}")
+                    print(f"\n!!! {table} interrupted — progress kept, rerun to resume !!!")
+                    print("\n".join(report))
+                    return 3
+                if not ok and not dry_run:
+                    failed = table
+                    break
+                if ok and not dry_run:
+                    # Still inside maintenance mode, so no write reaches the
+                    # swapped table before the workers have heard about it.
+                    announce_money_storage_change(db_path.parent)
+            if failed:
+                # Converted tables were verified and swapped one at a time; only the
+                # failing table's partial copy is discarded, its original is untouched.
+                discard_partial_copy(conn, failed)
+                print(f"\n!!! FAILURE DETECTED in {failed} — partial copy discarded, original kept !!!")
+                print("\n".join(report))
+                return 2
+            if not dry_run and not conn.execute(f'SELECT 1 FROM "{PROGRESS_TABLE}" LIMIT 1').fetchone():
+                conn.execute(f'DROP TABLE "{PROGRESS_TABLE}"')
+        finally:
             conn.close()
-            shutil.copy2(backup, DB_PATH)
-            print(f"Database restored from {backup}")
+
+    print("\n===== VERIFICATION REPORT =====")
+    print("\n".join(report))
+    print("===============================")
+    print("RESULT: SUCCESS" if not dry_run else "RESULT: DRY RUN OK")
+    return 0
+
+
+def run_postgres_migration(url, dry_run=False):
+    from sqlalchemy import create_engine, inspect, text
+
+    engine = create_engine(url)
+    report = []
+    with engine.connect() as conn:
+        inspector = inspect(conn)
+        trans = conn.begin()
+        try:
+            for table, cols in MONEY_COLUMNS.items():
+                if not inspector.has_table(table):
+                    report.append(f"[SKIP] {table}: table absent")
+                    continue
+                todo = unconverted_columns(inspector, table, cols)
+                if not todo:
+                    report.append(f"[SKIP] {table}: money columns already INTEGER cents")
+                    continue
+                if dry_run:
+                    report.append(f"[DRY] would migrate {table} columns {todo}")
+                    continue
+                before = {c: conn.execute(text(f'SELECT COALESCE(SUM("{c}"), 0) FROM "{table}"')).scalar()
+                          for c in todo}
+                for c in todo:
+                    conn.execute(text(f'ALTER TABLE "{table}" ALTER COLUMN "{c}" TYPE BIGINT '
+                                      f'USING ROUND("{c}"::numeric * 100)::bigint'))
+                rows = conn.execute(text(f'SELECT COUNT(*) FROM "{table}"')).scalar()
+                for c in todo:
+                    after = conn.execute(text(f'SELECT COALESCE(SUM("{c}"), 0) FROM "{table}"')).scalar()
+                    if not sums_match(float(before[c]), float(after), rows):
+                        raise ValueError(f"{table}.{c}: SUM {before[c]} vs {after} cents")
+                    report.append(f"[OK] {table}.{c}: sum {before[c]} -> {after} cents")
+        except Exception as exc:  # noqa: BLE001
+            trans.rollback()
+            report.append(f"[FAIL] {exc}")
+            print("\n!!! FAILURE DETECTED — transaction rolled back !!!")
             print("\n".join(report))
             return 2
-        conn.commit()
-    finally:
-        conn.close()
+        if dry_run:
+            trans.rollback()
+        else:
+            trans.commit()
+            announce_money_storage_change(DB_PATH.parent)
 
     print("\n===== VERIFICATION REPORT =====")
     print("\n".join(report))
@@ -202,10 +491,7 @@ def run_restore():
     restored = []
     for table in MONEY_COLUMNS:
         if create_sql(conn, f"{table}_float_backup"):
-            conn.execute("BEGIN")
-            conn.execute(f'DROP TABLE IF EXISTS "{table}"')
-            conn.execute(f'ALTER TABLE "{table}_float_backup" RENAME TO "{table}"')
-            conn.execute("COMMIT")
+            swap_table(conn, table, f"{table}_float_backup")
             restored.append(table)
     conn.close()
     print(f"Restored tables: {restored or 'none found'}")
@@ -215,12 +501,23 @@ def run_restore():
 def main():
     ap = argparse.ArgumentParser(description=__doc__)
     ap.add_argument("--dry-run", action="store_true")
+    ap.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE,
+                    help="rows copied and verified per transaction")
+    ap.add_argument("--file-backup", action="store_true",
+                    help="also copy the whole database file before starting")
     ap.add_argument("--restore", action="store_true",
                     help="swap back from <table>_float_backup tables")
     args = ap.parse_args()
+    url = database_uri_from_env(default="")
+    if url and not url.startswith("sqlite"):
+        if args.restore:
+            print("--restore only applies to SQLite; PostgreSQL migrations roll back on failure.")
+            sys.exit(1)
+        sys.exit(run_postgres_migration(url, dry_run=args.dry_run))
     if args.restore:
         sys.exit(run_restore())
-    sys.exit(run_migration(dry_run=args.dry_run))
+    sys.exit(run_migration(dry_run=args.dry_run, chunk_size=max(1, args.chunk_size),
+                           file_backup=args.file_backup))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,167 @@
+"""Money helpers shared by app.py, ai_tools.py and receipt.py.
+
+Amounts are stored as integer minor units (cents) through the ``Money``
+column type, so SQL ``SUM``/``GROUP BY`` aggregates run on integers and rows
+come back as exact two-decimal floats without per-row ``Decimal(str(...))``
+parsing. Arithmetic that needs rounding (tax, change, discounts) stays in
+``Decimal`` space via ``round_money`` and only converts at the boundaries.
+
+A database written by an older release keeps Float amounts until
+``migrate_money_columns.py`` converts it, one table at a time, while the app
+keeps serving. ``set_unconverted_tables`` names the tables still holding
+whole units, and their ``Money`` columns read and write those as they are.
+"""
+
+from __future__ import annotations
+
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Any, Iterable
+
+from sqlalchemy.types import BigInteger, TypeDecorator
+
+MONEY_QUANT = Decimal("0.01")
+CENTS_PER_UNIT = 100
+
+# Tables whose money columns still hold Float amounts (see module docstring).
+_unconverted_tables: frozenset = frozenset()
+
+
+def to_decimal(value: Any) -> Decimal:
+    if isinstance(value, Decimal):
+        return value
+    if isinstance(value, int) and not isinstance(value, bool):
+        return Decimal(value)
+    return Decimal(str(value))
+
+
+def safe_to_decimal(value: Any, default: Decimal = Decimal("0")) -> Decimal:
+    """Convert a value to Decimal, returning ``default`` for None/NaN/inf/unparseable input."""
+    if value is None:
+        return default
+    try:
+        result = to_decimal(value)
+    except (TypeError, ValueError, ArithmeticError):
+        return default
+    if not result.is_finite():
+        return default
+    return result
+
+
+def money_dec(value: Any) -> Decimal:
+    """Convert a value to a finite Decimal, defaulting to 0 for None/NaN/inf/unparseable input.
+
+    Thousands separators are accepted ("1,234.50"), since model tool
+    arguments often arrive formatted.
+    """
+    if isinstance(value, str):
+        value = value.replace(",", "")
+    return safe_to_decimal(value)
+
+
+def round_money(value: Any) -> Decimal:
+    """Round to 2 decimals with ROUND_HALF_UP, staying in Decimal space.
+
+    Intermediate money math stays on Decimal so totals match the JS frontend's
+    integer-cent arithmetic (Math.round per-item). Only final persistence/
+    display boundaries convert to float via money_float() or json_default().
+    """
+    return to_decimal(value).quantize(MONEY_QUANT, rounding=ROUND_HALF_UP)
+
+
+def quantize_money(value: Any) -> Decimal:
+    """Lenient ``round_money``: unparseable input counts as 0."""
+    return money_dec(value).quantize(MONEY_QUANT, rounding=ROUND_HALF_UP)
+
+
+def money_float(value: Any) -> float:
+    """Convert a money value to a 2-decimal float for final persistence/display (JSON)."""
+    # Values read from Money columns are already exact cents; skip the
+    # Decimal round-trip for them (round() is exact for such floats).
+    if isinstance(value, float) and round(value, 2) == value:
+        return value
+    return float(round_money(value))
+
+
+def money_str(value: Any) -> str:
+    """Format a money value as a quantized 2-decimal string (e.g. '1,234.50')."""
+    return f"{money_dec(value).quantize(MONEY_QUANT):,.2f}"
+
+
+def money_plain(value: Any) -> str:
+    """Format a money value as a plain 2-decimal string WITHOUT thousands separators (e.g. '1234.50')."""
+    return f"{quantize_money(value)}"
+
+
+def json_default(o: Any) -> float:
+    """json.dumps default handler: serialize Decimal as float (display boundary)."""
+    if isinstance(o, Decimal):
+        return float(o)
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+
+def to_cents(value: Any) -> int:
+    """Money value -> integer minor units, rounding half up."""
+    return int(round_money(value) * CENTS_PER_UNIT)
+
+
+def from_cents(cents: Any) -> Decimal:
+    """Integer minor units -> exact Decimal amount."""
+    return Decimal(int(cents or 0)).scaleb(-2)
+
+
+class Money(TypeDecorator):
+    """Money column stored as BIGINT cents, read back as a 2-decimal float.
+
+    Floats keep every existing caller (``+``, ``jsonify``, ``money_float``)
+    working unchanged. ``func.sum(Model.money_col)`` keeps this type, so SQL
+    totals are converted once per aggregate; expressions such as
+    ``price * quantity`` evaluate to plain Integer and need
+    ``type_coerce(expr, table.c.price.type)`` to be read back as an amount:
+    the column's own instance, so an unconverted table is read as whole units.
+
+    ``table_name`` is filled in by ``bind_money_columns``; while that table
+    is listed in ``set_unconverted_tables`` amounts are stored as whole units.
+    """
+
+    impl = BigInteger
+    cache_ok = True
+    table_name = None
+
+    def _holds_units(self):
+        return self.table_name is not None and self.table_name in _unconverted_tables
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        if self._holds_units():
+            return float(round_money(value))
+        return to_cents(value)
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        # Decided by the table's recorded state, not the value's type: SQLite
+        # returns whole amounts from a NUMERIC(12,2) column as int too.
+        if self._holds_units():
+            return float(value)
+        if not isinstance(value, (int, float)):
+            value = float(value)  # e.g. PostgreSQL SUM(bigint) returns Decimal
+        return value / CENTS_PER_UNIT
+
+
+def bind_money_columns(metadata) -> None:
+    """Record on every ``Money`` column of ``metadata`` which table it belongs to."""
+    for table in metadata.tables.values():
+        for column in table.columns:
+            if isinstance(column.type, Money):
+                column.type.table_name = table.name
+
+
+def set_unconverted_tables(tables: Iterable[str]) -> None:
+    """Name the tables whose money columns still hold whole units."""
+    global _unconverted_tables
+    _unconverted_tables = frozenset(tables)
+
+
+def unconverted_tables() -> frozenset:
+    return _unconverted_tables
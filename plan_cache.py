@@ -0,0 +1,208 @@
+"""Reusable plans for repeated task-shaped commands.
+
+Managers send near-identical commands every day ("restock low stock items
+from supplier 3"), and each one costs a planner LLM round trip. A validated
+plan is kept as a template keyed by the command's shape: the lowercased
+command with its literals (numbers and quoted strings) replaced by
+placeholders. Plan arguments equal to one of those literals become
+``{"$literal": i}`` slots. The next command with the same shape fills them
+from its own literals.
+
+Only plans whose binding is unambiguous are stored: every literal of the
+command must appear in the plan, and no plan value may match two literals.
+Everything else in the command (product names, statuses, wording) is part
+of the key, so a template is only ever reused for the same request with
+different numbers or quoted names.
+
+A plan can also lean on what the planner saw besides the command: the
+branch, the user and the turn context (date, recalled memories). The caller
+passes those as ``scope``; a template is only reused within the same scope.
+"""
+
+from __future__ import annotations
+
+import copy
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+_LITERAL_RE = re.compile(r"\"([^\"]+)\"|'([^']+)'|(?<![\w.])(\d+(?:\.\d+)?)(?![\w.])")
+_TEXT_FIELDS = ("description", "question")
+
+
+def _number(text: str):
+    return float(text) if "." in text else int(text)
+
+
+def command_shape(command: str) -> Tuple[str, List[Any]]:
+    """(shape, literals) of a command; numeric literals are parsed to numbers."""
+    literals: List[Any] = []
+
+    def placeholder(match):
+        quoted = match.group(1) or match.group(2)
+        literals.append(quoted if quoted is not None else _number(match.group(3)))
+        return f"<{len(literals) - 1}>"
+
+    shape = _LITERAL_RE.sub(placeholder, " ".join(command.strip().split()))
+    return shape.lower().rstrip(" ?.!"), literals
+
+
+def _slot_for(value: Any, literals: List[Any]) -> Optional[int]:
+    """Index of the one literal ``value`` stands for; -1 when it matches several."""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        matches = [i for i, lit in enumerate(literals)
+                   if isinstance(lit, (int, float)) and lit == value]
+    elif isinstance(value, str):
+        matches = [i for i, lit in enumerate(literals) if str(lit).lower() == value.strip().lower()]
+    else:
+        return None
+    if len(matches) > 1:
+        return -1
+    return matches[0] if matches else None
+
+
+def make_template(plan: Dict[str, Any], literals: List[Any]) -> Optional[Dict[str, Any]]:
+    """Replace literal argument values with slots; None if the binding is unclear."""
+    used = set()
+    ambiguous = False
+
+    def abstract(value: Any) -> Any:
+        nonlocal ambiguous
+        if isinstance(value, dict):
+            if "$from" in value:
+                return dict(value)
+            return {k: abstract(v) for k, v in value.items()}
+        if isinstance(value, list):
+            return [abstract(v) for v in value]
+        slot = _slot_for(value, literals)
+        if slot == -1:
+            ambiguous = True
+        elif slot is not None:
+            used.add(slot)
+            return {"$literal": slot, "type": type(value).__name__}
+        return value
+
+    steps = [{"step": step.get("label") or step["step"], "tool": step["tool"],
+              "args": abstract(step["args"]), "reason": step.get("reason") or ""}
+             for step in plan["steps"]]
+    if ambiguous or used != set(range(len(literals))):
+        return None
+    template = {"steps": steps}
+    for name in _TEXT_FIELDS:
+        template[name] = _abstract_text(plan.get(name) or "", literals)
+    for step in steps:
+        step["reason"] = _abstract_text(step["reason"], literals)
+    return template
+
+
+def _abstract_text(text: str, literals: List[Any]) -> str:
+    for index, literal in enumerate(literals):
+        text = re.sub(rf"(?<![\w.]){re.escape(str(literal))}(?![\w.])", f"{{${index}}}", text)
+    return text
+
+
+def _bind_text(text: str, literals: List[Any]) -> str:
+    return re.sub(r"\{\$(\d+)\}", lambda m: str(literals[int(m.group(1))]), text)
+
+
+def bind_template(template: Dict[str, Any], literals: List[Any]) -> Dict[str, Any]:
+    """Raw plan (steps as the planner would return them) for a new command's literals."""
+
+    def bind(value: Any) -> Any:
+        if isinstance(value, dict):
+            if "$literal" in value:
+                literal = literals[value["$literal"]]
+                if value.get("type") == "str":
+                    return str(literal)
+                if value.get("type") == "int" and isinstance(literal, float) and literal.is_integer():
+                    return int(literal)
+                return literal
+            return {k: bind(v) for k, v in value.items()}
+        if isinstance(value, list):
+            return [bind(v) for v in value]
+        return value
+
+    steps = [{**step, "args": bind(step["args"]), "reason": _bind_text(step["reason"], literals)}
+             for step in copy.deepcopy(template["steps"])]
+    raw = {"steps": steps}
+    for name in _TEXT_FIELDS:
+        raw[name] = _bind_text(template.get(name) or "", literals)
+    return raw
+
+
+class PlanTemplateCache:
+    def __init__(self, max_entries: int = 128):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._templates: "OrderedDict[Tuple[Hashable, str], Dict[str, Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.stored = 0
+
+    @classmethod
+    def from_env(cls, env: Dict[str, str]) -> "PlanTemplateCache":
+        return cls(max_entries=int(env.get("AI_PLAN_CACHE_SIZE", 128)))
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def lookup(self, command: str, scope: Hashable = None) -> Optional[Dict[str, Any]]:
+        """Raw plan re-bound to ``command``'s literals, or None on a miss."""
+        if not self.enabled:
+            return None
+        shape, literals = command_shape(command)
+        key = (scope, shape)
+        with self._lock:
+            template = self._templates.get(key)
+            if template is None or len(literals) != template["literal_count"]:
+                self.misses += 1
+                return None
+            self._templates.move_to_end(key)
+            self.hits += 1
+        return bind_template(template, literals)
+
+    def store(self, command: str, plan: Dict[str, Any], scope: Hashable = None) -> bool:
+        """Keep a validated plan as a template; False when it cannot be reused safely."""
+        if not self.enabled or plan.get("needs_clarification"):
+            return False
+        shape, literals = command_shape(command)
+        template = make_template(plan, literals)
+        if template is None:
+            return False
+        template["literal_count"] = len(literals)
+        key = (scope, shape)
+        with self._lock:
+            self._templates[key] = template
+            self._templates.move_to_end(key)
+            while len(self._templates) > self.max_entries:
+                self._templates.popitem(last=False)
+            self.stored += 1
+        return True
+
+    def forget(self, command: str, scope: Hashable = None) -> None:
+        with self._lock:
+            self._templates.pop((scope, command_shape(command)[0]), None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._templates.clear()
+
+    def report(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "templates": len(self._templates),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+                "stored": self.stored,
+            }
+
+
+plan_templates = PlanTemplateCache.from_env(os.environ)
@@ -3,9 +3,11 @@
 from __future__ import annotations
 
 from datetime import date, datetime
-from decimal import Decimal, ROUND_HALF_UP
+from decimal import Decimal
 from typing import Any, Iterable, Mapping
 
+from money import round_money
+
 
 RECEIPT_PAPER_58MM = "THERMAL_58MM"
 RECEIPT_PAPER_80MM = "THERMAL_80MM"
@@ -101,7 +103,7 @@ def calculate_thermal_page_height_mm(content_height_px: Any, safety_mm: int = 3)
 
 
 def _money(value: Any) -> Decimal:
-    return Decimal(str(value or 0)).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+    return round_money(value or 0)
 
 
 def _iso(value: Any) -> str:
@@ -0,0 +1,164 @@
+"""Pre-fork launcher: several waitress worker processes sharing one socket.
+
+One waitress process runs Python code on one core at a time, so a long AI
+chat turn (prompt building, tool execution, JSON handling) competes with
+checkout requests for the GIL. With ``--workers N`` the parent binds the
+listening socket, imports the app once (startup migrations run a single
+time), then forks N workers that accept on the same socket. A worker that
+dies is restarted.
+
+State that must be the same in every worker lives in shared_state.py
+(AI conversation history, cache invalidation events); the database is
+shared through SQLite's own locking.
+
+Usage:
+    python serve.py --workers 2 --threads 2          # or POS_WORKERS / POS_THREADS
+    python serve.py --workers 1                      # single process, as before
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import signal
+import socket
+import sys
+import time
+
+RESTART_BACKOFF_SECONDS = (1, 2, 5, 10, 30)
+# A worker that ran this long before dying is treated as a fresh failure.
+HEALTHY_UPTIME_SECONDS = 60
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Serve Parrot POS with one or more waitress worker processes.")
+    parser.add_argument("--host", default=os.environ.get("POS_HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.environ.get("POS_HTTP_PORT", "8888")))
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("POS_WORKERS", "1")),
+                        help="worker processes (default: POS_WORKERS or 1)")
+    parser.add_argument("--threads", type=int, default=int(os.environ.get("POS_THREADS", "2")),
+                        help="waitress threads per worker (default: POS_THREADS or 2)")
+    parser.add_argument("--connection-limit", type=int, default=32)
+    parser.add_argument("--backlog", type=int, default=64)
+    parser.add_argument("--channel-timeout", type=int, default=30)
+    parser.add_argument("--cleanup-interval", type=int, default=15)
+    parser.add_argument("--max-request-header-size", type=int, default=32768)
+    # Small for every route; large database restores arrive in parts (see app.py).
+    parser.add_argument("--max-request-body-size", type=int, default=6291456)
+    parser.add_argument("--ident", default="Parrot-POS")
+    return parser.parse_args(argv)
+
+
+def bind_socket(host: str, port: int, backlog: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.setblocking(False)
+    return sock
+
+
+def waitress_options(args) -> dict:
+    from admission import server_threads
+    return {
+        # POS_THREADS do the work; the extra threads hold admission queues (admission.py).
+        "threads": server_threads(args.threads, os.environ),
+        "connection_limit": args.connection_limit,
+        "backlog": args.backlog,
+        "channel_timeout": args.channel_timeout,
+        "cleanup_interval": args.cleanup_interval,
+        "max_request_header_size": args.max_request_header_size,
+        "max_request_body_size": args.max_request_body_size,
+        "ident": args.ident,
+    }
+
+
+def load_app():
+    """Import the app in the parent and close every pooled connection before forking."""
+    from app import app, db
+    from db_pools import dispose_read_only_pool
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+    dispose_read_only_pool()
+    return app
+
+
+def run_worker(app, sock: socket.socket, options: dict) -> None:
+    from waitress import serve
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    serve(app, sockets=[sock], **options)
+
+
+def spawn(app, sock, options) -> int:
+    pid = os.fork()
+    if pid == 0:
+        try:
+            run_worker(app, sock, options)
+        finally:
+            os._exit(0)
+    return pid
+
+
+def supervise(app, sock, options, workers: int) -> int:
+    children = {}  # pid -> started_at
+    failures = 0
+    stopping = False
+
+    def stop(signum, _frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    for _ in range(workers):
+        children[spawn(app, sock, options)] = time.monotonic()
+    print(f"[serve] {workers} workers x {options['threads']} threads on pid {os.getpid()}", flush=True)
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        started = children.pop(pid, None)
+        if started is None or stopping:
+            continue
+        uptime = time.monotonic() - started
+        failures = 0 if uptime >= HEALTHY_UPTIME_SECONDS else failures + 1
+        delay = RESTART_BACKOFF_SECONDS[min(failures, len(RESTART_BACKOFF_SECONDS) - 1)] if failures else 0
+        print(f"[serve] worker {pid} exited (status {status}); restarting in {delay}s", flush=True)
+        time.sleep(delay)
+        if not stopping:
+            children[spawn(app, sock, options)] = time.monotonic()
+    return 0
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    options = waitress_options(args)
+    # The app sizes its per-route-class admission limits from the thread count,
+    # and refuses database restores while more than one worker is running.
+    os.environ["POS_THREADS"] = str(args.threads)
+    single = args.workers <= 1 or not hasattr(os, "fork")
+    os.environ["POS_WORKERS"] = "1" if single else str(args.workers)
+    if single:
+        from waitress import serve
+        from app import app
+        serve(app, host=args.host, port=args.port, **options)
+        return 0
+    sock = bind_socket(args.host, args.port, args.backlog)
+    app = load_app()
+    return supervise(app, sock, options, args.workers)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
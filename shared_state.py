@@ -0,0 +1,196 @@
+"""State shared between worker processes (see serve.py).
+
+With several waitress processes, anything kept in module globals is only
+visible to the process that wrote it. Two kinds of state need to be shared:
+
+* AI conversation history -- a user's next chat may land on another
+  worker. ``SharedStateStore`` keeps it in a small SQLite file next to the
+  POS database, versioned so a worker only reloads it when another process
+  changed it.
+* Background AI chat jobs -- progress events and the final result of a
+  job run by one worker are polled or streamed by whichever worker serves
+  the client (``append_job_event`` / ``job_events``).
+* Cache invalidation -- settings changes and database restores must reset
+  caches in *every* worker. ``publish`` appends an event; each worker calls
+  ``poll`` at the start of a request and runs the local handlers for events
+  written by other processes. A sentinel file's mtime is checked first, so a
+  request with nothing new to apply costs one ``stat``.
+
+The file lives outside the POS database on purpose: a database restore
+replaces ``pos.db`` and must not drop the event that tells the other
+workers about it.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+SHARED_STATE_FILENAME = "shared_state.db"
+EVENT_RETENTION_SECONDS = 3600
+SENTINEL_SETTLE_NS = 2_000_000_000
+
+
+class SharedStateStore:
+    def __init__(self, path: str):
+        self.path = path
+        self.sentinel_path = f"{path}.events"
+        self._local = threading.local()
+        self._handlers: Dict[str, List[Callable[[Any], None]]] = {}
+        self._poll_lock = threading.Lock()
+        self._sentinel_mtime = None
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""CREATE TABLE IF NOT EXISTS conversation (
+                conversation_id TEXT PRIMARY KEY,
+                version INTEGER NOT NULL,
+                messages TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            )""")
+            conn.execute("""CREATE TABLE IF NOT EXISTS event (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                topic TEXT NOT NULL,
+                payload TEXT,
+                pid INTEGER NOT NULL,
+                created_at REAL NOT NULL
+            )""")
+            conn.execute("""CREATE TABLE IF NOT EXISTS job_event (
+                job_id TEXT NOT NULL,
+                seq INTEGER NOT NULL,
+                kind TEXT NOT NULL,
+                data TEXT,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (job_id, seq)
+            )""")
+            self._last_event_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM event").fetchone()[0]
+
+    def _connect(self) -> sqlite3.Connection:
+        # One connection per thread and per process: sqlite3 connections must
+        # not be shared across threads, nor survive a fork.
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA busy_timeout=5000")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    # -------------------------------------------------------- conversations
+
+    def load_conversation(self, conversation_id: str) -> Tuple[int, Optional[List[Dict[str, Any]]]]:
+        """(version, messages) for ``conversation_id``; (0, None) if none is stored."""
+        row = self._connect().execute(
+            "SELECT version, messages FROM conversation WHERE conversation_id = ?",
+            (str(conversation_id),)).fetchone()
+        if not row:
+            return 0, None
+        return row[0], json.loads(row[1])
+
+    def conversation_version(self, conversation_id: str) -> int:
+        row = self._connect().execute(
+            "SELECT version FROM conversation WHERE conversation_id = ?", (str(conversation_id),)).fetchone()
+        return row[0] if row else 0
+
+    def save_conversation(self, conversation_id: str, messages: List[Dict[str, Any]]) -> int:
+        """Store ``messages`` and return the new version."""
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO conversation (conversation_id, version, messages, updated_at) VALUES (?, 1, ?, ?) "
+                "ON CONFLICT(conversation_id) DO UPDATE SET version = version + 1, "
+                "messages = excluded.messages, updated_at = excluded.updated_at",
+                (str(conversation_id), json.dumps(messages), time.time()))
+            return conn.execute("SELECT version FROM conversation WHERE conversation_id = ?",
+                                (str(conversation_id),)).fetchone()[0]
+
+    def delete_conversation(self, conversation_id: str) -> None:
+        with self._connect() as conn:
+            conn.execute("DELETE FROM conversation WHERE conversation_id = ?", (str(conversation_id),))
+
+    # ------------------------------------------------------------------ jobs
+
+    def append_job_event(self, job_id: str, kind: str, data: Any = None,
+                         default: Optional[Callable[[Any], Any]] = None) -> int:
+        """Append a progress event to ``job_id`` and return its sequence number (from 1)."""
+        now = time.time()
+        with self._connect() as conn:
+            seq = conn.execute("SELECT COALESCE(MAX(seq), 0) + 1 FROM job_event WHERE job_id = ?",
+                               (str(job_id),)).fetchone()[0]
+            conn.execute("INSERT INTO job_event (job_id, seq, kind, data, created_at) VALUES (?, ?, ?, ?, ?)",
+                         (str(job_id), seq, kind, json.dumps(data, default=default), now))
+            if seq == 1:
+                conn.execute("DELETE FROM job_event WHERE created_at < ?", (now - EVENT_RETENTION_SECONDS,))
+        return seq
+
+    def clear_job_events(self, job_id: str) -> None:
+        """Forget events of an earlier job that had the same id (ids restart after a restore)."""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM job_event WHERE job_id = ?", (str(job_id),))
+
+    def job_events(self, job_id: str, after: int = 0) -> List[Dict[str, Any]]:
+        rows = self._connect().execute(
+            "SELECT seq, kind, data, created_at FROM job_event WHERE job_id = ? AND seq > ? ORDER BY seq",
+            (str(job_id), int(after))).fetchall()
+        return [{"seq": seq, "kind": kind, "data": json.loads(data) if data else None, "at": created_at}
+                for seq, kind, data, created_at in rows]
+
+    # ---------------------------------------------------------- invalidation
+
+    def subscribe(self, topic: str, handler: Callable[[Any], None]) -> None:
+        """Run ``handler(payload)`` in this process when another process publishes ``topic``."""
+        self._handlers.setdefault(topic, []).append(handler)
+
+    def publish(self, topic: str, payload: Any = None) -> int:
+        """Record an event for the other workers. The publisher applies its own change directly."""
+        now = time.time()
+        with self._connect() as conn:
+            event_id = conn.execute(
+                "INSERT INTO event (topic, payload, pid, created_at) VALUES (?, ?, ?, ?)",
+                (topic, json.dumps(payload), os.getpid(), now)).lastrowid
+            conn.execute("DELETE FROM event WHERE created_at < ?", (now - EVENT_RETENTION_SECONDS,))
+        with open(self.sentinel_path, "w", encoding="utf-8") as handle:
+            handle.write(str(event_id))
+        return event_id
+
+    def poll(self) -> int:
+        """Apply events published by other processes since the last poll; returns how many ran."""
+        try:
+            mtime = os.stat(self.sentinel_path).st_mtime_ns
+        except FileNotFoundError:
+            return 0
+        # A second publish within the filesystem's timestamp granularity leaves
+        # the mtime unchanged, so a recently written sentinel is always checked.
+        if mtime == self._sentinel_mtime and time.time_ns() - mtime > SENTINEL_SETTLE_NS:
+            return 0
+        with self._poll_lock:
+            rows = self._connect().execute(
+                "SELECT id, topic, payload, pid FROM event WHERE id > ? ORDER BY id",
+                (self._last_event_id,)).fetchall()
+            self._sentinel_mtime = mtime
+            applied = 0
+            for event_id, topic, payload, pid in rows:
+                self._last_event_id = event_id
+                if pid == os.getpid():
+                    continue
+                for handler in self._handlers.get(topic, ()):
+                    handler(json.loads(payload) if payload else None)
+                    applied += 1
+            return applied
+
+
+_stores: Dict[str, SharedStateStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_shared_state(directory: str) -> SharedStateStore:
+    """Process-wide store for ``directory`` (``SHARED_STATE_PATH`` overrides the file)."""
+    path = os.environ.get("SHARED_STATE_PATH") or os.path.join(directory, SHARED_STATE_FILENAME)
+    with _stores_lock:
+        store = _stores.get(path)
+        if store is None:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            store = _stores[path] = SharedStateStore(path)
+        return store
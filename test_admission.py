@@ -0,0 +1,140 @@
+"""Per-route-class admission control: limits, queues, 429s and the checkout reservation."""
+
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+from admission import AdmissionController, RouteClassLimits, default_route_classes, server_threads
+from app import app, Branch, User
+
+
+def controller(threads=3, reserved=1, **overrides):
+    classes = default_route_classes(threads, reserved)
+    for name, limits in overrides.items():
+        classes[name] = limits
+    return AdmissionController(classes, threads - reserved)
+
+
+class AdmissionControllerTests(unittest.TestCase):
+    def test_saturated_class_is_rejected_immediately_with_retry_after(self):
+        gate = controller(ai=RouteClassLimits(limit=1, queue=0, queue_timeout=5, retry_after=5))
+        self.assertEqual(gate.acquire('ai'), (True, 0))
+        started = time.monotonic()
+        self.assertEqual(gate.acquire('ai'), (False, 5))
+        self.assertLess(time.monotonic() - started, 0.5)
+        self.assertEqual(gate.report()['classes']['ai']['rejected'], 1)
+
+    def _acquire_later(self, gate, route_class):
+        results = []
+        waiter = threading.Thread(target=lambda: results.append(gate.acquire(route_class)))
+        waiter.start()
+        time.sleep(0.1)
+        return waiter, results
+
+    def test_other_classes_never_take_the_reserved_thread(self):
+        gate = controller(threads=2, reserved=1)
+        self.assertEqual(gate.acquire('reports'), (True, 0))
+        waiter, results = self._acquire_later(gate, 'crud')   # shared budget of one thread is used
+        self.assertEqual(results, [])
+        self.assertTrue(gate.acquire('checkout')[0])   # checkout still gets in
+        gate.release('reports')
+        waiter.join(2)
+        self.assertEqual(results, [(True, 0)])
+
+    def test_crud_burst_over_the_budget_queues_instead_of_failing(self):
+        # The shipped POS_THREADS=3 with one reserved thread: a third CRUD
+        # request waits for a running one rather than getting a 429.
+        gate = controller(threads=3, reserved=1)
+        self.assertTrue(gate.acquire('crud')[0])
+        self.assertTrue(gate.acquire('reports')[0])
+        waiter, results = self._acquire_later(gate, 'crud')
+        self.assertEqual(gate.report()['classes']['crud']['waiting'], 1)
+        self.assertTrue(gate.acquire('checkout')[0])
+        gate.release('reports')
+        waiter.join(2)
+        self.assertEqual(results, [(True, 0)])
+        self.assertEqual(gate.report()['classes']['crud']['rejected'], 0)
+
+    def test_waiting_requests_get_server_threads_of_their_own(self):
+        # 3 working threads + queues of crud (2), reports (1) and ai (1) + 2 event streams.
+        self.assertEqual(server_threads(3, {}), 9)
+        self.assertEqual(server_threads(3, {'ADMISSION_CRUD_QUEUE': '0'}), 7)
+        self.assertEqual(server_threads(3, {'ADMISSION_CONTROL': '0'}), 3)
+
+    def test_queued_request_is_admitted_when_a_slot_frees(self):
+        gate = controller(threads=4, reserved=1,
+                          reports=RouteClassLimits(limit=1, queue=1, queue_timeout=5, retry_after=10))
+        self.assertTrue(gate.acquire('reports')[0])
+        results = []
+        waiter = threading.Thread(target=lambda: results.append(gate.acquire('reports')))
+        waiter.start()
+        time.sleep(0.1)
+        self.assertEqual(gate.report()['classes']['reports']['waiting'], 1)
+        self.assertFalse(gate.acquire('reports')[0])   # queue of one is full
+        gate.release('reports')
+        waiter.join(2)
+        self.assertEqual(results, [(True, 0)])
+
+    def test_queue_wait_times_out(self):
+        gate = controller(threads=4, reserved=1,
+                          crud=RouteClassLimits(limit=1, queue=1, queue_timeout=0.1, retry_after=2))
+        self.assertTrue(gate.acquire('crud')[0])
+        self.assertEqual(gate.acquire('crud'), (False, 2))
+        self.assertEqual(gate.report()['classes']['crud']['waiting'], 0)
+
+    def test_event_streams_do_not_use_the_crud_budget(self):
+        gate = controller(threads=3, reserved=1)
+        self.assertTrue(gate.acquire('events')[0])
+        self.assertTrue(gate.acquire('events')[0])
+        self.assertEqual(gate.acquire('events'), (False, 1))   # falls back to polling
+        self.assertTrue(gate.acquire('crud')[0])
+        self.assertTrue(gate.acquire('crud')[0])               # the whole CRUD budget is still there
+
+    def test_environment_overrides_limits(self):
+        classes = default_route_classes(3, 1, {'ADMISSION_AI_LIMIT': '2', 'ADMISSION_AI_QUEUE': '0'})
+        self.assertEqual((classes['ai'].limit, classes['ai'].queue), (2, 0))
+
+
+class AdmissionRequestTests(unittest.TestCase):
+    def setUp(self):
+        app.config.update(TESTING=True)
+        with app.app_context():
+            self.user_id = User.query.filter_by(username='admin').first().id
+            self.branch_id = Branch.query.filter_by(is_active=True).first().id
+        self.gate = controller(threads=2, reserved=1,
+                               ai=RouteClassLimits(limit=1, queue=1, queue_timeout=0.1, retry_after=5),
+                               reports=RouteClassLimits(limit=1, queue=1, queue_timeout=0.1, retry_after=10))
+        patcher = patch('app.admission', self.gate)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _client(self):
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['user_id'] = self.user_id
+            session['role'] = 'manager'
+            session['branch_id'] = self.branch_id
+        return client
+
+    def test_ai_saturated_gets_429_while_scan_lookup_is_served(self):
+        client = self._client()
+        self.assertTrue(self.gate.acquire('ai')[0])   # a long chat is running
+        response = client.post('/api/agent/chat', json={'command': 'hello'})
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.headers['Retry-After'], '5')
+        self.assertEqual(response.get_json()['route_class'], 'ai')
+        self.assertEqual(client.get('/api/reports/sales').status_code, 429)
+        self.assertEqual(client.get('/api/products/search?q=zzz').status_code, 200)
+        self.assertEqual(self.gate.report()['classes']['checkout']['active'], 0)
+
+    def test_slots_are_released_after_each_request(self):
+        client = self._client()
+        for _ in range(3):
+            self.assertEqual(client.get('/api/reports/sales').status_code, 200)
+        stats = self.gate.report()['classes']['reports']
+        self.assertEqual((stats['active'], stats['admitted']), (0, 3))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,194 @@
+"""Background AI chat jobs: submission, progress events, polling and SSE."""
+
+import threading
+import time
+import unittest
+from unittest import mock
+
+import app as app_module
+from agent_jobs import AgentJobRunner
+from app import app, classify_request, db, AgentTask, Branch, User
+
+
+class FakeOrchestrator:
+    def __init__(self, release=None):
+        self.release = release
+
+    def process_command(self, command, user_id=None, progress=None):
+        progress('planning')
+        if self.release is not None:
+            self.release.wait(5)
+        progress('tool', name='get_sales_summary', ok=True, step=1)
+        return {'success': True, 'message': f'done: {command}'}
+
+
+class StreamingOrchestrator:
+    def process_command(self, command, user_id=None, progress=None):
+        for word in ('Sales ', 'are ', 'up.'):
+            progress('token', text=word)
+        return {'success': True, 'message': 'Sales are up.'}
+
+
+class AgentJobRunnerTests(unittest.TestCase):
+    def test_queue_is_bounded(self):
+        runner = AgentJobRunner(workers=1, queue_limit=1)
+        release = threading.Event()
+        self.assertTrue(runner.submit(release.wait))
+        self.assertTrue(runner.submit(release.wait))
+        self.assertFalse(runner.has_capacity())
+        self.assertFalse(runner.submit(release.wait))
+        release.set()
+        for _ in range(50):
+            if runner.report()['running'] + runner.report()['queued'] == 0:
+                break
+            time.sleep(0.05)
+        self.assertEqual(runner.report()['rejected'], 1)
+        self.assertTrue(runner.has_capacity())
+
+
+class AgentJobEndpointTests(unittest.TestCase):
+    def setUp(self):
+        app.config.update(TESTING=True)
+        with app.app_context():
+            self.user_id = User.query.filter_by(username='admin').first().id
+            self.branch_id = Branch.query.filter_by(is_active=True).first().id
+
+    def tearDown(self):
+        with app.app_context():
+            AgentTask.query.filter(AgentTask.command.like('job-test:%')).delete(synchronize_session=False)
+            db.session.commit()
+
+    def _client(self, user_id=None):
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['user_id'] = user_id or self.user_id
+            session['role'] = 'manager'
+            session['branch_id'] = self.branch_id
+        return client
+
+    def _wait_for_result(self, client, task_id):
+        for _ in range(100):
+            body = client.get(f'/api/agent/task/{task_id}').get_json()
+            if body.get('result'):
+                return body
+            time.sleep(0.05)
+        self.fail('job did not finish')
+
+    def test_submit_returns_at_once_and_poll_returns_result(self):
+        release = threading.Event()
+        client = self._client()
+        with mock.patch('app.get_ai_orchestrator', return_value=FakeOrchestrator(release)):
+            started = time.monotonic()
+            response = client.post('/api/agent/jobs', json={'command': 'job-test: sales today'})
+            self.assertLess(time.monotonic() - started, 1)
+            self.assertEqual(response.status_code, 202)
+            job = response.get_json()
+            self.assertEqual(job['poll_url'], f"/api/agent/task/{job['task_id']}")
+            self.assertIn(client.get(job['poll_url']).get_json()['status'], ('queued', 'executing'))
+            release.set()
+            body = self._wait_for_result(client, job['task_id'])
+
+        self.assertEqual(body['status'], 'completed')
+        self.assertEqual(body['result']['message'], 'done: job-test: sales today')
+        self.assertEqual([e['kind'] for e in body['events']], ['queued', 'started', 'planning', 'tool'])
+        self.assertEqual(body['events'][-1]['data'], {'name': 'get_sales_summary', 'ok': True, 'step': 1})
+
+    def test_event_stream_ends_with_final_result(self):
+        client = self._client()
+        with mock.patch('app.get_ai_orchestrator', return_value=FakeOrchestrator()):
+            job = client.post('/api/agent/jobs', json={'command': 'job-test: stream'}).get_json()
+            response = client.get(job['events_url'])
+            self.assertEqual(response.mimetype, 'text/event-stream')
+            text = response.get_data(as_text=True)
+        self.assertIn('event: planning', text)
+        self.assertIn('event: final', text)
+        self.assertIn('"message": "done: job-test: stream"', text.split('event: final')[1])
+        resumed = client.get(job['events_url'], headers={'Last-Event-ID': '4'}).get_data(as_text=True)
+        self.assertNotIn('event: planning', resumed)
+        self.assertIn('event: final', resumed)
+
+    def test_event_stream_is_short_lived_and_resumes_from_last_event_id(self):
+        release = threading.Event()
+        client = self._client()
+        with mock.patch('app.get_ai_orchestrator', return_value=FakeOrchestrator(release)), \
+                mock.patch('app.AI_JOB_STREAM_MAX_SECONDS', 0.3):
+            job = client.post('/api/agent/jobs', json={'command': 'job-test: reconnect'}).get_json()
+            started = time.monotonic()
+            first = client.get(job['events_url']).get_data(as_text=True)
+            self.assertLess(time.monotonic() - started, 2)
+            self.assertTrue(first.startswith('retry: '))
+            self.assertNotIn('event: final', first)
+            last_id = [line for line in first.splitlines() if line.startswith('id: ')][-1][4:]
+            release.set()
+            self._wait_for_result(client, job['task_id'])
+            resumed = client.get(job['events_url'], headers={'Last-Event-ID': last_id}).get_data(as_text=True)
+        self.assertNotIn('event: planning', resumed)
+        self.assertIn('event: final', resumed)
+
+    def test_event_streams_are_not_admitted_as_ai_turns_or_crud(self):
+        with app.test_request_context('/api/agent/task/1/events'):
+            self.assertEqual(classify_request(), 'events')
+
+    def test_streamed_tokens_are_coalesced_into_job_events(self):
+        client = self._client()
+        with mock.patch('app.get_ai_orchestrator', return_value=StreamingOrchestrator()):
+            job = client.post('/api/agent/jobs', json={'command': 'job-test: tokens'}).get_json()
+            text = client.get(job['events_url']).get_data(as_text=True)
+            body = self._wait_for_result(client, job['task_id'])
+        self.assertEqual(text.count('event: token'), 1)
+        self.assertIn('"text": "Sales are up."', text)
+        self.assertLess(text.index('event: token'), text.index('event: final'))
+        self.assertEqual(body['partial_message'], 'Sales are up.')
+        self.assertNotIn('token', [e['kind'] for e in body['events']])
+
+    def test_running_job_is_counted_by_the_restore_gate(self):
+        release = threading.Event()
+        client = self._client()
+        with mock.patch('app.get_ai_orchestrator', return_value=FakeOrchestrator(release)):
+            job = client.post('/api/agent/jobs', json={'command': 'job-test: gate'}).get_json()
+            for _ in range(100):
+                if client.get(job['poll_url']).get_json()['status'] == 'executing':
+                    break
+                time.sleep(0.02)
+            self.assertEqual(app_module._request_gate_state['active'], 1)
+            release.set()
+            self._wait_for_result(client, job['task_id'])
+        time.sleep(0.1)
+        self.assertEqual(app_module._request_gate_state['active'], 0)
+
+    def test_job_work_waits_while_a_restore_is_swapping(self):
+        entered = threading.Event()
+
+        def job():
+            with app_module.database_work_outside_requests():
+                entered.set()
+
+        self.assertTrue(app_module.quiesce_database_requests(timeout=1))
+        try:
+            worker = threading.Thread(target=job)
+            worker.start()
+            self.assertFalse(entered.wait(0.3))
+        finally:
+            app_module.resume_database_requests()
+        self.assertTrue(entered.wait(2))
+        worker.join(2)
+        self.assertEqual(app_module._request_gate_state['active'], 0)
+
+    def test_other_users_cannot_read_a_job(self):
+        with mock.patch('app.get_ai_orchestrator', return_value=FakeOrchestrator()):
+            job = self._client().post('/api/agent/jobs', json={'command': 'job-test: private'}).get_json()
+            self._wait_for_result(self._client(), job['task_id'])
+        stranger = self._client(user_id=self.user_id + 10_000)
+        self.assertEqual(stranger.get(job['poll_url']).status_code, 403)
+        self.assertEqual(stranger.get(job['events_url']).status_code, 403)
+
+    def test_full_job_queue_answers_429(self):
+        with mock.patch('app.ai_jobs', AgentJobRunner(workers=1, queue_limit=0)) as runner:
+            runner._running = 1
+            response = self._client().post('/api/agent/jobs', json={'command': 'job-test: busy'})
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.headers['Retry-After'], '5')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -15,7 +15,7 @@ Contract under test (see docs/AGENT_EXTENSION.md):
   * The final summary chat call receives truncated (compacted) results and
     must report an incomplete task when any step failed.
 
-No real API calls and no real database writes: ai_agent.requests.post is
+No real API calls and no real database writes: the shared provider session's post is
 mocked with scripted fake responses (style of test_ai_no_mock_data.py) and
 tool execution is stubbed at the orchestrator/ai_tools boundary.
 
@@ -32,7 +32,9 @@ from unittest import mock
 import ai_agent
 import ai_tools
 import agent_orchestrator
+import llm_http
 from agent_orchestrator import AgentOrchestrator
+from plan_cache import plan_templates
 
 # Feature detection: which parts of the contract are merged already?
 ORCH_SRC = inspect.getsource(AgentOrchestrator)
@@ -105,6 +107,7 @@ def plan_response(description, steps, call_id="c1"):
 class PlanExecuteTestBase(unittest.TestCase):
     def setUp(self):
         agent_orchestrator.reset_orchestrator()
+        plan_templates.clear()  # each test scripts its own planner replies
         self.orchestrator = AgentOrchestrator(None, {})
         self.orchestrator.set_request_context(
             {"branch_id": 1, "user_id": 1, "role": "manager"}
@@ -115,14 +118,14 @@ class PlanExecuteTestBase(unittest.TestCase):
         agent_orchestrator.reset_orchestrator()
 
     def script(self, *responses):
-        """Patch ai_agent.requests.post with a scripted sequence of bodies."""
+        """Patch the shared provider session's post with a scripted sequence of bodies."""
         queue = list(responses)
 
         def fake_post(url, headers=None, json=None, timeout=None, **kwargs):
             self.chat_payloads.append(json)
             return _FakeBody(queue.pop(0))
 
-        return mock.patch.object(ai_agent.requests, "post", side_effect=fake_post)
+        return mock.patch.object(llm_http.http_session(), "post", side_effect=fake_post)
 
     def fake_execute_ok(self, tool_calls):
         tc = tool_calls[0]
@@ -530,7 +533,7 @@ class AntiHallucinationSummaryTests(PlanExecuteTestBase):
                 "error": None,
             }]
 
-        with mock.patch.object(ai_agent.requests, "post",
+        with mock.patch.object(llm_http.http_session(), "post",
                                side_effect=post_side_effect), \
              mock.patch.object(self.orchestrator, "_execute_tools_with_context",
                                side_effect=fake_execute):
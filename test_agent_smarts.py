@@ -19,13 +19,16 @@ from unittest import mock
 
 import ai_agent
 import agent_orchestrator
+import llm_http
 from agent_orchestrator import AgentOrchestrator, CORE_TOOL_NAMES, SYSTEM_PROMPT
 from ai_agent import AIAgent, ChatResponse
+from plan_cache import plan_templates
 
 
 class SmartsTestBase(unittest.TestCase):
     def setUp(self):
         agent_orchestrator.reset_orchestrator()
+        plan_templates.clear()  # each test scripts its own planner replies
         self.orchestrator = AgentOrchestrator(None, {})
         self.orchestrator.set_request_context({"branch_id": 1, "user_id": 1, "role": "manager"})
 
@@ -48,7 +51,9 @@ class SystemPromptPolicyTests(SmartsTestBase):
             if m.role == "system"
         )
         self.assertIn("Tool use policy", applied)
-        self.assertIn("Current Date:", applied)
+        # The date changes daily, so it travels in the turn context, not the cached prefix.
+        self.assertNotIn("Current Date:", applied)
+        self.assertIn("Current Date:", self.orchestrator.agent.turn_context)
 
 
 class ToolExposureTests(SmartsTestBase):
@@ -189,7 +194,7 @@ class AddProductEndToEndTests(SmartsTestBase):
             def json(self):
                 return bodies.pop(0)
 
-        with mock.patch("ai_agent.requests.post",
+        with mock.patch.object(llm_http.http_session(), "post",
                         side_effect=lambda *a, **k: FakeBody()), \
              mock.patch.object(self.orchestrator, "_autonomy_allowed",
                                return_value=False):
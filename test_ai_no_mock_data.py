@@ -5,6 +5,7 @@ import unittest
 from unittest import mock
 
 import agent_orchestrator
+import llm_http
 from agent_orchestrator import AgentOrchestrator
 from ai_agent import ChatResponse, ToolCall
 
@@ -132,11 +133,11 @@ class ChatPayloadTests(unittest.TestCase):
             captured.update(url=url, json=json)
             return FakeResponse()
 
-        with mock.patch("ai_agent.requests.post", side_effect=fake_post):
+        with mock.patch.object(llm_http.http_session(), "post", side_effect=fake_post):
             agent.chat("hello", force_tool_call=True)
         self.assertEqual(captured["json"]["tool_choice"], "required")
 
-        with mock.patch("ai_agent.requests.post", side_effect=fake_post):
+        with mock.patch.object(llm_http.http_session(), "post", side_effect=fake_post):
             agent.chat("hello", force_tool_call=False)
         self.assertEqual(captured["json"]["tool_choice"], "auto")
 
@@ -0,0 +1,223 @@
+"""Per-year history archive: archival job and transparent report UNIONs."""
+
+import os
+import sqlite3
+import tempfile
+import unittest
+from datetime import datetime
+from unittest.mock import patch
+
+from sqlalchemy import create_engine
+
+import app as app_module
+from app import app, db, Branch, Customer, Debt, User
+from archive_history import (
+    archive_path,
+    archive_years,
+    closed_years,
+    run_archive,
+)
+from db_pools import dispose_read_only_pool
+
+TODAY = datetime(2026, 3, 1)
+
+
+def make_hot_database(path):
+    engine = create_engine(f'sqlite:///{path}')
+    db.metadata.create_all(engine)
+    engine.dispose()
+    conn = sqlite3.connect(path)
+    sales = [
+        (1, '2022-05-01 10:00:00.000000', 1000, 1),
+        (2, '2022-06-01 10:00:00.000000', 2550, 1),
+        (3, '2023-01-15 09:00:00.000000', 700, 2),    # referenced by a delivery
+        (4, '2023-02-15 09:00:00.000000', 125, 2),
+        (5, '2025-12-31 23:00:00.000000', 990, 1),    # previous year stays hot
+        (6, '2026-02-01 08:00:00.000000', 5000, 1),   # current year
+    ]
+    conn.executemany(
+        "INSERT INTO sale (id, transaction_id, date, total, tax, cash_received, branch_id, payment_method) "
+        "VALUES (?, 'tx' || ?, ?, ?, 0, ?, ?, 'cash')",
+        [(i, i, d, t, t, b) for i, d, t, b in sales])
+    conn.executemany(
+        "INSERT INTO sale_item (id, sale_id, product_id, quantity, price, tax) VALUES (?, ?, 1, 1, ?, 0)",
+        [(i, i, t) for i, _, t, _ in sales])
+    conn.execute("INSERT INTO customer (id, name) VALUES (1, 'Khin')")
+    conn.execute("INSERT INTO delivery (id, delivery_number, sale_id, stage, priority) "
+                 "VALUES (1, 'D-1', 3, 'delivered', 'normal')")
+    conn.execute("INSERT INTO debt (id, customer_id, amount, balance, date) VALUES (1, 1, 5000, 0, '2022-01-01')")
+    conn.execute("INSERT INTO debt (id, customer_id, amount, balance, date) VALUES (2, 1, 5000, 2000, '2022-01-01')")
+    conn.executemany(
+        "INSERT INTO debt_payment (id, debt_id, customer_id, amount, payment_date) VALUES (?, ?, 1, ?, ?)",
+        [(1, 1, 5000, '2022-03-01 00:00:00'), (2, 2, 3000, '2022-03-02 00:00:00'),
+         (3, 1, 0, '2026-01-01 00:00:00')])
+    conn.executemany(
+        "INSERT INTO agent_task (id, command, status, created_at, updated_at) VALUES (?, 'x', ?, ?, ?)",
+        [(1, 'completed', '2023-04-01 00:00:00', '2023-04-01 00:00:00'),
+         (2, 'pending_approval', '2023-04-02 00:00:00', '2023-04-02 00:00:00'),
+         (3, 'completed', '2026-01-02 00:00:00', '2026-01-02 00:00:00')])
+    conn.commit()
+    conn.close()
+
+
+def ids(path, table, schema='main'):
+    conn = sqlite3.connect(path)
+    try:
+        return [r[0] for r in conn.execute(f'SELECT id FROM {schema}."{table}" ORDER BY id')]
+    finally:
+        conn.close()
+
+
+class ArchiveJobTests(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.path = os.path.join(self.tmpdir.name, 'pos.db')
+        make_hot_database(self.path)
+
+    def test_closed_years_keep_current_and_previous_year(self):
+        conn = sqlite3.connect(self.path)
+        try:
+            self.assertEqual(closed_years(conn, 2, today=TODAY), [2022, 2023, 2024])
+        finally:
+            conn.close()
+
+    def test_moves_only_safe_rows_of_closed_years(self):
+        self.assertEqual(run_archive(db_path=self.path, today=TODAY), 0)
+
+        self.assertEqual(archive_years(self.path), [2022, 2023])
+        self.assertEqual(ids(self.path, 'sale'), [3, 5, 6])
+        self.assertEqual(ids(self.path, 'sale_item'), [3, 5, 6])
+        self.assertEqual(ids(self.path, 'debt_payment'), [2, 3])
+        self.assertEqual(ids(self.path, 'agent_task'), [2, 3])
+
+        conn = sqlite3.connect(archive_path(self.path, 2022))
+        try:
+            self.assertEqual(conn.execute('SELECT id, total FROM sale ORDER BY id').fetchall(), [(1, 1000), (2, 2550)])
+            self.assertEqual(conn.execute('SELECT id FROM debt_payment').fetchall(), [(1,)])
+        finally:
+            conn.close()
+        self.assertEqual(ids(archive_path(self.path, 2023), 'sale'), [4])
+        self.assertEqual(ids(archive_path(self.path, 2023), 'agent_task'), [1])
+        self.assertFalse(os.path.exists(self.path + '.maintenance'))
+
+    def test_dry_run_and_rerun_change_nothing(self):
+        self.assertEqual(run_archive(db_path=self.path, today=TODAY, dry_run=True), 0)
+        self.assertEqual(archive_years(self.path), [])
+        self.assertEqual(ids(self.path, 'sale'), [1, 2, 3, 4, 5, 6])
+
+        self.assertEqual(run_archive(db_path=self.path, today=TODAY, vacuum=True), 0)
+        self.assertEqual(run_archive(db_path=self.path, today=TODAY), 0)
+        self.assertEqual(ids(self.path, 'sale'), [3, 5, 6])
+        self.assertEqual(ids(archive_path(self.path, 2022), 'sale'), [1, 2])
+
+    def test_refuses_unconverted_money_columns(self):
+        conn = sqlite3.connect(self.path)
+        conn.execute('DROP TABLE promotion')
+        conn.execute('CREATE TABLE promotion (id INTEGER PRIMARY KEY, product_id INTEGER, discount_type TEXT, '
+                     'discount_value FLOAT, start_date DATETIME, end_date DATETIME)')
+        conn.commit()
+        conn.close()
+        self.assertEqual(run_archive(db_path=self.path, today=TODAY), 1)
+        self.assertEqual(ids(self.path, 'sale'), [1, 2, 3, 4, 5, 6])
+
+
+@unittest.skipUnless(app_module.database_backend.file_based, 'SQLite-only: archives are ATTACHed files')
+class ArchiveReportTests(unittest.TestCase):
+    """Reports against the live database UNION an archive file placed next to it."""
+
+    SALE_ID = 900000001
+
+    def setUp(self):
+        app.config.update(TESTING=True)
+        with app.app_context():
+            self.user_id = User.query.filter_by(username='admin').first().id
+            self.branch_id = Branch.query.filter_by(is_active=True).first().id
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.addCleanup(dispose_read_only_pool)
+        staging = os.path.join(self.tmpdir.name, 'staging.db')
+        make_hot_database(staging)
+        conn = sqlite3.connect(staging)
+        conn.execute('UPDATE sale SET id = ?, transaction_id = ?, user_id = ?, branch_id = ? WHERE id = 1',
+                     (self.SALE_ID, 'archived-tx', self.user_id, self.branch_id))
+        conn.execute('UPDATE sale_item SET sale_id = ? WHERE sale_id = 1', (self.SALE_ID,))
+        conn.execute('DELETE FROM sale WHERE id != ?', (self.SALE_ID,))
+        conn.execute('DELETE FROM sale_item WHERE sale_id != ?', (self.SALE_ID,))
+        conn.commit()
+        conn.close()
+        os.makedirs(os.path.join(self.tmpdir.name, 'archive'))
+        os.replace(staging, archive_path(os.path.join(self.tmpdir.name, 'pos.db'), 2019))
+        conn = sqlite3.connect(archive_path(os.path.join(self.tmpdir.name, 'pos.db'), 2019))
+        conn.execute("UPDATE sale SET date = '2019-07-01 12:00:00.000000' WHERE id = ?", (self.SALE_ID,))
+        conn.commit()
+        conn.close()
+        patcher = patch('app.resolve_database_file_path', return_value=os.path.join(self.tmpdir.name, 'pos.db'))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _client(self):
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['user_id'] = self.user_id
+            session['role'] = 'manager'
+            session['branch_id'] = self.branch_id
+        return client
+
+    def test_report_range_in_archived_year_reads_archive(self):
+        rows = self._client().get('/api/reports/sales?start=2019-01-01&end=2019-12-31').get_json()
+        self.assertEqual([r['transaction_id'] for r in rows], ['archived-tx'])
+        self.assertEqual(rows[0]['total'], 10.0)
+        self.assertEqual(rows[0]['username'], 'admin')
+
+    def test_report_range_outside_archive_skips_it(self):
+        rows = self._client().get('/api/reports/sales?start=2020-01-01&end=2020-12-31').get_json()
+        self.assertNotIn('archived-tx', [r['transaction_id'] for r in rows])
+
+    def test_paginated_search_includes_archived_rows(self):
+        body = self._client().get('/api/reports/sales?q=archived-tx&start=2019-01-01&page=1&per_page=10').get_json()
+        self.assertEqual(body['total'], 1)
+        self.assertEqual(body['items'][0]['id'], self.SALE_ID)
+
+    def test_open_range_reads_no_archive(self):
+        body = self._client().get('/api/reports/sales?q=archived-tx&page=1&per_page=10').get_json()
+        self.assertEqual(body['total'], 0)
+
+    def test_export_includes_archived_rows(self):
+        response = self._client().get('/api/reports/sales/export?start=2019-01-01&end=2019-12-31')
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(len(response.data), 0)
+
+    def test_dashboard_rollups_read_recent_history(self):
+        client = self._client()
+        self.assertEqual(client.get('/api/dashboard/top_products').status_code, 200)
+        self.assertEqual(client.get('/api/dashboard/sales_data').status_code, 200)
+
+    def test_ranges_over_too_many_archives_are_rejected(self):
+        for year in range(2008, 2019):
+            open(archive_path(os.path.join(self.tmpdir.name, 'pos.db'), year), 'wb').close()
+        with app.app_context():
+            customer = Customer(name='Archive range customer', branch_id=self.branch_id)
+            db.session.add(customer)
+            db.session.flush()
+            db.session.add(Debt(customer_id=customer.id, amount=5, balance=5, date=datetime(2008, 5, 1),
+                                status='pending', branch_id=self.branch_id))
+            db.session.commit()
+            customer_id = customer.id
+        self.addCleanup(self._remove_customer, customer_id)
+        client = self._client()
+        for url in ('/api/reports/sales?start=2008-01-01', '/api/reports/sales/export?start=2008-01-01',
+                    f'/api/customers/{customer_id}/debts'):
+            response = client.get(url)
+            self.assertEqual(response.status_code, 400, url)
+            self.assertIn('archived years', response.get_json()['message'])
+
+    def _remove_customer(self, customer_id):
+        with app.app_context():
+            Debt.query.filter_by(customer_id=customer_id).delete()
+            Customer.query.filter_by(id=customer_id).delete()
+            db.session.commit()
+
+
+if __name__ == '__main__':
+    unittest.main()
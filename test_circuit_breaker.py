@@ -0,0 +1,132 @@
+"""Provider circuit breaker, half-open probes, per-turn deadline and the fallback path."""
+
+import time
+import unittest
+from unittest import mock
+
+import requests
+
+import agent_orchestrator
+import llm_http
+from agent_orchestrator import AgentOrchestrator
+from ai_agent import AIAgent
+from circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class CircuitBreakerTests(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.breaker = CircuitBreaker(failure_rate=0.5, min_calls=4, window=10, open_seconds=30,
+                                      half_open_probes=1, clock=self.clock)
+
+    def test_opens_once_the_failure_rate_is_reached(self):
+        for outcome in (True, False, True):
+            self.breaker.record_success() if outcome else self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, CLOSED)   # too few calls to judge
+        self.breaker.record_failure()                  # 2 of 4 failed
+        self.assertEqual(self.breaker.state, OPEN)
+        self.assertFalse(self.breaker.allow())
+        self.assertEqual(self.breaker.report()["rejected"], 1)
+
+    def test_half_open_allows_one_probe_and_closes_on_success(self):
+        for _ in range(4):
+            self.breaker.record_failure()
+        self.clock.now += 30
+        self.assertEqual(self.breaker.state, HALF_OPEN)
+        self.assertTrue(self.breaker.allow())
+        self.assertFalse(self.breaker.allow())         # only one probe at a time
+        self.breaker.record_success()
+        self.assertEqual(self.breaker.state, CLOSED)
+        self.assertTrue(self.breaker.allow())
+
+    def test_failed_probe_reopens(self):
+        for _ in range(4):
+            self.breaker.record_failure()
+        self.clock.now += 31
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, OPEN)
+        self.assertAlmostEqual(self.breaker.retry_after(), 30)
+
+    def test_environment_configures_thresholds(self):
+        breaker = CircuitBreaker.from_env({"AI_BREAKER_MIN_CALLS": "2", "AI_BREAKER_OPEN_SECONDS": "5"})
+        self.assertEqual((breaker.min_calls, breaker.open_seconds), (2, 5.0))
+
+
+class ProviderCallTests(unittest.TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(llm_http, "breaker", CircuitBreaker(min_calls=2, open_seconds=60))
+        self.breaker = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_failing_provider_trips_the_breaker_and_later_calls_skip_the_network(self):
+        with mock.patch.object(llm_http.http_session(), "post",
+                               side_effect=requests.exceptions.ConnectionError("refused")) as post:
+            for _ in range(2):
+                with self.assertRaises(requests.exceptions.ConnectionError):
+                    llm_http.post("http://provider.test/chat/completions", json={}, timeout=5)
+            with self.assertRaises(llm_http.ProviderUnavailable):
+                llm_http.post("http://provider.test/chat/completions", json={}, timeout=5)
+        self.assertEqual(post.call_count, 2)
+        self.assertEqual(self.breaker.state, OPEN)
+
+    def test_chat_stops_retrying_at_the_turn_deadline(self):
+        agent = AIAgent(api_key="test-key")
+        with mock.patch.object(llm_http.http_session(), "post",
+                               side_effect=requests.exceptions.Timeout("slow")) as post:
+            started = time.monotonic()
+            with llm_http.turn_deadline(0.5):
+                response = agent.chat("hello")
+        self.assertLess(time.monotonic() - started, 0.5)  # no 1/3/7 s backoff sleeps
+        self.assertEqual(post.call_count, 1)
+        self.assertIn("timed out", response.error)
+
+    def test_call_is_refused_once_the_deadline_has_passed(self):
+        with mock.patch.object(llm_http.http_session(), "post") as post:
+            with llm_http.turn_deadline(0):
+                with self.assertRaises(llm_http.ProviderUnavailable):
+                    llm_http.post("http://provider.test/chat/completions", json={}, timeout=60)
+        post.assert_not_called()
+
+
+class OrchestratorFallbackTests(unittest.TestCase):
+    def setUp(self):
+        agent_orchestrator.reset_orchestrator()
+        self.orchestrator = AgentOrchestrator(None, {})
+        self.orchestrator.set_request_context({"branch_id": 1, "user_id": 1, "role": "manager"})
+        breaker = CircuitBreaker(min_calls=1, open_seconds=60)
+        breaker.record_failure()
+        patcher = mock.patch.object(llm_http, "breaker", breaker)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(agent_orchestrator.reset_orchestrator)
+
+    def test_open_breaker_answers_from_the_keyword_fallback_without_calling_the_provider(self):
+        with mock.patch.object(llm_http.http_session(), "post") as post, \
+             mock.patch.object(self.orchestrator, "_fallback_intent_detection",
+                               return_value="Low stock: Cola (2 left)") as fallback:
+            result = self.orchestrator.process_command("show low stock items", user_id=1)
+        post.assert_not_called()
+        fallback.assert_called_once_with("show low stock items")
+        self.assertTrue(result["success"])
+        self.assertTrue(result["degraded"])
+        self.assertEqual(result["message"], "Low stock: Cola (2 left)")
+
+    def test_open_breaker_without_a_keyword_match_explains_the_outage(self):
+        with mock.patch.object(self.orchestrator, "_fallback_intent_detection", return_value=None):
+            result = self.orchestrator.process_command("write me a poem", user_id=1)
+        self.assertFalse(result["success"])
+        self.assertIn("not responding", result["message"])
+        self.assertEqual(result["step_results"], [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,248 @@
+"""Database restore: streamed upload, verification before swap, request gate."""
+
+import io
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+from sqlalchemy import create_engine
+
+import app as app_module
+from app import app, db, Branch, User
+
+
+def make_pos_database(path, tables=None, marker='restored'):
+    """A backup with the current schema, or bare ``tables`` when given."""
+    if tables is None:
+        engine = create_engine(f'sqlite:///{path}')
+        db.metadata.create_all(engine)
+        engine.dispose()
+    conn = sqlite3.connect(path)
+    for table in tables or ():
+        conn.execute(f'CREATE TABLE "{table}" (id INTEGER PRIMARY KEY, note TEXT)')
+    conn.execute('CREATE TABLE restore_marker (value TEXT)')
+    conn.execute('INSERT INTO restore_marker VALUES (?)', (marker,))
+    conn.commit()
+    conn.close()
+
+
+def read_marker(path):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute('SELECT value FROM restore_marker').fetchone()[0]
+    finally:
+        conn.close()
+
+
+@unittest.skipUnless(app_module.database_backend.file_based, 'SQLite-only: restores swap the database file')
+class DatabaseRestoreTests(unittest.TestCase):
+    def setUp(self):
+        app.config.update(TESTING=True)
+        with app.app_context():
+            self.user_id = User.query.filter_by(username='admin').first().id
+            self.branch_id = Branch.query.filter_by(is_active=True).first().id
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.live_path = os.path.join(self.tmpdir.name, 'pos.db')
+        make_pos_database(self.live_path, marker='live')
+        patcher = patch('app.resolve_database_file_path', return_value=self.live_path)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.tmpdir.cleanup)
+
+    def _client(self):
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['user_id'] = self.user_id
+            session['role'] = 'manager'
+            session['branch_id'] = self.branch_id
+        return client
+
+    def _upload(self, payload, filename='backup.db'):
+        return self._client().post(
+            '/api/settings/database_restore',
+            data={'database': (io.BytesIO(payload), filename)},
+            content_type='multipart/form-data',
+        )
+
+    def _backup_bytes(self, **kwargs):
+        path = os.path.join(self.tmpdir.name, 'upload_source.db')
+        make_pos_database(path, **kwargs)
+        with open(path, 'rb') as handle:
+            data = handle.read()
+        os.remove(path)
+        return data
+
+    def _leftovers(self):
+        return sorted(name for name in os.listdir(self.tmpdir.name)
+                      if name not in ('pos.db', 'pos.db-wal', 'pos.db-shm'))
+
+    def test_valid_backup_replaces_live_file_and_cleans_up(self):
+        response = self._upload(self._backup_bytes())
+        self.assertEqual(response.status_code, 200, response.get_json())
+        self.assertTrue(response.get_json()['success'])
+        self.assertEqual(read_marker(self.live_path), 'restored')
+        self.assertEqual(self._leftovers(), [])
+
+    def test_non_sqlite_upload_is_rejected_without_touching_live_file(self):
+        response = self._upload(b'not a database at all' * 100)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(read_marker(self.live_path), 'live')
+        self.assertEqual(self._leftovers(), [])
+
+    def test_foreign_sqlite_database_fails_schema_check(self):
+        response = self._upload(self._backup_bytes(tables=('user',)))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('missing tables', response.get_json()['message'])
+        self.assertEqual(read_marker(self.live_path), 'live')
+
+    def test_backup_from_an_older_schema_is_rejected(self):
+        response = self._upload(self._backup_bytes(tables=app_module.DATABASE_RESTORE_REQUIRED_TABLES))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('schema version does not match', response.get_json()['message'])
+        self.assertEqual(read_marker(self.live_path), 'live')
+        self.assertEqual(self._leftovers(), [])
+
+    def test_backup_from_an_older_release_is_upgraded_on_restore(self):
+        path = os.path.join(self.tmpdir.name, 'old_release.db')
+        make_pos_database(path)
+        conn = sqlite3.connect(path)
+        conn.execute('DROP TABLE memory_embedding')   # added after that release
+        conn.commit()
+        conn.close()
+        with open(path, 'rb') as handle:
+            data = handle.read()
+        os.remove(path)
+
+        def upgrade():
+            # The engine of the test app is not the patched live file; upgrade that file instead.
+            engine = create_engine(f'sqlite:///{self.live_path}')
+            db.metadata.create_all(engine)
+            engine.dispose()
+
+        with patch('app.upgrade_database_schema', side_effect=upgrade) as upgraded:
+            response = self._upload(data)
+        self.assertEqual(response.status_code, 200, response.get_json())
+        upgraded.assert_called_once()
+        self.assertEqual(read_marker(self.live_path), 'restored')
+        conn = sqlite3.connect(self.live_path)
+        try:
+            self.assertIsNotNone(conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE name = 'memory_embedding'").fetchone())
+        finally:
+            conn.close()
+        self.assertEqual(self._leftovers(), [])
+
+    def test_restore_is_refused_while_several_workers_serve(self):
+        with patch.dict(os.environ, {'POS_WORKERS': '2'}):
+            response = self._upload(self._backup_bytes())
+            self.assertEqual(response.status_code, 409)
+            self.assertIn('POS_WORKERS=1', response.get_json()['message'])
+            self.assertEqual(self._client().post('/api/settings/database_restore/uploads').status_code, 409)
+        self.assertEqual(read_marker(self.live_path), 'live')
+        self.assertEqual(self._leftovers(), [])
+
+    def test_corrupt_pages_fail_integrity_check(self):
+        data = bytearray(self._backup_bytes())
+        # Keep the header but scribble over everything after the first page.
+        page_size = int.from_bytes(data[16:18], 'big')
+        data[page_size:] = b'\xff' * (len(data) - page_size)
+        response = self._upload(bytes(data))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Backup rejected', response.get_json()['message'])
+        self.assertEqual(read_marker(self.live_path), 'live')
+        self.assertEqual(self._leftovers(), [])
+
+    def _upload_in_parts(self, data):
+        client = self._client()
+        started = client.post('/api/settings/database_restore/uploads').get_json()
+        self.assertTrue(started['success'], started)
+        url = f"/api/settings/database_restore/uploads/{started['upload_id']}"
+        offset = 0
+        while offset < len(data):
+            part = data[offset:offset + started['part_bytes']]
+            body = client.put(f'{url}?offset={offset}', data=part,
+                              content_type='application/octet-stream').get_json()
+            self.assertTrue(body['success'], body)
+            offset = body['received']
+        # A retried part at an old offset is told how much already arrived.
+        retried = client.put(f'{url}?offset=0', data=data[:10], content_type='application/octet-stream')
+        self.assertEqual(retried.status_code, 409)
+        self.assertEqual(retried.get_json()['received'], len(data))
+        return client.post('/api/settings/database_restore', json={'upload_id': started['upload_id']})
+
+    def _big_backup(self):
+        source = os.path.join(self.tmpdir.name, 'big_source.db')
+        make_pos_database(source)
+        conn = sqlite3.connect(source)
+        conn.execute('CREATE TABLE filler (blob BLOB)')
+        conn.executemany('INSERT INTO filler VALUES (?)', [(os.urandom(1024),)] * 6000)
+        conn.commit()
+        conn.close()
+        with open(source, 'rb') as handle:
+            data = handle.read()
+        os.remove(source)
+        self.assertGreater(len(data), app.config['MAX_CONTENT_LENGTH'])
+        return data
+
+    def test_backup_larger_than_request_limit_is_uploaded_in_parts(self):
+        data = self._big_backup()
+        self.assertEqual(self._upload(data).status_code, 413)   # one request stays under the global limit
+        response = self._upload_in_parts(data)
+        self.assertEqual(response.status_code, 200, response.get_json())
+        self.assertEqual(read_marker(self.live_path), 'restored')
+        self.assertEqual(self._leftovers(), [])
+
+    def test_parts_past_the_restore_limit_are_refused(self):
+        client = self._client()
+        upload_id = client.post('/api/settings/database_restore/uploads').get_json()['upload_id']
+        with patch('app.DATABASE_RESTORE_MAX_BYTES', 100):
+            response = client.put(f'/api/settings/database_restore/uploads/{upload_id}?offset=0',
+                                  data=b'x' * 101, content_type='application/octet-stream')
+        self.assertEqual(response.status_code, 413)
+        self.assertEqual(client.put('/api/settings/database_restore/uploads/../../etc?offset=0',
+                                    data=b'x').status_code, 404)
+
+    def test_a_retried_part_waits_for_the_original_and_is_not_appended_twice(self):
+        upload_id = self._client().post('/api/settings/database_restore/uploads').get_json()['upload_id']
+        url = f'/api/settings/database_restore/uploads/{upload_id}?offset=0'
+        copy = app_module.copy_stream_limited
+        statuses = []
+
+        def slow_copy(*args):
+            time.sleep(0.2)
+            return copy(*args)
+
+        def put():
+            statuses.append(self._client().put(url, data=b'x' * 10,
+                                               content_type='application/octet-stream').status_code)
+
+        # Admission would queue the second request on a small test budget.
+        with patch('app.ADMISSION_ENABLED', False), patch('app.copy_stream_limited', side_effect=slow_copy):
+            workers = [threading.Thread(target=put) for _ in range(2)]
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+        self.assertEqual(sorted(statuses), [200, 409])
+        path = app_module.restore_upload_path(self.live_path, upload_id)
+        self.assertEqual(os.path.getsize(path), 10)
+
+    def test_requests_are_held_off_while_restore_is_swapping(self):
+        self.assertTrue(app_module.quiesce_database_requests(timeout=1))
+        try:
+            response = self._client().get('/api/branches/current')
+            self.assertEqual(response.status_code, 503)
+            self.assertEqual(response.headers['Retry-After'], '5')
+            # A second restore cannot start while one is in progress.
+            self.assertFalse(app_module.quiesce_database_requests(timeout=0))
+        finally:
+            app_module.resume_database_requests()
+        self.assertEqual(self._client().get('/api/branches/current').status_code, 200)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,141 @@
+"""Database backend selection: DATABASE_URL handling and dialect behaviour."""
+
+import os
+import threading
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import OperationalError
+
+import app as app_module
+from app import app, db, Branch, Product, Sale, SaleItem, User
+from db_backend import (
+    DEFAULT_DATABASE_URI, PostgresBackend, SQLiteBackend, database_uri_from_env,
+    get_backend, lock_rows_for_update,
+)
+
+
+def _engine_for(url):
+    return SimpleNamespace(url=make_url(url))
+
+
+class DatabaseUriTests(unittest.TestCase):
+    def test_defaults_to_instance_sqlite_file(self):
+        with patch.dict(os.environ, {'DATABASE_URL': ''}):
+            self.assertEqual(database_uri_from_env(), DEFAULT_DATABASE_URI)
+
+    def test_legacy_postgres_scheme_is_normalised(self):
+        with patch.dict(os.environ, {'DATABASE_URL': 'postgres://pos:pw@db/pos'}):
+            self.assertEqual(database_uri_from_env(), 'postgresql://pos:pw@db/pos')
+
+    def test_backend_is_chosen_by_dialect(self):
+        self.assertIsInstance(get_backend(_engine_for('sqlite:///pos.db')), SQLiteBackend)
+        self.assertIsInstance(get_backend(_engine_for('postgresql+psycopg://h/pos')), PostgresBackend)
+
+
+class LockErrorTests(unittest.TestCase):
+    def test_sqlite_retries_only_busy_database(self):
+        backend = SQLiteBackend()
+        self.assertTrue(backend.is_retryable_lock_error(Exception('database is locked')))
+        self.assertFalse(backend.is_retryable_lock_error(Exception('no such table: product')))
+
+    def test_postgres_retries_deadlocks_and_serialization_failures(self):
+        backend = PostgresBackend()
+        for code in ('40001', '40P01'):
+            exc = OperationalError('UPDATE product', {}, Exception('boom'))
+            exc.orig.sqlstate = code
+            self.assertTrue(backend.is_retryable_lock_error(exc), code)
+        self.assertFalse(backend.is_retryable_lock_error(Exception('syntax error')))
+
+
+class RowLockTests(unittest.TestCase):
+    def test_sqlite_issues_no_locking_query(self):
+        with app.app_context(), patch.object(type(Product.query), 'all') as all_rows:
+            self.assertEqual(lock_rows_for_update(Product.query, SQLiteBackend(), [2, 1]), [])
+        all_rows.assert_not_called()
+
+    def test_row_locks_are_taken_in_id_order(self):
+        captured = {}
+
+        def fake_all(query):
+            captured['sql'] = str(query.statement.compile(dialect=make_url('postgresql://').get_dialect()()))
+            captured['params'] = query.statement.compile().params
+            return []
+
+        with app.app_context(), patch.object(type(Product.query), 'all', fake_all):
+            lock_rows_for_update(Product.query, PostgresBackend(), [3, 1, 3])
+        self.assertIn('FOR UPDATE', captured['sql'])
+        self.assertIn('ORDER BY product.id', captured['sql'])
+        self.assertEqual(sorted(v for v in captured['params'].values() if isinstance(v, list))[0], [1, 3])
+
+
+# CI runs the whole suite a second time with DATABASE_URL pointing at a
+# PostgreSQL service container; locally these are skipped on SQLite.
+requires_postgres = unittest.skipUnless(
+    isinstance(app_module.database_backend, PostgresBackend),
+    'set DATABASE_URL=postgresql+psycopg://... to run against PostgreSQL')
+
+
+@requires_postgres
+class PostgresCheckoutTests(unittest.TestCase):
+    STOCK = 3
+
+    def setUp(self):
+        app.config.update(TESTING=True)
+        with app.app_context():
+            self.user_id = User.query.filter_by(username='admin').first().id
+            self.branch_id = Branch.query.filter_by(is_active=True).first().id
+            product = Product(name='PG lock test item', price=2, cost=1, stock=self.STOCK,
+                              tax_rate=0, branch_id=self.branch_id)
+            db.session.add(product)
+            db.session.commit()
+            self.product_id = product.id
+        self.addCleanup(self._remove_product)
+
+    def _remove_product(self):
+        with app.app_context():
+            sale_ids = [row.sale_id for row in SaleItem.query.filter_by(product_id=self.product_id)]
+            SaleItem.query.filter_by(product_id=self.product_id).delete()
+            Sale.query.filter(Sale.id.in_(sale_ids)).delete(synchronize_session=False)
+            Product.query.filter_by(id=self.product_id).delete()
+            db.session.commit()
+
+    def _client(self):
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['user_id'] = self.user_id
+            session['role'] = 'manager'
+            session['branch_id'] = self.branch_id
+        return client
+
+    def test_row_locks_run_against_the_live_database(self):
+        with app.app_context():
+            rows = lock_rows_for_update(Product.query, app_module.database_backend, [self.product_id])
+            self.assertEqual([row.id for row in rows], [self.product_id])
+            db.session.rollback()
+
+    def test_concurrent_checkouts_never_oversell(self):
+        sale = {'items': [{'product_id': self.product_id, 'quantity': 1, 'price': 2}],
+                'payment_method': 'cash', 'cash_received': 10}
+        barrier = threading.Barrier(self.STOCK * 2)
+        statuses = []
+
+        def checkout():
+            client = self._client()
+            barrier.wait()
+            statuses.append(client.post('/api/sales', json=sale).status_code)
+
+        threads = [threading.Thread(target=checkout) for _ in range(self.STOCK * 2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(statuses.count(201), self.STOCK, statuses)
+        with app.app_context():
+            self.assertEqual(db.session.get(Product, self.product_id).stock, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+"""Read-only pool routing for reports/AI read tools and per-pool metrics."""
+
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import URL
+from sqlalchemy.exc import OperationalError
+
+import app as app_module
+import db_pools
+from app import app, db, Branch, User
+from agent_orchestrator import AgentOrchestrator
+from db_pools import get_read_only_engine, read_only_db
+
+
+@unittest.skipUnless(app_module.database_backend.file_based, 'SQLite-only: the read-only pool opens the database file')
+class ReadOnlyPoolTests(unittest.TestCase):
+    def setUp(self):
+        app.config.update(TESTING=True)
+        with app.app_context():
+            self.user_id = User.query.filter_by(username='admin').first().id
+            self.branch_id = Branch.query.filter_by(is_active=True).first().id
+
+    def _client(self):
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['user_id'] = self.user_id
+            session['role'] = 'manager'
+            session['branch_id'] = self.branch_id
+        return client
+
+    def test_scope_routes_session_to_read_only_engine(self):
+        read_engine = get_read_only_engine()
+        self.assertIsNotNone(read_engine)
+        with app.app_context():
+            self.assertIs(db.session.get_bind(), db.engine)
+            with read_only_db():
+                self.assertIs(db.session.get_bind(), read_engine)
+                self.assertGreater(Branch.query.count(), 0)
+            self.assertIs(db.session.get_bind(), db.engine)
+            db.session.remove()
+
+    def test_writes_inside_read_only_scope_are_refused(self):
+        with app.app_context():
+            with read_only_db():
+                with self.assertRaises(OperationalError):
+                    db.session.execute(text("UPDATE app_setting SET value = value"))
+            db.session.rollback()
+            db.session.remove()
+
+    def test_report_routes_use_read_only_pool(self):
+        before = db_pools._pool_stats['read_only'].snapshot()['checkouts']
+        response = self._client().get('/api/reports/sales')
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(db_pools._pool_stats['read_only'].snapshot()['checkouts'], before)
+
+    def test_pool_metrics_endpoint_reports_both_pools_and_checkpoint(self):
+        response = self._client().get('/api/settings/database_pools')
+        self.assertEqual(response.status_code, 200)
+        payload = response.get_json()
+        self.assertTrue(payload['read_only_pool'])
+        self.assertEqual(set(payload['pools']), {'primary', 'read_only'})
+        for stats in payload['pools'].values():
+            self.assertIn('lock_errors', stats)
+            self.assertIn('peak_in_use', stats)
+        self.assertIn('frames_pending', payload['checkpoint'])
+
+    def test_only_read_tools_run_in_read_only_scope(self):
+        orchestrator = AgentOrchestrator(None, {})
+        seen = {}
+        orchestrator.agent.tool_functions['get_low_stock_items'] = (
+            lambda **kwargs: seen.setdefault('read', db_pools._read_only_active.get()) or {})
+        orchestrator.agent.tool_functions['create_purchase_order'] = (
+            lambda **kwargs: seen.setdefault('write', db_pools._read_only_active.get()) or {})
+        orchestrator.set_request_context({'branch_id': 1, 'user_id': 1, 'role': 'manager'})
+
+        class _Call:
+            def __init__(self, name):
+                self.id, self.function_name, self.arguments = name, name, {}
+
+        orchestrator._execute_tools_with_context([_Call('get_low_stock_items'), _Call('create_purchase_order')])
+        self.assertEqual(seen, {'read': True, 'write': False})
+
+    def test_read_only_engine_opens_paths_with_uri_characters(self):
+        with tempfile.TemporaryDirectory(prefix='pos?#%20') as directory:
+            path = os.path.join(directory, 'pos.db')
+            conn = sqlite3.connect(path)
+            conn.execute('CREATE TABLE marker (value TEXT)')
+            conn.execute("INSERT INTO marker VALUES ('here')")
+            conn.commit()
+            conn.close()
+            primary = create_engine(URL.create('sqlite', database=path))
+            try:
+                engine = db_pools.install_read_only_pool(primary)
+                with engine.connect() as connection:
+                    self.assertEqual(connection.execute(text('SELECT value FROM marker')).scalar(), 'here')
+            finally:
+                with app.app_context():
+                    db_pools.install_read_only_pool(db.engine)
+                primary.dispose()
+
+
+if __name__ == '__main__':
+    unittest.main()
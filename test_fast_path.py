@@ -0,0 +1,178 @@
+"""Confidence-scored fast path: unambiguous read questions skip the LLM."""
+
+import unittest
+import uuid
+from unittest import mock
+
+import agent_orchestrator
+import llm_http
+from agent_orchestrator import AgentOrchestrator, answer_paths
+from ai_agent import ChatResponse
+from app import app, db, AI_MODELS, Branch, Product, User
+from tool_cache import result_cache
+
+
+class FastPathRouterTests(unittest.TestCase):
+    def setUp(self):
+        self.orchestrator = AgentOrchestrator(None, {})
+
+    def route(self, command):
+        return self.orchestrator._route_fast_path(command)
+
+    def test_specific_read_phrases_are_confident(self):
+        for command, tool in (("show low stock items", "get_low_stock_items"),
+                              ("list pending purchase orders", "get_purchase_orders"),
+                              ("what is the sales trend?", "get_sales_trends"),
+                              ("which branch am I in?", "get_current_branch_context")):
+            with self.subTest(command=command):
+                route = self.route(command)
+                self.assertEqual(route["tool"], tool)
+                self.assertGreaterEqual(route["confidence"], 0.8)
+        self.assertEqual(self.route("list pending purchase orders")["arguments"], {"status": "pending"})
+
+    def test_phrase_keywords_do_not_count_as_a_second_intent(self):
+        # "stock" (inventory) sits inside "low stock"; "reorder" inside "what to reorder".
+        self.assertEqual(self.route("show low stock")["confidence"], 0.95)
+        self.assertEqual(self.route("what to reorder")["tool"], "suggest_reorder_quantities")
+
+    def test_loose_words_and_fragments_stay_below_the_threshold(self):
+        for command in ("show suppliers",          # one loose word
+                        "low stock",               # no question or request shape
+                        "pending purchase orders"):
+            with self.subTest(command=command):
+                self.assertLess(self.route(command)["confidence"], 0.8)
+
+    def test_keywords_inside_other_words_do_not_match(self):
+        # "owe" (debt) sits inside "lowest" and "deals" (promotion) inside "ideals".
+        self.assertIsNone(self.route("what is the lowest price?"))
+        self.assertIsNone(self.route("what are our ideals?"))
+
+    def test_ambiguous_or_reasoning_questions_go_to_the_model(self):
+        for command in ("low stock and pending purchase orders",
+                        "why are sales summary numbers down",
+                        "total sales last month",
+                        "should I reorder"):
+            with self.subTest(command=command):
+                self.assertLess(self.route(command)["confidence"], 0.8)
+
+    def test_writes_and_chat_are_never_routed(self):
+        self.assertIsNone(self.route("create a purchase order for the low stock items"))
+        self.assertIsNone(self.route("hello, who made you?"))
+
+
+class FastPathTurnTests(unittest.TestCase):
+    def setUp(self):
+        app.config.update(TESTING=True)
+        agent_orchestrator.reset_orchestrator()
+        result_cache.invalidate()
+        self.addCleanup(result_cache.invalidate)
+        self.addCleanup(agent_orchestrator.reset_orchestrator)
+        self.name = f"Fastpath Soda {uuid.uuid4().hex[:8]}"
+        with app.app_context():
+            user_id = User.query.filter_by(username='admin').first().id
+            branch_id = Branch.query.filter_by(is_active=True).first().id
+            product = Product(name=self.name, price=1000, stock=4, branch_id=branch_id)
+            db.session.add(product)
+            db.session.commit()
+            self.product_id = product.id
+        self.orchestrator = AgentOrchestrator(db, AI_MODELS, app=app)
+        self.orchestrator.set_request_context({"branch_id": branch_id, "user_id": user_id, "role": "manager"})
+
+    def tearDown(self):
+        with app.app_context():
+            Product.query.filter_by(id=self.product_id).delete()
+            db.session.commit()
+
+    def test_confident_question_is_answered_without_calling_the_provider(self):
+        before = answer_paths.report().get("fast_path", {}).get("turns", 0)
+        with mock.patch.object(llm_http.http_session(), "post") as post:
+            result = self.orchestrator.process_command(f"how much stock of {self.name}?", user_id=1)
+        post.assert_not_called()
+        self.assertTrue(result["success"])
+        self.assertEqual(result["answer_path"], "fast_path")
+        self.assertEqual(result["tool_results"][0]["function_name"], "search_products")
+        self.assertIn(f"**{self.name}** - 4 units", result["message"])
+        self.assertGreaterEqual(result["latency_ms"], 0)
+        self.assertEqual(answer_paths.report()["fast_path"]["turns"], before + 1)
+        roles = [m.role for m in self.orchestrator.agent.conversation_history[-2:]]
+        self.assertEqual(roles, ["user", "assistant"])
+
+    def test_longest_full_product_name_wins(self):
+        with app.app_context():
+            longer = Product(name=f"{self.name} Max", price=1200, stock=9,
+                             branch_id=Branch.query.filter_by(is_active=True).first().id)
+            db.session.add(longer)
+            db.session.commit()
+            self.addCleanup(self._delete_product, longer.id)
+        route = self.orchestrator._route_fast_path(f"how much stock of {self.name} Max?")
+        self.assertEqual(route["arguments"], {"query": f"{self.name} Max"})
+        self.assertGreaterEqual(route["confidence"], 0.8)
+
+    def _delete_product(self, product_id):
+        with app.app_context():
+            Product.query.filter_by(id=product_id).delete()
+            db.session.commit()
+
+    def _add_product(self, name, branch_id=None):
+        with app.app_context():
+            product = Product(name=name, price=100, stock=3,
+                              branch_id=branch_id or Branch.query.filter_by(is_active=True).first().id)
+            db.session.add(product)
+            db.session.commit()
+            self.addCleanup(self._delete_product, product.id)
+
+    def test_short_product_names_inside_other_words_do_not_match(self):
+        for name in ("Ice", "Tea", "Coca Cola"):
+            self._add_product(name)
+        for command in ("what are the prices?", "show me the price list", "is anyone still on my team?"):
+            with self.subTest(command=command):
+                route = self.orchestrator._route_fast_path(command)
+                self.assertFalse(route and route["tool"] == "search_products", route)
+        self.assertEqual(self.orchestrator._route_fast_path("how much stock of tea?")["arguments"],
+                         {"query": "Tea"})
+
+    def test_product_names_come_from_the_request_branch_only(self):
+        with app.app_context():
+            other = Branch(name="Fastpath Other", code=f"FP{uuid.uuid4().hex[:6]}")
+            db.session.add(other)
+            db.session.commit()
+            other_id = other.id
+        self.addCleanup(self._delete_branch, other_id)
+        self._add_product(f"Elsewhere Kiwi {uuid.uuid4().hex[:6]}", branch_id=other_id)
+        self.assertNotIn("Elsewhere", " ".join(self.orchestrator._product_names()))
+        self.assertIn(self.name, self.orchestrator._product_names())
+
+    def _delete_branch(self, branch_id):
+        with app.app_context():
+            Branch.query.filter_by(id=branch_id).delete()
+            db.session.commit()
+
+    def test_chat_without_question_shape_does_not_load_products(self):
+        with mock.patch.object(self.orchestrator, "_product_names", return_value=[self.name]) as names:
+            self.assertIsNone(self.orchestrator._route_fast_path("hello"))
+        names.assert_not_called()
+
+    def test_low_confidence_question_falls_through_to_the_model(self):
+        reply = ChatResponse(content="Sales dipped because of the holiday.", tool_calls=[], finish_reason="stop")
+        with mock.patch.object(self.orchestrator.agent, "chat", return_value=reply) as chat, \
+             mock.patch.object(self.orchestrator, "_should_plan", return_value=False), \
+             mock.patch.object(self.orchestrator, "_fallback_intent_detection", return_value=None):
+            result = self.orchestrator.process_command("why did revenue drop yesterday?", user_id=1)
+        chat.assert_called()
+        self.assertEqual(result["answer_path"], "llm")
+
+    def test_reply_that_cannot_be_formatted_falls_through_to_the_model(self):
+        reply = ChatResponse(content="Nothing is pending.", tool_calls=[], finish_reason="stop")
+        with mock.patch.object(self.orchestrator, "_format_tool_results_for_user",
+                               side_effect=ValueError("bad total")), \
+             mock.patch.object(self.orchestrator.agent, "chat", return_value=reply) as chat, \
+             mock.patch.object(self.orchestrator, "_should_plan", return_value=False), \
+             mock.patch.object(self.orchestrator, "_fallback_intent_detection", return_value=None):
+            result = self.orchestrator.process_command("show low stock items", user_id=1)
+        chat.assert_called()
+        self.assertTrue(result["success"])
+        self.assertNotEqual(result["answer_path"], "fast_path")
+
+
+if __name__ == "__main__":
+    unittest.main()
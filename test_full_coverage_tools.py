@@ -237,6 +237,46 @@ class ReceivePurchaseOrderTests(FullCoverageToolsTestBase):
         self.assertIn("exceeds remaining", result.get("error", ""))
 
 
+class ReportFormattingTests(FullCoverageToolsTestBase):
+    """Read tools whose results are formatted without the model (fast path)."""
+
+    def _format(self, tool, result):
+        return AgentOrchestrator(None, {})._format_tool_results_for_user(
+            [{"function_name": tool, "result": result, "error": None}], "")
+
+    def test_sales_trends_aggregate_sale_lines(self):
+        product = self._product("Trend Soda", stock=20, price=2.5)
+        for quantity in (2, 3):
+            sale = Sale(transaction_id=uuid.uuid4().hex, total=quantity * 2.5, tax=0,
+                        cash_received=quantity * 2.5, payment_method="cash",
+                        user_id=self.admin_id, branch_id=self.branch_id)
+            db.session.add(sale)
+            db.session.flush()
+            db.session.add(SaleItem(sale_id=sale.id, product_id=product.id, quantity=quantity,
+                                    price=2.5, tax=0))
+        db.session.commit()
+
+        result = self.tools.get_sales_trends(days=7)
+        self.assertEqual(result["total_products_sold"], 1)
+        top = result["top_selling_products"][0]
+        self.assertEqual((top["product_name"], top["total_quantity"], top["sale_count"]), ("Trend Soda", 5, 2))
+        self.assertEqual(top["total_revenue"], "12.50")
+        self.assertIn("**Trend Soda** - 5 units ($12.50)", self._format("get_sales_trends", result))
+
+    def test_purchase_order_totals_are_formatted(self):
+        supplier = Supplier(name=f"Sup-{uuid.uuid4().hex[:6]}", branch_id=self.branch_id)
+        db.session.add(supplier)
+        db.session.flush()
+        db.session.add(PurchaseOrder(po_number=f"PO-FMT-{uuid.uuid4().hex[:6].upper()}",
+                                     supplier_id=supplier.id, status="pending", total_amount=1234.5,
+                                     branch_id=self.branch_id, created_by=self.admin_id))
+        db.session.commit()
+
+        result = self.tools.get_purchase_orders(status="pending")
+        self.assertIsInstance(result["orders"][0]["total_amount"], str)
+        self.assertIn("Total: $1,234.50", self._format("get_purchase_orders", result))
+
+
 class ReturnExchangeToolTests(FullCoverageToolsTestBase):
     def _sale_with_item(self, qty=5, price=100.0):
         with app.app_context():
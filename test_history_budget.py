@@ -0,0 +1,119 @@
+"""Token-budgeted conversation history and compacted tool payloads."""
+
+import json
+import unittest
+
+from agent_orchestrator import AgentOrchestrator
+from ai_agent import AIAgent, CHARS_PER_TOKEN, HISTORY_SUMMARY_PREFIX, ToolCall, estimate_tokens
+from app import app
+from tool_cache import result_cache
+
+
+def conversation_tokens(agent):
+    return sum(estimate_tokens(m) for m in agent.conversation_history if m.role != "system")
+
+
+class TokenBudgetTrimTests(unittest.TestCase):
+    def setUp(self):
+        self.agent = AIAgent(api_key="test-key")
+        self.agent.set_system_prompt("system")
+
+    def add_turn(self, index, size=2000):
+        self.agent.add_user_message(f"question {index}")
+        self.agent.add_assistant_message("", tool_calls=[{"id": f"c{index}", "type": "function",
+                                                          "function": {"name": "t", "arguments": "{}"}}])
+        self.agent.add_tool_result(f"c{index}", "x" * size)
+        self.agent.add_assistant_message(f"answer {index}")
+
+    def test_oldest_whole_turns_are_dropped_to_fit_the_budget(self):
+        for index in range(10):
+            self.add_turn(index)
+        self.agent.trim_history(40, max_tokens=1500)
+        history = self.agent.conversation_history
+        self.assertEqual(history[0].content, "system")
+        self.assertEqual(history[1].role, "user")                  # never starts mid-turn
+        self.assertLessEqual(conversation_tokens(self.agent), 1500)
+        self.assertEqual(history[-1].content, "answer 9")
+
+    def test_latest_turn_is_kept_even_when_it_alone_exceeds_the_budget(self):
+        self.add_turn(0)
+        self.add_turn(1, size=40000)
+        self.agent.trim_history(40, max_tokens=1000)
+        self.assertEqual([m.content for m in self.agent.conversation_history if m.role == "user"], ["question 1"])
+
+    def test_dropped_turns_leave_a_bounded_recap(self):
+        for index in range(12):
+            self.add_turn(index)
+        self.agent.trim_history(40, max_tokens=1200, summarize=True)
+        recap = self.agent.conversation_history[1]
+        self.assertTrue(recap.content.startswith(HISTORY_SUMMARY_PREFIX))
+        self.assertIn("- Asked: question 9 | Answered: answer 9", recap.content)
+
+        for index in range(12, 30):
+            self.add_turn(index)
+            self.agent.trim_history(40, max_tokens=1200, summarize=True)
+        recaps = [m for m in self.agent.conversation_history if m.content.startswith(HISTORY_SUMMARY_PREFIX)]
+        self.assertEqual(len(recaps), 1)
+        self.assertEqual(len(recaps[0].content.splitlines()), 1 + 8)
+        self.assertNotIn("question 0 ", recaps[0].content)
+
+    def test_recap_is_sent_inside_the_first_user_message(self):
+        for index in range(12):
+            self.add_turn(index)
+        self.agent.trim_history(40, max_tokens=1200, summarize=True)
+        self.agent.turn_context = "Today is Monday."
+        payload = self.agent._build_messages_payload()
+        self.assertEqual([m["role"] for m in payload[:3]], ["system", "user", "assistant"])
+        self.assertTrue(payload[1]["content"].startswith(HISTORY_SUMMARY_PREFIX))
+        self.assertTrue(payload[1]["content"].endswith("question 10"))
+        self.assertEqual(sum(HISTORY_SUMMARY_PREFIX in m["content"] for m in payload), 1)
+        self.assertTrue(payload[-4]["content"].startswith("Today is Monday."))
+
+    def test_without_a_budget_only_the_message_count_applies(self):
+        for index in range(5):
+            self.add_turn(index)
+        self.agent.trim_history(40)
+        self.assertEqual(len(self.agent.conversation_history), 21)
+
+
+class CompactedToolHistoryTests(unittest.TestCase):
+    def setUp(self):
+        result_cache.invalidate()  # the stubbed tool must not be answered from earlier results
+        self.addCleanup(result_cache.invalidate)
+        self.orchestrator = AgentOrchestrator(None, {}, app=app)
+        self.orchestrator.set_request_context({"branch_id": 1, "user_id": 1, "role": "manager"})
+        self.inventory = {"total_products": 500,
+                          "inventory": [{"product_id": i, "name": f"Product {i}", "current_stock": i,
+                                         "status": "ok"} for i in range(500)]}
+        self.orchestrator.agent.tool_functions["get_inventory_status"] = lambda **kwargs: self.inventory
+
+    def test_history_gets_the_compacted_result_and_the_caller_the_full_one(self):
+        results = self.orchestrator._execute_tools_with_context(
+            [ToolCall(id="inv", function_name="get_inventory_status", arguments={})])
+        self.assertEqual(len(results[0]["result"]["inventory"]), 500)
+        stored = json.loads(self.orchestrator.agent.conversation_history[-1].content)
+        self.assertEqual(stored["total_products"], 500)
+        self.assertEqual(stored["inventory"][-1], "...[490 more items]")
+        self.assertLess(len(self.orchestrator.agent.conversation_history[-1].content),
+                        len(json.dumps(self.inventory)) / 10)
+
+    def test_request_payload_stays_bounded_across_turns(self):
+        agent = self.orchestrator.agent
+        sizes = []
+        for turn in range(15):
+            agent.add_user_message(f"inventory please ({turn})")
+            agent.add_assistant_message("", tool_calls=[{"id": f"inv{turn}", "type": "function",
+                                                         "function": {"name": "get_inventory_status",
+                                                                      "arguments": "{}"}}])
+            self.orchestrator._execute_tools_with_context(
+                [ToolCall(id=f"inv{turn}", function_name="get_inventory_status", arguments={})])
+            agent.add_assistant_message(f"There are 500 products ({turn}).")
+            agent.trim_history(self.orchestrator.max_history_messages, 1500, summarize=True)
+            sizes.append(len(json.dumps(agent._build_messages_payload())))
+        system_chars = len(agent.conversation_history[0].content)
+        self.assertLess(max(sizes) - system_chars, 1500 * CHARS_PER_TOKEN + 2000)
+        self.assertLess(sizes[-1], sizes[5] * 1.2)   # flat, not growing with every turn
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+"""One matcher pass answers every keyword question the router asks per turn."""
+
+import re
+import unittest
+
+from agent_orchestrator import TOOL_CATEGORIES, _READ_INTENTS, _WRITE_INTENT_KEYWORDS, analyze_command
+from keyword_matcher import KeywordMatcher
+
+
+def contains(text, keywords, whole_words=False):
+    """The router's earlier per-keyword check, kept as the reference."""
+    for keyword in keywords:
+        if whole_words or len(keyword) <= 2:
+            if re.search(r"\b" + re.escape(keyword) + r"\b", text):
+                return True
+        elif keyword in text:
+            return True
+    return False
+
+
+COMMANDS = (
+    "show low stock items", "how much stock of cola do we have", "pending purchase orders",
+    "restock low stock items from supplier 3", "create a purchase order for 20 sprite",
+    "which supplier do we owe the most", "cancel po-0012", "transfer 10 boxes from the warehouse",
+    "suppose we order more rice, what would it cost?", "hello", "update price of coffee to 2500",
+    "what did we sell yesterday and what should i reorder?", "spoon", "readdress", "unpaid",
+)
+
+
+class KeywordMatcherTests(unittest.TestCase):
+    def test_agrees_with_per_keyword_checks(self):
+        for text in COMMANDS:
+            with self.subTest(text=text):
+                result = analyze_command(text)
+                categories = {name for name, config in TOOL_CATEGORIES.items()
+                              if contains(text, config["keywords"])}
+                reads = {index for index, (_, _, keywords) in enumerate(_READ_INTENTS)
+                         if keywords and contains(text, keywords)}
+                self.assertEqual(result.categories, frozenset(categories))
+                self.assertEqual(result.write_intent, contains(text, _WRITE_INTENT_KEYWORDS, whole_words=True))
+                self.assertEqual(result.read_intents, reads)
+
+    def test_word_boundaries_and_overlapping_keywords(self):
+        matcher = KeywordMatcher([
+            ("write", ("add", "add product"), True),
+            ("stock", ("stock", "low stock", "stock level"), False),
+            ("po", ("po",), False),
+        ])
+        self.assertEqual(matcher.tags("please add product sprite"), {"write"})
+        self.assertEqual(matcher.tags("padded address"), set())
+        self.assertEqual(matcher.tags("restocking"), {"stock"})
+        self.assertEqual(matcher.tags("spoon post"), set())
+        self.assertEqual(matcher.tags("cancel po 12"), {"po"})
+        hits = matcher.hits("low stock level")
+        self.assertEqual({(hit.start, hit.keyword) for hit in hits},
+                         {(0, "low stock"), (4, "stock"), (4, "stock level")})
+
+    def test_empty_matcher_finds_nothing(self):
+        self.assertEqual(KeywordMatcher([]).hits("anything"), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,113 @@
+"""Shared provider session: keep-alive reuse, pool sizing and connect/TTFB timings."""
+
+import json
+import os
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+import llm_http
+from ai_agent import AIAgent
+
+COMPLETION = {"choices": [{"message": {"role": "assistant", "content": "ok"}, "finish_reason": "stop"}],
+              "usage": {}}
+
+
+class StandInProvider(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+    connections = set()
+    response_delay = 0.0
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        type(self).connections.add(self.client_address)
+        time.sleep(type(self).response_delay)
+        body = json.dumps(COMPLETION).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class SharedSessionTests(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), StandInProvider)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base_url = f"http://127.0.0.1:{cls.server.server_port}"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        StandInProvider.connections = set()
+        StandInProvider.response_delay = 0.0
+        llm_http.reset_http_session()
+        self.addCleanup(llm_http.reset_http_session)
+        patcher = mock.patch.object(llm_http, "metrics", llm_http.LatencyMetrics())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _agent(self):
+        agent = AIAgent(api_key="test-key")
+        agent.base_url = self.base_url
+        return agent
+
+    def test_separate_agents_reuse_one_keep_alive_connection(self):
+        for _ in range(3):
+            self.assertIsNone(self._agent().chat("hello").error)
+        self.assertEqual(len(StandInProvider.connections), 1)
+        report = llm_http.latency_report()
+        self.assertEqual((report["calls"], report["new_connections"], report["reused_connections"]), (3, 1, 2))
+        self.assertGreater(report["request_bytes_p50"], 0)   # size of the JSON body sent
+
+    def test_connect_time_is_separated_from_time_to_first_byte(self):
+        StandInProvider.response_delay = 0.3
+        first = llm_http.post(f"{self.base_url}/chat/completions", json={}, timeout=5)
+        second = llm_http.post(f"{self.base_url}/chat/completions", json={}, timeout=5)
+        self.assertFalse(first.timings["reused_connection"])
+        self.assertLess(first.timings["connect_ms"], 300)
+        self.assertGreaterEqual(first.timings["ttfb_ms"], 300)
+        self.assertEqual(second.timings["connect_ms"], 0)
+        self.assertTrue(second.timings["reused_connection"])
+
+    def test_pool_size_comes_from_the_environment(self):
+        with mock.patch.dict(os.environ, {"AI_HTTP_POOL_SIZE": "3"}):
+            llm_http.reset_http_session()
+            adapter = llm_http.http_session().get_adapter("https://api.example.test")
+        self.assertEqual(adapter._pool_maxsize, 3)
+
+    def test_forked_process_gets_its_own_session(self):
+        parent = llm_http.http_session()
+        with mock.patch("llm_http.os.getpid", return_value=os.getpid() + 1):
+            child = llm_http.http_session()
+        self.assertIsNot(parent, child)
+
+    def test_concurrent_calls_share_the_session(self):
+        errors = []
+
+        def call():
+            try:
+                llm_http.post(f"{self.base_url}/chat/completions", json={}, timeout=5).raise_for_status()
+            except Exception as exc:
+                errors.append(exc)
+
+        threads = [threading.Thread(target=call) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(errors, [])
+        self.assertEqual(llm_http.latency_report()["calls"], 6)
+
+
+if __name__ == "__main__":
+    unittest.main()
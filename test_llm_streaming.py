@@ -0,0 +1,150 @@
+"""Streamed completions: SSE chunk assembly, tool-call deltas and time to first token."""
+
+import json
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+
+import requests
+
+import ai_agent
+from ai_agent import AIAgent
+
+
+def sse(chunk):
+    return f"data: {json.dumps(chunk)}\n\n".encode("utf-8")
+
+
+def content_delta(text):
+    return {"choices": [{"index": 0, "delta": {"content": text}, "finish_reason": None}]}
+
+
+TOOL_CALL_CHUNKS = [
+    {"choices": [{"index": 0, "delta": {"role": "assistant", "tool_calls": [
+        {"index": 0, "id": "call_1", "type": "function", "function": {"name": "get_sales_summary", "arguments": ""}}]}}]},
+    {"choices": [{"index": 0, "delta": {"tool_calls": [{"index": 0, "function": {"arguments": '{"per'}}]}}]},
+    {"choices": [{"index": 0, "delta": {"tool_calls": [
+        {"index": 1, "id": "call_2", "type": "function", "function": {"name": "get_low_stock", "arguments": "{}"}}]}}]},
+    {"choices": [{"index": 0, "delta": {"tool_calls": [{"index": 0, "function": {"arguments": 'iod": "today"}'}}]}}]},
+    {"choices": [{"index": 0, "delta": {}, "finish_reason": "tool_calls"}]},
+]
+
+
+class StandInProvider(BaseHTTPRequestHandler):
+    """Minimal OpenAI-compatible endpoint that streams whatever the test queued."""
+
+    protocol_version = "HTTP/1.1"  # chunked transfer, as real providers stream
+    chunks = []
+    delay_after_first = 0.0
+    requests_seen = []
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        type(self).requests_seen.append(body)
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for position, chunk in enumerate(type(self).chunks):
+            self._write_chunk(sse(chunk))
+            if position == 0 and self.delay_after_first:
+                time.sleep(self.delay_after_first)
+        self._write_chunk(b"data: [DONE]\n\n")
+        self._write_chunk(b"")
+
+    def _write_chunk(self, data):
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def log_message(self, *args):
+        pass
+
+
+class StreamingTests(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), StandInProvider)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base_url = f"http://127.0.0.1:{cls.server.server_port}"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        StandInProvider.chunks = []
+        StandInProvider.delay_after_first = 0.0
+        StandInProvider.requests_seen = []
+        self.agent = AIAgent(api_key="test-key")
+        self.agent.base_url = self.base_url
+
+    def test_content_tokens_are_forwarded_and_assembled(self):
+        StandInProvider.chunks = [content_delta("Sales "), content_delta("are "), content_delta("up 5%."),
+                                  {"choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}]
+        tokens = []
+        response = self.agent.chat("how are sales?", on_token=tokens.append)
+        self.assertIsNone(response.error)
+        self.assertEqual(tokens, ["Sales ", "are ", "up 5%."])
+        self.assertEqual(response.content, "Sales are up 5%.")
+        self.assertEqual(response.finish_reason, "stop")
+        self.assertTrue(StandInProvider.requests_seen[0]["stream"])
+
+    def test_tool_call_fragments_are_joined_per_index(self):
+        StandInProvider.chunks = TOOL_CALL_CHUNKS
+        response = self.agent.chat("sales today and low stock", stream=True)
+        calls = [(c.id, c.function_name, c.arguments) for c in response.tool_calls]
+        self.assertEqual(calls, [("call_1", "get_sales_summary", {"period": "today"}),
+                                 ("call_2", "get_low_stock", {})])
+
+    def test_first_token_arrives_before_the_rest_of_the_answer(self):
+        StandInProvider.chunks = [content_delta("Here is your summary"), content_delta(" of a long week.")]
+        StandInProvider.delay_after_first = 0.5
+        first_token_at = []
+        started = time.monotonic()
+        self.agent.chat("summarise", on_token=lambda text: first_token_at or first_token_at.append(time.monotonic()))
+        total = time.monotonic() - started
+        self.assertLess(first_token_at[0] - started, 0.3)
+        self.assertGreaterEqual(total, 0.5)
+
+    def test_provider_error_chunk_becomes_response_error(self):
+        StandInProvider.chunks = [{"error": {"message": "rate limited"}}]
+        response = self.agent.chat("hi", on_token=lambda text: None)
+        self.assertEqual(response.error, "API Error: rate limited")
+
+    def test_stream_dropped_after_tokens_is_not_retried(self):
+        def half_a_reply(response, on_token=None):
+            on_token("Sales are")
+            raise requests.exceptions.ConnectionError("connection reset")
+
+        tokens = []
+        with patch("ai_agent.read_stream", side_effect=half_a_reply) as reader, \
+                patch("time.sleep") as sleep:
+            response = self.agent.chat("how are sales?", on_token=tokens.append)
+        self.assertEqual(tokens, ["Sales are"])   # nothing replayed
+        self.assertEqual(reader.call_count, 1)
+        sleep.assert_not_called()
+        self.assertEqual(response.error, ai_agent.STREAM_INTERRUPTED_MESSAGE)
+
+    def test_stream_dropped_before_any_token_is_retried(self):
+        attempts = []
+
+        def flaky(response, on_token=None):
+            attempts.append(1)
+            if len(attempts) == 1:
+                raise requests.exceptions.ConnectionError("connection reset")
+            on_token("Sales are up.")
+            return {"choices": [{"message": {"content": "Sales are up."}, "finish_reason": "stop"}]}
+
+        tokens = []
+        with patch("ai_agent.read_stream", side_effect=flaky), patch("time.sleep"):
+            response = self.agent.chat("how are sales?", on_token=tokens.append)
+        self.assertIsNone(response.error)
+        self.assertEqual(tokens, ["Sales are up."])
+        self.assertEqual(len(attempts), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
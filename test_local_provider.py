@@ -0,0 +1,238 @@
+"""Provider configuration and an on-prem OpenAI-compatible server, end to end."""
+
+import threading
+import time
+import unittest
+from unittest import mock
+
+import agent_orchestrator
+import llm_http
+from agent_orchestrator import AgentOrchestrator
+from ai_agent import APIFREE_BASE_URL, AIAgent, ProviderConfig
+from app import app, db, AI_MODELS, AppSetting, Branch, User, get_setting
+from llm_standin import StandInLLM
+from plan_cache import plan_templates
+from tool_cache import result_cache
+
+
+class ProviderConfigTests(unittest.TestCase):
+    def test_environment_wins_over_settings(self):
+        settings = {"ai_base_url": "http://10.0.0.5:11434/v1", "ai_model": "llama3.2", "ai_max_concurrency": "2"}
+        config = ProviderConfig.load(lambda key, default="": settings.get(key, default),
+                                     env={"AI_MODEL": "qwen2.5:7b", "AI_TIMEOUT_SECONDS": "20"})
+        self.assertEqual(config.base_url, "http://10.0.0.5:11434/v1")
+        self.assertEqual(config.model, "qwen2.5:7b")
+        self.assertEqual(config.timeout_seconds, 20.0)
+        self.assertEqual(config.max_concurrency, 2)
+        self.assertFalse(config.requires_api_key)
+
+    def test_hosted_key_is_only_sent_to_the_hosted_host(self):
+        env = {"APIFREE_API_KEY": "hosted-secret-1234"}
+        hosted = ProviderConfig.load(env=env)
+        self.assertEqual(hosted.effective_api_key, "hosted-secret-1234")
+        self.assertEqual(ProviderConfig.load(env={**env, "AI_BASE_URL": "https://api.apifree.ai/v2"}).effective_api_key,
+                         "hosted-secret-1234")
+        for base_url in ("http://10.0.0.5:11434/v1", "https://api.apifree.ai.evil.example/v1"):
+            with self.subTest(base_url=base_url):
+                config = ProviderConfig.load(env={**env, "AI_BASE_URL": base_url})
+                self.assertEqual(config.effective_api_key, "")
+                self.assertEqual(AIAgent(config=config).api_key, "")
+        gateway = ProviderConfig.load(env={**env, "AI_BASE_URL": "https://gw.example/v1", "AI_API_KEY": "gw-key"})
+        self.assertEqual(gateway.effective_api_key, "gw-key")
+
+    def test_defaults_and_invalid_values(self):
+        config = ProviderConfig.load(env={"AI_TIMEOUT_SECONDS": "soon", "AI_MAX_CONCURRENCY": "-3"})
+        self.assertEqual(config.base_url, APIFREE_BASE_URL)
+        self.assertEqual(config.timeout_seconds, 60.0)
+        self.assertEqual(config.max_concurrency, 0)
+        self.assertTrue(config.requires_api_key)
+
+
+class StandInServerTests(unittest.TestCase):
+    def setUp(self):
+        self.standin = StandInLLM(delay=0.05).start()
+        self.addCleanup(self.standin.stop)
+        self.config = ProviderConfig(base_url=self.standin.base_url, model="llama3.2", timeout_seconds=10)
+        self.addCleanup(llm_http.concurrency.set_limit, 0)
+
+    def test_chat_and_planner_share_one_client(self):
+        orchestrator = AgentOrchestrator(None, {})
+        orchestrator.agent = AIAgent(config=self.config)
+        orchestrator._setup_agent()
+        orchestrator.set_request_context({"branch_id": 1, "user_id": 1, "role": "manager"})
+        self.assertIsNone(orchestrator.agent.chat("hello").error)
+        self.assertIsNone(orchestrator._planner_chat("plan this").error)
+        self.assertEqual(len(self.standin.requests), 2)
+        for request in self.standin.requests:
+            self.assertEqual(request["path"], "/v1/chat/completions")
+            self.assertEqual(request["body"]["model"], "llama3.2")
+            self.assertIsNone(request["authorization"])   # a local server needs no key
+        self.assertEqual(orchestrator.get_status()["status"], "ready")
+
+    def test_script_replays_plan_tool_calls_and_answer(self):
+        self.standin.script = {"plan": {"description": "d", "steps": []},
+                               "tool_calls": [{"name": "get_low_stock_items"},
+                                              {"name": "get_sales_summary", "arguments": {"days": 7}}],
+                               "answer": "All good."}
+        tools = lambda *names: [{"type": "function", "function": {"name": n}} for n in names]
+        question = [{"role": "user", "content": "q"}]
+        plan, _ = self.standin.reply({"messages": question, "tools": tools("propose_plan")})
+        self.assertEqual(plan["tool_calls"][0]["function"]["name"], "propose_plan")
+        calls, finish = self.standin.reply({"messages": question, "tools": tools("get_sales_summary")})
+        self.assertEqual(finish, "tool_calls")
+        self.assertEqual([c["function"]["name"] for c in calls["tool_calls"]],
+                         ["get_low_stock_items", "get_sales_summary"])
+        answered = question + [{"role": "tool", "content": "{}"}]
+        self.assertEqual(self.standin.reply({"messages": answered, "tools": tools("get_sales_summary")})[0]["content"],
+                         "All good.")
+
+    def test_concurrency_limit_queues_extra_calls(self):
+        limited = ProviderConfig(base_url=self.standin.base_url, model="llama3.2", max_concurrency=1)
+        llm_http.concurrency.set_limit(1)   # app.apply_ai_concurrency_limit, once per worker
+        before = llm_http.concurrency.report()["waited"]
+        errors = []
+
+        def ask():
+            errors.append(AIAgent(config=limited).chat("hello").error)
+
+        threads = [threading.Thread(target=ask) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [None, None, None])
+        self.assertEqual(self.standin.peak_in_flight, 1)
+        self.assertGreaterEqual(llm_http.concurrency.report()["waited"] - before, 1)
+
+    def test_busy_provider_is_reported_when_the_turn_has_no_time_left(self):
+        limit = llm_http.ConcurrencyLimit(1)
+        with limit.slot():
+            with llm_http.turn_deadline(0.05), self.assertRaises(llm_http.ProviderBusy):
+                with limit.slot():
+                    pass
+        self.assertEqual(limit.report()["rejected"], 1)
+
+    def test_full_slots_are_busy_not_unavailable(self):
+        orchestrator = AgentOrchestrator(None, {})
+        orchestrator.agent = AIAgent(config=ProviderConfig(base_url=self.standin.base_url, model="llama3.2",
+                                                           max_concurrency=1))
+        llm_http.concurrency.set_limit(1)
+        orchestrator._setup_agent()
+        orchestrator.set_request_context({"branch_id": 1, "user_id": 1, "role": "manager"})
+        with llm_http.concurrency.slot():
+            self.assertEqual(orchestrator.get_status()["status"], "busy")
+            with llm_http.turn_deadline(0.05):
+                response = orchestrator.agent.chat("hello")
+            self.assertTrue(response.busy)
+            self.assertFalse(response.unavailable)
+            with mock.patch.object(orchestrator, "_fast_path_answer", return_value=None), \
+                 mock.patch.object(orchestrator, "_should_plan", return_value=False), \
+                 mock.patch.object(orchestrator.agent, "chat", return_value=response):
+                result = orchestrator.process_command("hello", user_id=1)
+        self.assertFalse(result["success"])
+        self.assertTrue(result["busy"])
+        self.assertNotIn("degraded", result)
+        self.assertEqual(result["answer_path"], "busy")
+        self.assertTrue(llm_http.provider_available())
+        self.assertEqual(orchestrator.get_status()["status"], "ready")
+
+
+class LocalProviderTurnTests(unittest.TestCase):
+    """A whole chat turn (tool call, tool run, answer) against the local stand-in."""
+
+    def setUp(self):
+        app.config.update(TESTING=True)
+        agent_orchestrator.reset_orchestrator()
+        plan_templates.clear()
+        result_cache.invalidate()
+        self.addCleanup(agent_orchestrator.reset_orchestrator)
+        self.addCleanup(result_cache.invalidate)
+        self.standin = StandInLLM(delay=0.02, answer="Sales are steady this week.").start()
+        self.addCleanup(self.standin.stop)
+        with app.app_context():
+            self.user_id = User.query.filter_by(username='admin').first().id
+            self.branch_id = Branch.query.filter_by(is_active=True).first().id
+
+    def test_turn_runs_against_the_local_server(self):
+        env = {"AI_BASE_URL": self.standin.base_url, "AI_MODEL": "llama3.2", "APIFREE_API_KEY": ""}
+        with mock.patch.dict("os.environ", env), app.app_context():
+            orchestrator = AgentOrchestrator(db, AI_MODELS, get_setting, app)
+            orchestrator.set_request_context({"branch_id": self.branch_id, "user_id": self.user_id,
+                                              "role": "manager"})
+            with mock.patch.object(orchestrator, "_should_plan", return_value=False):
+                started = time.perf_counter()
+                result = orchestrator.process_command("how are sales doing, and why?", user_id=self.user_id)
+                elapsed_ms = (time.perf_counter() - started) * 1000
+        self.assertTrue(result["success"], msg=result.get("message"))
+        self.assertEqual(result["answer_path"], "llm")
+        self.assertEqual([r["function_name"] for r in result["tool_results"]], ["get_sales_summary"])
+        self.assertTrue(self.standin.requests)
+        self.assertEqual({r["body"]["model"] for r in self.standin.requests}, {"llama3.2"})
+        # Each simulated model round trip takes 20 ms; the rest is local work.
+        self.assertLess(result["latency_ms"], elapsed_ms + 1)
+        self.assertGreaterEqual(result["latency_ms"], 20 * len(self.standin.requests))
+
+
+class ProviderSettingsApiTests(unittest.TestCase):
+    KEYS = ('ai_base_url', 'ai_model', 'ai_timeout_seconds', 'ai_max_concurrency', 'ai_base_url_api_key')
+
+    def setUp(self):
+        app.config.update(TESTING=True)
+        self.addCleanup(self._clear)
+        self.addCleanup(agent_orchestrator.reset_orchestrator)
+        with app.app_context():
+            self.user_id = User.query.filter_by(username='admin').first().id
+            self.branch_id = Branch.query.filter_by(is_active=True).first().id
+        self.client = app.test_client()
+        with self.client.session_transaction() as session:
+            session['user_id'] = self.user_id
+            session['role'] = 'manager'
+            session['branch_id'] = self.branch_id
+
+    def _clear(self):
+        with app.app_context():
+            AppSetting.query.filter(AppSetting.key.in_(self.KEYS)).delete(synchronize_session=False)
+            db.session.commit()
+
+    def test_manager_points_loli_at_an_on_prem_server(self):
+        provider = {"base_url": "http://192.168.1.20:11434/v1/", "model": "llama3.2",
+                    "timeout_seconds": "30", "max_concurrency": "2"}
+        with mock.patch.dict("os.environ", {"AI_BASE_URL": "", "AI_MODEL": "",
+                                            "AI_TIMEOUT_SECONDS": "", "AI_MAX_CONCURRENCY": ""}):
+            body = self.client.put('/api/settings', json={"ai_provider": provider}).get_json()
+            self.assertTrue(body["success"], msg=body)
+            self.assertEqual(body["ai_provider"], {"base_url": "http://192.168.1.20:11434/v1", "model": "llama3.2",
+                                                   "timeout_seconds": 30.0, "max_concurrency": 2,
+                                                   "api_key_configured": False})
+            self.assertEqual(self.client.get('/api/settings').get_json()["ai_provider"]["model"], "llama3.2")
+            self.assertEqual(llm_http.concurrency.limit, 2)
+            AIAgent(config=ProviderConfig(max_concurrency=5))   # agents do not change the worker's limit
+            self.assertEqual(llm_http.concurrency.limit, 2)
+            body = self.client.put('/api/settings', json={"ai_provider": {"model": ""}}).get_json()
+            self.assertEqual(body["ai_provider"]["model"], "deepseek-ai/deepseek-v4-pro-stable")
+        llm_http.concurrency.set_limit(0)
+
+    def test_key_for_a_base_url_is_dropped_when_the_url_changes(self):
+        with mock.patch.dict("os.environ", {"AI_BASE_URL": "", "AI_API_KEY": ""}):
+            body = self.client.put('/api/settings', json={"ai_provider": {
+                "base_url": "https://gateway.example/v1", "api_key": "gw-secret-123"}}).get_json()
+            self.assertTrue(body["ai_provider"]["api_key_configured"])
+            with app.app_context():
+                stored = AppSetting.query.filter_by(key='ai_base_url_api_key').first().value
+                self.assertNotIn("gw-secret", stored)   # encrypted at rest
+                self.assertEqual(get_setting('ai_base_url_api_key'), "gw-secret-123")
+            body = self.client.put('/api/settings', json={"ai_provider": {"model": "gpt-4o-mini"}}).get_json()
+            self.assertTrue(body["ai_provider"]["api_key_configured"])
+            body = self.client.put('/api/settings', json={"ai_provider": {
+                "base_url": "http://10.0.0.9:8080/v1"}}).get_json()
+            self.assertFalse(body["ai_provider"]["api_key_configured"])
+
+    def test_invalid_provider_settings_are_rejected(self):
+        for provider in ({"base_url": "ftp://models"}, {"timeout_seconds": "0"}, {"max_concurrency": "lots"}):
+            with self.subTest(provider=provider):
+                response = self.client.put('/api/settings', json={"ai_provider": provider})
+                self.assertEqual(response.status_code, 400)
+
+
+if __name__ == "__main__":
+    unittest.main()
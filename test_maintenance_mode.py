@@ -0,0 +1,83 @@
+"""Read-only maintenance mode: marker lifecycle and write rejection in the app."""
+
+import json
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import app as app_module
+from app import app, Branch, User
+from maintenance import maintenance_marker_path, maintenance_status, read_only_maintenance
+
+
+class MaintenanceMarkerTests(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.db_path = os.path.join(self.tmpdir.name, 'pos.db')
+
+    def test_marker_exists_only_inside_block(self):
+        self.assertIsNone(maintenance_status(self.db_path))
+        with read_only_maintenance(self.db_path, 'money column migration'):
+            status = maintenance_status(self.db_path)
+            self.assertEqual(status['reason'], 'money column migration')
+            self.assertEqual(status['pid'], os.getpid())
+        self.assertIsNone(maintenance_status(self.db_path))
+        self.assertFalse(os.path.exists(maintenance_marker_path(self.db_path)))
+
+    def test_second_holder_is_refused(self):
+        with read_only_maintenance(self.db_path, 'first'):
+            with self.assertRaises(RuntimeError):
+                with read_only_maintenance(self.db_path, 'second'):
+                    pass
+            self.assertEqual(maintenance_status(self.db_path)['reason'], 'first')
+
+    def test_marker_of_dead_process_is_ignored_and_taken_over(self):
+        with open(maintenance_marker_path(self.db_path), 'w', encoding='utf-8') as handle:
+            json.dump({'reason': 'crashed', 'pid': 2 ** 22 + 12345}, handle)
+        self.assertIsNone(maintenance_status(self.db_path))
+        with read_only_maintenance(self.db_path, 'resumed'):
+            self.assertEqual(maintenance_status(self.db_path)['reason'], 'resumed')
+
+
+@unittest.skipUnless(app_module.database_backend.file_based, 'SQLite-only: the marker sits next to the database file')
+class MaintenanceRequestTests(unittest.TestCase):
+    def setUp(self):
+        app.config.update(TESTING=True)
+        with app.app_context():
+            self.user_id = User.query.filter_by(username='admin').first().id
+            self.branch_id = Branch.query.filter_by(is_active=True).first().id
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.db_path = os.path.join(self.tmpdir.name, 'pos.db')
+        sqlite3.connect(self.db_path).close()
+        patcher = patch('app.resolve_database_file_path', return_value=self.db_path)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _client(self):
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['user_id'] = self.user_id
+            session['role'] = 'manager'
+            session['branch_id'] = self.branch_id
+        return client
+
+    def test_reads_are_served_and_writes_rejected(self):
+        client = self._client()
+        with read_only_maintenance(self.db_path, 'money column migration'):
+            self.assertEqual(client.get('/api/branches/current').status_code, 200)
+            response = client.post('/api/settings/database_restore', data={})
+            self.assertEqual(response.status_code, 503)
+            self.assertEqual(response.headers['Retry-After'], '30')
+            self.assertEqual(response.get_json()['maintenance'], 'money column migration')
+            pools = client.get('/api/settings/database_pools').get_json()
+            self.assertEqual(pools['maintenance']['reason'], 'money column migration')
+        # Without the marker the same request reaches the view (no file attached -> 400).
+        self.assertEqual(client.post('/api/settings/database_restore', data={}).status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,4 +1,4 @@
-"""Tests for money math helpers and the Float -> NUMERIC(12,2) migration.
+"""Tests for money math helpers and the Float -> INTEGER cents migration.
 
 Pure helper functions are imported from app.py (import does not touch
 instance/pos.db: db.create_all() only runs inside explicit init functions).
@@ -12,10 +12,18 @@ import pytest
 
 from app import money_float, round_money, safe_to_decimal, to_decimal
 from migrate_money_columns import (
+    INTEGER_TYPES,
     MONEY_COLUMNS,
+    PROGRESS_TABLE,
     build_new_create_sql,
+    cents_expr,
+    create_sql,
+    load_progress,
     needs_migration,
+    pending_tables,
     rename_table_in_create_sql,
+    run_migration,
+    sums_match,
     table_columns,
 )
 
@@ -185,8 +193,7 @@ def test_migration_preserves_sums_and_counts(tmp_path):
         new_sql = build_new_create_sql(orig_sql, cols)
         all_cols = [c for c, *_ in table_columns(conn, table)]
         col_list = ", ".join(f'"{c}"' for c in all_cols)
-        cast_list = ", ".join(
-            f'CAST("{c}" AS NUMERIC(12, 2))' if c in cols else f'"{c}"' for c in all_cols)
+        cast_list = ", ".join(cents_expr(c) if c in cols else f'"{c}"' for c in all_cols)
         conn.execute(f'DROP TABLE IF EXISTS "{table}_new"')
         conn.execute(rename_table_in_create_sql(new_sql, table, f"{table}_new"))
         conn.execute(f'INSERT INTO "{table}_new" ({col_list}) SELECT {cast_list} FROM "{table}"')
@@ -195,7 +202,7 @@ def test_migration_preserves_sums_and_counts(tmp_path):
         for c in cols:
             old_s = conn.execute(f'SELECT COALESCE(SUM("{c}"),0) FROM "{table}"').fetchone()[0] or 0
             new_s = conn.execute(f'SELECT COALESCE(SUM("{c}"),0) FROM "{table}_new"').fetchone()[0] or 0
-            assert abs(old_s - new_s) < 0.005
+            assert sums_match(old_s, new_s, new_n)
         conn.execute(f'DROP TABLE IF EXISTS "{table}_float_backup"')
         conn.execute(f'ALTER TABLE "{table}" RENAME TO "{table}_float_backup"')
         conn.execute(f'ALTER TABLE "{table}_new" RENAME TO "{table}"')
@@ -203,18 +210,162 @@ def test_migration_preserves_sums_and_counts(tmp_path):
     conn.commit()
 
     types = {n: t for n, t, _, _ in table_columns(conn, "product")}
-    assert all(types[c].startswith("NUMERIC") for c in ("price", "cost", "tax_rate"))
+    assert all(types[c] in INTEGER_TYPES for c in ("price", "cost", "tax_rate"))
     assert not needs_migration(conn, "product", ["price", "cost", "tax_rate"])
 
     new_prod_sum = conn.execute("SELECT SUM(price)+SUM(cost)+SUM(tax_rate) FROM product").fetchone()[0]
-    assert abs(old_prod_sum - new_prod_sum) < 0.005
+    assert sums_match(old_prod_sum, new_prod_sum, 3 * 50)
     assert conn.execute("SELECT COUNT(*) FROM sale_item").fetchone()[0] == old_n_items
     new_item_sum = conn.execute("SELECT SUM(price)+SUM(tax) FROM sale_item").fetchone()[0]
-    assert abs(old_item_sum - new_item_sum) < 0.005
+    assert sums_match(old_item_sum, new_item_sum, 2 * old_n_items)
     conn.close()
     assert migrated == ["product", "sale_item"]
 
 
+def test_unconverted_tables_are_served_as_units_while_migrating(tmp_path, monkeypatch):
+    import money
+    from sqlalchemy import Column, Integer, String, create_engine, inspect, select
+    from sqlalchemy.orm import Session, declarative_base
+    from migrate_money_columns import MONEY_STORAGE_EVENT, unconverted_tables
+
+    monkeypatch.setenv("SHARED_STATE_PATH", str(tmp_path / "shared_state.db"))
+    monkeypatch.setattr(money, "_unconverted_tables", frozenset())
+    Base = declarative_base()
+
+    class Product(Base):
+        __tablename__ = "product"
+        id = Column(Integer, primary_key=True)
+        name = Column(String(100))
+        price = Column(money.Money)
+
+    money.bind_money_columns(Base.metadata)
+    db = tmp_path / "m.db"
+    conn = sqlite3.connect(str(db))
+    _seed(conn)
+    conn.close()
+    engine = create_engine(f"sqlite:///{db}")
+
+    def price_of(name):
+        with Session(engine) as session:
+            return session.execute(select(Product.price).where(Product.name == name)).scalar_one()
+
+    def set_price(name, value):
+        with Session(engine) as session:
+            session.execute(select(Product).where(Product.name == name)).scalar_one().price = value
+            session.commit()
+        conn = sqlite3.connect(str(db))
+        try:
+            return conn.execute("SELECT price FROM product WHERE name = ?", (name,)).fetchone()[0]
+        finally:
+            conn.close()
+
+    money.set_unconverted_tables(unconverted_tables(inspect(engine)))
+    assert money.unconverted_tables() == {"product", "sale_item"}
+    assert price_of("P2") == 20.01
+    assert set_price("P3", 31.5) == 31.5
+
+    assert run_migration(db_path=db) == 0
+    events = sqlite3.connect(str(tmp_path / "shared_state.db"))
+    assert events.execute("SELECT COUNT(*) FROM event WHERE topic = ?", (MONEY_STORAGE_EVENT,)).fetchone()[0] == 2
+    events.close()
+
+    money.set_unconverted_tables(unconverted_tables(inspect(engine)))
+    assert money.unconverted_tables() == set()
+    assert price_of("P2") == 20.01
+    assert set_price("P3", 32) == 3200
+    engine.dispose()
+
+
+def test_numeric_columns_holding_whole_amounts_read_as_units(tmp_path, monkeypatch):
+    import money
+    from sqlalchemy import Column, Integer, create_engine, func, inspect, select
+    from sqlalchemy.orm import Session, declarative_base
+    from migrate_money_columns import unconverted_tables
+
+    monkeypatch.setattr(money, "_unconverted_tables", frozenset())
+    Base = declarative_base()
+
+    class Debt(Base):
+        __tablename__ = "debt"
+        id = Column(Integer, primary_key=True)
+        amount = Column(money.Money)
+
+    money.bind_money_columns(Base.metadata)
+    db = tmp_path / "n.db"
+    conn = sqlite3.connect(str(db))
+    conn.execute("CREATE TABLE debt (id INTEGER PRIMARY KEY, amount NUMERIC(12, 2))")
+    conn.executemany("INSERT INTO debt (amount) VALUES (?)", [(5.00,), (2.5,), (10,)])
+    conn.commit()
+    # NUMERIC affinity stores the whole amounts as INTEGER.
+    assert conn.execute("SELECT typeof(amount) FROM debt ORDER BY id").fetchall() == [
+        ("integer",), ("real",), ("integer",)]
+    conn.close()
+    engine = create_engine(f"sqlite:///{db}")
+    money.set_unconverted_tables(unconverted_tables(inspect(engine)))
+    assert money.unconverted_tables() == {"debt"}
+    with Session(engine) as session:
+        assert session.execute(select(Debt.amount).order_by(Debt.id)).scalars().all() == [5.0, 2.5, 10.0]
+        assert session.execute(select(func.sum(Debt.amount))).scalar() == 17.5
+    engine.dispose()
+
+
+def test_run_migration_converts_file_and_is_idempotent(tmp_path):
+    db = tmp_path / "m.db"
+    conn = sqlite3.connect(str(db))
+    _seed(conn)
+    assert pending_tables(conn) == ["product", "sale_item"]
+    conn.close()
+
+    assert run_migration(db_path=db) == 0
+
+    conn = sqlite3.connect(str(db))
+    assert pending_tables(conn) == []
+    assert conn.execute("SELECT price FROM product WHERE name = 'P2'").fetchone()[0] == 2001
+    assert conn.execute("SELECT price, tax FROM sale_item WHERE quantity = 3").fetchone() == (2997, 99)
+    assert conn.execute("SELECT COUNT(*) FROM product_float_backup").fetchone()[0] == 50
+    assert create_sql(conn, PROGRESS_TABLE) is None
+    conn.close()
+    assert not list(tmp_path.glob("m_pre_cents_*.db"))
+    assert not (tmp_path / "m.db.maintenance").exists()
+
+    assert run_migration(db_path=db) == 0
+    conn = sqlite3.connect(str(db))
+    assert conn.execute("SELECT price FROM product WHERE name = 'P2'").fetchone()[0] == 2001
+    conn.close()
+
+
+def _indexes(conn, table):
+    return sorted(row[1] for row in conn.execute(f'PRAGMA index_list("{table}")') if row[3] == "c")
+
+
+def test_swap_keeps_foreign_keys_and_indexes_on_the_live_table(tmp_path, monkeypatch):
+    import migrate_money_columns
+
+    db = tmp_path / "m.db"
+    conn = sqlite3.connect(str(db))
+    _seed(conn)
+    conn.executescript("""
+        CREATE INDEX idx_product_name ON product (name);
+        CREATE TABLE stock_note (id INTEGER PRIMARY KEY, product_id INTEGER REFERENCES product (id));
+    """)
+    conn.close()
+
+    assert run_migration(db_path=db) == 0
+    conn = sqlite3.connect(str(db))
+    assert [row[2] for row in conn.execute('PRAGMA foreign_key_list("stock_note")')] == ["product"]
+    assert _indexes(conn, "product") == ["idx_product_name"]
+    assert _indexes(conn, "product_float_backup") == []
+    conn.close()
+
+    monkeypatch.setattr(migrate_money_columns, "DB_PATH", db)
+    assert migrate_money_columns.run_restore() == 0
+    conn = sqlite3.connect(str(db))
+    assert [row[2] for row in conn.execute('PRAGMA foreign_key_list("stock_note")')] == ["product"]
+    assert _indexes(conn, "product") == ["idx_product_name"]
+    assert pending_tables(conn) == ["product", "sale_item"]
+    conn.close()
+
+
 def test_money_column_map_matches_expected_tables():
     expected = {
         "product": {"price", "cost", "tax_rate"},
@@ -234,3 +385,109 @@ def test_money_column_map_matches_expected_tables():
     }
     assert {t: set(c) for t, c in MONEY_COLUMNS.items()} == expected
 
+
+def test_run_migration_resumes_after_interruption(tmp_path, monkeypatch):
+    import migrate_money_columns
+
+    db = tmp_path / "m.db"
+    conn = sqlite3.connect(str(db))
+    _seed(conn)
+    conn.close()
+
+    real_copy_chunk = migrate_money_columns.copy_chunk
+    calls = {"n": 0}
+
+    def flaky_copy_chunk(*args, **kwargs):
+        calls["n"] += 1
+        if calls["n"] == 4:
+            raise KeyboardInterrupt
+        return real_copy_chunk(*args, **kwargs)
+
+    monkeypatch.setattr(migrate_money_columns, "copy_chunk", flaky_copy_chunk)
+    with pytest.raises(KeyboardInterrupt):
+        run_migration(db_path=db, chunk_size=15)
+
+    conn = sqlite3.connect(str(db))
+    assert load_progress(conn, "product") == (45, 45)
+    assert conn.execute("SELECT COUNT(*) FROM product_new").fetchone()[0] == 45
+    conn.close()
+
+    monkeypatch.setattr(migrate_money_columns, "copy_chunk", real_copy_chunk)
+    assert run_migration(db_path=db, chunk_size=15) == 0
+
+    conn = sqlite3.connect(str(db))
+    assert pending_tables(conn) == []
+    assert conn.execute("SELECT COUNT(*), COUNT(DISTINCT id) FROM product").fetchone() == (50, 50)
+    assert conn.execute("SELECT price FROM product WHERE name = 'P2'").fetchone()[0] == 2001
+    conn.close()
+
+
+def test_run_migration_discards_chunk_that_fails_verification(tmp_path, monkeypatch):
+    import migrate_money_columns
+
+    db = tmp_path / "m.db"
+    conn = sqlite3.connect(str(db))
+    _seed(conn)
+    conn.close()
+
+    monkeypatch.setattr(migrate_money_columns, "cents_expr", lambda c: f'CAST("{c}" AS INTEGER)')
+    assert run_migration(db_path=db, chunk_size=15) == 2
+
+    conn = sqlite3.connect(str(db))
+    assert pending_tables(conn) == ["product", "sale_item"]
+    assert create_sql(conn, "product_new") is None
+    assert load_progress(conn, "product") is None
+    assert conn.execute("SELECT price FROM product WHERE name = 'P2'").fetchone()[0] == 20.01
+    conn.close()
+
+
+def test_dry_run_reports_chunks_without_writing(tmp_path, capsys):
+    db = tmp_path / "m.db"
+    conn = sqlite3.connect(str(db))
+    _seed(conn)
+    conn.close()
+
+    assert run_migration(db_path=db, dry_run=True, chunk_size=15) == 0
+    assert "50 rows in 4 chunks" in capsys.readouterr().out
+    conn = sqlite3.connect(str(db))
+    assert pending_tables(conn) == ["product", "sale_item"]
+    assert create_sql(conn, PROGRESS_TABLE) is None
+    conn.close()
+
+
+def test_top_products_reads_an_unconverted_sale_item_table_as_units(monkeypatch):
+    import uuid
+
+    import money
+    from app import app, db, Branch, Product, Sale, SaleItem, User
+
+    app.config.update(TESTING=True)
+    with app.app_context():
+        user_id = User.query.filter_by(username='admin').first().id
+        branch_id = Branch.query.filter_by(is_active=True).first().id
+        product = Product(name=f"Units Tea {uuid.uuid4().hex[:6]}", price=2.5, stock=1, branch_id=branch_id)
+        db.session.add(product)
+        db.session.commit()
+        product_id = product.id
+    # Before the migrator reaches sale_item, its line prices hold whole units.
+    monkeypatch.setattr(money, "_unconverted_tables", frozenset({"sale_item"}))
+    sale_id = None
+    try:
+        with app.app_context():
+            sale = Sale(transaction_id=str(uuid.uuid4()), total=7.5, tax=0, branch_id=branch_id, user_id=user_id)
+            db.session.add(sale)
+            db.session.flush()
+            db.session.add(SaleItem(sale_id=sale.id, product_id=product_id, quantity=100_000, price=2.5, tax=0))
+            db.session.commit()
+            sale_id = sale.id
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session.update(user_id=user_id, role='manager', branch_id=branch_id)
+        rows = client.get('/api/dashboard/top_products').get_json()
+        assert {row['id']: row['sales_amount'] for row in rows}[product_id] == 250_000.0
+    finally:
+        with app.app_context():
+            SaleItem.query.filter_by(sale_id=sale_id).delete()
+            Sale.query.filter_by(id=sale_id).delete()
+            Product.query.filter_by(id=product_id).delete()
+            db.session.commit()
@@ -0,0 +1,199 @@
+"""BM25 recall over the SQLite memory registry when Mem0 is not configured."""
+
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from sqlalchemy.exc import OperationalError
+from werkzeug.security import generate_password_hash
+
+import app as app_module
+from ai_memory_service import MemoryService, VectorIndex, get_memory_service
+from app import app, db, Branch, MemoryAudit, MemoryEmbedding, MemoryRegistry, User
+
+
+class ConceptEmbedder:
+    """Deterministic stand-in for a local embedding model: one axis per concept."""
+
+    model = "concepts"
+    CONCEPTS = (("drink", "soda", "cola", "beverage"), ("report", "summary", "weekly"),
+                ("supplier", "vendor", "acme"), ("tea", "leaf"))
+
+    def __call__(self, texts):
+        return [[sum(word.strip('.,?"') in group for word in text.lower().split()) + 0.01
+                 for group in self.CONCEPTS] for text in texts]
+
+
+class RegistrySearchTests(unittest.TestCase):
+    def setUp(self):
+        app.config.update(TESTING=True)
+        with app.app_context():
+            self.user_id = User.query.filter_by(username='admin').first().id
+            self.branch_id = Branch.query.filter_by(is_active=True).first().id
+            peer = User.query.filter_by(username='memory-peer').first()
+            if peer is None:
+                peer = User(username='memory-peer', password=generate_password_hash('x'), role='cashier')
+                db.session.add(peer)
+                db.session.commit()
+            self.peer_id = peer.id
+        self.addCleanup(self._clear)
+        self._clear()
+        self.service = MemoryService(enabled=False, db=db, registry_model=MemoryRegistry, audit_model=MemoryAudit)
+
+    def _clear(self):
+        with app.app_context():
+            MemoryEmbedding.query.delete()
+            MemoryAudit.query.delete()
+            MemoryRegistry.query.delete()
+            db.session.commit()
+
+    def _add(self, memory_id, summary, user_id=None, scope='private'):
+        db.session.add(MemoryRegistry(memory_id=memory_id, user_id=user_id or self.user_id,
+                                      branch_id=self.branch_id, scope=scope, summary=summary, source='manual'))
+        db.session.commit()
+
+    def _recall(self, query, **kwargs):
+        return [item['id'] for item in self.service.retrieve(
+            query, user_id=self.user_id, branch_id=self.branch_id, **kwargs)]
+
+    def test_ranks_matches_and_filters_visibility_in_sql(self):
+        with app.app_context():
+            self._add('weekly', 'Send the weekly sales report on Mondays')
+            self._add('supplier', 'Acme is the preferred supplier for drinks')
+            self._add('shared', 'Sales reports go to the branch owner', scope='branch_shared')
+            self._add('peer', 'Peer wants sales reports daily', user_id=self.peer_id)
+            self.assertEqual(self._recall('weekly sales report', limit=2), ['weekly', 'shared'])
+            self.assertEqual(self._recall('sales reports', scope='branch_shared'), ['shared'])
+            self.assertNotIn('peer', self._recall('peer sales reports daily'))
+
+    def test_index_follows_edits_and_deletes(self):
+        with app.app_context():
+            self._add('alias', 'Call Coca-Cola "coke"')
+            MemoryRegistry.query.filter_by(memory_id='alias').update({'summary': 'Call Pepsi "soda"'})
+            db.session.commit()
+            self.assertEqual(self._recall('soda', limit=1), ['alias'])
+            self.assertEqual(db.session.execute(db.text(
+                "SELECT count(*) FROM memory_registry_fts WHERE memory_registry_fts MATCH 'coke'")).scalar(), 0)
+            MemoryRegistry.query.filter_by(memory_id='alias').delete()
+            db.session.commit()
+            self.assertEqual(self._recall('soda'), [])
+
+    def test_unmatched_command_still_recalls_recent_memories(self):
+        with app.app_context():
+            self._add('concise', 'I prefer concise answers')
+            self._add('tea', 'Tea is stocked on shelf three')
+            self.assertEqual(self._recall('hello', limit=5), ['tea', 'concise'])
+            self.assertEqual(self._recall('tea "OR" NEAR(', limit=5), ['tea', 'concise'])
+
+    def test_failing_index_falls_back_to_the_word_scan(self):
+        with app.app_context():
+            self._add('weekly', 'Send the weekly sales report on Mondays')
+            self.assertEqual(self._recall('weekly report', limit=1), ['weekly'])
+            execute = db.session.execute
+
+            def missing_index(statement, *args, **kwargs):
+                if 'MATCH' in str(statement):
+                    raise OperationalError(str(statement), {}, Exception('no such table: memory_registry_fts'))
+                return execute(statement, *args, **kwargs)
+
+            with mock.patch.object(db.session, 'execute', side_effect=missing_index):
+                self.assertEqual(self._recall('weekly report', limit=1), ['weekly'])
+            self.assertNotIn('memory_registry', self.service._fts_tables)
+            self.assertEqual(self._recall('weekly report', limit=1), ['weekly'])
+
+    def test_database_swap_reinstalls_the_index(self):
+        with app.app_context():
+            service = get_memory_service()
+            service._fts_tables['memory_registry'] = True
+            app_module.refresh_memory_search()
+            self.assertEqual(service._fts_tables, {})
+            if app_module.database_backend.supports_full_text_search:
+                self.assertEqual(db.session.execute(db.text(
+                    "SELECT count(*) FROM sqlite_master WHERE name = 'memory_registry_fts'")).scalar(), 1)
+
+
+class VectorRecallTests(RegistrySearchTests):
+    def setUp(self):
+        super().setUp()
+        self.directory = tempfile.mkdtemp(prefix="memory_vectors_")
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        self.service = MemoryService(enabled=False, db=db, registry_model=MemoryRegistry, audit_model=MemoryAudit,
+                                     embedding_model=MemoryEmbedding,
+                                     vector_index=VectorIndex(self.directory, ConceptEmbedder()))
+
+    def _remember(self, content, user_id=None, scope='private'):
+        saved = self.service.remember(content, user_id=user_id or self.user_id, branch_id=self.branch_id, scope=scope)
+        db.session.commit()
+        return saved["memory_id"]
+
+    def test_recall_by_meaning_is_scoped_and_survives_a_lost_index(self):
+        with app.app_context():
+            vendor = self._remember("Acme is our vendor")
+            drinks = self._remember("Cola beverage shelf is by the door", scope='branch_shared')
+            self._remember("Soda deliveries come on Friday", user_id=self.peer_id)
+            self.assertEqual(self._recall("where is the soda?", limit=1), [drinks])
+            self.assertEqual(self._recall("which supplier?", limit=1), [vendor])
+            self.assertEqual(MemoryEmbedding.query.count(), 3)
+            for name in os.listdir(self.directory):
+                os.remove(os.path.join(self.directory, name))
+            self.assertEqual(self._recall("where is the soda?", limit=1), [drinks])
+            self.assertTrue(os.listdir(self.directory))
+
+    def test_forget_removes_the_stored_vector(self):
+        with app.app_context():
+            memory_id = self._remember("Acme is our vendor")
+            self.assertTrue(self.service.forget(memory_id, user_id=self.user_id, branch_id=self.branch_id)["deleted"])
+            MemoryRegistry.query.filter_by(memory_id=memory_id).delete()
+            db.session.commit()
+            self.assertEqual(MemoryEmbedding.query.count(), 0)
+            self.assertEqual(self._branch_files(), [])
+            self.assertEqual(self._recall("supplier"), [])
+
+    def _branch_files(self):
+        return [name for name in os.listdir(self.directory) if name.startswith("branch_")]
+
+    def test_duplicate_vectors_are_recalled_once(self):
+        with app.app_context():
+            vendor = self._remember("Acme is our vendor")
+            self._remember("Tea leaf is on shelf three")
+            index = self.service.vector_index
+            vector = index.embed(["Acme is our vendor"])[0]
+            index.append(self.branch_id, [(vendor, self.user_id, vector)])
+            recalled = self._recall("which supplier?", limit=2)
+            self.assertEqual(recalled[0], vendor)
+            self.assertEqual(len(recalled), len(set(recalled)))
+
+    def test_rebuild_by_another_worker_is_remapped_at_the_same_size(self):
+        index = self.service.vector_index
+        other = VectorIndex(self.directory, ConceptEmbedder())   # a second worker on the same files
+        tea, acme = other.embed(["tea", "acme"])
+        other.rebuild(self.branch_id, len(tea), [("first", 0, tea)])
+        self.assertEqual(index.search(self.branch_id, tea, owners=[0], k=1)[0][0], "first")
+        other.rebuild(self.branch_id, len(tea), [("second", 0, acme)])
+        self.assertEqual(index.search(self.branch_id, acme, owners=[0], k=1)[0][0], "second")
+
+    @unittest.skipIf(os.name == "nt", "cross-process locking uses fcntl.flock")
+    def test_writers_in_other_workers_wait_for_the_lock(self):
+        index = self.service.vector_index
+        other = VectorIndex(self.directory, ConceptEmbedder())
+        vector = other.embed(["tea"])[0]
+        appended = threading.Event()
+
+        def append():
+            other.append(self.branch_id, [("late", 0, vector)])
+            appended.set()
+
+        with index.locked(), index.locked():   # re-entrant within a thread
+            worker = threading.Thread(target=append)
+            worker.start()
+            self.assertFalse(appended.wait(0.2))
+        self.assertTrue(appended.wait(5))
+        worker.join()
+        self.assertEqual(index.search(self.branch_id, vector, owners=[0], k=1)[0][0], "late")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,95 @@
+"""Tests for the shared money module and the integer-cents ``Money`` column type."""
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import Column, Integer, create_engine, func, select, type_coerce
+from sqlalchemy.orm import Session, declarative_base
+
+import ai_tools
+import receipt
+from money import (
+    Money,
+    from_cents,
+    money_dec,
+    money_float,
+    money_plain,
+    money_str,
+    quantize_money,
+    to_cents,
+)
+
+Base = declarative_base()
+
+
+class Line(Base):
+    __tablename__ = "line"
+    id = Column(Integer, primary_key=True)
+    price = Column(Money, nullable=False)
+    quantity = Column(Integer, nullable=False)
+    discount = Column(Money)
+
+
+@pytest.fixture()
+def session():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    with Session(engine) as s:
+        yield s
+    engine.dispose()
+
+
+@pytest.mark.parametrize("value, cents", [
+    (12.34, 1234), ("0.10", 10), (Decimal("2.675"), 268), (1.005, 101),
+    (-1.005, -101), (0, 0), (19999999.99, 1999999999),
+])
+def test_to_cents_rounds_half_up(value, cents):
+    assert to_cents(value) == cents
+
+
+def test_from_cents_is_exact_decimal():
+    assert from_cents(1234) == Decimal("12.34")
+    assert from_cents(None) == Decimal("0")
+
+
+def test_lenient_helpers_accept_formatted_and_garbage_input():
+    assert money_dec("1,234.50") == Decimal("1234.50")
+    assert money_dec("abc") == Decimal("0")
+    assert money_dec(float("nan")) == Decimal("0")
+    assert quantize_money("2.675") == Decimal("2.68")
+    assert money_str(1234.5) == "1,234.50"
+    assert money_plain("1,234.5") == "1234.50"
+
+
+def test_money_float_fast_path_and_rounding():
+    assert money_float(12.34) == 12.34
+    assert money_float(0.1 + 0.2) == 0.3
+    assert money_float(Decimal("2.675")) == 2.68
+
+
+def test_modules_share_one_implementation():
+    assert ai_tools.money_dec is money_dec
+    assert ai_tools.money_str is money_str
+    assert ai_tools.round_money is quantize_money
+    assert receipt._money("2.675") == Decimal("2.68")
+
+
+def test_money_column_stores_cents_and_reads_exact_amounts(session):
+    session.add_all([Line(price=0.1, quantity=3), Line(price=Decimal("0.2"), quantity=1, discount="1.005")])
+    session.commit()
+
+    raw = session.execute(select(type_coerce(Line.price, Integer)).order_by(Line.id)).scalars().all()
+    assert raw == [10, 20]
+    lines = session.execute(select(Line).order_by(Line.id)).scalars().all()
+    assert [l.price for l in lines] == [0.1, 0.2]
+    assert lines[0].discount is None
+    assert lines[1].discount == 1.01
+
+
+def test_sum_and_coerced_expressions_are_exact(session):
+    session.add_all([Line(price=0.1, quantity=3) for _ in range(10)])
+    session.commit()
+
+    assert session.execute(select(func.sum(Line.price))).scalar() == 1.0
+    line_total = type_coerce(Line.price * Line.quantity, Money)
+    assert session.execute(select(func.sum(line_total))).scalar() == 3.0
+    assert session.execute(select(func.count()).where(Line.price == 0.1)).scalar() == 10
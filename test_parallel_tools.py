@@ -0,0 +1,98 @@
+"""Concurrent execution of read-only tool calls within one turn."""
+
+import threading
+import time
+import unittest
+
+from agent_orchestrator import AgentOrchestrator
+from ai_agent import ToolCall
+from app import app, db, AI_MODELS, Branch
+from tool_cache import result_cache
+
+
+def call(name, call_id=None, **arguments):
+    return ToolCall(id=call_id or name, function_name=name, arguments=arguments)
+
+
+class ParallelReadToolTests(unittest.TestCase):
+    def setUp(self):
+        result_cache.invalidate()  # stubbed tools must not be answered from earlier results
+        self.addCleanup(result_cache.invalidate)
+        self.orchestrator = AgentOrchestrator(None, {}, app=app)
+        self.orchestrator.set_request_context({"branch_id": 1, "user_id": 1, "role": "manager"})
+        self.log = []
+        self.lock = threading.Lock()
+
+    def _stub(self, name, delay=0.2):
+        def tool(**kwargs):
+            with self.lock:
+                self.log.append(("start", name))
+            time.sleep(delay)
+            with self.lock:
+                self.log.append(("end", name))
+            return {"tool": name}
+        self.orchestrator.agent.tool_functions[name] = tool
+
+    def test_independent_read_tools_run_concurrently_and_keep_their_order(self):
+        names = ["get_inventory_status", "get_low_stock_items", "get_supplier_list"]
+        for name in names:
+            self._stub(name)
+        started = time.monotonic()
+        results = self.orchestrator._execute_tools_with_context([call(name) for name in names])
+        self.assertLess(time.monotonic() - started, 0.45)   # three 0.2 s tools, not 0.6 s
+        self.assertEqual([r["result"]["tool"] for r in results], names)
+        self.assertTrue(all(r["elapsed_ms"] >= 190 for r in results))
+        tool_messages = [m.tool_call_id for m in self.orchestrator.agent.conversation_history if m.role == "tool"]
+        self.assertEqual(tool_messages, names)
+
+    def test_write_tools_stay_sequential_between_read_batches(self):
+        for name in ("get_inventory_status", "get_low_stock_items", "get_supplier_list"):
+            self._stub(name, delay=0.05)
+        self._stub("create_purchase_order", delay=0.05)
+        results = self.orchestrator._execute_tools_with_context([
+            call("get_inventory_status"), call("get_low_stock_items"),
+            call("create_purchase_order"), call("get_supplier_list")])
+        self.assertEqual([r["function_name"] for r in results],
+                         ["get_inventory_status", "get_low_stock_items", "create_purchase_order", "get_supplier_list"])
+        write_start = self.log.index(("start", "create_purchase_order"))
+        self.assertLess(self.log.index(("end", "get_low_stock_items")), write_start)
+        self.assertLess(self.log.index(("end", "get_inventory_status")), write_start)
+        self.assertGreater(self.log.index(("start", "get_supplier_list")),
+                           self.log.index(("end", "create_purchase_order")))
+
+    def test_without_an_app_calls_run_sequentially(self):
+        self.orchestrator.app = None
+        for name in ("get_inventory_status", "get_low_stock_items"):
+            self._stub(name, delay=0.05)
+        self.orchestrator._execute_tools_with_context([call("get_inventory_status"), call("get_low_stock_items")])
+        self.assertEqual([entry[0] for entry in self.log], ["start", "end", "start", "end"])
+
+    def test_a_failing_read_tool_does_not_affect_its_neighbours(self):
+        self._stub("get_inventory_status", delay=0.01)
+
+        def broken(**kwargs):
+            raise RuntimeError("boom")
+        self.orchestrator.agent.tool_functions["get_low_stock_items"] = broken
+        results = self.orchestrator._execute_tools_with_context([
+            call("get_low_stock_items"), call("get_inventory_status"), call("no_such_tool")])
+        self.assertEqual(results[0]["error"], "boom")
+        self.assertIsNone(results[1]["error"])
+        self.assertIn("not found", results[2]["error"])
+
+
+class ParallelReadToolDatabaseTests(unittest.TestCase):
+    def test_pool_threads_get_their_own_app_context_and_session(self):
+        with app.app_context():
+            branch_id = Branch.query.filter_by(is_active=True).first().id
+        orchestrator = AgentOrchestrator(db, AI_MODELS, app=app)
+        orchestrator.set_request_context({"branch_id": branch_id, "user_id": 1, "role": "manager"})
+        calls = [call("get_inventory_status", "a"), call("get_low_stock_items", "b"),
+                 call("get_current_branch_context", "c")]
+        parallel = orchestrator._execute_tools_with_context(calls)
+        serial = [orchestrator._run_tool_call(tc) for tc in calls]
+        self.assertEqual([r["error"] for r in parallel], [None, None, None])
+        self.assertEqual([r["result"] for r in parallel], [r["result"] for r in serial])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,117 @@
+"""Plan templates: repeated task-shaped commands skip the planner LLM call."""
+
+import unittest
+from unittest import mock
+
+from agent_orchestrator import AgentOrchestrator
+from ai_agent import ChatResponse, ToolCall
+from plan_cache import PlanTemplateCache, bind_template, command_shape, make_template, plan_templates
+
+
+def restock_plan(supplier_id, quantity=None):
+    items = {"product_id": {"$from": "step1.items.0.product_id"},
+             "quantity": quantity if quantity is not None else {"$from": "step1.items.0.suggested_reorder_qty"}}
+    return {
+        "description": f"Order low stock items from supplier {supplier_id}",
+        "needs_clarification": False,
+        "question": "",
+        "steps": [
+            {"step": 1, "label": "find low stock", "tool": "get_low_stock_items", "args": {}, "reason": ""},
+            {"step": 2, "label": "order", "tool": "create_purchase_order",
+             "args": {"supplier_id": supplier_id, "items": [items]},
+             "reason": f"supplier {supplier_id} restocks them"},
+        ],
+    }
+
+
+class CommandShapeTests(unittest.TestCase):
+    def test_literals_become_placeholders(self):
+        self.assertEqual(command_shape("Restock low stock items from supplier 3"),
+                         ("restock low stock items from supplier <0>", [3]))
+        self.assertEqual(command_shape('Order 2.5 kg of "Jasmine Rice" from supplier 12?'),
+                         ("order <0> kg of <1> from supplier <2>", [2.5, "Jasmine Rice", 12]))
+
+    def test_template_rebinds_arguments_and_text(self):
+        _, literals = command_shape("restock low stock items from supplier 3")
+        template = make_template(restock_plan(3), literals)
+        raw = bind_template(template, [7])
+        self.assertEqual(raw["steps"][1]["args"]["supplier_id"], 7)
+        self.assertEqual(raw["steps"][1]["args"]["items"][0]["product_id"], {"$from": "step1.items.0.product_id"})
+        self.assertEqual(raw["description"], "Order low stock items from supplier 7")
+        self.assertEqual(raw["steps"][1]["reason"], "supplier 7 restocks them")
+
+    def test_unclear_bindings_are_not_stored(self):
+        cache = PlanTemplateCache()
+        # The same number twice: which one is the supplier?
+        self.assertFalse(cache.store("restock 3 units from supplier 3", restock_plan(3, quantity=3)))
+        # A literal the plan never used would be silently ignored on reuse.
+        self.assertFalse(cache.store("restock 10 units from supplier 3", restock_plan(3)))
+        clarify = dict(restock_plan(3), needs_clarification=True)
+        self.assertFalse(cache.store("restock low stock items from supplier 3", clarify))
+        self.assertEqual(cache.report()["templates"], 0)
+
+    def test_size_zero_disables_the_cache(self):
+        cache = PlanTemplateCache.from_env({"AI_PLAN_CACHE_SIZE": "0"})
+        self.assertFalse(cache.store("restock low stock items from supplier 3", restock_plan(3)))
+        self.assertIsNone(cache.lookup("restock low stock items from supplier 3"))
+
+
+class PlanCommandTemplateTests(unittest.TestCase):
+    def setUp(self):
+        plan_templates.clear()
+        self.addCleanup(plan_templates.clear)
+        self.orchestrator = AgentOrchestrator(None, {})
+        self.orchestrator.set_request_context({"branch_id": 1, "user_id": 1, "role": "manager"})
+
+    def planner_reply(self, supplier_id):
+        plan = restock_plan(supplier_id)
+        steps = [{"step": s["label"], "tool": s["tool"], "args": s["args"], "reason": s["reason"]}
+                 for s in plan["steps"]]
+        return ChatResponse(content="", finish_reason="tool_calls", tool_calls=[ToolCall(
+            id="p1", function_name="propose_plan",
+            arguments={"description": plan["description"], "steps": steps})])
+
+    def test_second_command_of_the_same_shape_skips_the_planner(self):
+        before = plan_templates.report()
+        with mock.patch.object(self.orchestrator, "_planner_chat",
+                               return_value=self.planner_reply(3)) as planner:
+            first = self.orchestrator._plan_command("Restock low stock items from supplier 3")
+            second = self.orchestrator._plan_command("restock low stock items from supplier 5")
+        self.assertEqual(planner.call_count, 1)
+        self.assertNotIn("from_template", first)
+        self.assertTrue(second["from_template"])
+        self.assertEqual(second["steps"][1]["args"]["supplier_id"], 5)
+        self.assertEqual(second["steps"][1]["step"], 2)
+        report = plan_templates.report()
+        self.assertEqual(report["hits"] - before["hits"], 1)
+        self.assertEqual(report["misses"] - before["misses"], 1)
+
+    def test_templates_are_not_shared_across_branches_users_or_context(self):
+        command = "restock low stock items from supplier 3"
+        with mock.patch.object(self.orchestrator, "_planner_chat",
+                               return_value=self.planner_reply(3)) as planner:
+            self.orchestrator._plan_command(command)
+            self.orchestrator.set_request_context({"branch_id": 2, "user_id": 1, "role": "manager"})
+            self.assertNotIn("from_template", self.orchestrator._plan_command(command))
+            self.orchestrator.set_request_context({"branch_id": 2, "user_id": 4, "role": "manager"})
+            self.assertNotIn("from_template", self.orchestrator._plan_command(command))
+            # Recalled memories change what the planner saw.
+            self.orchestrator._set_turn_context("- Supplier 3 is closed this month")
+            self.assertNotIn("from_template", self.orchestrator._plan_command(command))
+            self.assertTrue(self.orchestrator._plan_command(command)["from_template"])
+        self.assertEqual(planner.call_count, 4)
+
+    def test_template_failing_validation_is_dropped_and_replanned(self):
+        with mock.patch.object(self.orchestrator, "_planner_chat",
+                               return_value=self.planner_reply(3)) as planner:
+            self.orchestrator._plan_command("restock low stock items from supplier 3")
+            registry = dict(self.orchestrator._get_tool_registry())
+            registry.pop("create_purchase_order")
+            with mock.patch.object(self.orchestrator, "_get_tool_registry", return_value=registry):
+                self.assertIsNone(self.orchestrator._plan_command("restock low stock items from supplier 5"))
+        self.assertEqual(planner.call_count, 2)   # replanned instead of trusting the template
+        self.assertEqual(plan_templates.report()["templates"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
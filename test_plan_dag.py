@@ -0,0 +1,99 @@
+"""Plan execution as a dependency DAG: concurrent independent reads, unchanged fail-stop."""
+
+import threading
+import time
+import unittest
+
+from agent_orchestrator import AgentOrchestrator
+from app import app
+from tool_cache import result_cache
+
+
+def step(no, tool, **args):
+    return {"step": no, "tool": tool, "args": args, "reason": ""}
+
+
+class PlanDagTests(unittest.TestCase):
+    def setUp(self):
+        result_cache.invalidate()  # stubbed tools must not be answered from earlier results
+        self.addCleanup(result_cache.invalidate)
+        self.orchestrator = AgentOrchestrator(None, {}, app=app)
+        self.orchestrator.set_request_context({"branch_id": 1, "user_id": 1, "role": "manager"})
+        self.log = []
+        self.lock = threading.Lock()
+
+    def _stub(self, name, result=None, delay=0.2, error=None):
+        def tool(**kwargs):
+            with self.lock:
+                self.log.append(("start", name, kwargs))
+            time.sleep(delay)
+            with self.lock:
+                self.log.append(("end", name, kwargs))
+            if error:
+                raise RuntimeError(error)
+            return result if result is not None else {"tool": name}
+        self.orchestrator.agent.tool_functions[name] = tool
+
+    def _position(self, event, name):
+        return next(i for i, entry in enumerate(self.log) if entry[:2] == (event, name))
+
+    def test_independent_reads_run_together_and_dependents_wait(self):
+        self._stub("get_supplier_list", {"suppliers": [{"id": 42}]})
+        self._stub("get_inventory_status")
+        self._stub("get_supplier_details")
+        plan = {"steps": [
+            step(1, "get_supplier_list"),
+            step(2, "get_inventory_status"),
+            step(3, "get_supplier_details", supplier_id={"$from": "step1.suppliers.0.id"}),
+        ]}
+        started = time.monotonic()
+        step_results, pending = self.orchestrator._execute_plan(plan)
+        self.assertLess(time.monotonic() - started, 0.55)   # two waves of 0.2 s, not three
+        self.assertEqual([(r["step"], r["status"]) for r in step_results], [(1, "ok"), (2, "ok"), (3, "ok")])
+        self.assertEqual(pending, [])
+        self.assertLess(self._position("end", "get_supplier_list"), self._position("start", "get_supplier_details"))
+        self.assertEqual(self.log[self._position("start", "get_supplier_details")][2], {"supplier_id": 42})
+
+    def test_failure_skips_later_steps_even_if_they_already_ran(self):
+        self._stub("get_inventory_status", delay=0.05, error="inventory exploded")
+        self._stub("get_supplier_list", {"suppliers": [{"id": 7}]}, delay=0.1)
+        self._stub("get_supplier_details")
+        plan = {"steps": [
+            step(1, "get_inventory_status"),
+            step(2, "get_supplier_list"),
+            step(3, "get_supplier_details", supplier_id={"$from": "step2.suppliers.0.id"}),
+        ]}
+        step_results, _ = self.orchestrator._execute_plan(plan)
+        self.assertEqual([r["status"] for r in step_results], ["failed", "skipped", "skipped"])
+        self.assertIn("inventory exploded", step_results[0]["error"])
+        self.assertNotIn("get_supplier_details", [entry[1] for entry in self.log])
+
+    def test_write_steps_are_barriers_and_unapproved_writes_stay_proposals(self):
+        self._stub("get_low_stock_items", {"items": [{"product_id": 5}]}, delay=0.05)
+        self._stub("create_purchase_order", {"po_id": 1}, delay=0.05)
+        self._stub("get_purchase_orders", delay=0.05)
+        plan = {"steps": [
+            step(1, "get_low_stock_items"),
+            step(2, "create_purchase_order", supplier_id=1,
+                 items=[{"product_id": {"$from": "step1.items.0.product_id"}, "quantity": 10}]),
+            step(3, "get_purchase_orders"),
+        ]}
+        step_results, pending = self.orchestrator._execute_plan(plan)
+        self.assertEqual([r["status"] for r in step_results], ["ok", "proposal", "ok"])
+        self.assertEqual(pending[0]["args"]["items"][0]["product_id"], 5)
+
+        self.log.clear()
+        result_cache.invalidate()
+        step_results, pending = self.orchestrator._execute_plan(plan, approved_steps={2})
+        self.assertEqual(step_results[1]["executed_by"], "approved")
+        self.assertEqual(pending, [])
+        self.assertLess(self._position("end", "get_low_stock_items"), self._position("start", "create_purchase_order"))
+        self.assertLess(self._position("end", "create_purchase_order"), self._position("start", "get_purchase_orders"))
+
+    def test_dependencies_come_from_from_references(self):
+        args = {"a": {"$from": "step1.x"}, "b": [{"c": {"$from": "step3.items.0"}}], "d": "step2"}
+        self.assertEqual(AgentOrchestrator._from_dependencies(args), {1, 3})
+
+
+if __name__ == "__main__":
+    unittest.main()
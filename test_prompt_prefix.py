@@ -0,0 +1,115 @@
+"""Request layout that keeps the provider's cached prompt prefix reusable."""
+
+import unittest
+from unittest import mock
+
+import llm_http
+from agent_orchestrator import CORE_TOOL_NAMES, SYSTEM_PROMPT, AgentOrchestrator
+from llm_http import UsageMetrics, cached_prompt_tokens
+
+
+class FakeBody:
+    status_code = 200
+
+    def __init__(self, body):
+        self.body = body
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.body
+
+
+def reply(text, prompt_tokens=1000, cached_tokens=0):
+    return {"choices": [{"message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": 20,
+                      "prompt_tokens_details": {"cached_tokens": cached_tokens}}}
+
+
+class UsageMetricsTests(unittest.TestCase):
+    def test_cached_tokens_from_either_provider_shape(self):
+        self.assertEqual(cached_prompt_tokens({"prompt_tokens_details": {"cached_tokens": 768}}), 768)
+        self.assertEqual(cached_prompt_tokens({"prompt_cache_hit_tokens": 512}), 512)
+        self.assertEqual(cached_prompt_tokens({"prompt_tokens": 10}), 0)
+
+    def test_ratio_and_latency_split(self):
+        metrics = UsageMetrics()
+        metrics.record({"prompt_tokens": 1000, "completion_tokens": 10}, ttfb_ms=900)
+        metrics.record({"prompt_tokens": 1000, "completion_tokens": 10,
+                        "prompt_tokens_details": {"cached_tokens": 800}}, ttfb_ms=300)
+        metrics.record({})  # providers that report nothing are not counted
+        report = metrics.report()
+        self.assertEqual(report["calls"], 2)
+        self.assertEqual(report["calls_with_cache_hit"], 1)
+        self.assertEqual(report["cached_ratio"], 0.4)
+        self.assertEqual(report["ttfb_ms_p50_cached"], 300)
+        self.assertEqual(report["ttfb_ms_p50_uncached"], 900)
+
+
+class PromptPrefixTests(unittest.TestCase):
+    def setUp(self):
+        self.orchestrator = AgentOrchestrator(None, {})
+        self.orchestrator.set_request_context({"branch_id": 1, "user_id": 1, "role": "manager"})
+        self.sent = []
+
+    def send(self, bodies):
+        def post(*args, **kwargs):
+            self.sent.append(kwargs["json"])
+            return FakeBody(bodies.pop(0))
+        return mock.patch.object(llm_http.http_session(), "post", side_effect=post)
+
+    def test_volatile_context_follows_the_stable_prefix(self):
+        agent = self.orchestrator.agent
+        self.orchestrator._set_turn_context("- prefers weekly reports")
+        with self.send([reply("first"), reply("second", cached_tokens=900)]):
+            agent.chat("show low stock items", tools_override=self.orchestrator._filter_tools_for_query(
+                "show low stock items"))
+            first_history = [{"role": m.role, "content": m.content} for m in agent.conversation_history]
+            agent.chat("which suppliers have overdue debts?", tools_override=self.orchestrator._filter_tools_for_query(
+                "which suppliers have overdue debts?"))
+        first, second = self.sent
+        self.assertEqual(first["messages"][0], {"role": "system", "content": SYSTEM_PROMPT})
+        self.assertNotIn("Current Date:", SYSTEM_PROMPT)
+        # The second request repeats the first turn byte for byte, then the question with the context.
+        self.assertEqual(second["messages"][:-1], first_history)
+        question = second["messages"][-1]
+        self.assertEqual(question["role"], "user")
+        self.assertIn("Current Date:", question["content"])
+        self.assertIn("prefers weekly reports", question["content"])
+        self.assertTrue(question["content"].endswith("which suppliers have overdue debts?"))
+        self.assertNotIn("prefers weekly reports", agent.conversation_history[0].content)
+        # Strict chat templates accept one system message, and only at the start.
+        for payload in (first, second):
+            self.assertEqual([m["role"] for m in payload["messages"]].count("system"), 1)
+        for payload in (first, second):
+            names = [tool["function"]["name"] for tool in payload["tools"]]
+            self.assertEqual(names[:len(CORE_TOOL_NAMES)], list(CORE_TOOL_NAMES))
+            self.assertEqual(names[len(CORE_TOOL_NAMES):], sorted(names[len(CORE_TOOL_NAMES):]))
+
+    def test_planner_calls_share_the_prefix_and_record_usage(self):
+        before = llm_http.usage.report()
+        with self.send([reply("{}", prompt_tokens=1200, cached_tokens=1024)]):
+            self.orchestrator._planner_chat("plan this")
+        messages = self.sent[0]["messages"]
+        self.assertEqual(messages[0]["content"], SYSTEM_PROMPT)
+        self.assertEqual([m["role"] for m in messages], ["system", "user"])
+        self.assertIn("Current Date:", messages[1]["content"])
+        self.assertTrue(messages[1]["content"].endswith("plan this"))
+        after = llm_http.usage.report()
+        self.assertEqual(after["prompt_tokens"] - before["prompt_tokens"], 1200)
+        self.assertEqual(after["cached_tokens"] - before["cached_tokens"], 1024)
+
+    def test_recalled_memory_does_not_outlive_the_turn(self):
+        with mock.patch.object(self.orchestrator, "_build_memory_context", return_value="- likes tea"), \
+             mock.patch.object(self.orchestrator, "_fast_path_answer", return_value=None), \
+             mock.patch.object(self.orchestrator, "_should_plan", return_value=False), \
+             self.send([reply("Hello!")]):
+            self.orchestrator.process_command("hello", user_id=1)
+        self.assertIn("likes tea", self.sent[0]["messages"][-1]["content"])
+        self.assertNotIn("likes tea", self.orchestrator.agent.turn_context)
+        self.assertEqual(self.orchestrator.agent.conversation_history[0].content, SYSTEM_PROMPT)
+
+
+if __name__ == "__main__":
+    unittest.main()
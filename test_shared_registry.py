@@ -0,0 +1,63 @@
+"""One read-only tool registry per process; only conversation state is per user."""
+
+import unittest
+
+import agent_orchestrator
+from agent_orchestrator import AgentOrchestrator, CORE_TOOL_NAMES, TOOL_CATEGORIES, shared_tool_registry
+from ai_tools import TOOL_METADATA
+
+
+class SharedToolRegistryTests(unittest.TestCase):
+    def setUp(self):
+        self.first = AgentOrchestrator(None, {})
+        self.second = AgentOrchestrator(None, {})
+        self.first.set_request_context({"branch_id": 1, "user_id": 1, "role": "manager"})
+        self.second.set_request_context({"branch_id": 2, "user_id": 2, "role": "cashier"})
+
+    def test_schemas_registry_and_catalog_are_the_same_objects(self):
+        self.assertIs(self.first.agent.tools, self.second.agent.tools)
+        self.assertIs(self.first._get_tool_registry(), self.second._get_tool_registry())
+        registry = self.first._get_tool_registry()
+        self.assertIs(self.first._build_planning_catalog(registry), self.second._build_planning_catalog(registry))
+        self.assertEqual(self.first._build_planning_catalog(registry),
+                         agent_orchestrator._format_planning_catalog(dict(registry)))
+        with self.assertRaises(TypeError):
+            registry["fake_tool"] = {}
+
+    def test_tool_functions_stay_bound_to_each_users_context(self):
+        first = self.first.agent.tool_functions["get_inventory_status"]
+        second = self.second.agent.tool_functions["get_inventory_status"]
+        self.assertEqual(first.__self__.context["branch_id"], 1)
+        self.assertEqual(second.__self__.context["branch_id"], 2)
+        self.assertEqual(set(self.first.agent.tool_functions), set(shared_tool_registry().names))
+
+    def test_filtered_tools_match_the_category_rules_and_stay_read_only(self):
+        filtered = self.first._filter_tools_for_query("which suppliers have overdue debts?")
+        names = {tool["function"]["name"] for tool in filtered}
+        expected = {tool for category in ("supplier", "debt") for tool in TOOL_CATEGORIES[category]["tools"]}
+        expected = {name for name in expected | set(CORE_TOOL_NAMES) if not TOOL_METADATA[name]["mutates"]}
+        self.assertEqual(names, expected)
+        everything = self.first._filter_tools_for_query("hello there")
+        self.assertFalse(any(TOOL_METADATA[t["function"]["name"]]["mutates"] for t in everything))
+
+    def test_registering_an_extra_tool_does_not_touch_the_shared_schemas(self):
+        shared = shared_tool_registry().schemas
+        self.first.agent.register_tool("extra_tool", "Extra", {"type": "object", "properties": {}}, lambda: {})
+        self.assertEqual(len(self.first.agent.tools), len(shared) + 1)
+        self.assertIs(self.second.agent.tools, shared)
+        self.assertNotIn("extra_tool", [t["function"]["name"] for t in shared])
+        self.assertIn("extra_tool", self.first._get_tool_registry())
+
+    def test_registering_a_shared_tool_again_replaces_its_schema(self):
+        shared = shared_tool_registry().schemas
+        name = shared[0]["function"]["name"]
+        self.first.agent.register_tool(name, "Replaced", {"type": "object", "properties": {}}, lambda: {})
+        tools = self.first.agent.tools
+        self.assertEqual(len(tools), len(shared))
+        self.assertEqual([t["function"]["description"] for t in tools if t["function"]["name"] == name],
+                         ["Replaced"])
+        self.assertNotEqual(shared[0]["function"]["description"], "Replaced")
+
+
+if __name__ == "__main__":
+    unittest.main()
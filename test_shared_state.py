@@ -0,0 +1,89 @@
+"""State shared between serve.py worker processes: conversations and invalidation events."""
+
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+import agent_orchestrator
+from shared_state import SharedStateStore
+
+
+class SharedStateStoreTests(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.path = os.path.join(self.tmpdir.name, 'shared_state.db')
+
+    def test_conversation_round_trip_bumps_version(self):
+        store = SharedStateStore(self.path)
+        self.assertEqual(store.load_conversation('7'), (0, None))
+        self.assertEqual(store.save_conversation('7', [{'role': 'user', 'content': 'hi'}]), 1)
+        self.assertEqual(store.save_conversation('7', [{'role': 'user', 'content': 'again'}]), 2)
+        self.assertEqual(SharedStateStore(self.path).load_conversation('7'),
+                         (2, [{'role': 'user', 'content': 'again'}]))
+        store.delete_conversation('7')
+        self.assertEqual(store.conversation_version('7'), 0)
+
+    def test_poll_applies_events_from_other_processes_only(self):
+        store = SharedStateStore(self.path)
+        received = []
+        store.subscribe('database_replaced', received.append)
+
+        store.publish('database_replaced', {'by': 'self'})
+        self.assertEqual(store.poll(), 0)
+
+        subprocess.run([sys.executable, '-c', (
+            'import sys; from shared_state import SharedStateStore; '
+            'SharedStateStore(sys.argv[1]).publish("database_replaced", {"by": "other"})'
+        ), self.path], check=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+
+        self.assertEqual(store.poll(), 1)
+        self.assertEqual(received, [{'by': 'other'}])
+        self.assertEqual(store.poll(), 0)
+
+
+class SharedConversationTests(unittest.TestCase):
+    """Two orchestrators on one store stand in for the same user on two workers."""
+
+    class FakeDb:
+        pass
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.store = SharedStateStore(os.path.join(self.tmpdir.name, 'shared_state.db'))
+
+    def _worker(self):
+        orchestrator = agent_orchestrator.AgentOrchestrator(
+            self.FakeDb(), {}, conversation_store=self.store, conversation_id='1')
+
+        def turn(command, user_id=None):
+            orchestrator.agent.add_user_message(command)
+            orchestrator.agent.add_assistant_message(f'answer to {command}')
+            return {'success': True}
+
+        orchestrator._process_command_locked = turn
+        return orchestrator
+
+    def test_next_turn_on_another_worker_sees_history(self):
+        first, second = self._worker(), self._worker()
+        first.process_command('stock of rice?')
+        second.process_command('and sugar?')
+
+        contents = [m.content for m in second.agent.conversation_history]
+        self.assertEqual(second.agent.conversation_history[0].role, 'system')
+        self.assertEqual(contents[1:], ['stock of rice?', 'answer to stock of rice?',
+                                        'and sugar?', 'answer to and sugar?'])
+        self.assertEqual(len(first.get_conversation_history()), 5)
+
+    def test_clear_on_one_worker_clears_everywhere(self):
+        first, second = self._worker(), self._worker()
+        first.process_command('hello')
+        second.clear_conversation()
+        self.assertEqual([m['role'] for m in first.get_conversation_history()], ['system'])
+
+
+if __name__ == '__main__':
+    unittest.main()
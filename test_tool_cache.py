@@ -0,0 +1,186 @@
+"""Branch-scoped TTL cache for read-only AI tool results and its write invalidation."""
+
+import os
+import unittest
+import uuid
+from unittest.mock import patch
+
+from sqlalchemy import update
+
+from agent_orchestrator import AgentOrchestrator
+from ai_agent import ToolCall
+import app as app_module
+from app import app, db, AI_MODELS, Branch, Product, User
+from tool_cache import ToolResultCache, result_cache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+class ToolResultCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.cache = ToolResultCache(ttl=30, max_entries=2, clock=self.clock)
+        self.calls = 0
+
+    def _call(self, result=None):
+        def call():
+            self.calls += 1
+            return result if result is not None else {"n": self.calls}
+        return call
+
+    def test_entries_expire_after_the_ttl(self):
+        self.assertEqual(self.cache.get_or_call(1, "get_low_stock_items", {}, self._call()), ({"n": 1}, False))
+        self.assertEqual(self.cache.get_or_call(1, "get_low_stock_items", {}, self._call()), ({"n": 1}, True))
+        self.clock.now += 30
+        self.assertEqual(self.cache.get_or_call(1, "get_low_stock_items", {}, self._call()), ({"n": 2}, False))
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 2))
+
+    def test_arguments_are_normalised_and_branches_kept_apart(self):
+        self.assertEqual(ToolResultCache.key(1, "search_products", {"query": "cola", "limit": None}),
+                         ToolResultCache.key(1, "search_products", {"query": "cola"}))
+        self.assertNotEqual(ToolResultCache.key(1, "search_products", {"query": "cola"}),
+                            ToolResultCache.key(2, "search_products", {"query": "cola"}))
+
+    def test_invalidating_one_branch_keeps_the_others(self):
+        self.cache.get_or_call(1, "get_sales_summary", {}, self._call())
+        self.cache.get_or_call(2, "get_sales_summary", {}, self._call())
+        self.cache.invalidate({1})
+        self.assertFalse(self.cache.get_or_call(1, "get_sales_summary", {}, self._call())[1])
+        self.assertTrue(self.cache.get_or_call(2, "get_sales_summary", {}, self._call())[1])
+
+    def test_error_results_are_not_cached_and_hits_are_copies(self):
+        self.cache.get_or_call(1, "get_debt_summary", {}, self._call({"error": "locked"}))
+        self.assertFalse(self.cache.get_or_call(1, "get_debt_summary", {}, self._call())[1])
+        hit, _ = self.cache.get_or_call(1, "get_debt_summary", {}, self._call())
+        hit["n"] = 99
+        self.assertNotEqual(self.cache.get_or_call(1, "get_debt_summary", {}, self._call())[0]["n"], 99)
+
+    def test_result_read_before_an_invalidation_is_not_stored(self):
+        for invalidated in ({1}, {"*"}):
+            def stale_read():
+                self.cache.invalidate(invalidated)   # a commit lands while the tool is reading
+                return {"n": "stale"}
+            self.assertEqual(self.cache.get_or_call(1, "get_sales_summary", {}, stale_read), ({"n": "stale"}, False))
+            self.assertEqual(self.cache.get_or_call(1, "get_sales_summary", {}, self._call()), ({"n": 1}, False))
+            self.calls = 0
+            self.cache.invalidate()
+
+    def test_invalidating_another_branch_still_stores_the_result(self):
+        def read():
+            self.cache.invalidate({2})
+            return {"n": "fresh"}
+        self.cache.get_or_call(1, "get_sales_summary", {}, read)
+        self.assertTrue(self.cache.get_or_call(1, "get_sales_summary", {}, self._call())[1])
+
+    def test_size_is_bounded(self):
+        for tool in ("a", "b", "c"):
+            self.cache.get_or_call(1, tool, {}, self._call())
+        self.assertEqual(self.cache.report()["entries"], 2)
+
+
+class ToolCacheInvalidationTests(unittest.TestCase):
+    def setUp(self):
+        app.config.update(TESTING=True)
+        result_cache.invalidate()
+        self.addCleanup(result_cache.invalidate)
+        self.name = f"Cache Cola {uuid.uuid4().hex[:8]}"
+        with app.app_context():
+            self.user_id = User.query.filter_by(username='admin').first().id
+            self.branch_id = Branch.query.filter_by(is_active=True).first().id
+            product = Product(name=self.name, price=1000, stock=5, branch_id=self.branch_id)
+            db.session.add(product)
+            db.session.commit()
+            self.product_id = product.id
+        self.orchestrator = AgentOrchestrator(db, AI_MODELS, app=app)
+        self.orchestrator.set_request_context({"branch_id": self.branch_id, "user_id": self.user_id,
+                                               "role": "manager"})
+
+    def tearDown(self):
+        with app.app_context():
+            Product.query.filter_by(id=self.product_id).delete()
+            db.session.commit()
+
+    def _search(self):
+        outcome = self.orchestrator._run_tool_call(
+            ToolCall(id="s", function_name="search_products", arguments={"query": self.name}))
+        self.assertIsNone(outcome["error"])
+        return outcome["cached"], outcome["result"]["inventory"][0]["current_stock"]
+
+    def test_repeat_question_is_served_from_the_cache(self):
+        self.assertEqual(self._search(), (False, 5))
+        self.assertEqual(self._search(), (True, 5))
+
+    def test_endpoint_write_invalidates_the_branch(self):
+        self._search()
+        response = self._client().put(f'/api/products/{self.product_id}', json={'stock': 9})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self._search(), (False, 9))
+
+    def test_mutating_ai_tool_invalidates_the_branch(self):
+        self._search()
+        outcome = self.orchestrator._run_tool_call(ToolCall(
+            id="w", function_name="adjust_product_stock",
+            arguments={"product_id": self.product_id, "delta": -2, "reason": "breakage"}))
+        self.assertIsNone(outcome["error"])
+        self.assertFalse(outcome["cached"])
+        self.assertEqual(self._search(), (False, 3))
+
+    def _client(self):
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['user_id'] = self.user_id
+            session['role'] = 'manager'
+            session['branch_id'] = self.branch_id
+        return client
+
+    def test_bulk_endpoint_update_invalidates(self):
+        self._search()
+        response = self._client().post('/api/categories/bulk-update', json={
+            'action': 'assign', 'item_type': 'product', 'item_ids': [self.product_id], 'category_id': None})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(self._search()[0])
+
+    def test_executed_update_statement_invalidates(self):
+        self._search()
+        with app.app_context():
+            db.session.execute(update(Product).where(Product.id == self.product_id).values(stock=7))
+            db.session.commit()
+        self.assertEqual(self._search(), (False, 7))
+
+    def test_commit_is_published_to_the_other_workers(self):
+        with patch.dict(os.environ, {'POS_WORKERS': '2'}), \
+                patch.object(app_module.shared_state, 'publish') as publish:
+            with app.app_context():
+                db.session.get(Product, self.product_id).stock = 6
+                db.session.commit()
+        publish.assert_called_once_with('tool_cache_invalidated', [self.branch_id])
+
+    def test_invalidation_from_another_worker_clears_this_one(self):
+        self._search()
+        app_module.apply_remote_tool_cache_invalidation([self.branch_id])
+        self.assertFalse(self._search()[0])
+
+    def test_rolled_back_write_keeps_the_cache(self):
+        self._search()
+        with app.app_context():
+            db.session.get(Product, self.product_id).stock = 50
+            db.session.flush()
+            db.session.rollback()
+        self.assertEqual(self._search(), (True, 5))
+
+    def test_status_endpoint_reports_counters(self):
+        self._search()
+        self._search()
+        stats = self._client().get('/api/agent/status').get_json()['status']['tool_cache']
+        self.assertGreaterEqual(stats['hits'], 1)
+        self.assertGreaterEqual(stats['misses'], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,186 @@
+"""Short-lived cache for read-only AI tool results.
+
+Users ask Loli the same questions again and again ("low stock?", "today's
+sales?"), and each turn would re-run the same queries. Results of read-only
+tools are kept for ``ttl`` seconds. They are keyed by (branch_id, tool name,
+normalised arguments).
+
+Writes invalidate the cache through SQLAlchemy session events rather than
+by hooking each endpoint. ``watch_session`` notes which branches a flush
+touched (any object of a tracked model). The entries of those branches are
+dropped when the transaction commits, so it does not matter whether the
+write came from an app.py endpoint or a mutating AI tool. An object without
+a ``branch_id`` (a category row, a branch itself) clears every branch,
+unless the same flush also wrote a branch-scoped row such as the sale its
+items belong to.
+
+Bulk statements (``Query.update``/``delete`` and ``session.execute(update(...))``)
+never reach the flush, so ``do_orm_execute`` notes them as well. They name no
+single row, so they clear every branch.
+
+A read that misses before a commit can finish after the commit's
+``invalidate()``. ``get_or_call`` notes the branch's invalidation
+generation before calling and does not store the result if it changed.
+
+Each worker process has its own cache. ``watch_session`` takes a ``publish``
+callback that app.py points at shared_state, so a commit in one worker also
+clears the other workers' entries.
+"""
+
+from __future__ import annotations
+
+import copy
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import event
+
+ALL_BRANCHES = "*"
+_MISSING = object()
+
+
+class ToolResultCache:
+    def __init__(self, ttl: float = 30.0, max_entries: int = 256,
+                 clock: Callable[[], float] = time.monotonic):
+        self.ttl = ttl
+        self.max_entries = max(1, max_entries)
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple, Tuple[float, Any]]" = OrderedDict()
+        self._generations: Dict[Any, int] = {ALL_BRANCHES: 0}
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @classmethod
+    def from_env(cls, env: Dict[str, str]) -> "ToolResultCache":
+        return cls(ttl=float(env.get("AI_TOOL_CACHE_TTL", 30)),
+                   max_entries=int(env.get("AI_TOOL_CACHE_SIZE", 256)))
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    @staticmethod
+    def key(branch_id: Any, tool: str, arguments: Optional[Dict[str, Any]]) -> Tuple:
+        normalised = {k: v for k, v in (arguments or {}).items() if v is not None}
+        return branch_id, tool, json.dumps(normalised, sort_keys=True, default=str)
+
+    def get(self, key: Tuple) -> Any:
+        """The cached result (a copy) or ``_MISSING``; counts the hit or miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= self._clock():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return _MISSING
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return copy.deepcopy(entry[1])
+
+    def _generation(self, branch_id: Any) -> Tuple[int, int]:
+        return self._generations[ALL_BRANCHES], self._generations.get(branch_id, 0)
+
+    def generation(self, branch_id: Any) -> Tuple[int, int]:
+        """Invalidation count of ``branch_id``; pass it to ``put`` to skip storing stale results."""
+        with self._lock:
+            return self._generation(branch_id)
+
+    def put(self, key: Tuple, result: Any, generation: Optional[Tuple[int, int]] = None) -> None:
+        with self._lock:
+            if generation is not None and generation != self._generation(key[0]):
+                return
+            self._entries[key] = (self._clock() + self.ttl, copy.deepcopy(result))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_or_call(self, branch_id: Any, tool: str, arguments: Optional[Dict[str, Any]],
+                    call: Callable[[], Any]) -> Tuple[Any, bool]:
+        """Return (result, was_cached); results of failed calls are never stored."""
+        if not self.enabled:
+            return call(), False
+        key = self.key(branch_id, tool, arguments)
+        cached = self.get(key)
+        if cached is not _MISSING:
+            return cached, True
+        generation = self.generation(branch_id)
+        result = call()
+        if not (isinstance(result, dict) and result.get("error")):
+            self.put(key, result, generation)
+        return result, False
+
+    def invalidate(self, branch_ids: Iterable[Any] = (ALL_BRANCHES,)) -> None:
+        branch_ids = set(branch_ids)
+        with self._lock:
+            if ALL_BRANCHES in branch_ids:
+                self._entries.clear()
+                self._generations[ALL_BRANCHES] += 1
+            else:
+                for key in [k for k in self._entries if k[0] in branch_ids]:
+                    del self._entries[key]
+                for branch_id in branch_ids:
+                    self._generations[branch_id] = self._generations.get(branch_id, 0) + 1
+            self.invalidations += 1
+
+    def report(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "ttl_seconds": self.ttl,
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+                "invalidations": self.invalidations,
+            }
+
+
+result_cache = ToolResultCache.from_env(os.environ)
+
+
+def watch_session(session_class, cache: ToolResultCache, tracked_models: Iterable[type],
+                  publish: Optional[Callable[[list], None]] = None) -> None:
+    """Invalidate ``cache`` when a transaction that wrote a tracked model commits.
+
+    ``publish`` is called with the cleared branch ids so other processes can
+    drop theirs too.
+    """
+    tracked = tuple(tracked_models)
+    tracked_tables = {model.__table__ for model in tracked}
+
+    @event.listens_for(session_class, "after_flush")
+    def _collect(session, flush_context):
+        touched = [obj for obj in (*session.new, *session.dirty, *session.deleted)
+                   if isinstance(obj, tracked)]
+        if not touched:
+            return
+        scoped = {obj.branch_id for obj in touched if getattr(obj, "branch_id", None) is not None}
+        if not scoped:
+            scoped = {ALL_BRANCHES}
+        session.info.setdefault("tool_cache_branches", set()).update(scoped)
+
+    @event.listens_for(session_class, "do_orm_execute")
+    def _collect_bulk(orm_execute_state):
+        if not (orm_execute_state.is_update or orm_execute_state.is_delete):
+            return
+        if getattr(orm_execute_state.statement, "table", None) in tracked_tables:
+            orm_execute_state.session.info.setdefault("tool_cache_branches", set()).add(ALL_BRANCHES)
+
+    @event.listens_for(session_class, "after_commit")
+    def _invalidate(session):
+        branches = session.info.pop("tool_cache_branches", None)
+        if branches:
+            cache.invalidate(branches)
+            if publish is not None:
+                publish(sorted(branches, key=str))
+
+    @event.listens_for(session_class, "after_rollback")
+    def _discard(session):
+        session.info.pop("tool_cache_branches", None)